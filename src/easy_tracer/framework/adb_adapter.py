@@ -1,88 +1,116 @@
-import subprocess
-from typing import List
+import threading
+from typing import Callable, List, Optional
 from easy_tracer.models.device import Device
-from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
+from easy_tracer.framework.adb_client import AdbClient, DeviceTrackStream
+
+
+def parse_devices(output: str) -> List[Device]:
+    """Parses the output of ``adb devices -l`` (or a track-devices snapshot)."""
+    devices = []
+
+    # Parse output line by line
+    # Example output:
+    # List of devices attached
+    # 1234567890abcde        device product:bullhead model:Nexus_5X device:bullhead transport_id:1
+
+    lines = output.split("\n")
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("List of devices"):
+            continue
+
+        # Split by whitespace to get serial and status first
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+
+        serial = parts[0]
+        status = parts[1]
+
+        # Parse key:value pairs for the rest
+        details = {}
+        for part in parts[2:]:
+            if ":" in part:
+                key, value = part.split(":", 1)
+                details[key] = value
+
+        device = Device(
+            serial=serial,
+            status=status,
+            model=details.get("model", ""),
+            product=details.get("product", ""),
+            device=details.get("device", ""),
+            usb=details.get("usb", ""),
+            transport_id=details.get("transport_id", ""),
+        )
+        devices.append(device)
+
+    return devices
 
 
 class AdbAdapter:
-    def __init__(self, adb_path: str = "adb"):
+    def __init__(self, adb_path: str = "adb", adb_client: Optional[AdbClient] = None):
         self.adb_path = adb_path
-
-    def _run_command(self, args: List[str]) -> str:
-        """Runs an adb command and returns the output."""
-        try:
-            result = subprocess.run(
-                [self.adb_path] + args,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            # Check if it's just no devices found or a real error
-            raise RuntimeError(f"ADB command failed: {e.stderr}") from e
-        except FileNotFoundError:
-            raise RuntimeError(
-                f"ADB executable not found at '{self.adb_path}'. Please ensure Android SDK Platform-Tools are installed and in PATH."
-            )
+        # Without a shared client every call goes through the adb executable.
+        self.client = adb_client or AdbClient(adb_path, use_server=False)
+        self._track_stream: Optional[DeviceTrackStream] = None
 
     def list_devices(self) -> List[Device]:
         """Lists connected devices with details."""
-        devices = []
         try:
-            output = self._run_command(["devices", "-l"])
+            output = self.client.devices_output()
         except RuntimeError:
             return []
 
-        # Parse output line by line
-        # Example output:
-        # List of devices attached
-        # 1234567890abcde        device product:bullhead model:Nexus_5X device:bullhead transport_id:1
+        return parse_devices(output)
 
-        lines = output.split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("List of devices"):
-                continue
+    def track_devices(
+        self,
+        on_devices: Callable[[List[Device]], None],
+        stop_event: threading.Event,
+        retry_interval: float = 2.0,
+    ) -> None:
+        """
+        Blocks until stop_event is set, calling on_devices with the full device list
+        every time the adb server reports a change. Reconnects if the server restarts.
+        """
+        if not self.client.use_server:
+            # No server connection to subscribe to; poll the executable instead.
+            last: Optional[List[Device]] = None
+            while not stop_event.is_set():
+                devices = self.list_devices()
+                if devices != last:
+                    on_devices(devices)
+                    last = devices
+                stop_event.wait(retry_interval)
+            return
 
-            # Split by whitespace to get serial and status first
-            parts = line.split()
-            if len(parts) < 2:
+        while not stop_event.is_set():
+            try:
+                stream = self.client.track_devices()
+            except (OSError, RuntimeError):
+                stop_event.wait(retry_interval)
                 continue
 
-            serial = parts[0]
-            status = parts[1]
-
-            # Parse key:value pairs for the rest
-            details = {}
-            for part in parts[2:]:
-                if ":" in part:
-                    key, value = part.split(":", 1)
-                    details[key] = value
-
-            device = Device(
-                serial=serial,
-                status=status,
-                model=details.get("model", ""),
-                product=details.get("product", ""),
-                device=details.get("device", ""),
-                usb=details.get("usb", ""),
-                transport_id=details.get("transport_id", ""),
-            )
-            devices.append(device)
-
-        return devices
+            self._track_stream = stream
+            try:
+                for snapshot in stream:
+                    if stop_event.is_set():
+                        break
+                    on_devices(parse_devices(snapshot))
+            except (OSError, RuntimeError):
+                pass
+            finally:
+                self._track_stream = None
+                stream.close()
+            stop_event.wait(retry_interval)
+
+    def stop_tracking(self) -> None:
+        """Unblocks a running track_devices call."""
+        stream = self._track_stream
+        if stream is not None:
+            stream.close()
 
     def is_available(self) -> bool:
         """Checks if ADB is available."""
-        try:
-            subprocess.run(
-                [self.adb_path, "--version"],
-                capture_output=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        return self.client.is_available()
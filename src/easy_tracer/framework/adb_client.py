@@ -0,0 +1,796 @@
+"""Client for the adb server's smart-socket protocol.
+
+Talks to the adb server on port 5037 directly instead of forking an ``adb``
+process per call. When the server cannot be reached (not started yet, custom
+build, etc.) every operation falls back to the equivalent ``adb`` command line.
+"""
+
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from easy_tracer.framework.cancellation import CancellationToken
+from easy_tracer.framework.compression import CompressionPolicy, GzipDecodingSink
+from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
+
+DEFAULT_ADB_HOST = "127.0.0.1"
+DEFAULT_ADB_PORT = 5037
+
+# shell v2 packet ids
+_SHELL_STDIN = 0
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+_SHELL_CLOSE_STDIN = 4
+
+_SYNC_DATA_MAX = 64 * 1024
+_STREAM_CHUNK = 256 * 1024
+
+_T = TypeVar("_T")
+
+
+class AdbError(RuntimeError):
+    """Raised when adb rejects a request or a device command fails."""
+
+
+class _ServerUnavailable(OSError):
+    """The adb server socket could not be reached; the caller should fall back to the adb binary."""
+
+
+class _ConnectionClosed(AdbError):
+    """The adb server closed the connection in the middle of a reply."""
+
+
+# A dropped connection to the adb server, as opposed to e.g. a local file error
+_CONNECTION_ERRORS = (ConnectionError, _ConnectionClosed)
+
+
+class DeviceTrackStream:
+    """Iterates over the device-list snapshots pushed by ``host:track-devices-l``."""
+
+    def __init__(self, client: "AdbClient", sock: socket.socket):
+        self._client = client
+        self._sock = sock
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                block = self._client._read_hex_block(self._sock)
+            except OSError as e:
+                raise AdbError(f"Device tracking connection lost: {e}") from e
+            yield block.decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        """Closes the stream; safe to call from another thread to unblock the reader."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+@dataclass
+class ShellResult:
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+def _interrupt_on_cancel(
+    cancel_token: Optional[CancellationToken], interrupt: Callable[[], None]
+) -> Callable[[], None]:
+    """Runs interrupt (which unblocks a transfer) when cancel_token is cancelled; returns the unregister function."""
+    if cancel_token is None:
+        return lambda: None
+    return cancel_token.on_cancel(interrupt)
+
+
+def _shutdown_socket(sock: socket.socket) -> Callable[[], None]:
+    def interrupt() -> None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    return interrupt
+
+
+def _join_command(command: Union[str, List[str]]) -> str:
+    # adb itself joins shell arguments with single spaces
+    if isinstance(command, str):
+        return command
+    return " ".join(command)
+
+
+class AdbClient:
+    def __init__(
+        self,
+        adb_path: str = "adb",
+        host: str = DEFAULT_ADB_HOST,
+        port: int = DEFAULT_ADB_PORT,
+        use_server: bool = True,
+        connect_timeout: float = 5.0,
+        max_idle_per_device: int = 2,
+        compression: Optional[CompressionPolicy] = None,
+    ):
+        self.adb_path = adb_path
+        self.host = host
+        self.port = port
+        self.use_server = use_server
+        self.connect_timeout = connect_timeout
+        self.max_idle_per_device = max_idle_per_device
+        self.compression = compression or CompressionPolicy()
+        self._idle_sync: Dict[str, List[socket.socket]] = {}
+        self._pool_lock = threading.Lock()
+        self._has_gzip: Dict[str, bool] = {}
+
+    # ------------------------------------------------------------------
+    # Wire protocol
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> socket.socket:
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        except OSError as e:
+            raise _ServerUnavailable(str(e)) from e
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = sock.recv(size - len(buf))
+            if not chunk:
+                raise _ConnectionClosed("adb server closed the connection unexpectedly")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _send_request(self, sock: socket.socket, request: str) -> None:
+        payload = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(payload) + payload)
+
+    def _read_hex_block(self, sock: socket.socket) -> bytes:
+        length = int(self._recv_exact(sock, 4), 16)
+        return self._recv_exact(sock, length)
+
+    def _read_status(self, sock: socket.socket) -> None:
+        status = self._recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            message = self._read_hex_block(sock).decode("utf-8", errors="replace")
+            raise AdbError(message)
+        raise AdbError(f"Unexpected adb server response: {status!r}")
+
+    def _host_query(self, request: str) -> str:
+        sock = self._connect()
+        try:
+            self._send_request(sock, request)
+            self._read_status(sock)
+            return self._read_hex_block(sock).decode("utf-8", errors="replace")
+        finally:
+            sock.close()
+
+    def _open_service(self, serial: str, service: str) -> socket.socket:
+        """Connects, switches the socket to the device transport and opens a service on it."""
+        sock = self._connect()
+        try:
+            self._send_request(sock, f"host:transport:{serial}")
+            self._read_status(sock)
+            self._send_request(sock, service)
+            self._read_status(sock)
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    # ------------------------------------------------------------------
+    # Subprocess fallback
+    # ------------------------------------------------------------------
+
+    def _run_adb(
+        self, args: List[str], text: bool = True, input_data: Optional[Union[str, bytes]] = None
+    ) -> subprocess.CompletedProcess:
+        try:
+            return subprocess.run(
+                [self.adb_path] + args,
+                input=input_data,
+                capture_output=True,
+                text=text,
+                check=False,
+                **subprocess_hidden_window_kwargs(),
+            )
+        except FileNotFoundError:
+            raise AdbError(
+                f"ADB executable not found at '{self.adb_path}'. Please ensure Android SDK Platform-Tools are installed and in PATH."
+            )
+
+    # ------------------------------------------------------------------
+    # Host services
+    # ------------------------------------------------------------------
+
+    def devices_output(self) -> str:
+        """Returns the device list in the same format as ``adb devices -l``."""
+        if self.use_server:
+            try:
+                return self._host_query("host:devices-l")
+            except OSError:
+                pass
+        result = self._run_adb(["devices", "-l"])
+        if result.returncode != 0:
+            raise AdbError(f"ADB command failed: {result.stderr}")
+        return result.stdout
+
+    def track_devices(self) -> DeviceTrackStream:
+        """
+        Opens a ``host:track-devices-l`` stream. The server sends the full device
+        list once and again whenever a device is added, removed or changes state.
+        Starts the adb server through the executable if it isn't running yet.
+        """
+        try:
+            sock = self._connect()
+        except _ServerUnavailable:
+            self._run_adb(["start-server"])
+            sock = self._connect()
+        try:
+            self._send_request(sock, "host:track-devices-l")
+            self._read_status(sock)
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return DeviceTrackStream(self, sock)
+
+    def is_available(self) -> bool:
+        """Checks whether the adb server answers, or the adb executable can be run."""
+        if self.use_server:
+            try:
+                self._host_query("host:version")
+                return True
+            except (OSError, AdbError):
+                pass
+        try:
+            return self._run_adb(["--version"]).returncode == 0
+        except AdbError:
+            return False
+
+    # ------------------------------------------------------------------
+    # Device services
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _shell_args(device_serial: str, command: Union[str, List[str]]) -> List[str]:
+        args = ["-s", device_serial, "shell"]
+        if isinstance(command, str):
+            args.append(command)
+        else:
+            args.extend(command)
+        return args
+
+    def shell(
+        self,
+        device_serial: str,
+        command: Union[str, List[str]],
+        check: bool = True,
+        stdin_data: Optional[Union[str, bytes]] = None,
+    ) -> ShellResult:
+        """
+        Runs a shell command on the device and returns its output and exit code.
+        stdin_data, if given, is written to the command's stdin.
+        """
+        result = None
+        if self.use_server:
+            try:
+                result = self._shell_v2(device_serial, _join_command(command), stdin_data=stdin_data)
+            except _ServerUnavailable:
+                # Never re-run a command that may already have started on the device.
+                result = None
+        if result is None:
+            if isinstance(stdin_data, bytes):
+                completed = self._run_adb(
+                    self._shell_args(device_serial, command), text=False, input_data=stdin_data
+                )
+                result = ShellResult(
+                    completed.returncode,
+                    completed.stdout.decode("utf-8", errors="replace"),
+                    completed.stderr.decode("utf-8", errors="replace"),
+                )
+            else:
+                completed = self._run_adb(self._shell_args(device_serial, command), input_data=stdin_data)
+                result = ShellResult(completed.returncode, completed.stdout, completed.stderr)
+
+        if check and result.exit_code != 0:
+            raise AdbError(result.stderr or result.stdout or f"exit code {result.exit_code}")
+        return result
+
+    def shell_stream(
+        self,
+        device_serial: str,
+        command: Union[str, List[str]],
+        sink: BinaryIO,
+        on_progress: Optional[Callable[[int], None]] = None,
+        check: bool = True,
+        stdin_data: Optional[Union[str, bytes]] = None,
+        compress: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> ShellResult:
+        """
+        Runs a shell command and writes its stdout to sink as it arrives, so binary
+        output of any size is copied with bounded memory. on_progress receives the
+        number of bytes written so far. The returned result has empty stdout.
+        With compress the output is gzipped on the device and inflated on the
+        way into sink; see should_compress(). Cancelling cancel_token drops the
+        connection (adbd then stops the command) and raises CaptureCancelled.
+        """
+        # Timed from the first byte, since commands like perfetto only write once they finish
+        first_byte: List[float] = []
+        received = [0]
+
+        def progress(count: int) -> None:
+            if not first_byte:
+                first_byte.append(time.monotonic())
+            received[0] = count
+            if on_progress:
+                on_progress(count)
+
+        result = self._shell_stream(
+            device_serial, command, sink, progress, check, stdin_data, compress, cancel_token
+        )
+        if first_byte:
+            self.compression.record(device_serial, compress, received[0], time.monotonic() - first_byte[0])
+        return result
+
+    def _shell_stream(
+        self,
+        device_serial: str,
+        command: Union[str, List[str]],
+        sink: BinaryIO,
+        on_progress: Optional[Callable[[int], None]] = None,
+        check: bool = True,
+        stdin_data: Optional[Union[str, bytes]] = None,
+        compress: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> ShellResult:
+        if compress:
+            command = f"set -o pipefail; ({_join_command(command)}) | gzip -c -1"
+            decoder = GzipDecodingSink(sink)
+            result = self._shell_stream(
+                device_serial,
+                command,
+                decoder,
+                on_progress=(lambda _: on_progress(decoder.written)) if on_progress else None,
+                check=check,
+                stdin_data=stdin_data,
+                cancel_token=cancel_token,
+            )
+            try:
+                decoder.finish()
+            except EOFError as e:
+                raise AdbError(f"{e}: {result.stderr}".rstrip(": ")) from e
+            return result
+
+        result = None
+        if self.use_server:
+            try:
+                result = self._shell_v2(
+                    device_serial,
+                    _join_command(command),
+                    sink,
+                    on_progress,
+                    stdin_data=stdin_data,
+                    cancel_token=cancel_token,
+                )
+            except _ServerUnavailable:
+                result = None
+        if result is None:
+            result = self._exec_out_stream(device_serial, command, sink, on_progress, stdin_data, cancel_token)
+
+        if check and result.exit_code != 0:
+            raise AdbError(result.stderr or f"exit code {result.exit_code}")
+        return result
+
+    def _exec_out_stream(
+        self,
+        device_serial: str,
+        command: Union[str, List[str]],
+        sink: BinaryIO,
+        on_progress: Optional[Callable[[int], None]],
+        stdin_data: Optional[Union[str, bytes]],
+        cancel_token: Optional[CancellationToken],
+    ) -> ShellResult:
+        """
+        Streams through ``adb exec-out``, which never allocates a PTY that would
+        mangle binary output. exec-out mixes stderr into stdout and drops the exit
+        code, so both are written to a file on the device and read back afterwards.
+        """
+        status_path = f"/data/local/tmp/.easy_tracer_stream_{os.getpid()}_{threading.get_ident()}"
+        wrapped = f'({_join_command(command)}) 2>{status_path}; echo "$?" >>{status_path}'
+        result = self._stream_adb(
+            ["-s", device_serial, "exec-out", wrapped], sink, on_progress, stdin_data, cancel_token
+        )
+        status = self.shell(device_serial, f"cat {status_path}; rm -f {status_path}", check=False).stdout
+        stderr, _, exit_code = status.rstrip("\n").rpartition("\n")
+        if not exit_code.isdigit():
+            # The command never finished, e.g. adb was killed
+            return ShellResult(result.exit_code or 1, "", status or result.stderr)
+        return ShellResult(int(exit_code), "", stderr + "\n" if stderr else "")
+
+    def _stream_adb(
+        self,
+        args: List[str],
+        sink: BinaryIO,
+        on_progress: Optional[Callable[[int], None]],
+        stdin_data: Optional[Union[str, bytes]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> ShellResult:
+        try:
+            proc = subprocess.Popen(
+                [self.adb_path] + args,
+                stdin=subprocess.PIPE if stdin_data is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **subprocess_hidden_window_kwargs(),
+            )
+        except FileNotFoundError:
+            raise AdbError(f"ADB executable not found at '{self.adb_path}'.")
+
+        if stdin_data is not None:
+            if isinstance(stdin_data, str):
+                stdin_data = stdin_data.encode("utf-8")
+            proc.stdin.write(stdin_data)
+            proc.stdin.close()
+
+        # Drain stderr on the side so a chatty command can't block on a full pipe
+        stderr_chunks: List[bytes] = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        stderr_thread.start()
+        unregister = _interrupt_on_cancel(cancel_token, proc.kill)
+        written = 0
+        try:
+            while True:
+                chunk = proc.stdout.read(_STREAM_CHUNK)
+                if not chunk:
+                    break
+                sink.write(chunk)
+                written += len(chunk)
+                if on_progress:
+                    on_progress(written)
+        finally:
+            unregister()
+            exit_code = proc.wait()
+            stderr_thread.join()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        return ShellResult(exit_code, "", b"".join(stderr_chunks).decode("utf-8", errors="replace"))
+
+    def _shell_v2(
+        self,
+        device_serial: str,
+        command: str,
+        sink: Optional[BinaryIO] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        stdin_data: Optional[Union[str, bytes]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Optional[ShellResult]:
+        try:
+            sock = self._open_service(device_serial, f"shell,v2,raw:{command}")
+        except AdbError as e:
+            # Old devices don't support shell v2; let the adb binary deal with them.
+            if "unsupported" in str(e) or "not supported" in str(e):
+                return None
+            raise
+        if stdin_data is not None:
+            data = stdin_data.encode("utf-8") if isinstance(stdin_data, str) else stdin_data
+            try:
+                sock.sendall(bytes([_SHELL_STDIN]) + struct.pack("<I", len(data)) + data)
+                # Close stdin so commands reading it (perfetto -c -) see EOF
+                sock.sendall(bytes([_SHELL_CLOSE_STDIN]) + struct.pack("<I", 0))
+            except OSError as e:
+                sock.close()
+                raise AdbError(f"Lost connection to adb server during shell command: {e}") from e
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code = 0
+        written = 0
+        unregister = _interrupt_on_cancel(cancel_token, _shutdown_socket(sock))
+        try:
+            while True:
+                header = sock.recv(1)
+                if not header:
+                    break
+                packet_id = header[0]
+                (length,) = struct.unpack("<I", self._recv_exact(sock, 4))
+                data = self._recv_exact(sock, length) if length else b""
+                if packet_id == _SHELL_STDOUT:
+                    if sink is None:
+                        stdout.extend(data)
+                        continue
+                    sink.write(data)
+                    written += len(data)
+                    if on_progress:
+                        on_progress(written)
+                elif packet_id == _SHELL_STDERR:
+                    stderr.extend(data)
+                elif packet_id == _SHELL_EXIT:
+                    exit_code = data[0] if data else 0
+                    break
+        except (OSError, AdbError) as e:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if isinstance(e, AdbError):
+                raise
+            raise AdbError(f"Lost connection to adb server during shell command: {e}") from e
+        finally:
+            unregister()
+            sock.close()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        return ShellResult(
+            exit_code,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+        )
+
+    def _sync_call(self, device_serial: str, operation: Callable[[socket.socket], _T]) -> _T:
+        """
+        Runs operation on a pooled ``sync:`` connection for the device. The server
+        drops idle connections when the device reconnects or adb restarts, which
+        only shows once a pooled connection is used; the operation is then retried
+        once on a fresh connection. A connection whose operation failed is closed,
+        never pooled, since it may be in the middle of a reply.
+        """
+        pooled = False
+        try:
+            with self._sync_session(device_serial) as (sock, pooled):
+                return operation(sock)
+        except _CONNECTION_ERRORS:
+            if not pooled:
+                raise
+        with self._sync_session(device_serial, reuse=False) as (sock, _):
+            return operation(sock)
+
+    @contextmanager
+    def _sync_session(
+        self, device_serial: str, reuse: bool = True
+    ) -> Iterator[Tuple[socket.socket, bool]]:
+        """Yields a ``sync:`` connection for the device and whether it came from the pool."""
+        sock = None
+        if reuse:
+            with self._pool_lock:
+                idle = self._idle_sync.get(device_serial)
+                sock = idle.pop() if idle else None
+        pooled = sock is not None
+        if sock is None:
+            sock = self._open_service(device_serial, "sync:")
+        try:
+            yield sock, pooled
+        except BaseException:
+            sock.close()
+            raise
+        with self._pool_lock:
+            idle = self._idle_sync.setdefault(device_serial, [])
+            if len(idle) < self.max_idle_per_device:
+                idle.append(sock)
+                return
+        self._quit_sync(sock)
+
+    @staticmethod
+    def _quit_sync(sock: socket.socket) -> None:
+        try:
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+        except OSError:
+            pass
+        sock.close()
+
+    def _read_sync_fail(self, sock: socket.socket, length: int) -> AdbError:
+        message = self._recv_exact(sock, length).decode("utf-8", errors="replace")
+        return AdbError(message)
+
+    def should_compress(self, device_serial: str) -> bool:
+        """
+        True when transfers from the device should be gzipped on the device:
+        the compression policy favours it for this link and the device has gzip.
+        """
+        if not self.compression.should_compress(device_serial):
+            return False
+        if device_serial not in self._has_gzip:
+            try:
+                probe = self.shell(device_serial, "gzip -h >/dev/null 2>&1", check=False)
+                self._has_gzip[device_serial] = probe.exit_code == 0
+            except AdbError:
+                return False
+        return self._has_gzip[device_serial]
+
+    def pull(
+        self,
+        device_serial: str,
+        remote_path: str,
+        local_path: str,
+        compress: Optional[bool] = False,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Copies a file from the device to the host. With compress the file is
+        gzipped on the device and inflated while it streams in; None lets
+        should_compress() decide from the measured link speed.
+        on_progress receives (bytes received, file size or 0 if unknown).
+        Cancelling cancel_token aborts the transfer, removes the partial file
+        and raises CaptureCancelled.
+        """
+        if compress is None:
+            compress = self.should_compress(device_serial)
+        progress = None
+        if on_progress:
+            total = self.file_size(device_serial, remote_path)
+            progress = lambda received: on_progress(received, total)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        started = time.monotonic()
+        if compress:
+            self._pull_gzip(device_serial, remote_path, local_path, progress, cancel_token)
+        else:
+            self._pull_plain(device_serial, remote_path, local_path, progress, cancel_token)
+        if os.path.exists(local_path):
+            self.compression.record(
+                device_serial, compress, os.path.getsize(local_path), time.monotonic() - started
+            )
+        return local_path
+
+    def file_size(self, device_serial: str, remote_path: str) -> int:
+        """Returns the size of a file on the device in bytes, or 0 if it can't be determined."""
+        if self.use_server:
+            path = remote_path.encode("utf-8")
+
+            def stat(sock: socket.socket) -> bytes:
+                sock.sendall(b"STAT" + struct.pack("<I", len(path)) + path)
+                return self._recv_exact(sock, 16)
+
+            try:
+                header = self._sync_call(device_serial, stat)
+                if header[:4] == b"STAT":
+                    # The v1 STAT reply holds mode, size and mtime; the size wraps past 4 GB
+                    return struct.unpack("<III", header[4:])[1]
+            except (OSError, AdbError):
+                pass
+        result = self.shell(device_serial, ["stat", "-c", "%s", remote_path], check=False)
+        size = result.stdout.strip()
+        return int(size) if size.isdigit() else 0
+
+    def _pull_gzip(
+        self,
+        device_serial: str,
+        remote_path: str,
+        local_path: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> None:
+        tmp_path = local_path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                decoder = GzipDecodingSink(f)
+                # pull() records the whole transfer with the compression policy
+                self._shell_stream(
+                    device_serial,
+                    ["gzip", "-c", "-1", remote_path],
+                    decoder,
+                    on_progress=(lambda _: on_progress(decoder.written)) if on_progress else None,
+                    cancel_token=cancel_token,
+                )
+                decoder.finish()
+            os.replace(tmp_path, local_path)
+        except EOFError as e:
+            raise AdbError(str(e)) from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _pull_plain(
+        self,
+        device_serial: str,
+        remote_path: str,
+        local_path: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> None:
+        if self.use_server:
+            try:
+                self._sync_call(
+                    device_serial,
+                    lambda sock: self._sync_pull(sock, remote_path, local_path, on_progress, cancel_token),
+                )
+                return
+            except (_ServerUnavailable,) + _CONNECTION_ERRORS:
+                pass
+        completed = self._run_adb(["-s", device_serial, "pull", remote_path, local_path])
+        if completed.returncode != 0:
+            raise AdbError(completed.stderr or completed.stdout)
+
+    def _sync_pull(
+        self,
+        sock: socket.socket,
+        remote_path: str,
+        local_path: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> None:
+        path = remote_path.encode("utf-8")
+        sock.sendall(b"RECV" + struct.pack("<I", len(path)) + path)
+        tmp_path = local_path + ".part"
+        unregister = _interrupt_on_cancel(cancel_token, _shutdown_socket(sock))
+        received = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    try:
+                        header = self._recv_exact(sock, 8)
+                    except (OSError, AdbError):
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                        raise
+                    tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+                    if tag == b"DATA":
+                        f.write(self._recv_exact(sock, length))
+                        received += length
+                        if on_progress:
+                            on_progress(received)
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                    elif tag == b"DONE":
+                        break
+                    elif tag == b"FAIL":
+                        raise self._read_sync_fail(sock, length)
+                    else:
+                        raise AdbError(f"Unexpected sync response: {tag!r}")
+            os.replace(tmp_path, local_path)
+        finally:
+            unregister()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def push(self, device_serial: str, local_path: str, remote_path: str, mode: int = 0o644) -> str:
+        """Copies a file from the host to the device."""
+        if self.use_server:
+            try:
+                self._sync_call(
+                    device_serial, lambda sock: self._sync_push(sock, local_path, remote_path, mode)
+                )
+                return remote_path
+            except (_ServerUnavailable,) + _CONNECTION_ERRORS:
+                pass
+        completed = self._run_adb(["-s", device_serial, "push", local_path, remote_path])
+        if completed.returncode != 0:
+            raise AdbError(completed.stderr or completed.stdout)
+        return remote_path
+
+    def _sync_push(self, sock: socket.socket, local_path: str, remote_path: str, mode: int) -> None:
+        spec = f"{remote_path},{0o100000 | mode}".encode("utf-8")
+        sock.sendall(b"SEND" + struct.pack("<I", len(spec)) + spec)
+        with open(local_path, "rb") as f:
+            while True:
+                chunk = f.read(_SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+        sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+        header = self._recv_exact(sock, 8)
+        tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+        if tag == b"FAIL":
+            raise self._read_sync_fail(sock, length)
+        if tag != b"OKAY":
+            raise AdbError(f"Unexpected sync response: {tag!r}")
+
+    def close(self) -> None:
+        """Closes all pooled connections."""
+        with self._pool_lock:
+            pooled = [sock for socks in self._idle_sync.values() for sock in socks]
+            self._idle_sync.clear()
+        for sock in pooled:
+            self._quit_sync(sock)
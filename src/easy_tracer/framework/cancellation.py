@@ -0,0 +1,77 @@
+import threading
+from typing import Callable, List, Optional
+
+# Capture phases reported through on_phase callbacks
+PHASE_STARTING = "starting"
+PHASE_RECORDING = "recording"
+PHASE_STOPPING = "stopping"
+PHASE_PULLING = "pulling"
+PHASE_POST_PROCESSING = "post-processing"
+
+PhaseCallback = Callable[[str], None]
+
+
+class CaptureCancelled(RuntimeError):
+    """Raised by a capture that stopped because its CancellationToken was cancelled."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared between the UI and a running capture.
+    Long blocking steps (a perfetto session, an adb pull) register on_cancel
+    callbacks that interrupt them, e.g. by signalling the tracer on the device;
+    everything else checks raise_if_cancelled() between steps.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        if callbacks:
+            # Callbacks talk to the device; never block the caller (usually the UI thread)
+            threading.Thread(target=self._run_callbacks, args=(callbacks,), daemon=True).start()
+
+    @staticmethod
+    def _run_callbacks(callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Registers callback to run once the token is cancelled (right away if it
+        already is). Returns a function that unregisters it.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        self._run_callbacks([callback])
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise CaptureCancelled("Capture cancelled")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleeps for up to timeout seconds; returns True early if cancelled."""
+        return self._event.wait(timeout)
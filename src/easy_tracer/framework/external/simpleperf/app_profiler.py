@@ -288,6 +288,8 @@ class ProfilerBase(object):
                 binary_cache_args += ['--disable_adb_root']
             if self.args.ndk_path:
                 binary_cache_args += ['--ndk_path', self.args.ndk_path]
+            if self.args.binary_store:
+                binary_cache_args += ['--binary_store', self.args.binary_store]
             subprocess.check_call(binary_cache_args)
 
 
@@ -512,6 +514,11 @@ def main():
                                       device to binary_cache directory. It can be used to annotate
                                       source code and disassembly. This option skips it.""")
 
+    record_group.add_argument('--binary_store',
+                              help="""Directory of binaries shared by profiles. Binaries found
+                                      there aren't pulled from device again. See
+                                      binary_cache_builder.py.""")
+
     other_group = parser.add_argument_group('Other options')
     other_group.add_argument('--ndk_path', type=extant_dir,
                              help="""Set the path of a ndk release. app_profiler.py needs some
@@ -20,17 +20,20 @@
 """
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import itertools
 import logging
 import os
 import os.path
 from pathlib import Path
 import shutil
 import sys
+import threading
 from typing import Dict, List, Optional, Union
 
 from simpleperf_report_lib import ReportLib
 from simpleperf_utils import (
-    AdbHelper, BaseArgumentParser, extant_dir, extant_file, flatten_arg_list,
+    AdbHelper, BaseArgumentParser, bytes_to_str, extant_dir, extant_file, flatten_arg_list,
     ReadElf, str_to_bytes)
 
 
@@ -38,9 +41,67 @@ def is_jit_symfile(dso_name):
     return dso_name.split('/')[-1].startswith('TemporaryFile')
 
 
+def link_or_copy(from_path: Path, to_path: Path):
+    """ Hard links from_path to to_path, copying when links aren't supported. """
+    try:
+        os.link(from_path, to_path)
+    except OSError:
+        shutil.copy(from_path, to_path)
+
+
+class BinaryStore:
+    """ Binaries shared by the binary caches of all profiles, stored once per build id.
+        build_id_index lists them in "<build_id>=<path_in_store>" lines. It is only appended
+        to, so the store is never rescanned for build ids.
+    """
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        self.index_path = store_dir / 'build_id_index'
+        self.lock = threading.Lock()
+        self.build_id_map: Dict[str, Path] = {}
+        if self.index_path.is_file():
+            with open(self.index_path, 'rb') as fh:
+                for line in fh:
+                    items = bytes_to_str(line).strip().split('=')
+                    if len(items) == 2:
+                        self.build_id_map[items[0]] = store_dir / items[1]
+
+    def get(self, build_id: str) -> Optional[Path]:
+        path = self.build_id_map.get(build_id)
+        if path and path.is_file():
+            return path
+        return None
+
+    def add(self, build_id: str, from_path: Path) -> Path:
+        """ Adds a binary already checked to have build_id. Returns its path in the store. """
+        relative_path = Path(build_id[2:]) / from_path.name
+        path = self.store_dir / relative_path
+        with self.lock:
+            if self.get(build_id):
+                return self.build_id_map[build_id]
+            os.makedirs(path.parent, exist_ok=True)
+            tmp_path = path.with_name('%s.%d.part' % (path.name, os.getpid()))
+            if tmp_path.is_file():
+                tmp_path.unlink()
+            link_or_copy(from_path, tmp_path)
+            os.replace(tmp_path, path)
+            # Write in binary mode to avoid "\r\n" problem on windows, like build_id_list.
+            with open(self.index_path, 'ab') as fh:
+                fh.write(str_to_bytes(f'{build_id}={relative_path.as_posix()}\n'))
+            self.build_id_map[build_id] = path
+        return path
+
+
 class BinaryCache:
     def __init__(self, binary_dir: Path):
         self.binary_dir = binary_dir
+        # Binaries known to have their build id, for build_id_list.
+        self.build_id_paths: Dict[str, Path] = {}
+
+    def add_binary(self, build_id: str, path: Path):
+        if build_id:
+            self.build_id_paths[build_id] = path
 
     def get_path_in_cache(self, device_path: str, build_id: str) -> Path:
         """ Given a binary path in perf.data, return its corresponding path in the cache.
@@ -78,17 +139,26 @@ class BinarySource:
 
 
 class BinarySourceFromDevice(BinarySource):
-    """ Pull binaries from device. """
+    """ Pull binaries from device. Binaries found in the store aren't pulled, and pulled
+        binaries are added to it. Up to jobs binaries are pulled at the same time.
+    """
 
-    def __init__(self, readelf: ReadElf, disable_adb_root: bool):
+    def __init__(self, readelf: ReadElf, disable_adb_root: bool,
+                 store: Optional[BinaryStore] = None, jobs: int = 1):
         super().__init__(readelf)
         self.adb = AdbHelper(enable_switch_to_root=not disable_adb_root)
+        self.store = store
+        self.jobs = jobs
+        self.tmp_file_ids = itertools.count()
 
     def collect_binaries(self, binaries: Dict[str, str], binary_cache: BinaryCache):
         if not self.adb.is_device_available():
             return
-        for path, build_id in binaries.items():
-            self.collect_binary(path, build_id, binary_cache)
+        with ThreadPoolExecutor(self.jobs) as executor:
+            futures = [executor.submit(self.collect_binary, path, build_id, binary_cache)
+                       for path, build_id in binaries.items()]
+            for future in futures:
+                future.result()
         self.pull_kernel_symbols(binary_cache.binary_dir / 'kallsyms')
 
     def collect_binary(self, path: str, build_id: str, binary_cache: BinaryCache):
@@ -96,16 +166,29 @@ class BinarySourceFromDevice(BinarySource):
             # [kernel.kallsyms] or unknown, or something we can't find binary.
             return
         binary_cache_file = binary_cache.get_path_in_cache(path, build_id)
-        self.check_and_pull_binary(path, build_id, binary_cache_file)
+        if self.check_and_pull_binary(path, build_id, binary_cache_file):
+            binary_cache.add_binary(build_id, binary_cache_file)
 
-    def check_and_pull_binary(self, path: str, expected_build_id: str, binary_cache_file: Path):
+    def check_and_pull_binary(self, path: str, expected_build_id: str,
+                              binary_cache_file: Path) -> bool:
         """If the binary_cache_file exists and has the expected_build_id, there
-           is no need to pull the binary from device. Otherwise, pull it.
+           is no need to pull the binary from device. Nor if the store has it. Otherwise,
+           pull it. Returns True if binary_cache_file has the expected_build_id.
         """
+        stored_file = self.store.get(expected_build_id) if (
+            self.store and expected_build_id) else None
         if binary_cache_file.is_file() and (
                 not expected_build_id or expected_build_id == self.read_build_id(binary_cache_file)
         ):
             logging.info('use current file in binary_cache: %s', binary_cache_file)
+            return True
+        elif stored_file:
+            logging.info('link file from binary store: %s to %s', stored_file, binary_cache_file)
+            os.makedirs(binary_cache_file.parent, exist_ok=True)
+            if binary_cache_file.is_file():
+                binary_cache_file.unlink()
+            link_or_copy(stored_file, binary_cache_file)
+            return True
         else:
             logging.info('pull file to binary_cache: %s to %s', path, binary_cache_file)
             target_dir = binary_cache_file.parent
@@ -119,16 +202,27 @@ class BinarySourceFromDevice(BinarySource):
                 success = False
             if not success:
                 logging.warning('failed to pull %s from device', path)
+                return False
+            if not expected_build_id:
+                return True
+            if self.read_build_id(binary_cache_file) != expected_build_id:
+                logging.warning('%s on device has a different build id than in perf.data', path)
+                return False
+            if self.store:
+                self.store.add(expected_build_id, binary_cache_file)
+            return True
 
     def pull_file_from_device(self, device_path: str, host_path: Path) -> bool:
         if self.adb.run(['pull', device_path, str(host_path)]):
             return True
         # On non-root devices, we can't pull /data/app/XXX/base.odex directly.
         # Instead, we can first copy the file to /data/local/tmp, then pull it.
+        # Files are pulled in parallel, so give the copy a unique name.
         filename = device_path[device_path.rfind('/')+1:]
-        if (self.adb.run(['shell', 'cp', device_path, '/data/local/tmp']) and
-                self.adb.run(['pull', '/data/local/tmp/' + filename, host_path])):
-            self.adb.run(['shell', 'rm', '/data/local/tmp/' + filename])
+        tmp_path = '/data/local/tmp/binary_cache_%d_%s' % (next(self.tmp_file_ids), filename)
+        if (self.adb.run(['shell', 'cp', device_path, tmp_path]) and
+                self.adb.run(['pull', tmp_path, host_path])):
+            self.adb.run(['shell', 'rm', tmp_path])
             return True
         return False
 
@@ -223,6 +317,7 @@ class BinarySourceFromLibDirs(BinarySource):
     def copy_to_binary_cache(
             self, from_path: Path, expected_build_id: str, device_path: str):
         to_path = self.binary_cache.get_path_in_cache(device_path, expected_build_id)
+        self.binary_cache.add_binary(expected_build_id, to_path)
         if not self.need_to_copy(from_path, to_path, expected_build_id):
             # The existing file in binary_cache can provide more information, so no need to copy.
             return
@@ -230,6 +325,9 @@ class BinarySourceFromLibDirs(BinarySource):
         if not to_dir.is_dir():
             os.makedirs(to_dir)
         logging.info('copy to binary_cache: %s to %s', from_path, to_path)
+        if to_path.is_file():
+            # It may be linked from the binary store, which must not change.
+            to_path.unlink()
         shutil.copy(from_path, to_path)
 
     def need_to_copy(self, from_path: Path, to_path: Path, expected_build_id: str):
@@ -250,9 +348,11 @@ class BinarySourceFromLibDirs(BinarySource):
 class BinaryCacheBuilder:
     """Collect all binaries needed by perf.data in binary_cache."""
 
-    def __init__(self, ndk_path: Optional[str], disable_adb_root: bool):
+    def __init__(self, ndk_path: Optional[str], disable_adb_root: bool,
+                 binary_store_dir: Optional[Union[Path, str]] = None, jobs: int = 1):
         self.readelf = ReadElf(ndk_path)
-        self.device_source = BinarySourceFromDevice(self.readelf, disable_adb_root)
+        store = BinaryStore(Path(binary_store_dir)) if binary_store_dir else None
+        self.device_source = BinarySourceFromDevice(self.readelf, disable_adb_root, store, jobs)
         self.binary_cache_dir = Path('binary_cache')
         self.binary_cache = BinaryCache(self.binary_cache_dir)
         self.binaries = {}
@@ -311,19 +411,17 @@ class BinaryCacheBuilder:
 
     def create_build_id_list(self):
         """ Create build_id_list. So report scripts can find a binary by its build_id instead of
-            path.
+            path. The build ids of binaries were checked when they were collected, so there is
+            no need to read them again.
         """
         build_id_list_path = self.binary_cache_dir / 'build_id_list'
         # Write in binary mode to avoid "\r\n" problem on windows, which can confuse simpleperf.
         with open(build_id_list_path, 'wb') as fh:
-            for root, _, files in os.walk(self.binary_cache_dir):
-                for filename in files:
-                    path = Path(os.path.join(root, filename))
-                    build_id = self.readelf.get_build_id(path)
-                    if build_id:
-                        relative_path = path.relative_to(self.binary_cache_dir)
-                        line = f'{build_id}={relative_path}\n'
-                        fh.write(str_to_bytes(line))
+            for build_id, path in sorted(self.binary_cache.build_id_paths.items()):
+                if path.is_file():
+                    relative_path = path.relative_to(self.binary_cache_dir)
+                    line = f'{build_id}={relative_path}\n'
+                    fh.write(str_to_bytes(line))
 
     def find_path_in_cache(self, device_path: str) -> Optional[Path]:
         build_id = self.binaries.get(device_path)
@@ -340,9 +438,15 @@ def main() -> bool:
     parser.add_argument('--disable_adb_root', action='store_true', help="""
         Force adb to run in non root mode.""")
     parser.add_argument('--ndk_path', nargs=1, help='Find tools in the ndk path.')
+    parser.add_argument('--binary_store', help="""
+        Directory of binaries shared with other profiles. Binaries found there by build id
+        aren't pulled from device, and pulled binaries are added to it.""")
+    parser.add_argument('-j', '--jobs', type=int, default=4, help="""
+        Pull up to this many binaries from device at the same time. Default is 4.""")
     args = parser.parse_args()
     ndk_path = None if not args.ndk_path else args.ndk_path[0]
-    builder = BinaryCacheBuilder(ndk_path, args.disable_adb_root)
+    builder = BinaryCacheBuilder(ndk_path, args.disable_adb_root, args.binary_store,
+                                 max(args.jobs, 1))
     symfs_dirs = flatten_arg_list(args.native_lib_dir)
     return builder.build_binary_cache(args.perf_data_path, symfs_dirs)
 
@@ -32,7 +32,8 @@ import logging
 import sys
 from typing import List, Dict, Optional, NamedTuple, Tuple
 
-from simpleperf_report_lib import GetReportLib
+from simpleperf_report_lib import (
+    CallChainStructure, GetReportLib, ReportLib, SampleStruct, SymbolStruct)
 from simpleperf_utils import BaseArgumentParser, ReportLibOptions
 
 
@@ -406,22 +407,38 @@ def _gecko_profile(
             report_lib_options.trace_offcpu = 'on-cpu'
     lib.SetReportOptions(report_lib_options)
 
-    arch = lib.GetArch()
-    meta_info = lib.MetaInfo()
-    record_cmd = lib.GetRecordCmd()
-
-    # Map from tid to Thread
-    thread_map: Dict[int, Thread] = {}
-    # Map from pid to process name
-    process_names: Dict[int, str] = {}
-
+    builder = GeckoProfileBuilder(percpu_samples)
+    builder.begin(lib)
     while True:
         sample = lib.GetNextSample()
         if sample is None:
             lib.Close()
             break
-        symbol = lib.GetSymbolOfCurrentSample()
-        callchain = lib.GetCallChainOfCurrentSample()
+        builder.add_sample(sample, lib.GetSymbolOfCurrentSample(),
+                           lib.GetCallChainOfCurrentSample())
+    return builder.profile(max_remove_gap_length)
+
+
+class GeckoProfileBuilder:
+    """The steps of _gecko_profile(), for callers that read the samples themselves."""
+
+    def __init__(self, percpu_samples: bool) -> None:
+        self.percpu_samples = percpu_samples
+        self.arch: Optional[str] = None
+        self.meta_info: Dict[str, str] = {}
+        self.record_cmd: Optional[str] = None
+        # Map from tid to Thread
+        self.thread_map: Dict[int, Thread] = {}
+        # Map from pid to process name
+        self.process_names: Dict[int, str] = {}
+
+    def begin(self, lib: ReportLib) -> None:
+        self.arch = lib.GetArch()
+        self.meta_info = lib.MetaInfo()
+        self.record_cmd = lib.GetRecordCmd()
+
+    def add_sample(self, sample: SampleStruct, symbol: SymbolStruct,
+                   callchain: CallChainStructure) -> None:
         sample_time_ms = sample.time / 1000000
 
         stack = ['%s (in %s)' % (symbol.symbol_name, symbol.dso_name)]
@@ -431,10 +448,11 @@ def _gecko_profile(
         # We want root first, leaf last.
         stack.reverse()
 
-        if percpu_samples:
+        thread_map = self.thread_map
+        if self.percpu_samples:
             if sample.tid == sample.pid:
-                process_names[sample.pid] = sample.thread_comm
-            process_name = process_names.get(sample.pid)
+                self.process_names[sample.pid] = sample.thread_comm
+            process_name = self.process_names.get(sample.pid)
             stack = [
                 '%s tid %d (in %s pid %d)' %
                 (sample.thread_comm, sample.tid, process_name, sample.pid)] + stack
@@ -463,6 +481,17 @@ def _gecko_profile(
                 # setting `simpleperf record --clockid realtime`.
                 time_ms=sample_time_ms)
 
+    def profile(self, max_remove_gap_length: int) -> GeckoProfile:
+        return _gecko_profile_from_threads(
+            self.thread_map, max_remove_gap_length, self.arch, self.meta_info, self.record_cmd)
+
+
+def _gecko_profile_from_threads(
+        thread_map: Dict[int, Thread],
+        max_remove_gap_length: int,
+        arch: Optional[str],
+        meta_info: Dict[str, str],
+        record_cmd: Optional[str]) -> GeckoProfile:
     for thread in thread_map.values():
         thread.sort_samples()
 
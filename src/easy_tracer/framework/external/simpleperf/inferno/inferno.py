@@ -111,6 +111,26 @@ def parse_samples(process, args, sample_filter_fn):
     if kallsyms_file:
         lib.SetKallsymsFile(kallsyms_file)
     lib.SetReportOptions(args.report_lib_options)
+    begin_parse_samples(process, args, lib)
+
+    while True:
+        sample = lib.GetNextSample()
+        if sample is None:
+            lib.Close()
+            break
+        symbol = lib.GetSymbolOfCurrentSample()
+        callchain = lib.GetCallChainOfCurrentSample()
+        if sample_filter_fn and not sample_filter_fn(sample, symbol, callchain):
+            continue
+        process.add_sample(sample, symbol, callchain)
+
+    end_parse_samples(process, args)
+
+
+# begin_parse_samples(), process.add_sample() and end_parse_samples() are the steps
+# of parse_samples(), for callers that read the samples themselves.
+
+def begin_parse_samples(process, args, lib):
     process.cmd = lib.GetRecordCmd()
     product_props = lib.MetaInfo().get("product_props")
     if product_props:
@@ -126,17 +146,8 @@ def parse_samples(process, args, sample_filter_fn):
     else:
         process.props['trace_offcpu'] = False
 
-    while True:
-        sample = lib.GetNextSample()
-        if sample is None:
-            lib.Close()
-            break
-        symbol = lib.GetSymbolOfCurrentSample()
-        callchain = lib.GetCallChainOfCurrentSample()
-        if sample_filter_fn and not sample_filter_fn(sample, symbol, callchain):
-            continue
-        process.add_sample(sample, symbol, callchain)
 
+def end_parse_samples(process, args):
     if process.pid == 0:
         main_threads = [thread for thread in process.threads.values() if thread.tid == thread.pid]
         if main_threads:
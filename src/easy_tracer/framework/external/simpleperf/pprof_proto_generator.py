@@ -262,6 +262,9 @@ class Function(object):
 
 
 # pylint: disable=no-member
+NUMBERS_RE = re.compile(r"\d+")
+
+
 class PprofProfileGenerator(object):
 
     def __init__(self, config):
@@ -303,7 +306,25 @@ class PprofProfileGenerator(object):
         if self.config.get('show_art_frames'):
             self.lib.ShowArtFrames()
         self.lib.SetReportOptions(self.config['report_lib_options'])
+        self.begin_record_file(self.lib)
+
+        # Process all samples in perf.data, aggregate samples.
+        while True:
+            report_sample = self.lib.GetNextSample()
+            if report_sample is None:
+                self.lib.Close()
+                self.lib = None
+                break
+            self.add_report_sample(report_sample, self.lib.GetEventOfCurrentSample(),
+                                   self.lib.GetSymbolOfCurrentSample(),
+                                   self.lib.GetCallChainOfCurrentSample())
 
+    # begin_record_file() and add_report_sample() are the steps of load_record_file(),
+    # for callers that read the samples themselves. lib must stay open until the
+    # last sample has been added.
+
+    def begin_record_file(self, lib):
+        self.lib = lib
         comments = [
             "Simpleperf Record Command:\n" + self.lib.GetRecordCmd(),
             "Converted to pprof with:\n" + " ".join(sys.argv),
@@ -317,49 +338,37 @@ class PprofProfileGenerator(object):
         if "timestamp" in meta_info:
             self.profile.time_nanos = int(meta_info["timestamp"]) * 1000 * 1000 * 1000
 
-        numbers_re = re.compile(r"\d+")
-
-        # Process all samples in perf.data, aggregate samples.
-        while True:
-            report_sample = self.lib.GetNextSample()
-            if report_sample is None:
-                self.lib.Close()
-                self.lib = None
-                break
-            event = self.lib.GetEventOfCurrentSample()
-            symbol = self.lib.GetSymbolOfCurrentSample()
-            callchain = self.lib.GetCallChainOfCurrentSample()
-
-            sample_type_id = self.get_sample_type_id(event.name)
-            sample = Sample()
-            sample.add_value(sample_type_id, 1)
-            sample.add_value(sample_type_id + 1, report_sample.period)
-            sample.labels.append(Label(
-                self.get_string_id("thread"),
-                self.get_string_id(report_sample.thread_comm)))
-            # Heuristic: threadpools doing similar work are often named as
-            # name-1, name-2, name-3. Combine threadpools into one label
-            # "name-%d" if they only differ by a number.
-            sample.labels.append(Label(
-                self.get_string_id("threadpool"),
-                self.get_string_id(
-                    numbers_re.sub("%d", report_sample.thread_comm))))
-            sample.labels.append(Label(
-                self.get_string_id("pid"),
-                self.get_string_id(str(report_sample.pid))))
-            sample.labels.append(Label(
-                self.get_string_id("tid"),
-                self.get_string_id(str(report_sample.tid))))
+    def add_report_sample(self, report_sample, event, symbol, callchain):
+        sample_type_id = self.get_sample_type_id(event.name)
+        sample = Sample()
+        sample.add_value(sample_type_id, 1)
+        sample.add_value(sample_type_id + 1, report_sample.period)
+        sample.labels.append(Label(
+            self.get_string_id("thread"),
+            self.get_string_id(report_sample.thread_comm)))
+        # Heuristic: threadpools doing similar work are often named as
+        # name-1, name-2, name-3. Combine threadpools into one label
+        # "name-%d" if they only differ by a number.
+        sample.labels.append(Label(
+            self.get_string_id("threadpool"),
+            self.get_string_id(
+                NUMBERS_RE.sub("%d", report_sample.thread_comm))))
+        sample.labels.append(Label(
+            self.get_string_id("pid"),
+            self.get_string_id(str(report_sample.pid))))
+        sample.labels.append(Label(
+            self.get_string_id("tid"),
+            self.get_string_id(str(report_sample.tid))))
+        if self._filter_symbol(symbol):
+            location_id = self.get_location_id(report_sample.ip, symbol)
+            sample.add_location_id(location_id)
+        for i in range(max(0, callchain.nr - self.max_chain_length), callchain.nr):
+            entry = callchain.entries[i]
             if self._filter_symbol(symbol):
-                location_id = self.get_location_id(report_sample.ip, symbol)
+                location_id = self.get_location_id(entry.ip, entry.symbol)
                 sample.add_location_id(location_id)
-            for i in range(max(0, callchain.nr - self.max_chain_length), callchain.nr):
-                entry = callchain.entries[i]
-                if self._filter_symbol(symbol):
-                    location_id = self.get_location_id(entry.ip, entry.symbol)
-                    sample.add_location_id(location_id)
-            if sample.location_ids:
-                self.add_sample(sample)
+        if sample.location_ids:
+            self.add_sample(sample)
 
     def gen(self, jobs: int):
         # 1. Generate line info for locations and functions.
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""report_engine.py: generate several reports from perf.data in one pass.
+
+report_html.py, gecko_profile_generator.py, pprof_proto_generator.py,
+stackcollapse.py and inferno each open perf.data and symbolize every sample
+on their own. This script reads the samples once and hands each one to a sink
+per requested format, so every extra format costs only its own aggregation.
+
+  Example:
+    ./report_engine.py -i perf.data --html report.html --gecko gecko_profile.json
+
+A format that fails is reported on a line starting with REPORT_FAILED; the
+other formats are still written.
+
+--time-window and --time-window-part report only part of the recording. The
+window bounds come from a current sample cache, or else a scan of the sample
+times. The window is applied as a sample filter: ReportLib still reads every sample
+record and drops the ones outside it before the sinks see them. Parts of one
+recording can be reported in parallel:
+    ./report_engine.py -i perf.data --html part1.html --time-window-part 1 2
+    ./report_engine.py -i perf.data --html part2.html --time-window-part 2 2
+"""
+
+from abc import ABC, abstractmethod
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from simpleperf_report_lib import (
+    CallChainStructure, EventStruct, GetReportLib, ProtoCallChain, ProtoCallChainEntry,
+    ProtoSymbol, ReportLib, SampleStruct, SymbolStruct)
+from simpleperf_utils import BaseArgumentParser, get_script_dir, ReportLibOptions
+
+REPORT_FAILED = 'REPORT_FAILED'
+
+
+def hide_unknown_ip(symbol: SymbolStruct) -> SymbolStruct:
+    """
+    Undoes ShowIpForUnknownSymbol() for one symbol: the lib.so[+vaddr] name it gives
+    an unknown symbol goes back to 'unknown', as stackcollapse.py (without --addrs)
+    and pprof_proto_generator.py report it.
+    """
+    name = symbol.symbol_name
+    if not name.endswith(']') or name != '%s[+%x]' % (
+            os.path.basename(symbol.dso_name), symbol.vaddr_in_file):
+        return symbol
+    return ProtoSymbol(
+        dso_name=symbol.dso_name, vaddr_in_file=symbol.vaddr_in_file, symbol_name='unknown',
+        symbol_addr=symbol.symbol_addr, symbol_len=symbol.symbol_len, mapping=symbol.mapping)
+
+
+def hide_unknown_ips(callchain: CallChainStructure) -> CallChainStructure:
+    """hide_unknown_ip() for every entry; returns callchain itself if no entry changes."""
+    entries = []
+    changed = False
+    for i in range(callchain.nr):
+        entry = callchain.entries[i]
+        original = entry.symbol
+        symbol = hide_unknown_ip(original)
+        changed = changed or symbol is not original
+        entries.append(ProtoCallChainEntry(ip=entry.ip, symbol=symbol))
+    return ProtoCallChain(nr=len(entries), entries=entries) if changed else callchain
+
+
+class ReportSink(ABC):
+    """Receives every sample of one pass and writes one report at the end."""
+
+    name = ''
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+
+    def begin(self, lib: ReportLib) -> None:
+        """Called once the record file is open, before the first sample."""
+
+    @abstractmethod
+    def add_sample(self, lib: ReportLib, sample: SampleStruct, event: EventStruct,
+                   symbol: SymbolStruct, callchain: CallChainStructure) -> None:
+        """Called for every sample in the record file."""
+
+    @abstractmethod
+    def finish(self) -> None:
+        """Called after the last sample; writes output_path."""
+
+
+class HtmlSink(ReportSink):
+    name = 'html'
+
+    def __init__(self, output_path: str, binary_cache_path: Optional[str]):
+        super().__init__(output_path)
+        from report_html import RecordData
+        self.record_data = RecordData(binary_cache_path, None, build_addr_hit_map=False)
+
+    def begin(self, lib: ReportLib) -> None:
+        self.record_data.begin_record_file(lib)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.record_data.add_sample(lib, sample, event, symbol, callchain)
+
+    def finish(self) -> None:
+        from report_html import MAX_CALLSTACK_LENGTH, ReportGenerator
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), MAX_CALLSTACK_LENGTH * 2 + 50))
+        self.record_data.end_record_file()
+        # Same defaults as report_html.py's --min_func_percent/--min_callchain_percent
+        self.record_data.limit_percents(0.01, 0.01)
+        self.record_data.sort_call_graph_by_function_name()
+        report_generator = ReportGenerator(self.output_path)
+        report_generator.write_script()
+        report_generator.write_content_div()
+        report_generator.write_record_data_blocks(self.record_data)
+        report_generator.finish()
+
+
+class GeckoSink(ReportSink):
+    name = 'gecko'
+
+    def __init__(self, output_path: str):
+        super().__init__(output_path)
+        from gecko_profile_generator import GeckoProfileBuilder
+        self.builder = GeckoProfileBuilder(percpu_samples=False)
+
+    def begin(self, lib: ReportLib) -> None:
+        self.builder.begin(lib)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.builder.add_sample(sample, symbol, callchain)
+
+    def finish(self) -> None:
+        # Same default as gecko_profile_generator.py's --remove-gaps
+        profile = self.builder.profile(max_remove_gap_length=3)
+        with open(self.output_path, 'w') as f:
+            json.dump(profile, f, sort_keys=True)
+
+
+class PprofSink(ReportSink):
+    name = 'pprof'
+
+    def __init__(self, output_path: str, report_lib_options: ReportLibOptions, jobs: int):
+        super().__init__(output_path)
+        from pprof_proto_generator import PprofProfileGenerator
+        self.jobs = jobs
+        self.generator = PprofProfileGenerator({
+            'output_file': output_path,
+            'dso_filters': None,
+            'ndk_path': None,
+            'max_chain_length': 1000000000,
+            'report_lib_options': report_lib_options,
+        })
+
+    def begin(self, lib: ReportLib) -> None:
+        self.generator.begin_record_file(lib)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.generator.add_report_sample(
+            sample, event, hide_unknown_ip(symbol), hide_unknown_ips(callchain))
+
+    def finish(self) -> None:
+        from pprof_proto_generator import store_pprof_profile
+        self.generator.lib = None
+        store_pprof_profile(self.output_path, self.generator.gen(self.jobs))
+
+
+class StackCollapseSink(ReportSink):
+    name = 'stackcollapse'
+
+    def __init__(self, output_path: str):
+        super().__init__(output_path)
+        from stackcollapse import StackCollapser
+        self.collapser = StackCollapser('', False, False, False, False)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.collapser.add_sample(sample, event, hide_unknown_ips(callchain))
+
+    def finish(self) -> None:
+        with open(self.output_path, 'w') as f:
+            for line in self.collapser.lines():
+                f.write(line + '\n')
+
+
+class InfernoSink(ReportSink):
+    name = 'inferno'
+
+    def __init__(self, output_path: str):
+        super().__init__(output_path)
+        # inferno imports its helpers as top-level modules
+        inferno_dir = os.path.join(get_script_dir(), 'inferno')
+        if inferno_dir not in sys.path:
+            sys.path.append(inferno_dir)
+        from data_types import Process
+        self.process = Process('', 0)
+        # Same defaults as inferno.py's report options
+        self.args = argparse.Namespace(
+            report_path=output_path, embedded_flamegraph=False, one_flamegraph=False,
+            title=None, capture_duration=0, color='hot', min_callchain_percentage=0.01,
+            max_callchain_depth=1000000000)
+
+    def begin(self, lib: ReportLib) -> None:
+        from inferno.inferno import begin_parse_samples
+        begin_parse_samples(self.process, self.args, lib)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.process.add_sample(sample, symbol, callchain)
+
+    def finish(self) -> None:
+        from inferno.inferno import end_parse_samples, generate_threads_offsets, output_report
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 1500))
+        end_parse_samples(self.process, self.args)
+        generate_threads_offsets(self.process)
+        output_report(self.process, self.args)
+
+
+class SampleCacheSink(ReportSink):
+    """Writes the columnar sample cache (see sample_cache.py) from the same pass."""
+
+    name = 'samples'
+
+    def __init__(self, output_path: str, record_file: str,
+                 report_lib_options: Optional[ReportLibOptions], symfs_dir: Optional[str]):
+        super().__init__(output_path)
+        from sample_cache import SampleCacheBuilder
+        self.record_file = record_file
+        # Recorded in the cache, which is only reused with the same options
+        self.report_lib_options = report_lib_options
+        self.symfs_dir = symfs_dir
+        self.builder = SampleCacheBuilder()
+
+    def begin(self, lib: ReportLib) -> None:
+        self.builder.begin(lib)
+
+    def add_sample(self, lib, sample, event, symbol, callchain) -> None:
+        self.builder.add_sample(sample, event, symbol, callchain)
+
+    def finish(self) -> None:
+        from sample_cache import source_info
+        self.builder.write(self.output_path, source_info(
+            self.record_file, self.report_lib_options, self.symfs_dir))
+
+
+def run_report_pass(
+        record_file: str,
+        sinks: List[ReportSink],
+        report_lib_options: ReportLibOptions,
+        binary_cache_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Reads record_file once, feeding every sample to every sink, then lets each
+    sink write its report. Returns {sink name: error} for the sinks that failed;
+    a failing sink is dropped without stopping the others.
+    """
+    errors: Dict[str, str] = {}
+
+    def call(sink: ReportSink, fn, *args) -> bool:
+        try:
+            fn(*args)
+            return True
+        except Exception as e:
+            logging.exception('%s report failed', sink.name)
+            errors[sink.name] = str(e) or type(e).__name__
+            return False
+
+    lib = GetReportLib(record_file)
+    # Shared by all sinks; report_html, gecko and inferno all ask for it anyway.
+    # The pprof and stackcollapse sinks turn the names back into 'unknown'.
+    lib.ShowIpForUnknownSymbol()
+    if binary_cache_path:
+        lib.SetSymfs(binary_cache_path)
+        kallsyms = os.path.join(binary_cache_path, 'kallsyms')
+        if os.path.isfile(kallsyms):
+            lib.SetKallsymsFile(kallsyms)
+    lib.SetReportOptions(report_lib_options)
+
+    try:
+        active = [sink for sink in sinks if call(sink, sink.begin, lib)]
+        while active:
+            sample = lib.GetNextSample()
+            if sample is None:
+                break
+            event = lib.GetEventOfCurrentSample()
+            symbol = lib.GetSymbolOfCurrentSample()
+            callchain = lib.GetCallChainOfCurrentSample()
+            active = [sink for sink in active
+                      if call(sink, sink.add_sample, lib, sample, event, symbol, callchain)]
+    finally:
+        lib.Close()
+
+    for sink in active:
+        call(sink, sink.finish)
+    return errors
+
+
+def create_sinks(
+        outputs: List[Tuple[str, str]],
+        report_lib_options: ReportLibOptions,
+        binary_cache_path: Optional[str],
+        jobs: int,
+        record_file: str = 'perf.data') -> Tuple[List[ReportSink], Dict[str, str]]:
+    """Creates a sink per (format, output path); formats that can't be set up go in errors."""
+    factories = {
+        'html': lambda path: HtmlSink(path, binary_cache_path),
+        'gecko': GeckoSink,
+        'pprof': lambda path: PprofSink(path, report_lib_options, jobs),
+        'stackcollapse': StackCollapseSink,
+        'inferno': InfernoSink,
+        'samples': lambda path: SampleCacheSink(
+            path, record_file, report_lib_options, binary_cache_path),
+    }
+    sinks: List[ReportSink] = []
+    errors: Dict[str, str] = {}
+    for fmt, path in outputs:
+        try:
+            sinks.append(factories[fmt](path))
+        except Exception as e:
+            # e.g. pprof without the protobuf package
+            errors[fmt] = str(e) or type(e).__name__
+    return sinks, errors
+
+
+def write_time_window_filter(
+        record_file: str,
+        window: Optional[Tuple[float, float]] = None,
+        part: Optional[Tuple[int, int]] = None) -> str:
+    """
+    Writes a sample filter file keeping one time window of record_file: either
+    window, (start, end) in seconds from the first sample, or part, (i, n) for
+    the i-th (1-based) of n equal windows. Returns the path of the filter file.
+    """
+    from sample_cache import read_time_bounds, split_time_range
+    from sample_filter import write_filter_file
+    first, last = read_time_bounds(record_file)
+    if part is not None:
+        index, parts = part
+        if not 1 <= index <= parts:
+            raise ValueError('time window part %d is not in 1..%d' % (index, parts))
+        begin, end = split_time_range(first, last, parts)[index - 1]
+        comment = 'time window part %d of %d' % (index, parts)
+    else:
+        begin = first + int(window[0] * 1e9)
+        end = first + int(window[1] * 1e9)
+        comment = 'time window %.3f s to %.3f s' % window
+    fd, path = tempfile.mkstemp(prefix='time_window_', suffix='.txt')
+    os.close(fd)
+    write_filter_file(path, comment, begin, end)
+    return path
+
+
+def main():
+    parser = BaseArgumentParser(description=__doc__)
+    parser.add_argument('-i', '--record_file', default='perf.data', help='Default is perf.data.')
+    parser.add_argument('--html', help='Write a report_html.py report to this path.')
+    parser.add_argument('--gecko', help='Write a Firefox Profiler (gecko) profile to this path.')
+    parser.add_argument('--pprof', help='Write a pprof profile to this path.')
+    parser.add_argument('--stackcollapse', help='Write folded stacks to this path.')
+    parser.add_argument('--inferno', help='Write an inferno flamegraph to this path.')
+    parser.add_argument('--samples', help='Write a columnar sample cache to this path.')
+    parser.add_argument('--binary_cache', help="""Directory of binaries with symbols. Default is
+                        binary_cache/ next to the record file, if it exists.""")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Use multithreading to speed up pprof source line annotation.')
+    window_group = parser.add_mutually_exclusive_group()
+    window_group.add_argument('--time-window', nargs=2, type=float, metavar=('START', 'END'),
+                              help='Only report samples START to END seconds after the first.')
+    window_group.add_argument('--time-window-part', nargs=2, type=int, metavar=('I', 'N'),
+                              help='Only report the I-th of N equal time windows.')
+    parser.add_report_lib_options()
+    args = parser.parse_args()
+
+    outputs = [(fmt, getattr(args, fmt))
+               for fmt in ('html', 'gecko', 'pprof', 'stackcollapse', 'inferno', 'samples')
+               if getattr(args, fmt)]
+    if not outputs:
+        parser.error('no report format requested')
+    binary_cache_path = args.binary_cache
+    if binary_cache_path is None:
+        default_cache = os.path.join(os.path.dirname(os.path.abspath(args.record_file)),
+                                     'binary_cache')
+        binary_cache_path = default_cache if os.path.isdir(default_cache) else None
+
+    filter_file = None
+    if args.time_window or args.time_window_part:
+        if args.samples:
+            parser.error('--samples caches the whole recording; drop it with a time window')
+        filter_file = write_time_window_filter(
+            args.record_file,
+            tuple(args.time_window) if args.time_window else None,
+            tuple(args.time_window_part) if args.time_window_part else None)
+        args.report_lib_options.sample_filters = (
+            list(args.report_lib_options.sample_filters or []) + ['--filter-file', filter_file])
+
+    try:
+        sinks, errors = create_sinks(outputs, args.report_lib_options, binary_cache_path,
+                                     args.jobs or 1, args.record_file)
+        errors.update(run_report_pass(args.record_file, sinks, args.report_lib_options,
+                                      binary_cache_path))
+    finally:
+        if filter_file:
+            os.remove(filter_file)
+    for fmt, path in outputs:
+        if fmt in errors:
+            print('%s %s: %s' % (REPORT_FAILED, fmt, errors[fmt]))
+        else:
+            logging.info("%s report generated at '%s'." % (fmt, path))
+
+
+if __name__ == '__main__':
+    main()
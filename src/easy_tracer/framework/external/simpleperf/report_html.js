@@ -1705,9 +1705,79 @@ class DisassemblyView {
 }
 
 
-function initGlobalObjects() {
-    let recordData = $('#record_data').text();
-    gRecordInfo = JSON.parse(recordData);
+// Record data is split into <script class="record_data"> blocks. A value stored in another
+// block is written as {"__chunk": blockId}, and that block is only parsed when the value is
+// first used. Compressed blocks are all decompressed at load: DecompressionStream is async,
+// but the values are read synchronously.
+let gRecordDataBlocks = new Map();
+
+async function readRecordDataBlock(script) {
+    let text = script.textContent;
+    if (script.dataset.encoding != 'gzip-base64') {
+        return text;
+    }
+    let binary = atob(text);
+    let bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; ++i) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    let stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    return await new Response(stream).text();
+}
+
+async function loadRecordDataBlocks() {
+    let scripts = Array.from(document.querySelectorAll('script[type="application/json"]'));
+    // Decompress the blocks concurrently rather than one after another.
+    let texts = await Promise.all(scripts.map(readRecordDataBlock));
+    scripts.forEach((script, i) => {
+        // The text is kept in gRecordDataBlocks until it is parsed.
+        gRecordDataBlocks.set(script.id, texts[i]);
+        script.remove();
+    });
+}
+
+function parseRecordDataBlock(blockId) {
+    let text = gRecordDataBlocks.get(blockId);
+    gRecordDataBlocks.delete(blockId);
+    let value = JSON.parse(text);
+    // Call graph blocks are big and never refer to other blocks, so skip walking them.
+    return text.includes('"__chunk"') ? resolveChunks(value) : value;
+}
+
+function resolveChunks(value) {
+    if (value === null || typeof value != 'object') {
+        return value;
+    }
+    for (let key of Object.keys(value)) {
+        let child = value[key];
+        if (child === null || typeof child != 'object') {
+            continue;
+        }
+        if ('__chunk' in child) {
+            defineLazyChunk(value, key, child.__chunk);
+        } else {
+            resolveChunks(child);
+        }
+    }
+    return value;
+}
+
+function defineLazyChunk(holder, key, blockId) {
+    Object.defineProperty(holder, key, {
+        configurable: true,
+        enumerable: true,
+        get() {
+            let value = parseRecordDataBlock(blockId);
+            Object.defineProperty(holder, key, {
+                value: value, configurable: true, enumerable: true, writable: true});
+            return value;
+        },
+    });
+}
+
+async function initGlobalObjects() {
+    await loadRecordDataBlocks();
+    gRecordInfo = parseRecordDataBlock('record_data');
     gProcesses = gRecordInfo.processNames;
     gThreads = gRecordInfo.threadNames;
     gLibList = gRecordInfo.libList;
@@ -1770,7 +1840,7 @@ createPromise()
     .then(updateProgress('Load page...', 0))
     .then(waitDocumentReady)
     .then(updateProgress('Parse Json data...', 20))
-    .then(wait(initGlobalObjects))
+    .then(initGlobalObjects)
     .then(updateProgress('Create tabs...', 30))
     .then(wait(createTabs))
     .then(updateProgress('Draw ChartStat...', 40))
@@ -17,6 +17,8 @@
 
 from __future__ import annotations
 import argparse
+from array import array
+import base64
 import collections
 from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
@@ -26,9 +28,11 @@ import logging
 import os
 from pathlib import Path
 import sys
-from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import zlib
 
-from simpleperf_report_lib import GetReportLib, SymbolStruct
+from simpleperf_report_lib import (
+    CallChainStructure, EventStruct, GetReportLib, ReportLib, SampleStruct, SymbolStruct)
 from simpleperf_utils import (
     Addr2Nearestline, AddrRange, BaseArgumentParser, BinaryFinder, Disassembly, get_script_dir,
     log_exit, Objdump, open_report_in_browser, ReadElf, ReportLibOptions, SourceFileSearcher)
@@ -69,6 +73,73 @@ class HtmlWriter(object):
         return self
 
 
+class RecordDataWriter(object):
+    """ Writes record data as <script type="application/json"> blocks without holding the
+        whole json text in memory. The block with id record_data holds the top level object.
+        A value stored in a block of its own is written as {"__chunk": "<block id>"}, and
+        report_html.js only parses that block when the value is first used. With compress,
+        each block is gzip compressed and base64 encoded. DecompressionStream is async while
+        the lazy values are read synchronously, so report_html.js decompresses every block
+        when the page loads and keeps its text until the block is parsed.
+    """
+
+    FLUSH_SIZE = 1024 * 1024
+
+    def __init__(self, hw: HtmlWriter, compress: bool = True):
+        self.hw = hw
+        self.compress = compress
+        self.block_count = 0
+
+    def write_block(self, block_id: str, pieces: Iterable[str]):
+        attrs = {'id': block_id, 'class': 'record_data', 'type': 'application/json'}
+        if self.compress:
+            attrs['data-encoding'] = 'gzip-base64'
+        self.hw.open_tag('script', **attrs)
+        compressor = zlib.compressobj(wbits=31) if self.compress else None
+        # base64 encodes whole 3-byte groups, so leftover bytes wait for the next write.
+        pending = b''
+
+        def write(text: str, final: bool = False):
+            nonlocal pending
+            if not compressor:
+                self.hw.add(text)
+                return
+            data = pending + compressor.compress(text.encode('utf-8'))
+            if final:
+                data += compressor.flush()
+                size = len(data)
+            else:
+                size = len(data) - len(data) % 3
+            self.hw.add(base64.b64encode(data[:size]).decode('ascii'))
+            pending = data[size:]
+
+        buf: List[str] = []
+        buf_size = 0
+        for piece in pieces:
+            buf.append(piece)
+            buf_size += len(piece)
+            if buf_size >= self.FLUSH_SIZE:
+                write(''.join(buf))
+                buf = []
+                buf_size = 0
+        write(''.join(buf), final=True)
+        self.hw.close_tag()
+
+    def write_chunk(self, pieces: Iterable[str]) -> Dict[str, str]:
+        """ Writes a block with a new id, and returns the reference to put in its place. """
+        self.block_count += 1
+        block_id = 'record_data_%d' % self.block_count
+        self.write_block(block_id, pieces)
+        return {'__chunk': block_id}
+
+    def write_value(self, value: Any) -> Dict[str, str]:
+        return self.write_chunk([dump_json(value)])
+
+
+def dump_json(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
 def modify_text_for_html(text: str) -> str:
     return text.replace('>', '&gt;').replace('<', '&lt;')
 
@@ -102,6 +173,17 @@ class EventScope(object):
                                for process in processes]
         return result
 
+    def write_sample_info(
+            self, writer: RecordDataWriter, gen_addr_hit_map: bool) -> Dict[str, Any]:
+        """ Like get_sample_info(), but each thread is written to blocks of its own. """
+        result = {}
+        result['eventName'] = self.name
+        result['eventCount'] = self.event_count
+        processes = sorted(self.processes.values(), key=lambda a: a.event_count, reverse=True)
+        result['processes'] = [process.write_sample_info(writer, gen_addr_hit_map)
+                               for process in processes]
+        return result
+
     @property
     def threads(self) -> Iterator[ThreadScope]:
         for process in self.processes.values():
@@ -143,6 +225,16 @@ class ProcessScope(object):
                              for thread in threads]
         return result
 
+    def write_sample_info(
+            self, writer: RecordDataWriter, gen_addr_hit_map: bool) -> Dict[str, Any]:
+        result = {}
+        result['pid'] = self.pid
+        result['eventCount'] = self.event_count
+        threads = sorted(self.threads.values(), key=lambda a: a.sample_count, reverse=True)
+        result['threads'] = [thread.write_sample_info(writer, gen_addr_hit_map)
+                             for thread in threads]
+        return result
+
     def merge_by_thread_name(self, process: ProcessScope):
         self.event_count += process.event_count
         thread_list: List[ThreadScope] = list(
@@ -167,8 +259,8 @@ class ThreadScope(object):
         self.event_count = 0
         self.sample_count = 0
         self.libs: Dict[int, LibScope] = {}  # map from lib_id to LibScope
-        self.call_graph = CallNode(-1)
-        self.reverse_call_graph = CallNode(-1)
+        self.call_graph = CallTree()
+        self.reverse_call_graph = CallTree()
 
     def add_callstack(
             self, event_count: int, callstack: List[Tuple[int, int, int]],
@@ -195,14 +287,8 @@ class ThreadScope(object):
                 function.build_addr_hit_map(addr, event_count if i == 0 else 0, event_count)
 
         # build call graph and reverse call graph
-        node = self.call_graph
-        for item in reversed(callstack):
-            node = node.get_child(item[1])
-        node.event_count += event_count
-        node = self.reverse_call_graph
-        for item in callstack:
-            node = node.get_child(item[1])
-        node.event_count += event_count
+        self.call_graph.add_path((item[1] for item in reversed(callstack)), event_count)
+        self.reverse_call_graph.add_path((item[1] for item in callstack), event_count)
 
     def update_subtree_event_count(self):
         self.call_graph.update_subtree_event_count()
@@ -234,6 +320,21 @@ class ThreadScope(object):
         result['rg'] = self.reverse_call_graph.gen_sample_info()
         return result
 
+    def write_sample_info(
+            self, writer: RecordDataWriter, gen_addr_hit_map: bool) -> Dict[str, str]:
+        """ Writes the thread, and its call graphs separately, as the flamegraph tab loads
+            them only when it's opened.
+        """
+        result = {}
+        result['tid'] = self.tid
+        result['eventCount'] = self.event_count
+        result['sampleCount'] = self.sample_count
+        result['libs'] = [lib.gen_sample_info(gen_addr_hit_map)
+                          for lib in self.libs.values()]
+        result['g'] = writer.write_chunk(self.call_graph.iter_json())
+        result['rg'] = writer.write_chunk(self.reverse_call_graph.iter_json())
+        return writer.write_value(result)
+
     def merge(self, thread: ThreadScope):
         self.event_count += thread.event_count
         self.sample_count += thread.sample_count
@@ -361,67 +462,152 @@ class FunctionScope(object):
         return map1
 
 
-class CallNode(object):
+class CallTree(object):
+    """ A call graph kept in parallel arrays instead of one object per node.
+        Node 0 is the root (func_id -1); every other node is created after its
+        parent, so parents always have smaller indexes than their children and
+        a node's children appear in creation order. That lets every whole-tree
+        operation below be a single forward or backward pass over the arrays.
+        index maps (parent << 32 | func_id) to the child node; it is only
+        needed while adding paths and is dropped once the tree is complete.
+    """
 
-    def __init__(self, func_id: int):
-        self.event_count = 0
-        self.subtree_event_count = 0
-        self.func_id = func_id
-        # map from func_id to CallNode
-        self.children: Dict[int, CallNode] = collections.OrderedDict()
+    def __init__(self):
+        self.parent = array('i', [-1])
+        self.func_id = array('i', [-1])
+        self.event_count = array('q', [0])
+        self.subtree_event_counts = array('q', [0])
+        self.index: Optional[Dict[int, int]] = {}
 
-    def get_child(self, func_id: int) -> CallNode:
-        child = self.children.get(func_id)
-        if not child:
-            child = self.children[func_id] = CallNode(func_id)
-        return child
+    def __len__(self) -> int:
+        return len(self.func_id)
+
+    @property
+    def subtree_event_count(self) -> int:
+        return self.subtree_event_counts[0]
+
+    def _get_index(self) -> Dict[int, int]:
+        if self.index is None:
+            self.index = {(self.parent[node] << 32) | self.func_id[node]: node
+                          for node in range(1, len(self))}
+        return self.index
+
+    def _add_node(self, parent: int, func_id: int) -> int:
+        node = len(self.func_id)
+        self.parent.append(parent)
+        self.func_id.append(func_id)
+        self.event_count.append(0)
+        self.subtree_event_counts.append(0)
+        return node
+
+    def add_path(self, func_ids: Iterator[int], event_count: int):
+        """ Walks down from the root along func_ids, and adds event_count to the last node. """
+        index = self._get_index()
+        node = 0
+        for func_id in func_ids:
+            key = (node << 32) | func_id
+            child = index.get(key)
+            if child is None:
+                child = index[key] = self._add_node(node, func_id)
+            node = child
+        self.event_count[node] += event_count
 
     def update_subtree_event_count(self):
-        self.subtree_event_count = self.event_count
-        for child in self.children.values():
-            self.subtree_event_count += child.update_subtree_event_count()
-        return self.subtree_event_count
+        subtree = array('q', self.event_count)
+        parent = self.parent
+        for node in range(len(subtree) - 1, 0, -1):
+            subtree[parent[node]] += subtree[node]
+        self.subtree_event_counts = subtree
+        # Loading is done; the child index is rebuilt if anything is merged later.
+        self.index = None
 
     def cut_edge(self, min_limit: float, hit_func_ids: Set[int]):
-        hit_func_ids.add(self.func_id)
-        to_del_children = []
-        for key in self.children:
-            child = self.children[key]
-            if child.subtree_event_count < min_limit:
-                to_del_children.append(key)
-            else:
-                child.cut_edge(min_limit, hit_func_ids)
-        for key in to_del_children:
-            del self.children[key]
+        """ Removes subtrees whose event count is below min_limit (never the root). """
+        hit_func_ids.add(-1)
+        keep = bytearray(len(self))
+        keep[0] = 1
+        parent = self.parent
+        subtree = self.subtree_event_counts
+        for node in range(1, len(self)):
+            if keep[parent[node]] and subtree[node] >= min_limit:
+                keep[node] = 1
+                hit_func_ids.add(self.func_id[node])
+        self._rebuild([node for node in range(len(self)) if keep[node]])
+
+    def _rebuild(self, order: List[int]):
+        """ Keeps the nodes in order (parents before children), renumbering them. """
+        new_ids = {old: new for new, old in enumerate(order)}
+        self.parent = array('i', [-1] + [new_ids[self.parent[old]] for old in order[1:]])
+        self.func_id = array('i', (self.func_id[old] for old in order))
+        self.event_count = array('q', (self.event_count[old] for old in order))
+        self.subtree_event_counts = array('q', (self.subtree_event_counts[old] for old in order))
+        self.index = None
+
+    def children_lists(self) -> List[List[int]]:
+        children: List[List[int]] = [[] for _ in range(len(self))]
+        parent = self.parent
+        for node in range(1, len(self)):
+            children[parent[node]].append(node)
+        return children
 
     def gen_sample_info(self) -> Dict[str, Any]:
-        result = {}
-        result['e'] = self.event_count
-        result['s'] = self.subtree_event_count
-        result['f'] = self.func_id
-        result['c'] = [child.gen_sample_info() for child in self.children.values()]
-        return result
-
-    def merge(self, node: CallNode):
-        self.event_count += node.event_count
-        self.subtree_event_count += node.subtree_event_count
-        for key, child in node.children.items():
-            cur_child = self.children.get(key)
-            if cur_child is None:
-                self.children[key] = child
-            else:
-                cur_child.merge(child)
+        nodes = [{'e': self.event_count[node], 's': self.subtree_event_counts[node],
+                  'f': self.func_id[node], 'c': []} for node in range(len(self))]
+        parent = self.parent
+        for node in range(1, len(self)):
+            nodes[parent[node]]['c'].append(nodes[node])
+        return nodes[0]
+
+    def iter_json(self) -> Iterator[str]:
+        """ Yields gen_sample_info() as compact json, without building the nested dicts. """
+        children = self.children_lists()
+
+        def node_start(node: int) -> str:
+            return '{"e":%d,"s":%d,"f":%d,"c":[' % (
+                self.event_count[node], self.subtree_event_counts[node], self.func_id[node])
+
+        yield node_start(0)
+        stack = [iter(children[0])]
+        first = True
+        while stack:
+            node = next(stack[-1], -1)
+            if node < 0:
+                stack.pop()
+                first = False
+                yield ']}'
+                continue
+            yield node_start(node) if first else ',' + node_start(node)
+            stack.append(iter(children[node]))
+            first = True
+
+    def merge(self, tree: CallTree):
+        """ Adds tree's nodes and counts to this tree; new children keep tree's order. """
+        self.event_count[0] += tree.event_count[0]
+        self.subtree_event_counts[0] += tree.subtree_event_counts[0]
+        index = self._get_index()
+        mapped = array('i', [0]) * len(tree)
+        for node in range(1, len(tree)):
+            parent = mapped[tree.parent[node]]
+            key = (parent << 32) | tree.func_id[node]
+            cur = index.get(key)
+            if cur is None:
+                cur = index[key] = self._add_node(parent, tree.func_id[node])
+            mapped[node] = cur
+            self.event_count[cur] += tree.event_count[node]
+            self.subtree_event_counts[cur] += tree.subtree_event_counts[node]
 
     def sort_by_function_name(self, get_func_name: Callable[[int], str]) -> None:
-        if self.children:
-            child_func_ids = list(self.children.keys())
-            child_func_ids.sort(key=get_func_name)
-            new_children = collections.OrderedDict()
-            for func_id in child_func_ids:
-                new_children[func_id] = self.children[func_id]
-            self.children = new_children
-            for child in self.children.values():
-                child.sort_by_function_name(get_func_name)
+        """ Reorders every node's children by function name, keeping the tree the same. """
+        children = self.children_lists()
+        order: List[int] = []
+        # Breadth first, so parents still come before their children.
+        queue = collections.deque([0])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            queue.extend(sorted(children[node],
+                                key=lambda child: get_func_name(self.func_id[child])))
+        self._rebuild(order)
 
 
 @dataclass
@@ -590,7 +776,7 @@ class RecordData(object):
                     s: [sourceCodeInfo] [optional]
                     a: [addrInfo] (sorted by addrInfo.addr) [optional]
                 }
-                callGraph and reverseCallGraph are both of type CallNode.
+                callGraph and reverseCallGraph are both of type CallNode (see CallTree).
                 callGraph shows how a function calls other functions.
                 reverseCallGraph shows how a function is called by other functions.
                 CallNode {
@@ -646,44 +832,54 @@ class RecordData(object):
         if self.binary_cache_path:
             lib.SetSymfs(self.binary_cache_path)
         lib.SetReportOptions(report_lib_options)
-        self.meta_info = lib.MetaInfo()
-        self.cmdline = lib.GetRecordCmd()
-        self.arch = lib.GetArch()
+        self.begin_record_file(lib)
         while True:
             raw_sample = lib.GetNextSample()
             if not raw_sample:
                 lib.Close()
                 break
-            raw_event = lib.GetEventOfCurrentSample()
-            symbol = lib.GetSymbolOfCurrentSample()
-            callchain = lib.GetCallChainOfCurrentSample()
-            event = self._get_event(raw_event.name)
-            self.total_samples += 1
-            event.sample_count += 1
-            event.event_count += raw_sample.period
-            process = event.get_process(raw_sample.pid)
-            process.event_count += raw_sample.period
-            thread = process.get_thread(raw_sample.tid, raw_sample.thread_comm)
-            thread.event_count += raw_sample.period
-            thread.sample_count += 1
+            self.add_sample(lib, raw_sample, lib.GetEventOfCurrentSample(),
+                            lib.GetSymbolOfCurrentSample(), lib.GetCallChainOfCurrentSample())
+        self.end_record_file()
+
+    # begin_record_file(), add_sample() and end_record_file() are the steps of
+    # load_record_file(), for callers that read the samples themselves.
 
+    def begin_record_file(self, lib: ReportLib):
+        self.meta_info = lib.MetaInfo()
+        self.cmdline = lib.GetRecordCmd()
+        self.arch = lib.GetArch()
+
+    def add_sample(self, lib: ReportLib, raw_sample: SampleStruct, raw_event: EventStruct,
+                   symbol: SymbolStruct, callchain: CallChainStructure):
+        event = self._get_event(raw_event.name)
+        self.total_samples += 1
+        event.sample_count += 1
+        event.event_count += raw_sample.period
+        process = event.get_process(raw_sample.pid)
+        process.event_count += raw_sample.period
+        thread = process.get_thread(raw_sample.tid, raw_sample.thread_comm)
+        thread.event_count += raw_sample.period
+        thread.sample_count += 1
+
+        lib_id = self.libs.get_lib_id(symbol.dso_name)
+        if lib_id is None:
+            lib_id = self.libs.add_lib(symbol.dso_name, lib.GetBuildIdForPath(symbol.dso_name))
+        func_id = self.functions.get_func_id(lib_id, symbol)
+        callstack = [(lib_id, func_id, symbol.vaddr_in_file)]
+        for i in range(callchain.nr):
+            symbol = callchain.entries[i].symbol
             lib_id = self.libs.get_lib_id(symbol.dso_name)
             if lib_id is None:
-                lib_id = self.libs.add_lib(symbol.dso_name, lib.GetBuildIdForPath(symbol.dso_name))
+                lib_id = self.libs.add_lib(
+                    symbol.dso_name, lib.GetBuildIdForPath(symbol.dso_name))
             func_id = self.functions.get_func_id(lib_id, symbol)
-            callstack = [(lib_id, func_id, symbol.vaddr_in_file)]
-            for i in range(callchain.nr):
-                symbol = callchain.entries[i].symbol
-                lib_id = self.libs.get_lib_id(symbol.dso_name)
-                if lib_id is None:
-                    lib_id = self.libs.add_lib(
-                        symbol.dso_name, lib.GetBuildIdForPath(symbol.dso_name))
-                func_id = self.functions.get_func_id(lib_id, symbol)
-                callstack.append((lib_id, func_id, symbol.vaddr_in_file))
-            if len(callstack) > MAX_CALLSTACK_LENGTH:
-                callstack = callstack[:MAX_CALLSTACK_LENGTH]
-            thread.add_callstack(raw_sample.period, callstack, self.build_addr_hit_map)
+            callstack.append((lib_id, func_id, symbol.vaddr_in_file))
+        if len(callstack) > MAX_CALLSTACK_LENGTH:
+            callstack = callstack[:MAX_CALLSTACK_LENGTH]
+        thread.add_callstack(raw_sample.period, callstack, self.build_addr_hit_map)
 
+    def end_record_file(self):
         for event in self.events.values():
             for thread in event.threads:
                 thread.update_subtree_event_count()
@@ -826,7 +1022,12 @@ class RecordData(object):
                 if not dso_info:
                     continue
 
-                tasks = self.split_disassembly_jobs(functions, disassemble_job_size)
+                if objdump.cache and dso_info[2]:
+                    # The binary is disassembled once into the cache, and looking up
+                    # functions there is cheap, so one job per binary is enough.
+                    tasks = self.split_disassembly_jobs(functions, sys.maxsize)
+                else:
+                    tasks = self.split_disassembly_jobs(functions, disassemble_job_size)
                 logging.debug('create %d jobs to disassemble %d functions in %s',
                               len(tasks), len(functions), lib.name)
                 for task in tasks:
@@ -867,6 +1068,23 @@ class RecordData(object):
 
     def gen_record_info(self) -> Dict[str, Any]:
         """ Return json data which will be used by report_html.js. """
+        record_info = self._gen_record_header()
+        record_info['functionMap'] = self._gen_function_map()
+        record_info['sampleInfo'] = self._gen_sample_info()
+        record_info['sourceFiles'] = self._gen_source_files()
+        return record_info
+
+    def write_record_info(self, writer: RecordDataWriter):
+        """ Writes the same data as gen_record_info(), one thread or table at a time. """
+        record_info = self._gen_record_header()
+        record_info['functionMap'] = writer.write_chunk(self._iter_function_map_json())
+        record_info['sampleInfo'] = [
+            event.write_sample_info(writer, self.gen_addr_hit_map_in_record_info)
+            for event in self.events.values()]
+        record_info['sourceFiles'] = writer.write_chunk(self._iter_source_files_json())
+        writer.write_block('record_data', [dump_json(record_info)])
+
+    def _gen_record_header(self) -> Dict[str, Any]:
         record_info = {}
         timestamp = self.meta_info.get('timestamp')
         if timestamp:
@@ -889,9 +1107,6 @@ class RecordData(object):
         record_info['processNames'] = self._gen_process_names()
         record_info['threadNames'] = self._gen_thread_names()
         record_info['libList'] = self._gen_lib_list()
-        record_info['functionMap'] = self._gen_function_map()
-        record_info['sampleInfo'] = self._gen_sample_info()
-        record_info['sourceFiles'] = self._gen_source_files()
         return record_info
 
     def _gen_process_names(self) -> Dict[int, str]:
@@ -913,7 +1128,15 @@ class RecordData(object):
         return [modify_text_for_html(lib.name) for lib in self.libs.libs]
 
     def _gen_function_map(self) -> Dict[int, Any]:
-        func_map: Dict[int, Any] = {}
+        return dict(self._iter_function_map())
+
+    def _iter_function_map_json(self) -> Iterator[str]:
+        yield '{'
+        for i, (func_id, func_data) in enumerate(self._iter_function_map()):
+            yield '%s"%d":%s' % (',' if i else '', func_id, dump_json(func_data))
+        yield '}'
+
+    def _iter_function_map(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
         for func_id in sorted(self.functions.id_to_func):
             function = self.functions.id_to_func[func_id]
             func_data = {}
@@ -928,17 +1151,24 @@ class RecordData(object):
                         [modify_text_for_html(code),
                          hex_address_for_json(addr)])
                 func_data['d'] = disassembly_list
-            func_map[func_id] = func_data
-        return func_map
+            yield func_id, func_data
 
     def _gen_sample_info(self) -> List[Dict[str, Any]]:
         return [event.get_sample_info(self.gen_addr_hit_map_in_record_info)
                 for event in self.events.values()]
 
     def _gen_source_files(self) -> List[Dict[str, Any]]:
+        return list(self._iter_source_files())
+
+    def _iter_source_files_json(self) -> Iterator[str]:
+        yield '['
+        for i, file_data in enumerate(self._iter_source_files()):
+            yield (',' if i else '') + dump_json(file_data)
+        yield ']'
+
+    def _iter_source_files(self) -> Iterator[Dict[str, Any]]:
         source_files = sorted(self.source_files.path_to_source_files.values(),
                               key=lambda x: x.file_id)
-        file_list = []
         for source_file in source_files:
             file_data = {}
             if not source_file.real_path:
@@ -950,8 +1180,7 @@ class RecordData(object):
                 for line in source_file.line_to_code:
                     code_map[line] = modify_text_for_html(source_file.line_to_code[line])
                 file_data['code'] = code_map
-            file_list.append(file_data)
-        return file_list
+            yield file_data
 
 
 URLS = {
@@ -998,6 +1227,12 @@ class ReportGenerator(object):
         self.hw.add(json.dumps(record_data))
         self.hw.close_tag()
 
+    def write_record_data_blocks(self, record_data: RecordData, compress: bool = True):
+        """ Streams record data as several blocks instead of one json string (see
+            RecordDataWriter), so memory stays flat and the browser parses each block lazily.
+        """
+        record_data.write_record_info(RecordDataWriter(self.hw, compress))
+
     def write_script(self):
         self.hw.open_tag('script').add_file('report_html.js').close_tag()
 
@@ -1033,6 +1268,9 @@ def get_args() -> argparse.Namespace:
         help='Use multithreading to speed up disassembly and source code annotation.')
     parser.add_argument('--ndk_path', nargs=1, help='Find tools in the ndk path.')
     parser.add_argument('--no_browser', action='store_true', help="Don't open report in browser.")
+    parser.add_argument('--no_compress_record_data', action='store_true', help="""Store record
+                        data as plain json. Compressed data needs a browser supporting
+                        DecompressionStream.""")
     parser.add_argument('--aggregate-by-thread-name', action='store_true', help="""aggregate
                         samples by thread name instead of thread id. This is useful for
                         showing multiple perf.data generated for the same app.""")
@@ -1086,7 +1324,8 @@ def main():
     report_generator = ReportGenerator(args.report_path)
     report_generator.write_script()
     report_generator.write_content_div()
-    report_generator.write_record_data(record_data.gen_record_info())
+    report_generator.write_record_data_blocks(
+        record_data, compress=not args.no_compress_record_data)
     report_generator.finish()
 
     if not args.no_browser:
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""sample_cache.py: decode perf.data once into a columnar sample cache.
+
+Reading perf.data through ReportLib costs a ctypes call and a Python object
+per sample and per callchain frame, every time a report or filter runs. The
+cache written here stores the decoded samples as flat typed columns:
+
+    samples:  time, pid, tid, cpu, period, event_id, thread_name (string id)
+              sorted by time
+    frames:   callchain_offsets[i]..callchain_offsets[i + 1] index frame_symbols
+              and frame_vaddrs; the sample's own symbol first, then its callers
+    symbols:  symbol_names, symbol_dsos (string ids), symbol_addrs, symbol_lens
+    strings:  string_offsets into string_data (utf-8)
+    threads:  thread_ids (sorted); thread_offsets[k]..thread_offsets[k + 1]
+              index thread_samples and thread_times, the sample indexes and
+              times of thread_ids[k] in time order
+
+The file is a small JSON header followed by 8-byte aligned raw columns.
+SampleCache maps it with mmap and exposes each column as a typed memoryview,
+or as a zero-copy NumPy array when NumPy is installed. Time-range queries use
+binary search over the sorted time column, per-thread queries over the
+thread columns, so reports and filters can pick a time window or split a
+recording without reading perf.data again. Both perf.data and
+cmd_report_sample.proto input work, since both are read through GetReportLib.
+
+  Example:
+    ./sample_cache.py -i perf.data          # writes perf.data.samples
+"""
+
+from array import array
+import bisect
+import dataclasses
+import json
+import logging
+import mmap
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from simpleperf_report_lib import GetReportLib
+from simpleperf_utils import BaseArgumentParser, ReportLibOptions
+
+CACHE_SUFFIX = '.samples'
+MAGIC = b'SPSC'
+VERSION = 2
+_ALIGN = 8
+
+# Column name -> array typecode, in file order
+SAMPLE_COLUMNS = {
+    'time': 'Q',
+    'pid': 'I',
+    'tid': 'I',
+    'cpu': 'I',
+    'period': 'Q',
+    'event_id': 'I',
+    'thread_name': 'I',
+    'callchain_offsets': 'Q',
+    'frame_symbols': 'I',
+    'frame_vaddrs': 'Q',
+    'symbol_names': 'I',
+    'symbol_dsos': 'I',
+    'symbol_addrs': 'Q',
+    'symbol_lens': 'Q',
+    'string_offsets': 'Q',
+    'string_data': 'B',
+    'thread_ids': 'I',
+    'thread_offsets': 'Q',
+    'thread_samples': 'Q',
+    'thread_times': 'Q',
+}
+
+_NUMPY_DTYPES = {'Q': 'u8', 'I': 'u4', 'B': 'u1'}
+
+
+def cache_path_for(record_file: str) -> str:
+    return record_file + CACHE_SUFFIX
+
+
+def _file_info(record_file: str) -> Dict[str, int]:
+    st = os.stat(record_file)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def source_info(
+        record_file: str,
+        report_lib_options: Optional[ReportLibOptions] = None,
+        symfs_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    What a cache of record_file was decoded from: the file's size and mtime, and the
+    symfs and report options that shape its samples and symbols. A cache is stale
+    once any of them changes.
+    """
+    options = dataclasses.asdict(report_lib_options) if report_lib_options is not None else {}
+    info: Dict[str, Any] = _file_info(record_file)
+    info['symfs'] = symfs_dir or ''
+    # Through JSON, so it compares equal to the copy read back from a cache header
+    info['report_lib_options'] = json.loads(json.dumps(options))
+    return info
+
+
+class SampleCacheBuilder:
+    """Collects decoded samples; feed it from a ReportLib loop, then write()."""
+
+    def __init__(self) -> None:
+        self.columns = {name: array(typecode) for name, typecode in SAMPLE_COLUMNS.items()}
+        self.columns['callchain_offsets'].append(0)
+        self.meta_info: Dict[str, str] = {}
+        self.record_cmd = ''
+        self.arch = ''
+        self.events: List[str] = []
+        self._event_ids: Dict[str, int] = {}
+        self._strings: Dict[str, int] = {}
+        self._string_list: List[str] = []
+        self._symbols: Dict[Tuple[str, str, int], int] = {}
+
+    def begin(self, lib: Any) -> None:
+        self.meta_info = lib.MetaInfo()
+        self.record_cmd = lib.GetRecordCmd()
+        self.arch = lib.GetArch()
+
+    def _string_id(self, value: str) -> int:
+        string_id = self._strings.get(value)
+        if string_id is None:
+            string_id = self._strings[value] = len(self._string_list)
+            self._string_list.append(value)
+        return string_id
+
+    def _symbol_id(self, symbol: Any) -> int:
+        key = (symbol.dso_name, symbol.symbol_name, symbol.symbol_addr)
+        symbol_id = self._symbols.get(key)
+        if symbol_id is None:
+            symbol_id = self._symbols[key] = len(self._symbols)
+            self.columns['symbol_names'].append(self._string_id(symbol.symbol_name))
+            self.columns['symbol_dsos'].append(self._string_id(symbol.dso_name))
+            self.columns['symbol_addrs'].append(symbol.symbol_addr)
+            self.columns['symbol_lens'].append(symbol.symbol_len)
+        return symbol_id
+
+    def add_sample(self, sample: Any, event: Any, symbol: Any, callchain: Any) -> None:
+        event_id = self._event_ids.get(event.name)
+        if event_id is None:
+            event_id = self._event_ids[event.name] = len(self.events)
+            self.events.append(event.name)
+        columns = self.columns
+        columns['time'].append(sample.time)
+        columns['pid'].append(sample.pid)
+        columns['tid'].append(sample.tid)
+        columns['cpu'].append(sample.cpu)
+        columns['period'].append(sample.period)
+        columns['event_id'].append(event_id)
+        columns['thread_name'].append(self._string_id(sample.thread_comm))
+        frame_symbols = columns['frame_symbols']
+        frame_vaddrs = columns['frame_vaddrs']
+        frame_symbols.append(self._symbol_id(symbol))
+        frame_vaddrs.append(symbol.vaddr_in_file)
+        for i in range(callchain.nr):
+            entry_symbol = callchain.entries[i].symbol
+            frame_symbols.append(self._symbol_id(entry_symbol))
+            frame_vaddrs.append(entry_symbol.vaddr_in_file)
+        columns['callchain_offsets'].append(len(frame_symbols))
+
+    def _sort_by_time(self) -> None:
+        times = self.columns['time']
+        order = sorted(range(len(times)), key=times.__getitem__)
+        if all(i == n for n, i in enumerate(order)):
+            return
+        for name in ('time', 'pid', 'tid', 'cpu', 'period', 'event_id', 'thread_name'):
+            column = self.columns[name]
+            self.columns[name] = array(column.typecode, (column[i] for i in order))
+        offsets = self.columns['callchain_offsets']
+        symbols = self.columns['frame_symbols']
+        vaddrs = self.columns['frame_vaddrs']
+        new_offsets = array('Q', [0])
+        new_symbols = array('I')
+        new_vaddrs = array('Q')
+        for i in order:
+            start, end = offsets[i], offsets[i + 1]
+            new_symbols.extend(symbols[start:end])
+            new_vaddrs.extend(vaddrs[start:end])
+            new_offsets.append(len(new_symbols))
+        self.columns['callchain_offsets'] = new_offsets
+        self.columns['frame_symbols'] = new_symbols
+        self.columns['frame_vaddrs'] = new_vaddrs
+
+    def _index_threads(self) -> None:
+        times = self.columns['time']
+        tids = self.columns['tid']
+        # sorted() is stable, so each thread's samples stay in time order
+        order = sorted(range(len(tids)), key=tids.__getitem__)
+        thread_ids = self.columns['thread_ids'] = array('I')
+        thread_offsets = self.columns['thread_offsets'] = array('Q')
+        self.columns['thread_samples'] = array('Q', order)
+        self.columns['thread_times'] = array('Q', (times[i] for i in order))
+        for pos, i in enumerate(order):
+            if not thread_ids or thread_ids[-1] != tids[i]:
+                thread_ids.append(tids[i])
+                thread_offsets.append(pos)
+        thread_offsets.append(len(order))
+
+    def write(self, cache_path: str, source: Optional[Dict[str, int]] = None) -> None:
+        self._sort_by_time()
+        self._index_threads()
+        string_offsets = self.columns['string_offsets'] = array('Q', [0])
+        string_data = self.columns['string_data'] = array('B')
+        for value in self._string_list:
+            string_data.frombytes(value.encode('utf-8'))
+            string_offsets.append(len(string_data))
+
+        layout: Dict[str, List[Any]] = {}
+        offset = 0
+        for name in SAMPLE_COLUMNS:
+            column = self.columns[name]
+            layout[name] = [column.typecode, offset, len(column)]
+            offset += _aligned(len(column) * column.itemsize)
+        header = json.dumps({
+            'version': VERSION,
+            'byteorder': sys.byteorder,
+            'source': source or {},
+            'meta_info': self.meta_info,
+            'record_cmd': self.record_cmd,
+            'arch': self.arch,
+            'events': self.events,
+            'columns': layout,
+        }).encode('utf-8')
+        header_len = _aligned(len(MAGIC) + 4 + len(header)) - len(MAGIC) - 4
+
+        # Write next to the target and rename, so readers never map a partial file.
+        # Per process, as parallel time window reports may rebuild a stale cache at once.
+        tmp_path = '%s.%d.part' % (cache_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(header_len.to_bytes(4, 'little'))
+            f.write(header.ljust(header_len, b' '))
+            for name in SAMPLE_COLUMNS:
+                data = self.columns[name].tobytes()
+                f.write(data)
+                f.write(b'\0' * (_aligned(len(data)) - len(data)))
+        os.replace(tmp_path, cache_path)
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class SampleCache:
+    """A memory-mapped sample cache; see the module docstring for the columns."""
+
+    def __init__(self, cache_path: str):
+        self.path = cache_path
+        with open(cache_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError('%s is not a sample cache' % cache_path)
+        header_len = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 4], 'little')
+        data_start = len(MAGIC) + 4 + header_len
+        self.header = json.loads(self._mm[len(MAGIC) + 4:data_start].decode('utf-8'))
+        if self.header.get('version') != VERSION or self.header.get('byteorder') != sys.byteorder:
+            self._mm.close()
+            raise ValueError('%s was written by an incompatible version' % cache_path)
+        self._data_start = data_start
+        self._views: Dict[str, memoryview] = {}
+        self.events: List[str] = self.header['events']
+        self.meta_info: Dict[str, str] = self.header['meta_info']
+        self.record_cmd: str = self.header['record_cmd']
+        self.arch: str = self.header['arch']
+
+    def close(self) -> None:
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+        self._mm.close()
+
+    def __enter__(self) -> 'SampleCache':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.header['columns']['time'][2]
+
+    def column(self, name: str) -> memoryview:
+        """The column as a read-only typed memoryview over the mapped file."""
+        view = self._views.get(name)
+        if view is None:
+            typecode, offset, count = self.header['columns'][name]
+            start = self._data_start + offset
+            size = array(typecode).itemsize
+            view = memoryview(self._mm)[start:start + count * size].cast(typecode)
+            self._views[name] = view
+        return view
+
+    def numpy_column(self, name: str) -> Any:
+        """The column as a zero-copy NumPy array; needs NumPy installed."""
+        import numpy as np
+        typecode, offset, count = self.header['columns'][name]
+        return np.frombuffer(self._mm, dtype=_NUMPY_DTYPES[typecode], count=count,
+                             offset=self._data_start + offset)
+
+    def string(self, string_id: int) -> str:
+        offsets = self.column('string_offsets')
+        data = self.column('string_data')
+        return bytes(data[offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+
+    def symbol_name(self, symbol_id: int) -> str:
+        return self.string(self.column('symbol_names')[symbol_id])
+
+    def dso_name(self, symbol_id: int) -> str:
+        return self.string(self.column('symbol_dsos')[symbol_id])
+
+    def callchain(self, sample_index: int) -> memoryview:
+        """Symbol ids of the sample's frames, the sampled symbol first."""
+        offsets = self.column('callchain_offsets')
+        return self.column('frame_symbols')[offsets[sample_index]:offsets[sample_index + 1]]
+
+    def time_range(self, start_ns: int, end_ns: int) -> Tuple[int, int]:
+        """[lo, hi) indexes of the samples with start_ns <= time < end_ns."""
+        times = self.column('time')
+        return bisect.bisect_left(times, start_ns), bisect.bisect_left(times, end_ns)
+
+    def samples(self, lo: int = 0, hi: Optional[int] = None) -> Iterator[int]:
+        return iter(range(lo, len(self) if hi is None else hi))
+
+    def time_bounds(self) -> Tuple[int, int]:
+        """(first, last) sample time, (0, 0) for a recording without samples."""
+        times = self.column('time')
+        return (times[0], times[-1]) if len(times) else (0, 0)
+
+    def thread_samples(self, tid: int, start_ns: int = 0,
+                       end_ns: Optional[int] = None) -> memoryview:
+        """Indexes of tid's samples with start_ns <= time < end_ns, in time order."""
+        thread_ids = self.column('thread_ids')
+        k = bisect.bisect_left(thread_ids, tid)
+        if k == len(thread_ids) or thread_ids[k] != tid:
+            return self.column('thread_samples')[0:0]
+        offsets = self.column('thread_offsets')
+        times = self.column('thread_times')
+        lo = bisect.bisect_left(times, start_ns, offsets[k], offsets[k + 1])
+        hi = offsets[k + 1] if end_ns is None else bisect.bisect_left(
+            times, end_ns, lo, offsets[k + 1])
+        return self.column('thread_samples')[lo:hi]
+
+    def thread_ids(self) -> memoryview:
+        return self.column('thread_ids')
+
+    def split_time_range(self, parts: int, start_ns: Optional[int] = None,
+                         end_ns: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Splits [start_ns, end_ns] (default: all samples) into parts [begin, end)
+        windows of equal length. The last window ends past end_ns, so together
+        they cover every sample in the range exactly once.
+        """
+        first, last = self.time_bounds()
+        return split_time_range(first if start_ns is None else start_ns,
+                                last if end_ns is None else end_ns, parts)
+
+
+def split_time_range(start_ns: int, end_ns: int, parts: int) -> List[Tuple[int, int]]:
+    """SampleCache.split_time_range() for explicit bounds."""
+    step = (end_ns - start_ns) // parts
+    bounds = [start_ns + step * i for i in range(parts)] + [end_ns + 1]
+    return list(zip(bounds, bounds[1:]))
+
+
+def build_sample_cache(
+        record_file: str,
+        cache_path: Optional[str] = None,
+        report_lib_options: Optional[ReportLibOptions] = None,
+        symfs_dir: Optional[str] = None) -> str:
+    """Decodes record_file into a sample cache; returns the cache path."""
+    cache_path = cache_path or cache_path_for(record_file)
+    lib = GetReportLib(record_file)
+    lib.ShowIpForUnknownSymbol()
+    if symfs_dir:
+        lib.SetSymfs(symfs_dir)
+    if report_lib_options is not None:
+        lib.SetReportOptions(report_lib_options)
+    builder = SampleCacheBuilder()
+    try:
+        builder.begin(lib)
+        while True:
+            sample = lib.GetNextSample()
+            if sample is None:
+                break
+            builder.add_sample(sample, lib.GetEventOfCurrentSample(),
+                               lib.GetSymbolOfCurrentSample(), lib.GetCallChainOfCurrentSample())
+    finally:
+        lib.Close()
+    builder.write(cache_path, source_info(record_file, report_lib_options, symfs_dir))
+    return cache_path
+
+
+def _open_cache(cache_path: str) -> Optional[SampleCache]:
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        return SampleCache(cache_path)
+    except ValueError:
+        logging.info('Ignoring unreadable sample cache %s' % cache_path)
+        return None
+
+
+def load_sample_cache(
+        record_file: str,
+        cache_path: Optional[str] = None,
+        report_lib_options: Optional[ReportLibOptions] = None,
+        symfs_dir: Optional[str] = None) -> SampleCache:
+    """
+    Maps the cache of record_file decoded with report_lib_options and symfs_dir,
+    (re)building it when missing or out of date.
+    """
+    cache_path = cache_path or cache_path_for(record_file)
+    cache = _open_cache(cache_path)
+    if cache is not None:
+        if cache.header.get('source') == source_info(record_file, report_lib_options, symfs_dir):
+            return cache
+        cache.close()
+    build_sample_cache(record_file, cache_path, report_lib_options, symfs_dir)
+    return SampleCache(cache_path)
+
+
+def read_time_bounds(record_file: str, cache_path: Optional[str] = None) -> Tuple[int, int]:
+    """
+    (first, last) sample time of record_file, (0, 0) without samples. Symfs and
+    symbol options don't move samples, so any current cache without sample filters
+    answers this; otherwise the sample times are scanned without writing a cache.
+    """
+    cache = _open_cache(cache_path or cache_path_for(record_file))
+    if cache is not None:
+        with cache:
+            source = cache.header.get('source', {})
+            file_info = _file_info(record_file)
+            if ({key: source.get(key) for key in file_info} == file_info
+                    and not source.get('report_lib_options', {}).get('sample_filters')):
+                return cache.time_bounds()
+    first = last = None
+    lib = GetReportLib(record_file)
+    try:
+        while True:
+            sample = lib.GetNextSample()
+            if sample is None:
+                break
+            first = sample.time if first is None else min(first, sample.time)
+            last = sample.time if last is None else max(last, sample.time)
+    finally:
+        lib.Close()
+    return (first, last) if first is not None else (0, 0)
+
+
+def main():
+    parser = BaseArgumentParser(description=__doc__)
+    parser.add_argument('-i', '--record_file', default='perf.data', help='Default is perf.data.')
+    parser.add_argument('-o', '--output', help='Cache path. Default is <record_file>.samples.')
+    parser.add_argument('--symfs',
+                        help='Set the path to find binaries with symbols and debug info.')
+    parser.add_report_lib_options()
+    args = parser.parse_args()
+    cache_path = build_sample_cache(args.record_file, args.output, args.report_lib_options,
+                                    args.symfs)
+    logging.info("Sample cache generated at '%s'." % cache_path)
+
+
+if __name__ == '__main__':
+    main()
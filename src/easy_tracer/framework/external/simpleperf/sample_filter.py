@@ -27,7 +27,7 @@ Example:
 """
 
 import logging
-from simpleperf_report_lib import ReportLib
+from sample_cache import read_time_bounds
 from simpleperf_utils import BaseArgumentParser
 from typing import Tuple
 
@@ -38,20 +38,17 @@ class RecordFileReader:
 
     def get_time_range(self) -> Tuple[int, int]:
         """ Return a tuple of (min_timestamp, max_timestamp). """
-        min_timestamp = 0
-        max_timestamp = 0
-        lib = ReportLib()
-        lib.SetRecordFile(self.record_file)
-        while True:
-            sample = lib.GetNextSample()
-            if not sample:
-                break
-            if not min_timestamp or sample.time < min_timestamp:
-                min_timestamp = sample.time
-            if not max_timestamp or sample.time > max_timestamp:
-                max_timestamp = sample.time
-        lib.Close()
-        return (min_timestamp, max_timestamp)
+        # Two values from the sample cache when a current one exists, else a
+        # scan of the sample times; no cache is built just for this.
+        return read_time_bounds(self.record_file)
+
+
+def write_filter_file(output_file: str, comment: str, begin: int, end: int) -> None:
+    """ Write a filter file keeping samples with begin <= timestamp < end. """
+    with open(output_file, 'w') as fh:
+        fh.write('// %s\n' % comment)
+        fh.write('GLOBAL_BEGIN %d\n' % begin)
+        fh.write('GLOBAL_END %d\n' % end)
 
 
 def show_time_range(record_file: str) -> None:
@@ -77,10 +74,7 @@ def filter_samples(
         return
     if not split_time_range:
         output_file = output_file_prefix
-        with open(output_file, 'w') as fh:
-            fh.write('// %s\n' % comment)
-            fh.write('GLOBAL_BEGIN %d\n' % min_timestamp)
-            fh.write('GLOBAL_END %d\n' % max_timestamp)
+        write_filter_file(output_file, comment, min_timestamp, max_timestamp)
         print('Generate sample filter file: %s' % output_file)
     else:
         step = (max_timestamp - min_timestamp) // split_time_range
@@ -20,18 +20,25 @@
 
 from __future__ import annotations
 import argparse
+from array import array
+import bisect
 from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+import json
 import logging
 import os
 import os.path
 from pathlib import Path
 import re
 import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
+import threading
 import time
-from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union, TextIO
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import zlib
 
 
 NDK_ERROR_MESSAGE = "Please install the Android NDK (https://developer.android.com/studio/projects/install-ndk), then set NDK path with --ndk_path option."
@@ -466,6 +473,88 @@ class BinaryFinder:
         return True
 
 
+class SymbolizationCache(object):
+    """ An sqlite database of Addr2Nearestline results, keyed by build id. Binaries with the
+        same build id have the same debug info, so a result found for one report can be
+        reused by later reports, including ones from other scripts. Addrs without line info
+        are stored too, so they aren't searched again. Nothing is stored for a binary without
+        .debug_line: a stripped binary has the same build id as the unstripped one.
+    """
+
+    # Addr2Nearestline uses the cache in this file when the variable is set.
+    PATH_ENV = 'SIMPLEPERF_SYMBOLIZATION_CACHE'
+    QUERY_BATCH = 500
+
+    @classmethod
+    def from_env(cls) -> Optional[SymbolizationCache]:
+        path = os.environ.get(cls.PATH_ENV)
+        if not path:
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error as e:
+            logging.warning("Can't open symbolization cache %s: %s" % (path, e))
+            return None
+
+    def __init__(self, db_path: Union[Path, str]):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Shared by the threads of Addr2Nearestline.convert_addrs_to_lines().
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_path), timeout=60, check_same_thread=False)
+        # Several report processes may use the cache at the same time.
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS source_lines (
+                build_id TEXT NOT NULL,
+                with_function_name INTEGER NOT NULL,
+                addr INTEGER NOT NULL,
+                func_addr INTEGER NOT NULL,
+                lines TEXT NOT NULL,
+                PRIMARY KEY (build_id, with_function_name, addr, func_addr)) WITHOUT ROWID""")
+
+    @staticmethod
+    def _to_sql_int(value: int) -> int:
+        """ sqlite integers are signed 64-bit. """
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+    def get_lines(self, build_id: str, with_function_name: bool,
+                  addrs: Dict[int, int]) -> Dict[int, List[List[Union[str, int]]]]:
+        """ addrs maps addr to func_addr. Returns the cached lines of each found addr, as
+            [file, line] or [file, line, function] items. An empty list means no line info.
+        """
+        result = {}
+        addr_list = list(addrs)
+        for i in range(0, len(addr_list), self.QUERY_BATCH):
+            batch = {self._to_sql_int(addr): addr for addr in addr_list[i:i + self.QUERY_BATCH]}
+            query = ('SELECT addr, func_addr, lines FROM source_lines WHERE build_id = ? AND '
+                     'with_function_name = ? AND addr IN (%s)' % ','.join('?' * len(batch)))
+            with self.lock:
+                rows = self.conn.execute(
+                    query, [build_id, int(with_function_name)] + list(batch)).fetchall()
+            for sql_addr, sql_func_addr, lines in rows:
+                addr = batch[sql_addr]
+                if self._to_sql_int(addrs[addr]) == sql_func_addr:
+                    result[addr] = json.loads(lines)
+        return result
+
+    def put_lines(self, build_id: str, with_function_name: bool,
+                  items: List[Tuple[int, int, List[List[Union[str, int]]]]]):
+        """ Stores (addr, func_addr, lines) items. """
+        rows = [(build_id, int(with_function_name), self._to_sql_int(addr),
+                 self._to_sql_int(func_addr), json.dumps(lines))
+                for addr, func_addr, lines in items]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO source_lines VALUES (?, ?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            # The results are still used for this report.
+            logging.warning("Can't update symbolization cache: %s" % e)
+
+    def close(self):
+        self.conn.close()
+
+
 class Addr2Nearestline(object):
     """ Use llvm-symbolizer to convert (dso_path, func_addr, addr) to (source_file, line).
         For instructions generated by C++ compilers without a matching statement in source code
@@ -492,6 +581,7 @@ class Addr2Nearestline(object):
               range(addr - addr_step * 5, addr - addr_step * 128 - 1, -addr_step).
               (128 is a guess number. A nested switch statement in
                system/core/demangle/Demangler.cpp has >300 bytes without line info in arm64.)
+        With a SymbolizationCache, step 2 only runs for addrs missing from the cache.
     """
     class Dso(object):
         """ Info of a dynamic shared library.
@@ -535,7 +625,8 @@ class Addr2Nearestline(object):
 
     def __init__(
             self, ndk_path: Optional[str],
-            binary_finder: BinaryFinder, with_function_name: bool):
+            binary_finder: BinaryFinder, with_function_name: bool,
+            cache: Optional[SymbolizationCache] = None):
         self.symbolizer_path = ToolFinder.find_tool_path('llvm-symbolizer', ndk_path)
         if not self.symbolizer_path:
             log_exit("Can't find llvm-symbolizer. " + NDK_ERROR_MESSAGE)
@@ -543,6 +634,7 @@ class Addr2Nearestline(object):
         self.dso_map: Dict[str, Addr2Nearestline.Dso] = {}  # map from dso_path to Dso.
         self.binary_finder = binary_finder
         self.with_function_name = with_function_name
+        self.cache = cache or SymbolizationCache.from_env()
 
     def add_addr(self, dso_path: str, build_id: Optional[str], func_addr: int, addr: int):
         dso = self.dso_map.get(dso_path)
@@ -567,15 +659,57 @@ class Addr2Nearestline(object):
                 logging.debug("Can't find dso %s" % dso_path)
             return
 
+        addrs = dso.addrs
+        build_id = None
+        if self.cache:
+            build_id = dso.build_id or self.readelf.get_build_id(real_path)
+            if build_id:
+                addrs = self._read_cache(dso, build_id)
+                if not addrs:
+                    return
+
         if not self._check_debug_line_section(real_path):
             logging.debug("file %s doesn't contain .debug_line section." % real_path)
             return
-
         addr_step = self._get_addr_step(real_path)
-        self._collect_line_info(dso, real_path, [0])
-        self._collect_line_info(dso, real_path, range(-addr_step, -addr_step * 4 - 1, -addr_step))
+        self._collect_line_info(dso, real_path, [0], addrs)
+        self._collect_line_info(dso, real_path,
+                                range(-addr_step, -addr_step * 4 - 1, -addr_step), addrs)
         self._collect_line_info(dso, real_path,
-                                range(-addr_step * 5, -addr_step * 128 - 1, -addr_step))
+                                range(-addr_step * 5, -addr_step * 128 - 1, -addr_step), addrs)
+        if build_id:
+            self._write_cache(dso, build_id, addrs)
+
+    def _read_cache(self, dso: Addr2Nearestline.Dso,
+                    build_id: str) -> Dict[int, Addr2Nearestline.Addr]:
+        """ Fills source lines from the cache, and returns the addrs missing from it. """
+        cached = self.cache.get_lines(build_id, self.with_function_name,
+                                      {addr: addr_obj.func_addr
+                                       for addr, addr_obj in dso.addrs.items()})
+        for addr, lines in cached.items():
+            if not lines:
+                continue
+            source_lines = []
+            for item in lines:
+                source = (dso.get_file_id(item[0]), item[1])
+                if self.with_function_name:
+                    source += (dso.get_func_id(item[2]),)
+                source_lines.append(source)
+            dso.addrs[addr].source_lines = source_lines
+        return {addr: addr_obj for addr, addr_obj in dso.addrs.items() if addr not in cached}
+
+    def _write_cache(self, dso: Addr2Nearestline.Dso, build_id: str,
+                     addrs: Dict[int, Addr2Nearestline.Addr]):
+        items = []
+        for addr, addr_obj in addrs.items():
+            lines = []
+            for source in addr_obj.source_lines or []:
+                item = [dso.file_id_to_name[source[0]], source[1]]
+                if self.with_function_name:
+                    item.append(dso.func_id_to_name[source[2]])
+                lines.append(item)
+            items.append((addr, addr_obj.func_addr, lines))
+        self.cache.put_lines(build_id, self.with_function_name, items)
 
     def _check_debug_line_section(self, real_path: Path) -> bool:
         return '.debug_line' in self.readelf.get_sections(real_path)
@@ -589,12 +723,17 @@ class Addr2Nearestline(object):
         return 1
 
     def _collect_line_info(
-            self, dso: Addr2Nearestline.Dso, real_path: Path, addr_shifts: List[int]):
-        """ Use addr2line to get line info in a dso, with given addr shifts. """
+            self, dso: Addr2Nearestline.Dso, real_path: Path, addr_shifts: List[int],
+            addrs: Optional[Dict[int, Addr2Nearestline.Addr]] = None):
+        """ Use addr2line to get line info in a dso, with given addr shifts. Only addrs
+            (default all addrs of the dso) are searched.
+        """
+        if addrs is None:
+            addrs = dso.addrs
         # 1. Collect addrs to send to addr2line.
         addr_set: Set[int] = set()
-        for addr in dso.addrs:
-            addr_obj = dso.addrs[addr]
+        for addr in addrs:
+            addr_obj = addrs[addr]
             if addr_obj.source_lines:  # already has source line, no need to search.
                 continue
             for shift in addr_shifts:
@@ -617,9 +756,9 @@ class Addr2Nearestline(object):
             return
         addr_map = self.parse_line_output(stdoutdata, dso)
 
-        # 3. Fill line info in dso.addrs.
-        for addr in dso.addrs:
-            addr_obj = dso.addrs[addr]
+        # 3. Fill line info in addrs.
+        for addr in addrs:
+            addr_obj = addrs[addr]
             if addr_obj.source_lines:
                 continue
             for shift in addr_shifts:
@@ -807,29 +946,163 @@ class Disassembly:
         self.lines: List[Tuple[str, int]] = []
 
 
+class DisassemblyCache(object):
+    """ Whole-binary objdump output, stored once per cache key (see Objdump.get_dso_info()).
+        Each file holds the output lines in zlib compressed blocks, followed by an index of
+        the addr range and file position of every block, so disassembling functions only
+        reads the blocks covering them.
+    """
+
+    # Objdump uses a cache in this directory when the variable is set.
+    PATH_ENV = 'SIMPLEPERF_DISASSEMBLY_CACHE'
+    MAGIC = b'SPDISASM'
+    BLOCK_LINES = 2048
+    # Footer: index offset, block count, magic.
+    FOOTER = struct.Struct('<QQ8s')
+
+    @classmethod
+    def from_env(cls) -> Optional[DisassemblyCache]:
+        path = os.environ.get(cls.PATH_ENV)
+        return cls(path) if path else None
+
+    def __init__(self, cache_dir: Union[Path, str]):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        self.key_locks: Dict[str, threading.Lock] = {}
+        # Map from cache key to its index: [min_addr, max_addr, offset, size] of each block.
+        self.indexes: Dict[str, array] = {}
+
+    def get_path(self, key: str) -> Path:
+        if key.startswith('0x'):
+            key = key[2:]
+        return self.cache_dir / (key + '.disasm')
+
+    def get_lines(self, key: str, sorted_addr_ranges: List[AddrRange],
+                  build: Callable[[], Optional[Iterator[str]]]) -> Optional[Iterator[str]]:
+        """ Returns the output lines needed to disassemble sorted_addr_ranges. If the binary
+            isn't cached yet, build() is called for its whole objdump output.
+        """
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # Other threads disassembling the same binary wait for one build.
+        with key_lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = self._read_index(key)
+                if index is None:
+                    lines = build()
+                    if lines is None:
+                        return None
+                    index = self._write(key, lines)
+                self.indexes[key] = index
+        return self._read_lines(key, index, self._find_blocks(index, sorted_addr_ranges))
+
+    def _write(self, key: str, lines: Iterator[str]) -> array:
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name('%s.%d.part' % (path.name, os.getpid()))
+        index = array('Q')
+        max_addr = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                block: List[str] = []
+                for line in lines:
+                    block.append(line)
+                    if len(block) == self.BLOCK_LINES:
+                        max_addr = self._write_block(f, block, index, max_addr)
+                        block = []
+                if block:
+                    self._write_block(f, block, index, max_addr)
+                index_offset = f.tell()
+                f.write(index.tobytes())
+                f.write(self.FOOTER.pack(index_offset, len(index) // 4, self.MAGIC))
+            os.replace(tmp_path, path)
+        except BaseException:
+            remove(tmp_path)
+            raise
+        return index
+
+    def _write_block(self, f, block: List[str], index: array, max_addr: int) -> int:
+        addrs = [addr for addr in map(Objdump.get_addr_from_disassembly_line, block) if addr]
+        # A block without addrs sorts right after the previous one.
+        min_addr = min(addrs) if addrs else max_addr
+        max_addr = max(addrs) if addrs else max_addr
+        data = zlib.compress('\n'.join(block).encode('utf-8'))
+        index.extend([min_addr, max_addr, f.tell(), len(data)])
+        f.write(data)
+        return max_addr
+
+    def _read_index(self, key: str) -> Optional[array]:
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                f.seek(-self.FOOTER.size, os.SEEK_END)
+                index_offset, block_count, magic = self.FOOTER.unpack(f.read(self.FOOTER.size))
+                if magic != self.MAGIC:
+                    return None
+                f.seek(index_offset)
+                index = array('Q')
+                index.frombytes(f.read(block_count * 4 * index.itemsize))
+                return index
+        except (OSError, struct.error, ValueError):
+            return None
+
+    @staticmethod
+    def _find_blocks(index: array, sorted_addr_ranges: List[AddrRange]) -> List[int]:
+        """ Objdump prints addrs in increasing order. Each range needs the blocks from the one
+            reaching its start to the one after its end, so lines following the last
+            instruction stop where they would in a direct objdump run.
+        """
+        max_addrs = index[1::4]
+        min_addrs = index[0::4]
+        blocks: Set[int] = set()
+        for addr_range in sorted_addr_ranges:
+            first = bisect.bisect_left(max_addrs, addr_range.start)
+            last = bisect.bisect_left(min_addrs, addr_range.end)
+            blocks.update(range(first, min(last + 1, len(max_addrs))))
+        return sorted(blocks)
+
+    def _read_lines(self, key: str, index: array, blocks: List[int]) -> Iterator[str]:
+        with open(self.get_path(key), 'rb') as f:
+            for i in blocks:
+                f.seek(index[i * 4 + 2])
+                data = zlib.decompress(f.read(index[i * 4 + 3]))
+                yield from data.decode('utf-8').split('\n')
+
+
 class Objdump(object):
     """ A wrapper of objdump to disassemble code. """
 
-    def __init__(self, ndk_path: Optional[str], binary_finder: BinaryFinder):
+    def __init__(self, ndk_path: Optional[str], binary_finder: BinaryFinder,
+                 cache: Optional[DisassemblyCache] = None):
         self.ndk_path = ndk_path
         self.binary_finder = binary_finder
         self.readelf = ReadElf(ndk_path)
         self.objdump_paths: Dict[str, str] = {}
+        self.cache = cache or DisassemblyCache.from_env()
 
     def get_dso_info(self, dso_path: str, expected_build_id: Optional[str]
-                     ) -> Optional[Tuple[str, str]]:
+                     ) -> Optional[Tuple[str, str, Optional[str]]]:
+        """ Returns (real_path, arch, cache_key). cache_key is only looked up with a cache.
+            It is the build id plus the file size: a stripped binary has the same build id
+            as the unstripped one, but disassembles without source lines.
+        """
         real_path = self.binary_finder.find_binary(dso_path, expected_build_id)
         if not real_path:
             return None
         arch = self.readelf.get_arch(real_path)
         if arch == 'unknown':
             return None
-        return (str(real_path), arch)
-
-    def disassemble_function(self, dso_info, addr_range: AddrRange) -> Optional[Disassembly]:
-        """ Disassemble code for an addr range in a binary.
-        """
-        real_path, arch = dso_info
+        cache_key = None
+        if self.cache:
+            build_id = expected_build_id or self.readelf.get_build_id(real_path)
+            if build_id:
+                cache_key = '%s-%d' % (build_id, os.path.getsize(real_path))
+        return (str(real_path), arch, cache_key)
+
+    def _get_objdump_args(self, dso_info, start_addr: Optional[int] = None,
+                          stop_addr: Optional[int] = None) -> List[str]:
+        real_path, arch = dso_info[:2]
         objdump_path = self.objdump_paths.get(arch)
         if not objdump_path:
             objdump_path = ToolFinder.find_tool_path('llvm-objdump', self.ndk_path, arch)
@@ -837,13 +1110,19 @@ class Objdump(object):
                 log_exit("Can't find llvm-objdump." + NDK_ERROR_MESSAGE)
             self.objdump_paths[arch] = objdump_path
 
-        # Run objdump.
-        args = [objdump_path, '-dlC', '--no-show-raw-insn',
-                '--start-address=0x%x' % addr_range.start,
-                '--stop-address=0x%x' % (addr_range.end),
-                real_path]
+        args = [objdump_path, '-dlC', '--no-show-raw-insn']
+        if start_addr is not None:
+            args += ['--start-address=0x%x' % start_addr, '--stop-address=0x%x' % stop_addr]
+        args.append(real_path)
         if arch == 'arm' and 'llvm-objdump' in objdump_path:
             args += ['--print-imm-hex']
+        return args
+
+    def disassemble_function(self, dso_info, addr_range: AddrRange) -> Optional[Disassembly]:
+        """ Disassemble code for an addr range in a binary.
+        """
+        # Run objdump.
+        args = self._get_objdump_args(dso_info, addr_range.start, addr_range.end)
         try:
             subproc = subprocess.Popen(args, stdout=subprocess.PIPE)
             (stdoutdata, _) = subproc.communicate()
@@ -871,23 +1150,30 @@ class Objdump(object):
         """
         if not sorted_addr_ranges:
             return []
-        real_path, arch = dso_info
-        objdump_path = self.objdump_paths.get(arch)
-        if not objdump_path:
-            objdump_path = ToolFinder.find_tool_path('llvm-objdump', self.ndk_path, arch)
-            if not objdump_path:
-                log_exit("Can't find llvm-objdump." + NDK_ERROR_MESSAGE)
-            self.objdump_paths[arch] = objdump_path
+        cache_key = dso_info[2] if len(dso_info) > 2 else None
+        if self.cache and cache_key:
+            try:
+                lines = self.cache.get_lines(
+                    cache_key, sorted_addr_ranges, lambda: self._disassemble_binary(dso_info))
+                if lines is None:
+                    return None
+                result = self._parse_disassembly_for_functions(lines, sorted_addr_ranges)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logging.warning("Can't disassemble %s: %s" % (dso_info[0], e))
+                return None
+            # objdump --stop-address ends the output at the last instruction, while the
+            # whole binary output has a blank line and the next function after it.
+            stop_addr = max(addr_range.end for addr_range in sorted_addr_ranges)
+            for addr_range, disassembly in zip(sorted_addr_ranges, result):
+                if addr_range.end == stop_addr:
+                    while disassembly.lines and not disassembly.lines[-1][1]:
+                        disassembly.lines.pop()
+            return result
 
         # Run objdump.
         start_addr = sorted_addr_ranges[0].start
         stop_addr = max(addr_range.end for addr_range in sorted_addr_ranges)
-        args = [objdump_path, '-dlC', '--no-show-raw-insn',
-                '--start-address=0x%x' % start_addr,
-                '--stop-address=0x%x' % stop_addr,
-                real_path]
-        if arch == 'arm' and 'llvm-objdump' in objdump_path:
-            args += ['--print-imm-hex']
+        args = self._get_objdump_args(dso_info, start_addr, stop_addr)
         try:
             proc = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
             result = self._parse_disassembly_for_functions(proc.stdout, sorted_addr_ranges)
@@ -896,16 +1182,29 @@ class Objdump(object):
             return None
         return result
 
-    def _parse_disassembly_for_functions(self, fh: TextIO, sorted_addr_ranges: List[AddrRange]) -> Optional[List[Disassembly]]:
+    def _disassemble_binary(self, dso_info) -> Optional[Iterator[str]]:
+        """ Returns the objdump output lines of the whole binary. """
+        try:
+            proc = subprocess.Popen(self._get_objdump_args(dso_info),
+                                    stdout=subprocess.PIPE, text=True)
+        except OSError:
+            return None
+
+        def read_lines() -> Iterator[str]:
+            for line in proc.stdout:
+                yield line.rstrip()
+            # Don't cache the output of a failed run.
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        return read_lines()
+
+    def _parse_disassembly_for_functions(self, lines: Iterable[str], sorted_addr_ranges: List[AddrRange]) -> Optional[List[Disassembly]]:
         current_id = 0
         in_range = False
         result = [Disassembly() for _ in sorted_addr_ranges]
-        while True:
-            line = fh.readline()
-            if not line:
-                break
+        for line in lines:
             line = line.rstrip()  # Remove '\r\n'.
-            addr = self._get_addr_from_disassembly_line(line)
+            addr = self.get_addr_from_disassembly_line(line)
             if current_id >= len(sorted_addr_ranges):
                 continue
             if addr:
@@ -921,7 +1220,8 @@ class Objdump(object):
                 result[current_id].lines.append((line, addr))
         return result
 
-    def _get_addr_from_disassembly_line(self, line: str) -> int:
+    @staticmethod
+    def get_addr_from_disassembly_line(line: str) -> int:
         # line may be an instruction, like: " 24a469c: stp x29, x30, [sp, #-0x60]!" or
         #  "ffffffc0085d9664:      	paciasp".
         # line may be a function start point, like "00000000024a4698 <DoWork()>:".
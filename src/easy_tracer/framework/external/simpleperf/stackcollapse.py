@@ -25,9 +25,9 @@
 """
 
 from collections import defaultdict
-from simpleperf_report_lib import GetReportLib
+from simpleperf_report_lib import CallChainStructure, EventStruct, GetReportLib, SampleStruct
 from simpleperf_utils import BaseArgumentParser, ReportLibOptions
-from typing import DefaultDict
+from typing import DefaultDict, Iterator
 
 import logging
 
@@ -54,48 +54,73 @@ def collapse_stacks(
         lib.SetKallsymsFile(kallsyms_file)
     lib.SetReportOptions(report_lib_options)
 
-    stacks: DefaultDict[str, int] = defaultdict(int)
-    event_defaulted = False
-    event_warning_shown = False
+    collapser = StackCollapser(event_filter, include_pid, include_tid, annotate_kernel,
+                               annotate_jit)
     while True:
         sample = lib.GetNextSample()
         if sample is None:
             lib.Close()
             break
-        event = lib.GetEventOfCurrentSample()
-        symbol = lib.GetSymbolOfCurrentSample()
-        callchain = lib.GetCallChainOfCurrentSample()
-        if not event_filter:
-            event_filter = event.name
-            event_defaulted = True
-        elif event.name != event_filter:
-            if event_defaulted and not event_warning_shown:
+        collapser.add_sample(sample, lib.GetEventOfCurrentSample(),
+                             lib.GetCallChainOfCurrentSample())
+
+    for line in collapser.lines():
+        print(line)
+
+
+class StackCollapser:
+    """Aggregates samples per folded stack; the sample loop of collapse_stacks()."""
+
+    def __init__(
+            self,
+            event_filter: str,
+            include_pid: bool,
+            include_tid: bool,
+            annotate_kernel: bool,
+            annotate_jit: bool):
+        self.event_filter = event_filter
+        self.include_pid = include_pid
+        self.include_tid = include_tid
+        self.annotate_kernel = annotate_kernel
+        self.annotate_jit = annotate_jit
+        self.stacks: DefaultDict[str, int] = defaultdict(int)
+        self.event_defaulted = False
+        self.event_warning_shown = False
+
+    def add_sample(self, sample: SampleStruct, event: EventStruct,
+                   callchain: CallChainStructure) -> None:
+        if not self.event_filter:
+            self.event_filter = event.name
+            self.event_defaulted = True
+        elif event.name != self.event_filter:
+            if self.event_defaulted and not self.event_warning_shown:
                 logging.warning(
                     'Input has multiple event types. Filtering for the first event type seen: %s' %
-                    event_filter)
-                event_warning_shown = True
-            continue
+                    self.event_filter)
+                self.event_warning_shown = True
+            return
 
         stack = []
         for i in range(callchain.nr):
             entry = callchain.entries[i]
             func = entry.symbol.symbol_name
-            if annotate_kernel and "kallsyms" in entry.symbol.dso_name or ".ko" in entry.symbol.dso_name:
+            if self.annotate_kernel and "kallsyms" in entry.symbol.dso_name or ".ko" in entry.symbol.dso_name:
                 func += '_[k]'  # kernel
-            if annotate_jit and entry.symbol.dso_name == "[JIT app cache]":
+            if self.annotate_jit and entry.symbol.dso_name == "[JIT app cache]":
                 func += '_[j]'  # jit
             stack.append(func)
-        if include_tid:
+        if self.include_tid:
             stack.append("%s-%d/%d" % (sample.thread_comm, sample.pid, sample.tid))
-        elif include_pid:
+        elif self.include_pid:
             stack.append("%s-%d" % (sample.thread_comm, sample.pid))
         else:
             stack.append(sample.thread_comm)
         stack.reverse()
-        stacks[";".join(stack)] += sample.period
+        self.stacks[";".join(stack)] += sample.period
 
-    for k in sorted(stacks.keys()):
-        print("%s %d" % (k, stacks[k]))
+    def lines(self) -> Iterator[str]:
+        for k in sorted(self.stacks.keys()):
+            yield "%s %d" % (k, self.stacks[k])
 
 
 def main():
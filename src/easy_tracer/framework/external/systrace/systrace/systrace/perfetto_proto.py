@@ -0,0 +1,144 @@
+"""Minimal protobuf wire format reader for Perfetto traces.
+
+Decodes fields straight from the bytes of a trace, without generated message
+classes or the protobuf package. Length-delimited fields are returned as
+memoryview slices, so nested messages are read without copying. Field
+numbers come from the Perfetto protos:
+https://android.googlesource.com/platform/external/perfetto/+/refs/heads/main/protos/perfetto/trace/
+"""
+
+import logging
+import zlib
+
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_FIXED32 = 5
+
+# Trace.packet
+TRACE_PACKET_FIELD = 1
+# TracePacket.compressed_packets: a zlib compressed Trace of more packets
+COMPRESSED_PACKETS_FIELD = 50
+
+# Bytes of trace file read at a time.
+_READ_SIZE = 1 << 20
+
+
+def read_varint(buf, pos):
+  """Returns (value, position after the varint) of the varint at buf[pos]."""
+  b = buf[pos]
+  pos += 1
+  if b < 0x80:
+    return b, pos
+  result = b & 0x7f
+  shift = 7
+  while True:
+    b = buf[pos]
+    pos += 1
+    result |= (b & 0x7f) << shift
+    if b < 0x80:
+      return result, pos
+    shift += 7
+
+
+def to_signed(value):
+  """Reinterprets a decoded int32/int64 varint as a signed number."""
+  return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def iter_fields(buf):
+  """Yields (field number, wire type, value) for each field of a message.
+
+  Values are ints, except for length-delimited fields, which are slices of
+  buf.
+  """
+  pos = 0
+  end = len(buf)
+  # Most keys, values and lengths fit in one byte; read_varint is only
+  # called for longer varints.
+  while pos < end:
+    key = buf[pos]
+    pos += 1
+    if key >= 0x80:
+      key, pos = read_varint(buf, pos - 1)
+    wire_type = key & 7
+    if wire_type == WIRETYPE_VARINT:
+      value = buf[pos]
+      pos += 1
+      if value >= 0x80:
+        value, pos = read_varint(buf, pos - 1)
+    elif wire_type == WIRETYPE_LENGTH_DELIMITED:
+      length = buf[pos]
+      pos += 1
+      if length >= 0x80:
+        length, pos = read_varint(buf, pos - 1)
+      value = buf[pos:pos + length]
+      pos += length
+    elif wire_type == WIRETYPE_FIXED64:
+      value = int.from_bytes(buf[pos:pos + 8], 'little')
+      pos += 8
+    elif wire_type == WIRETYPE_FIXED32:
+      value = int.from_bytes(buf[pos:pos + 4], 'little')
+      pos += 4
+    else:
+      raise ValueError('Unsupported protobuf wire type %d' % wire_type)
+    yield key >> 3, wire_type, value
+
+
+def iter_packed_varints(buf):
+  """Yields the values of a packed repeated varint field."""
+  pos = 0
+  end = len(buf)
+  while pos < end:
+    value, pos = read_varint(buf, pos)
+    yield value
+
+
+def decode_string(buf):
+  return bytes(buf).decode('utf-8', 'replace')
+
+
+def iter_trace_packets(f):
+  """Yields every TracePacket of the Perfetto trace in file object f.
+
+  The file is read a block at a time. Packets inside compressed_packets are
+  decompressed and yielded in place. A packet cut short by the end of the
+  file ends the trace.
+  """
+  buf = b''
+  pos = 0
+  while True:
+    if len(buf) - pos < 20:
+      buf = buf[pos:] + f.read(_READ_SIZE)
+      pos = 0
+      if not buf:
+        return
+    key, pos = read_varint(buf, pos)
+    if key & 7 != WIRETYPE_LENGTH_DELIMITED:
+      raise ValueError('Not a Perfetto trace: unexpected field %d' % key)
+    length, pos = read_varint(buf, pos)
+    if len(buf) < pos + length:
+      buf = buf[pos:] + f.read(max(_READ_SIZE, pos + length - len(buf)))
+      pos = 0
+      if len(buf) < length:
+        logging.warning('Perfetto trace ends in the middle of a packet')
+        return
+    packet = memoryview(buf)[pos:pos + length]
+    pos += length
+    if key >> 3 == TRACE_PACKET_FIELD:
+      for packet in _expand_packet(packet):
+        yield packet
+
+
+def _expand_packet(packet):
+  for field, _, value in iter_fields(packet):
+    if field == COMPRESSED_PACKETS_FIELD:
+      break
+  else:
+    yield packet
+    return
+  trace = zlib.decompress(value)
+  for field, _, inner in iter_fields(memoryview(trace)):
+    if field == TRACE_PACKET_FIELD:
+      for nested in _expand_packet(inner):
+        yield nested
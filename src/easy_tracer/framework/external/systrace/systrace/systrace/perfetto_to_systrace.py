@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+"""Converts Perfetto protobuf traces to systrace text or Chrome JSON.
+
+A local replacement for 'traceconv systrace' covering what the systrace
+importer shows: ftrace bundles (including compact sched), the process tree
+and atrace print events. The trace is decoded with perfetto_proto one packet
+at a time. Bundles hold the events of one CPU in order; they are queued per
+CPU and merged once every CPU has moved past them, so memory doesn't grow
+with the size of the trace.
+
+Usage: perfetto_to_systrace.py [--format systrace|json] input output
+"""
+
+import collections
+import io
+import json
+import optparse
+import sys
+
+from systrace import perfetto_proto
+from systrace.perfetto_proto import decode_string
+from systrace.perfetto_proto import iter_fields
+from systrace.perfetto_proto import iter_packed_varints
+from systrace.perfetto_proto import to_signed
+
+# TracePacket
+PACKET_FTRACE_EVENTS = 1
+PACKET_PROCESS_TREE = 2
+# FtraceEventBundle
+BUNDLE_CPU = 1
+BUNDLE_EVENT = 2
+BUNDLE_COMPACT_SCHED = 4
+# FtraceEvent
+EVENT_TIMESTAMP = 1
+EVENT_PID = 2
+EVENT_PRINT = 3
+EVENT_SCHED_SWITCH = 4
+EVENT_CPU_FREQUENCY = 11
+EVENT_CPU_IDLE = 13
+EVENT_SCHED_WAKEUP = 17
+EVENT_SCHED_WAKING = 20
+# FtraceEventBundle.CompactSched
+COMPACT_SWITCH_TIMESTAMP = 1
+COMPACT_SWITCH_PREV_STATE = 2
+COMPACT_SWITCH_NEXT_PID = 3
+COMPACT_SWITCH_NEXT_PRIO = 4
+COMPACT_INTERN_TABLE = 5
+COMPACT_SWITCH_NEXT_COMM_INDEX = 6
+COMPACT_WAKING_TIMESTAMP = 7
+COMPACT_WAKING_PID = 8
+COMPACT_WAKING_TARGET_CPU = 9
+COMPACT_WAKING_PRIO = 10
+COMPACT_WAKING_COMM_INDEX = 11
+# ProcessTree
+TREE_PROCESSES = 1
+TREE_THREADS = 2
+PROCESS_PID = 1
+PROCESS_CMDLINE = 3
+THREAD_TID = 1
+THREAD_NAME = 2
+THREAD_TGID = 3
+
+SYSTRACE_HEADER = (
+    '# tracer: nop\n'
+    '#\n'
+    '#                                      _-----=> irqs-off\n'
+    '#                                     / _----=> need-resched\n'
+    '#                                    | / _---=> hardirq/softirq\n'
+    '#                                    || / _--=> preempt-depth\n'
+    '#                                    ||| /     delay\n'
+    '#           TASK-PID    TGID   CPU#  ||||    TIMESTAMP  FUNCTION\n'
+    '#              | |        |      |   ||||       |         |\n')
+
+# Task state bits printed by sched_switch, lowest bit first; 0 is running.
+_TASK_STATES = 'SDTtXZPI'
+_TASK_STATE_PREEMPTED = 0x100
+# Comm the kernel shows for tasks it has no name for.
+_UNKNOWN_COMM = '<...>'
+_IDLE_TASK = (0, '<idle>', 120)
+# Lines are held back for merging until every CPU seen so far has events this
+# much newer, which leaves room for CPUs whose first bundle comes later.
+_SORT_WINDOW_NS = 1000000000
+# Lines held back before the oldest are written regardless.
+_MAX_PENDING_LINES = 1 << 18
+
+
+def _format_prev_state(state):
+  letters = '|'.join(c for i, c in enumerate(_TASK_STATES) if state & 1 << i)
+  # A preempted task was still running: the kernel prints R+ for it
+  letters = letters or 'R'
+  if state & _TASK_STATE_PREEMPTED:
+    letters += '+'
+  return letters
+
+
+def _packed(values, wire_type, value):
+  # Repeated scalars are packed by Perfetto, but the wire format allows both.
+  if wire_type == perfetto_proto.WIRETYPE_LENGTH_DELIMITED:
+    values.extend(iter_packed_varints(value))
+  else:
+    values.append(value)
+
+
+class PerfettoToSystrace(object):
+  """Turns the packets of one Perfetto trace into systrace lines.
+
+  Call iter_lines() with the open trace file.
+  """
+
+  def __init__(self):
+    self._comms = {0: _IDLE_TASK[1]}
+    self._tgids = {}
+    # cpu -> (pid, comm, prio) of the task running there
+    self._running = {}
+    # cpu -> timestamp of the newest event read for it
+    self._cpu_ts = {}
+    # cpu -> (timestamp, seq, cpu, pid, name, args) not written yet
+    self._queues = collections.defaultdict(collections.deque)
+    self._pending = 0
+    self._seq = 0
+
+  def iter_lines(self, trace_file):
+    """Yields the systrace text of the trace, header first, line by line."""
+    yield SYSTRACE_HEADER
+    for packet in perfetto_proto.iter_trace_packets(trace_file):
+      for field, _, value in iter_fields(packet):
+        if field == PACKET_FTRACE_EVENTS:
+          self._read_bundle(value)
+        elif field == PACKET_PROCESS_TREE:
+          self._read_process_tree(value)
+      if not self._cpu_ts:
+        continue
+      # Every CPU has written all its events up to the slowest one
+      watermark = min(self._cpu_ts.values()) - _SORT_WINDOW_NS
+      if self._pending > _MAX_PENDING_LINES:
+        # A CPU that stopped tracing can't hold back the others for ever
+        watermark = max(self._cpu_ts.values()) - _SORT_WINDOW_NS
+      for entry in self._take_pending(watermark):
+        yield self._format(entry)
+    for entry in self._take_pending(float('inf')):
+      yield self._format(entry)
+
+  def _take_pending(self, watermark):
+    """Returns the pending events up to watermark in timestamp order."""
+    ready = []
+    for queue in self._queues.values():
+      while queue and queue[0][0] <= watermark:
+        ready.append(queue.popleft())
+    self._pending -= len(ready)
+    # Sorting merges the runs of each CPU, which it finds already in order
+    ready.sort()
+    return ready
+
+  def _format(self, entry):
+    ts, _, cpu, pid, name, args = entry
+    tgid = self._tgids.get(pid)
+    return '%16s-%-5d (%5s) [%03d] .... %d.%06d: %s: %s\n' % (
+        self._comms.get(pid, _UNKNOWN_COMM), pid,
+        '-----' if tgid is None else tgid, cpu,
+        ts // 1000000000, ts % 1000000000 // 1000, name, args)
+
+  def _read_process_tree(self, tree):
+    for field, _, value in iter_fields(tree):
+      if field == TREE_PROCESSES:
+        pid = None
+        cmdline = None
+        for f, _, v in iter_fields(value):
+          if f == PROCESS_PID:
+            pid = v
+          elif f == PROCESS_CMDLINE and cmdline is None:
+            cmdline = decode_string(v)
+        if pid is None:
+          continue
+        self._tgids[pid] = pid
+        if cmdline and pid not in self._comms:
+          # The kernel keeps the first 15 characters of the executable name
+          self._comms[pid] = cmdline.rsplit('/', 1)[-1][:15]
+      elif field == TREE_THREADS:
+        tid = name = tgid = None
+        for f, _, v in iter_fields(value):
+          if f == THREAD_TID:
+            tid = v
+          elif f == THREAD_NAME:
+            name = decode_string(v)
+          elif f == THREAD_TGID:
+            tgid = v
+        if tid is None:
+          continue
+        if tgid is not None:
+          self._tgids[tid] = tgid
+        if name:
+          self._comms[tid] = name
+
+  def _read_bundle(self, bundle):
+    cpu = 0
+    events = []
+    for field, _, value in iter_fields(bundle):
+      if field == BUNDLE_CPU:
+        cpu = value
+      elif field == BUNDLE_EVENT:
+        event = _read_event(value)
+        if event is not None:
+          events.append(event)
+      elif field == BUNDLE_COMPACT_SCHED:
+        events.extend(_read_compact_sched(value))
+    if not events:
+      return
+    # Switches and wakings of compact sched come in separate columns
+    events.sort(key=lambda event: event[0])
+    running = self._running.get(cpu, _IDLE_TASK)
+    queue = self._queues[cpu]
+    for ts, pid, name, args in events:
+      if name == 'sched_switch':
+        prev, prev_state, next_task = args
+        if prev is None:
+          # Compact switches leave out the task switched from
+          prev = running
+        for task in (prev, next_task):
+          if task[0]:
+            self._comms[task[0]] = task[1]
+        pid = prev[0]
+        args = ('prev_comm=%s prev_pid=%d prev_prio=%d prev_state=%s ==> '
+                'next_comm=%s next_pid=%d next_prio=%d' % (
+                    prev[1], prev[0], prev[2], _format_prev_state(prev_state),
+                    next_task[1], next_task[0], next_task[2]))
+        running = next_task
+      elif name in ('sched_wakeup', 'sched_waking'):
+        if args[1] and args[0]:
+          self._comms[args[1]] = args[0]
+        if pid is None:
+          # Compact wakings are done by the task running on the CPU
+          pid = running[0]
+        args = 'comm=%s pid=%d prio=%d target_cpu=%03d' % args
+      self._seq += 1
+      queue.append((ts, self._seq, cpu, pid, name, args))
+    self._pending += len(events)
+    self._running[cpu] = running
+    self._cpu_ts[cpu] = max(self._cpu_ts.get(cpu, 0), events[-1][0])
+
+
+def _read_print(event):
+  for field, _, value in iter_fields(event):
+    if field == 2:  # buf
+      return decode_string(value).rstrip('\n')
+  return ''
+
+
+def _read_sched_switch(event):
+  # prev_comm = 1, prev_pid = 2, prev_prio = 3, prev_state = 4,
+  # next_comm = 5, next_pid = 6, next_prio = 7
+  prev_comm = next_comm = ''
+  prev_pid = prev_prio = prev_state = next_pid = next_prio = 0
+  for field, _, value in iter_fields(event):
+    if field == 1:
+      prev_comm = decode_string(value)
+    elif field == 2:
+      prev_pid = to_signed(value)
+    elif field == 3:
+      prev_prio = to_signed(value)
+    elif field == 4:
+      prev_state = to_signed(value)
+    elif field == 5:
+      next_comm = decode_string(value)
+    elif field == 6:
+      next_pid = to_signed(value)
+    elif field == 7:
+      next_prio = to_signed(value)
+  return ((prev_pid, prev_comm, prev_prio), prev_state,
+          (next_pid, next_comm, next_prio))
+
+
+def _read_sched_wakeup(event):
+  # sched_wakeup and sched_waking: comm = 1, pid = 2, prio = 3,
+  # target_cpu = 5
+  comm = ''
+  pid = prio = target_cpu = 0
+  for field, _, value in iter_fields(event):
+    if field == 1:
+      comm = decode_string(value)
+    elif field == 2:
+      pid = to_signed(value)
+    elif field == 3:
+      prio = to_signed(value)
+    elif field == 5:
+      target_cpu = to_signed(value)
+  return comm, pid, prio, target_cpu
+
+
+def _read_cpu_state(event):
+  # cpu_frequency and cpu_idle: state = 1, cpu_id = 2
+  state = cpu_id = 0
+  for field, _, value in iter_fields(event):
+    if field == 1:
+      state = value
+    elif field == 2:
+      cpu_id = value
+  return 'state=%d cpu_id=%d' % (state, cpu_id)
+
+
+# FtraceEvent field -> (ftrace event name, reader of its arguments)
+_EVENT_READERS = {
+    EVENT_PRINT: ('tracing_mark_write', _read_print),
+    EVENT_SCHED_SWITCH: ('sched_switch', _read_sched_switch),
+    EVENT_CPU_FREQUENCY: ('cpu_frequency', _read_cpu_state),
+    EVENT_CPU_IDLE: ('cpu_idle', _read_cpu_state),
+    EVENT_SCHED_WAKEUP: ('sched_wakeup', _read_sched_wakeup),
+    EVENT_SCHED_WAKING: ('sched_waking', _read_sched_wakeup),
+}
+
+
+def _read_event(event):
+  """Returns (timestamp, pid, name, args) of an FtraceEvent, or None."""
+  ts = pid = 0
+  name = args = None
+  for field, _, value in iter_fields(event):
+    if field == EVENT_TIMESTAMP:
+      ts = value
+    elif field == EVENT_PID:
+      pid = value
+    elif field in _EVENT_READERS:
+      name, reader = _EVENT_READERS[field]
+      args = reader(value)
+  if name is None:
+    return None
+  return ts, pid, name, args
+
+
+def _read_compact_sched(compact):
+  """Returns the events of a CompactSched like _read_event does.
+
+  Their pid is None, and so is the task switched from: both are the task
+  running on the CPU, which only the caller knows.
+  """
+  intern_table = []
+  columns = dict((field, []) for field in (
+      COMPACT_SWITCH_TIMESTAMP, COMPACT_SWITCH_PREV_STATE,
+      COMPACT_SWITCH_NEXT_PID, COMPACT_SWITCH_NEXT_PRIO,
+      COMPACT_SWITCH_NEXT_COMM_INDEX, COMPACT_WAKING_TIMESTAMP,
+      COMPACT_WAKING_PID, COMPACT_WAKING_TARGET_CPU, COMPACT_WAKING_PRIO,
+      COMPACT_WAKING_COMM_INDEX))
+  for field, wire_type, value in iter_fields(compact):
+    if field == COMPACT_INTERN_TABLE:
+      intern_table.append(decode_string(value))
+    elif field in columns:
+      _packed(columns[field], wire_type, value)
+  events = []
+  # Timestamps are deltas from the previous event of the same column
+  ts = 0
+  for delta, prev_state, pid, prio, comm in zip(
+      columns[COMPACT_SWITCH_TIMESTAMP], columns[COMPACT_SWITCH_PREV_STATE],
+      columns[COMPACT_SWITCH_NEXT_PID], columns[COMPACT_SWITCH_NEXT_PRIO],
+      columns[COMPACT_SWITCH_NEXT_COMM_INDEX]):
+    ts += delta
+    next_task = (to_signed(pid), intern_table[comm], to_signed(prio))
+    events.append((ts, None, 'sched_switch',
+                   (None, to_signed(prev_state), next_task)))
+  ts = 0
+  for delta, pid, target_cpu, prio, comm in zip(
+      columns[COMPACT_WAKING_TIMESTAMP], columns[COMPACT_WAKING_PID],
+      columns[COMPACT_WAKING_TARGET_CPU], columns[COMPACT_WAKING_PRIO],
+      columns[COMPACT_WAKING_COMM_INDEX]):
+    ts += delta
+    events.append((ts, None, 'sched_waking',
+                   (intern_table[comm], to_signed(pid), to_signed(prio),
+                    to_signed(target_cpu))))
+  return events
+
+
+def iter_systrace_lines(trace_file):
+  """Yields the systrace text of the Perfetto trace in trace_file."""
+  return PerfettoToSystrace().iter_lines(trace_file)
+
+
+def convert(trace_file, out, output_format='systrace'):
+  """Writes the Perfetto trace in trace_file to the text file out.
+
+  Args:
+      trace_file: The trace, opened in binary mode.
+      out: The output, opened in text mode.
+      output_format: 'systrace' for systrace text, or 'json' for Chrome JSON
+          with the text as its systemTraceEvents.
+  """
+  lines = iter_systrace_lines(trace_file)
+  if output_format == 'json':
+    out.write('{"traceEvents": [], "systemTraceEvents": "')
+    for line in lines:
+      out.write(json.encoder.encode_basestring(line)[1:-1])
+    out.write('"}\n')
+  else:
+    out.writelines(lines)
+
+
+def main(argv=None):
+  parser = optparse.OptionParser(
+      usage='%prog [options] perfetto_trace output_file')
+  parser.add_option('--format', dest='output_format', default='systrace',
+                    choices=['systrace', 'json'],
+                    help='Write systrace text (the default) or Chrome JSON.')
+  options, args = parser.parse_args(argv)
+  if len(args) != 2:
+    parser.error('Expected a Perfetto trace and an output file.')
+  with open(args[0], 'rb') as trace_file:
+    with io.open(args[1], 'w', encoding='utf-8', newline='\n') as out:
+      convert(trace_file, out, options.output_format)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
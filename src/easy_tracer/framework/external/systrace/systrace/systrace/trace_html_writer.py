@@ -0,0 +1,213 @@
+"""Writes systrace results to a self-contained HTML file.
+
+Each TraceResult is streamed into its own trace-data block, gzip compressed
+and base64 encoded piece by piece, so a trace is never held decoded or
+encoded as a whole. The page loads the blocks with trace_viewer.js.
+
+The catapult trace viewer (systrace_trace_viewer.html and the
+webcomponents.min.js polyfill) is inlined when it can be found, in
+$SYSTRACE_VIEWER_DIR or where catapult keeps it. Neither is in this tree, so
+the first capture downloads them into $SYSTRACE_VIEWER_DIR. Without them the
+page lists the traces with buttons to open them in the Perfetto UI or save
+them, so a capture always produces a usable file.
+"""
+
+import base64
+import html
+import io
+import json
+import os
+import shutil
+import sys
+import urllib.request
+import zlib
+
+# Directory that may hold the catapult viewer assets below.
+VIEWER_DIR_ENV = 'SYSTRACE_VIEWER_DIR'
+TRACE_VIEWER_HTML = 'systrace_trace_viewer.html'
+WEBCOMPONENTS_JS = 'webcomponents.min.js'
+# Where the assets are downloaded from. Gitiles serves ?format=TEXT as base64.
+VIEWER_ASSET_URLS = {
+    TRACE_VIEWER_HTML: (
+        'https://android.googlesource.com/platform/external/chromium-trace/'
+        '+/refs/heads/main/catapult/systrace/systrace/systrace_trace_viewer.html'
+        '?format=TEXT'),
+    WEBCOMPONENTS_JS: (
+        'https://chromium.googlesource.com/catapult/+/refs/heads/main/'
+        'third_party/polymer/components/webcomponentsjs/webcomponents.min.js'
+        '?format=TEXT'),
+}
+_DOWNLOAD_TIMEOUT_SECONDS = 30
+
+_SYSTRACE_DIR = os.path.abspath(os.path.dirname(__file__))
+_CATAPULT_ROOT = os.path.dirname(os.path.dirname(_SYSTRACE_DIR))
+_POLYMER_DIR = os.path.join(_CATAPULT_ROOT, 'third_party', 'polymer',
+                            'components', 'webcomponentsjs')
+# Raw trace bytes compressed per step.
+_CHUNK_SIZE = 1 << 20
+# base64 encodes 57 bytes per 76 character line.
+_BASE64_LINE_BYTES = 57
+
+_STANDALONE_HEAD = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<title>Android System Trace</title>
+<style>
+  body { font-family: sans-serif; margin: 16px; }
+  h2 { font-size: 16px; }
+  button { margin-right: 8px; }
+  pre { background: #f5f5f5; max-height: 320px; overflow: auto; padding: 8px; }
+</style>
+</head>
+<body>
+<p>The trace viewer is not bundled with this file; open a trace in the
+Perfetto UI or save it for another viewer.</p>
+<div id="trace_list"></div>
+'''
+
+_CATAPULT_BODY = '''<body>
+  <tr-ui-timeline-view>
+    <track-view-container id='track_view_container'></track-view-container>
+  </tr-ui-timeline-view>
+'''
+
+
+# Set once a download failed, so later captures in this process don't wait
+# on the network again.
+_download_failed = False
+
+
+def find_viewer_assets(download=True):
+  """Returns the paths of (trace viewer html, polyfill js), or None.
+
+  With download, missing assets are fetched into $SYSTRACE_VIEWER_DIR.
+  """
+  viewer_dir = os.environ.get(VIEWER_DIR_ENV)
+  dirs = [viewer_dir, _SYSTRACE_DIR]
+  viewer = _find_file(TRACE_VIEWER_HTML, dirs)
+  polyfill = _find_file(WEBCOMPONENTS_JS, dirs + [_POLYMER_DIR])
+  if viewer and polyfill:
+    return viewer, polyfill
+  if download and viewer_dir and download_viewer_assets(viewer_dir):
+    return find_viewer_assets(download=False)
+  return None
+
+
+def download_viewer_assets(viewer_dir):
+  """Downloads the viewer assets missing from viewer_dir; True on success."""
+  global _download_failed
+  if _download_failed:
+    return False
+  try:
+    os.makedirs(viewer_dir, exist_ok=True)
+    for name, url in sorted(VIEWER_ASSET_URLS.items()):
+      path = os.path.join(viewer_dir, name)
+      if os.path.isfile(path):
+        continue
+      with urllib.request.urlopen(url,
+                                  timeout=_DOWNLOAD_TIMEOUT_SECONDS) as response:
+        data = base64.b64decode(response.read(), validate=False)
+      # Written under a temporary name so a partial file is never used
+      tmp_path = path + '.part'
+      with open(tmp_path, 'wb') as f:
+        f.write(data)
+      os.replace(tmp_path, path)
+  except (OSError, ValueError) as e:
+    _download_failed = True
+    sys.stderr.write('Could not download the trace viewer: %s\n' % e)
+    return False
+  return True
+
+
+def _find_file(name, dirs):
+  for d in dirs:
+    if d and os.path.isfile(os.path.join(d, name)):
+      return os.path.join(d, name)
+  return None
+
+
+def write_trace_html(trace_results, output_file_name, viewer_assets=None):
+  """Writes trace_results to output_file_name; returns its absolute path.
+
+  Args:
+      trace_results: A list of TraceResults.
+      output_file_name: The name of the HTML file to write.
+      viewer_assets: (trace viewer html, polyfill js) paths; defaults to
+          find_viewer_assets().
+  """
+  if viewer_assets is None:
+    viewer_assets = find_viewer_assets()
+  with open(output_file_name, 'wb') as f:
+    if viewer_assets:
+      _write_catapult_head(f, *viewer_assets)
+      f.write(_CATAPULT_BODY.encode('utf-8'))
+    else:
+      f.write(_STANDALONE_HEAD.encode('utf-8'))
+    f.write(b'<!-- BEGIN TRACE -->\n')
+    for result in trace_results:
+      f.write(b'<script class="trace-data" type="application/text" '
+              b'data-encoding="gzip-base64" data-source="%s">\n'
+              % html.escape(result.source_name).encode('utf-8'))
+      _write_encoded(f, result.raw_data)
+      f.write(b'</script>\n')
+    f.write(b'<!-- END TRACE -->\n<script>\n')
+    with open(os.path.join(_SYSTRACE_DIR, 'trace_viewer.js'), 'rb') as js:
+      shutil.copyfileobj(js, f)
+    f.write(b'</script>\n</body>\n</html>\n')
+  return os.path.abspath(output_file_name)
+
+
+def _write_catapult_head(f, viewer_html, polyfill_js):
+  """Writes the head of prefix.html.template, streaming the assets into it."""
+  with io.open(os.path.join(_SYSTRACE_DIR, 'prefix.html.template'),
+               encoding='utf-8') as template_file:
+    template = template_file.read()
+  head = template[:template.index('</head>') + len('</head>\n')]
+  before_polyfill, rest = head.split('{{WEBCOMPONENTS_V0_POLYFILL_JS}}')
+  before_viewer, after_viewer = rest.split('{{SYSTRACE_TRACE_VIEWER_HTML}}')
+  f.write(before_polyfill.encode('utf-8'))
+  with open(polyfill_js, 'rb') as asset:
+    shutil.copyfileobj(asset, f)
+  f.write(before_viewer.encode('utf-8'))
+  with open(viewer_html, 'rb') as asset:
+    shutil.copyfileobj(asset, f)
+  f.write(after_viewer.encode('utf-8'))
+
+
+def _write_encoded(f, raw_data):
+  """Writes raw_data gzip compressed and base64 encoded, a piece at a time."""
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+  pending = b''
+  for piece in _iter_raw_data(raw_data):
+    pending += compressor.compress(piece)
+    # Encode whole base64 lines; the rest waits for more output
+    cut = len(pending) - len(pending) % _BASE64_LINE_BYTES
+    if cut:
+      f.write(base64.encodebytes(pending[:cut]))
+      pending = pending[cut:]
+  f.write(base64.encodebytes(pending + compressor.flush()))
+
+
+def _iter_raw_data(raw_data):
+  """Yields raw_data as utf-8 pieces of at most about _CHUNK_SIZE bytes."""
+  if isinstance(raw_data, (dict, list)):
+    pieces = []
+    size = 0
+    for piece in json.JSONEncoder().iterencode(raw_data):
+      pieces.append(piece)
+      size += len(piece)
+      if size >= _CHUNK_SIZE:
+        yield ''.join(pieces).encode('utf-8')
+        pieces = []
+        size = 0
+    yield ''.join(pieces).encode('utf-8')
+  elif isinstance(raw_data, str):
+    for start in range(0, len(raw_data), _CHUNK_SIZE):
+      yield raw_data[start:start + _CHUNK_SIZE].encode('utf-8')
+  elif isinstance(raw_data, (bytes, bytearray, memoryview)):
+    view = memoryview(raw_data)
+    for start in range(0, len(view), _CHUNK_SIZE):
+      yield view[start:start + _CHUNK_SIZE]
+  else:
+    raise ValueError('Invalid trace result format for HTML output')
@@ -0,0 +1,117 @@
+// Loads the trace-data blocks written by trace_html_writer.py. Each block is
+// gzip compressed and base64 encoded. With the catapult trace viewer on the
+// page the traces are imported into its timeline view; otherwise they are
+// listed with buttons to open them in the Perfetto UI or save them.
+
+'use strict';
+
+const PERFETTO_UI_URL = 'https://ui.perfetto.dev';
+// Lines of each trace shown when there's no trace viewer
+const PREVIEW_LINES = 200;
+
+async function readTraceDataBlock(script) {
+  let text = script.textContent;
+  if (script.dataset.encoding != 'gzip-base64') {
+    return new TextEncoder().encode(text.substring(1)).buffer;
+  }
+  // atob skips the line breaks between base64 lines
+  let binary = atob(text);
+  let bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; ++i) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  let stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  return await new Response(stream).arrayBuffer();
+}
+
+async function loadTraces() {
+  let traces = [];
+  for (let script of document.querySelectorAll('script.trace-data')) {
+    traces.push({source: script.dataset.source, buffer: await readTraceDataBlock(script)});
+    script.remove();
+  }
+  return traces;
+}
+
+function showInTimelineView(traces) {
+  let timelineViewEl = document.querySelector('tr-ui-timeline-view');
+  timelineViewEl.globalMode = true;
+  let decoder = new TextDecoder();
+  let m = new tr.Model();
+  let i = new tr.importer.Import(m);
+  let p = i.importTracesWithProgressDialog(traces.map((t) => decoder.decode(t.buffer)));
+  p.then(
+    function() {
+      timelineViewEl.model = m;
+      timelineViewEl.updateDocumentFavicon();
+      timelineViewEl.globalMode = true;
+      timelineViewEl.viewTitle = 'Android System Trace';
+    },
+    function(err) {
+      let overlay = new tr.ui.b.Overlay();
+      overlay.textContent = tr.b.normalizeException(err).message;
+      overlay.title = 'Import error';
+      overlay.visible = true;
+    });
+}
+
+function openInPerfetto(trace) {
+  let ui = window.open(PERFETTO_UI_URL);
+  if (!ui) {
+    alert('Allow pop-ups to open the trace in the Perfetto UI.');
+    return;
+  }
+  // The UI only listens once it has loaded; it answers PING with PONG
+  let timer = setInterval(() => ui.postMessage('PING', PERFETTO_UI_URL), 100);
+  window.addEventListener('message', function onMessage(event) {
+    if (event.source != ui || event.data != 'PONG') {
+      return;
+    }
+    clearInterval(timer);
+    window.removeEventListener('message', onMessage);
+    ui.postMessage({perfetto: {
+      buffer: trace.buffer,
+      title: document.title + ' - ' + trace.source,
+      fileName: trace.source + '.txt',
+    }}, PERFETTO_UI_URL);
+  });
+}
+
+function saveTrace(trace) {
+  let link = document.createElement('a');
+  link.href = URL.createObjectURL(new Blob([trace.buffer]));
+  link.download = trace.source + '.txt';
+  link.click();
+  URL.revokeObjectURL(link.href);
+}
+
+function showTraceList(traces) {
+  let list = document.getElementById('trace_list');
+  let decoder = new TextDecoder();
+  for (let trace of traces) {
+    let section = document.createElement('section');
+    let title = document.createElement('h2');
+    title.textContent = trace.source + ' (' + (trace.buffer.byteLength / 1e6).toFixed(1) + ' MB)';
+    let open = document.createElement('button');
+    open.textContent = 'Open in Perfetto UI';
+    open.onclick = () => openInPerfetto(trace);
+    let save = document.createElement('button');
+    save.textContent = 'Save';
+    save.onclick = () => saveTrace(trace);
+    let preview = document.createElement('pre');
+    // Decode only the start of the trace for the preview
+    let head = decoder.decode(trace.buffer.slice(0, 1 << 16));
+    preview.textContent = head.split('\n').slice(0, PREVIEW_LINES).join('\n');
+    section.append(title, open, save, preview);
+    list.append(section);
+  }
+}
+
+window.addEventListener('load', async function() {
+  let traces = await loadTraces();
+  if (window.tr && document.querySelector('tr-ui-timeline-view')) {
+    showInTimelineView(traces);
+  } else {
+    showTraceList(traces);
+  }
+});
@@ -16,12 +16,15 @@ import six
 
 import py_utils
 
+from devil.android import device_errors
 from devil.android import device_utils
 from devil.android.sdk import version_codes
+from devil.utils import cmd_helper
 from py_trace_event import trace_time as trace_time_module
 from systrace import trace_result
 from systrace import tracing_agents
 from systrace import util
+from systrace.tracing_agents import atrace_stream
 
 # Text that ADB sends, but does not need to be displayed to the user.
 ADB_IGNORE_REGEXP = br'^capturing trace\.\.\. done|^capturing trace\.\.\.'
@@ -29,6 +32,8 @@ ADB_IGNORE_REGEXP = br'^capturing trace\.\.\. done|^capturing trace\.\.\.'
 ADB_STDOUT_READ_TIMEOUT = 0.2
 # The number of seconds to wait for large output from ADB.
 ADB_LARGE_OUTPUT_TIMEOUT = 600
+# Most bytes of atrace output read from ADB at a time.
+ADB_READ_SIZE = 1 << 20
 # The adb shell command to initiate a trace.
 ATRACE_BASE_ARGS = ['atrace']
 # If a custom list of categories is not specified, traces will include
@@ -207,10 +212,26 @@ class AtraceAgent(tracing_agents.TracingAgent):
   def _collect_and_preprocess(self):
     """Collects and preprocesses trace data.
 
-    Stores results in self._trace_data.
+    The output of atrace is processed while ADB streams it, so only the
+    processed trace is ever held in memory. Stores results in self._trace_data.
     """
-    trace_data = self._collect_trace_data()
-    self._trace_data = self._preprocess_trace_data(trace_data)
+    pid2_tgid = None
+    if _FIX_MISSING_TGIDS:
+      # Gathered before stopping, as the trace is patched while it arrives
+      procfs_dump = self._device_utils.RunShellCommand(
+          'echo -n /proc/[0-9]*/task/[0-9]*',
+          shell=True, check_return=True)[0].split(' ')
+      pid2_tgid = extract_tgids(procfs_dump)
+    processor = atrace_stream.AtraceStreamProcessor(
+        pid2_tgid, fix_circular=_FIX_CIRCULAR_TRACES)
+    self._stop_collect_trace(processor.feed)
+    trace_data = processor.finish()
+
+    if not trace_data:
+      logging.error('No data was captured.  Output file was not written.')
+      sys.exit(1)
+
+    self._trace_data = trace_data
 
   @py_utils.Timeout(tracing_agents.START_STOP_TIMEOUT)
   def StopAgentTracing(self, timeout=None):
@@ -248,90 +269,44 @@ class AtraceAgent(tracing_agents.TracingAgent):
       shell.RunCommand(cmd, close=True)
       did_record_sync_marker_callback(t1, sync_id)
 
-  def _stop_collect_trace(self):
-    """Stops atrace.
+  def _stop_collect_trace(self, on_output):
+    """Stops atrace, passing the dumped trace to on_output chunk by chunk.
 
     Note that prior to Api 23, --async-stop isn't working correctly. It
     doesn't stop tracing and clears trace buffer before dumping it rendering
     results unusable."""
-    compress_trace_data = '-z' in self._tracer_args
     if self._device_sdk_version < version_codes.MARSHMALLOW:
       is_trace_enabled_file = '%s/tracing_on' % self._tracing_path
       # Stop tracing first so new data won't arrive while dump is performed (it
       # may take a non-trivial time and tracing buffer may overflow).
       self._device_utils.WriteFile(is_trace_enabled_file, '0')
-      # For compressed trace data, we don't want encoding when adb shell reads
-      # the temp output file. (crbug/1271668)
-      if compress_trace_data:
-        result = self._device_utils.RunShellCommand(
-            self._tracer_args + ['--async_dump'], raw_output=True,
-            large_output=True, check_return=True,
-            timeout=ADB_LARGE_OUTPUT_TIMEOUT,
-            encoding=None)
-      else:
-        result = self._device_utils.RunShellCommand(
-            self._tracer_args + ['--async_dump'], raw_output=True,
-            large_output=True, check_return=True,
-            timeout=ADB_LARGE_OUTPUT_TIMEOUT)
+      self._stream_shell_output(self._tracer_args + ['--async_dump'], on_output)
       # Run synchronous tracing for 0 seconds to stop tracing, clear buffers
       # and other state.
       self._device_utils.RunShellCommand(
           self._tracer_args + ['-t 0'], check_return=True)
     else:
       # On M+ --async_stop does everything necessary
-      if compress_trace_data:
-        result = self._device_utils.RunShellCommand(
-            self._tracer_args + ['--async_stop'], raw_output=True,
-            large_output=True, check_return=True,
-            timeout=ADB_LARGE_OUTPUT_TIMEOUT,
-            encoding=None)
-      else:
-        result = self._device_utils.RunShellCommand(
-            self._tracer_args + ['--async_stop'], raw_output=True,
-            large_output=True, check_return=True,
-            timeout=ADB_LARGE_OUTPUT_TIMEOUT)
-
-    return six.ensure_binary(result)
-
-  def _collect_trace_data(self):
-    """Reads the output from atrace and stops the trace."""
-    result = self._stop_collect_trace()
-
-    data_start = re.search(TRACE_START_REGEXP, result)
-    if data_start:
-      data_start = data_start.end(0)
-    else:
-      raise IOError('Unable to get atrace data. Did you forget adb root?')
-    output = re.sub(ADB_IGNORE_REGEXP, b'', result[data_start:])
-    return output
-
-  def _preprocess_trace_data(self, trace_data):
-    """Performs various processing on atrace data.
-
-    Args:
-      trace_data: The raw trace data.
-    Returns:
-      The processed trace data.
-    """
-    if trace_data:
-      trace_data = strip_and_decompress_trace(trace_data)
-
-    if not trace_data:
-      logging.error('No data was captured.  Output file was not written.')
-      sys.exit(1)
-
-    if _FIX_MISSING_TGIDS:
-      # Gather proc data from device and patch tgids
-      procfs_dump = self._device_utils.RunShellCommand(
-          'echo -n /proc/[0-9]*/task/[0-9]*',
-          shell=True, check_return=True)[0].split(' ')
-      pid2_tgid = extract_tgids(procfs_dump)
-      trace_data = fix_missing_tgids(trace_data, pid2_tgid)
-
-    if _FIX_CIRCULAR_TRACES:
-      trace_data = fix_circular_traces(trace_data)
-
-    return trace_data
+      self._stream_shell_output(self._tracer_args + ['--async_stop'], on_output)
+
+  def _stream_shell_output(self, args, on_output):
+    """Runs args in adb shell, passing its raw output to on_output as it comes.
+
+    The output is never decoded, so compressed trace data (-z) arrives intact
+    (crbug/1271668). adb is started directly rather than with
+    AdbWrapper.StartShell, whose pipes are in text mode."""
+    cmd = ' '.join(cmd_helper.SingleQuote(arg) for arg in args)
+    adb_cmd = [self._device_utils.adb.GetAdbPath(), '-s',
+               self._device_serial_number, 'shell', cmd]
+    returncode, stderr = atrace_stream.stream_command_output(
+        adb_cmd, on_output, ADB_LARGE_OUTPUT_TIMEOUT, ADB_READ_SIZE)
+    if returncode is None:
+      raise device_errors.CommandTimeoutError(
+          'adb shell %s timed out after %d s' % (cmd, ADB_LARGE_OUTPUT_TIMEOUT))
+    if returncode:
+      raise device_errors.AdbShellCommandFailedError(
+          cmd, stderr.decode('utf-8', 'replace'), returncode,
+          self._device_serial_number)
 
 def extract_tgids(trace_lines):
   """Removes the procfs dump from the given trace text
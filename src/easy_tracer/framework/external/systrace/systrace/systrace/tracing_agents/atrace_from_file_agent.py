@@ -2,77 +2,57 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-from __future__ import print_function
 import os
-import re
-import stat
-import subprocess
-import sys
-from six.moves.urllib.request import urlopen  # pylint: disable=import-error
-from six.moves.urllib.error import URLError   # pylint: disable=import-error
 
 import py_utils
 
+from systrace import perfetto_to_systrace
 from systrace import trace_result
 from systrace import tracing_agents
 from systrace.tracing_agents import atrace_agent
+from systrace.tracing_agents import atrace_stream
 
-
-# ADB sends this text to indicate the beginning of the trace data.
-TRACE_START_REGEXP = br'TRACE\:'
-# Text that ADB sends, but does not need to be displayed to the user.
-ADB_IGNORE_REGEXP = br'^capturing trace\.\.\. done|^capturing trace\.\.\.'
-
-T2T_OUTPUT = 'trace.systrace'
+# Converted Perfetto traces are fed to the stream processor in batches of
+# this many lines.
+PERFETTO_LINES_PER_CHUNK = 4096
 
 def try_create_agent(options):
   if options.from_file is not None:
-    with open(options.from_file, 'rb') as f_in:
-      if is_perfetto(f_in):
-        if convert_perfetto_trace(options.from_file):
-          options.from_file = T2T_OUTPUT
-        else:
-          print ('Perfetto trace file: ' + options.from_file +
-                 ' could not be converted.')
-          sys.exit(1)
     return AtraceFromFileAgent(options)
   return False
 
-def convert_perfetto_trace(in_file):
-  traceconv_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
-                                          '../traceconv'))
-  try:
-    traceconv = urlopen('https://get.perfetto.dev/traceconv')
-    with open(traceconv_path, 'w') as out:
-      out.write(traceconv.read())
-  except URLError:
-    print('Could not download traceconv to convert the Perfetto trace.')
-    sys.exit(1)
-  os.chmod(traceconv_path, stat.S_IXUSR | stat.S_IRUSR | stat.S_IWUSR)
-  return subprocess.call([traceconv_path, 'systrace', in_file, T2T_OUTPUT]) == 0
-
 def is_perfetto(from_file):
-  # Starts with a preamble for field ID=1 (TracePacket)
-  if ord(from_file.read(1)) != 0x0a:
-    return False
-  for _ in range(10): # Check the first 10 packets are structured correctly
-    # Then a var int that specifies field size
-    field_size = 0
-    shift = 0
-    while True:
-      c = ord(from_file.read(1))
-      field_size |= (c & 0x7f) << shift
-      shift += 7
-      if not c & 0x80:
-        break
-    # The packet itself
-    from_file.seek(field_size, os.SEEK_CUR)
-    # The preamble for the next field ID=1 (TracePacket)
-    if ord(from_file.read(1)) != 0x0a:
+  """Returns whether from_file holds a Perfetto trace; rewinds it after."""
+  try:
+    # Starts with a preamble for field ID=1 (TracePacket)
+    if from_file.read(1) != b'\x0a':
       return False
-  # Go back to the beginning of the file
-  from_file.seek(0)
-  return True
+    for _ in range(10): # Check the first 10 packets are structured correctly
+      # Then a var int that specifies field size
+      field_size = 0
+      shift = 0
+      while True:
+        c = ord(from_file.read(1))
+        field_size |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+          break
+      # The packet itself
+      from_file.seek(field_size, os.SEEK_CUR)
+      # The preamble for the next field ID=1 (TracePacket)
+      preamble = from_file.read(1)
+      if not preamble:
+        # A short trace with fewer packets
+        return True
+      if preamble != b'\x0a':
+        return False
+    return True
+  except TypeError:
+    # The file ended inside a field size
+    return False
+  finally:
+    # Go back to the beginning of the file
+    from_file.seek(0)
 
 class AtraceFromFileConfig(tracing_agents.TracingConfig):
   def __init__(self, from_file):
@@ -118,16 +98,22 @@ class AtraceFromFileAgent(tracing_agents.TracingAgent):
     return trace_result.TraceResult('trace-data', self._trace_data)
 
   def _read_trace_data(self):
-    with open(self._filename, 'rb') as f:
-      result = f.read()
-    data_start = re.search(TRACE_START_REGEXP, result).end(0)
-    data = re.sub(ADB_IGNORE_REGEXP, '', result[data_start:])
-    return self._preprocess_data(data)
-
-  # pylint: disable=no-self-use
-  def _preprocess_data(self, data):
     # TODO: add fix_threads and fix_tgids options back in here
     # once we embed the dump data in the file (b/27504068)
-    data = atrace_agent.strip_and_decompress_trace(data)
-    data = atrace_agent.fix_circular_traces(data)
-    return data
+    processor = atrace_stream.AtraceStreamProcessor()
+    with open(self._filename, 'rb') as f:
+      if is_perfetto(f):
+        # Converted locally instead of with traceconv, which had to be
+        # downloaded first
+        processor.feed(b'TRACE:\n')
+        lines = []
+        for line in perfetto_to_systrace.iter_systrace_lines(f):
+          lines.append(line)
+          if len(lines) == PERFETTO_LINES_PER_CHUNK:
+            processor.feed(''.join(lines).encode('utf-8'))
+            lines = []
+        processor.feed(''.join(lines).encode('utf-8'))
+      else:
+        for chunk in iter(lambda: f.read(atrace_agent.ADB_READ_SIZE), b''):
+          processor.feed(chunk)
+    return processor.finish()
@@ -0,0 +1,248 @@
+"""Single-pass preprocessing of atrace output.
+
+atrace_agent used to collect the whole adb output and then run
+strip_and_decompress_trace, fix_missing_tgids and fix_circular_traces over
+it, each making a full copy. AtraceStreamProcessor applies the same steps to
+the output chunk by chunk as adb produces it: finding the TRACE: marker,
+collapsing the CRLFs adb shell adds, decompressing with a zlib.decompressobj,
+dropping '\\r', patching missing TGIDs and trimming the prefix of circular
+traces. Only the processed trace is kept, in one bytearray.
+"""
+
+import re
+import subprocess
+import threading
+import zlib
+
+# ADB sends this text to indicate the beginning of the trace data.
+TRACE_START_REGEXP = br'TRACE\:'
+# Text that ADB sends, but does not need to be displayed to the user.
+ADB_IGNORE_REGEXP = br'^capturing trace\.\.\. done|^capturing trace\.\.\.'
+# Plain-text trace data should always start with this string.
+TRACE_TEXT_HEADER = b'# tracer'
+
+# Most decompressed output produced per zlib call, so a highly compressed
+# chunk can't expand all at once.
+_DECOMPRESS_STEP = 1 << 20
+# Enough raw output to tell the ignored adb text and line endings apart.
+_PREFIX_SIZE = 64
+
+_TGID_RE = re.compile(br'^\s*(\S+)-(\d+)\s+(\(\S+\))', re.MULTILINE)
+_BUFFER_START_RE = re.compile(br'^#+ CPU \d+ buffer started', re.MULTILINE)
+_HEADER_END_RE = re.compile(br'^[^#]', re.MULTILINE)
+
+
+class AtraceStreamProcessor(object):
+  """Turns raw atrace output into the processed trace in one pass.
+
+  Call feed() with each chunk of adb output, then finish() for the trace.
+  """
+
+  def __init__(self, pid2_tgid=None, fix_circular=True):
+    """
+    Args:
+      pid2_tgid: pid -> tgid (both bytes) to patch missing TGIDs with, as
+          returned by atrace_agent.extract_tgids; None leaves them alone.
+      fix_circular: Drop the prefix of the trace where not all CPUs have
+          events yet, see atrace_agent.fix_circular_traces.
+    """
+    self._pid2_tgid = pid2_tgid
+    self._fix_circular = fix_circular
+    # 'start' until TRACE:, 'prefix' until the line endings are known, 'head'
+    # until plain text and zlib data can be told apart, then 'body'.
+    self._state = 'start'
+    self._pending = b''
+    self._crlf = None
+    self._carry = b''
+    self._head = b''
+    self._decompressor = None
+    self._decoded_started = False
+    self._line = b''
+    self._header_len = None
+    self._out = bytearray()
+
+  def feed(self, chunk):
+    if self._state == 'start':
+      chunk = self._find_start(chunk)
+      if self._state == 'start':
+        return
+    if self._state == 'prefix':
+      self._pending += chunk
+      if len(self._pending) < _PREFIX_SIZE:
+        return
+      chunk = self._take_prefix()
+    chunk = self._normalize(chunk)
+    if self._state == 'head':
+      self._head += chunk
+      # One newline may come before the header
+      if len(self._head) <= len(TRACE_TEXT_HEADER):
+        return
+      chunk = self._take_head()
+    self._decode(chunk)
+
+  def finish(self):
+    """Flushes the remaining data; returns the processed trace as bytes."""
+    if self._state == 'start':
+      raise IOError('Unable to get atrace data. Did you forget adb root?')
+    chunk = self._take_prefix() if self._state == 'prefix' else b''
+    chunk = self._normalize(chunk, final=True)
+    if self._state == 'head':
+      self._head += chunk
+      chunk = self._take_head()
+    self._decode(chunk)
+    if self._decompressor is not None:
+      self._decoded(self._decompressor.flush())
+    if self._line:
+      self._add_lines(self._line)
+      self._line = b''
+    out = bytes(self._out)
+    self._out = bytearray()
+    return out
+
+  def _find_start(self, chunk):
+    data = self._pending + chunk
+    match = re.search(TRACE_START_REGEXP, data)
+    if not match:
+      # Keep enough to find a marker split across chunks
+      self._pending = data[-(len(TRACE_START_REGEXP) - 1):]
+      return b''
+    self._pending = b''
+    self._state = 'prefix'
+    return data[match.end(0):]
+
+  def _take_prefix(self):
+    data = re.sub(ADB_IGNORE_REGEXP, b'', self._pending)
+    self._pending = b''
+    # Collapse CRLFs that are added by adb shell.
+    if data.startswith(b'\r\n'):
+      self._crlf = b'\r\n'
+    elif data.startswith(b'\r\r\n'):
+      # On windows, adb adds an extra '\r' character for each line.
+      self._crlf = b'\r\r\n'
+    self._state = 'head'
+    return data
+
+  def _normalize(self, chunk, final=False):
+    if not self._crlf:
+      return chunk
+    data = self._carry + chunk
+    self._carry = b''
+    if not final:
+      # Hold back a partial line ending so it's collapsed with the next chunk
+      for n in range(len(self._crlf) - 1, 0, -1):
+        if data.endswith(self._crlf[:n]):
+          self._carry = data[-n:]
+          data = data[:-n]
+          break
+    return data.replace(self._crlf, b'\n')
+
+  def _take_head(self):
+    head = self._head
+    self._head = b''
+    # Skip the initial newline.
+    if head.startswith(b'\n'):
+      head = head[1:]
+    if not head.startswith(TRACE_TEXT_HEADER):
+      # No header found, so assume the data is compressed.
+      self._decompressor = zlib.decompressobj()
+    self._state = 'body'
+    return head
+
+  def _decode(self, data):
+    if self._decompressor is None:
+      self._decoded(data)
+      return
+    while data:
+      self._decoded(self._decompressor.decompress(data, _DECOMPRESS_STEP))
+      data = self._decompressor.unconsumed_tail
+
+  # Decoded text is processed in whole lines.
+  def _decoded(self, data):
+    # Enforce Unix line-endings.
+    data = data.replace(b'\r', b'')
+    if not self._decoded_started:
+      # Skip any initial newlines.
+      data = data.lstrip(b'\n')
+      if not data:
+        return
+      self._decoded_started = True
+    end = data.rfind(b'\n') + 1
+    if not end:
+      self._line += data
+      return
+    lines = self._line + data[:end]
+    self._line = data[end:]
+    self._add_lines(lines)
+
+  def _add_lines(self, lines):
+    if self._pid2_tgid is not None:
+      lines = _TGID_RE.sub(self._replace_tgid, lines)
+    start = 0
+    if self._header_len is None:
+      header_end = _HEADER_END_RE.search(lines)
+      if not header_end:
+        self._out += lines
+        return
+      start = header_end.start()
+      self._out += lines[:start]
+      # Need to keep the header intact to make the importer happy.
+      self._header_len = len(self._out)
+    if self._fix_circular:
+      # The kernel marks the first event kept on each CPU whose buffer
+      # overflowed; everything before the last marker is incomplete.
+      last = None
+      for last in _BUFFER_START_RE.finditer(lines, start):
+        pass
+      if last is not None:
+        del self._out[self._header_len:]
+        start = last.start()
+    self._out += memoryview(lines)[start:]
+
+  def _replace_tgid(self, m):
+    tid = m.group(2)
+    if (int(tid) > 0 and m.group(1) != b'<idle>' and m.group(3) == b'(-----)'
+        and tid in self._pid2_tgid):
+      # returns Proc_name-PID (TGID)
+      # Binder_2-381 (-----) becomes Binder_2-381 (128)
+      return m.group(1) + b'-' + m.group(2) + b' ( ' + self._pid2_tgid[tid] + b')'
+    return m.group(0)
+
+
+def stream_command_output(args, on_output, timeout, read_size=1 << 20):
+  """Runs args, passing its raw stdout to on_output chunk by chunk.
+
+  The pipe is binary and read with read1, so each chunk is whatever the
+  process has written so far and compressed output is never decoded. The
+  process is killed if it is still running after timeout seconds, even while
+  a read is blocked.
+
+  Returns:
+    (returncode, stderr); returncode is None if the timeout killed it.
+  """
+  process = subprocess.Popen(args, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+  expired = threading.Event()
+
+  def expire():
+    expired.set()
+    process.kill()
+
+  timer = threading.Timer(timeout, expire)
+  timer.daemon = True
+  timer.start()
+  try:
+    while True:
+      chunk = process.stdout.read1(read_size)
+      if not chunk:
+        break
+      on_output(chunk)
+    stderr = process.stderr.read()
+    process.wait()
+  finally:
+    timer.cancel()
+    if process.poll() is None:
+      process.kill()
+      process.wait()
+    process.stdout.close()
+    process.stderr.close()
+  return (None if expired.is_set() else process.returncode), stderr
@@ -1,12 +1,43 @@
-import subprocess
+import os
 import time
-from typing import List
-from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
+from typing import BinaryIO, Callable, List, Optional
+from easy_tracer.framework.adb_client import AdbClient, AdbError
+from easy_tracer.framework.cancellation import (
+    PHASE_PULLING,
+    PHASE_RECORDING,
+    PHASE_STARTING,
+    PHASE_STOPPING,
+    CancellationToken,
+    CaptureCancelled,
+    PhaseCallback,
+)
+from easy_tracer.framework.perfetto_config import TraceConfig, build_trace_config, to_binary
+
+DEFAULT_CATEGORIES = [
+    "sched",
+    "gfx",
+    "view",
+    "wm",
+    "am",
+    "hal",
+    "res",
+    "dalvik",
+    "freq",
+    "idle",
+    "binder_driver",
+    "binder_lock",
+]
+
+# traced may only write into this directory on recent Android releases
+LONG_TRACE_DIR = "/data/misc/perfetto-traces"
+# How long a signalled long-mode session gets to write out its trace and exit
+STOP_GRACE_SECONDS = 30
 
 
 class PerfettoAdapter:
-    def __init__(self, adb_path: str = "adb"):
+    def __init__(self, adb_path: str = "adb", adb_client: Optional[AdbClient] = None):
         self.adb_path = adb_path
+        self.adb = adb_client or AdbClient(adb_path, use_server=False)
 
     def record_trace(
         self,
@@ -15,94 +46,357 @@ class PerfettoAdapter:
         duration_seconds: int = 10,
         categories: List[str] = None,
         buffer_size_kb: int = 32768,
+        stream_output: bool = False,
+        on_progress: Optional[Callable[[int], None]] = None,
+        trace_config: Optional[TraceConfig] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
     ) -> str:
         """
         Records a Perfetto trace on the device and pulls it to the local machine.
+        With stream_output the trace is written to perfetto's stdout and streamed
+        straight into output_path instead of going through a file on the device.
+        on_progress receives the number of bytes received so far.
+        When trace_config is given it is piped to 'perfetto -c -' and replaces
+        duration, buffer and categories.
+        Cancelling cancel_token stops perfetto on the device, removes the device
+        and partial local files and raises CaptureCancelled.
         Returns the local path to the trace file.
         """
         if categories is None:
-            categories = [
-                "sched",
-                "gfx",
-                "view",
-                "wm",
-                "am",
-                "hal",
-                "res",
-                "dalvik",
-                "freq",
-                "idle",
-                "binder_driver",
-                "binder_lock",
-            ]
+            categories = list(DEFAULT_CATEGORIES)
+        config_data = to_binary(trace_config) if trace_config is not None else None
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_STARTING)
+
+        if stream_output:
+            if config_data is not None:
+                cmd = ["perfetto", "-c", "-", "-o", "-"]
+            else:
+                cmd = self._build_command("-", duration_seconds, buffer_size_kb, categories)
+            return self._record_streamed(
+                device_serial, cmd, output_path, on_progress, config_data, cancel_token, phase
+            )
 
         device_output_path = f"/data/local/tmp/trace_{int(time.time())}.perfetto-trace"
 
-        # Build config commands
-        # We'll use the simple command line arguments for perfetto instead of passing a full config file for now
-        # to keep it simple and robust.
+        # Without a full config, fall back to perfetto's simple command line arguments
+        if config_data is not None:
+            cmd = ["perfetto", "-c", "-", "-o", device_output_path]
+        else:
+            cmd = self._build_command(device_output_path, duration_seconds, buffer_size_kb, categories)
+
+        unregister = self._stop_on_cancel(device_serial, cancel_token, device_output_path)
+        try:
+            # 1. Start Capture
+            phase(PHASE_RECORDING)
+            self.adb.shell(
+                device_serial,
+                self._tracer_command(cmd, cancel_token, device_output_path),
+                stdin_data=config_data,
+            )
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            # 2. Pull the file, gzipped on the device when the link is slow
+            phase(PHASE_PULLING)
+            self.adb.pull(
+                device_serial,
+                device_output_path,
+                output_path,
+                compress=None,
+                on_progress=(lambda received, _total: on_progress(received)) if on_progress else None,
+                cancel_token=cancel_token,
+            )
+            return output_path
+
+        except AdbError as e:
+            raise RuntimeError(f"Perfetto capture failed: {e}") from e
+        finally:
+            unregister()
+            # 3. Cleanup on device
+            self.adb.shell(device_serial, ["rm", "-f", device_output_path], check=False)
+            if cancel_token is not None:
+                self.adb.shell(device_serial, ["rm", "-f", self._pid_file(device_output_path)], check=False)
+
+    @staticmethod
+    def _pid_file(device_output_path: str) -> str:
+        return device_output_path + ".pid"
+
+    def _tracer_command(
+        self, cmd: List[str], cancel_token: Optional[CancellationToken], device_output_path: str
+    ) -> List[str]:
+        """
+        With a cancel token, wraps cmd so the shell records perfetto's pid (exec
+        keeps the pid) in a file next to the trace, for _stop_on_cancel().
+        """
+        if cancel_token is None:
+            return cmd
+        script = f"echo $$ > {self._pid_file(device_output_path)}; exec {' '.join(cmd)}"
+        return ["sh", "-c", f"'{script}'"]
+
+    def _stop_on_cancel(
+        self, device_serial: str, cancel_token: Optional[CancellationToken], device_output_path: str
+    ) -> Callable[[], None]:
+        """Sends SIGTERM to the perfetto started by _tracer_command() when cancel_token is cancelled."""
+        if cancel_token is None:
+            return lambda: None
+        pid_file = self._pid_file(device_output_path)
+        return cancel_token.on_cancel(
+            lambda: self.adb.shell(device_serial, f"kill -TERM $(cat {pid_file}) 2>/dev/null", check=False)
+        )
 
+    @staticmethod
+    def _build_command(
+        output: str, duration_seconds: int, buffer_size_kb: int, categories: List[str]
+    ) -> List[str]:
         cmd = [
-            self.adb_path,
-            "-s",
-            device_serial,
-            "shell",
             "perfetto",
             "-o",
-            device_output_path,
+            output,
             "-t",
             f"{duration_seconds}s",
             "-b",
             f"{buffer_size_kb}kb",
         ]
-
         # Append categories
         cmd.extend(categories)
+        return cmd
+
+    def _record_streamed(
+        self,
+        device_serial: str,
+        cmd: List[str],
+        output_path: str,
+        on_progress: Optional[Callable[[int], None]],
+        config_data: Optional[bytes] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
+    ) -> str:
+        """Runs perfetto with '-o -' and copies its stdout into output_path chunk by chunk."""
+        tmp_path = output_path + ".part"
+        phase = on_phase or (lambda _: None)
+        # Names the pid file; nothing is written there in streaming mode
+        device_output_path = f"/data/local/tmp/trace_{int(time.time())}.stream"
+        pulling = []
+
+        def progress(received: int) -> None:
+            # perfetto only writes to stdout once tracing has stopped
+            if not pulling:
+                pulling.append(True)
+                phase(PHASE_PULLING)
+            if on_progress:
+                on_progress(received)
 
+        unregister = self._stop_on_cancel(device_serial, cancel_token, device_output_path)
         try:
-            # 1. Start Capture
-            subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
+            phase(PHASE_RECORDING)
+            with open(tmp_path, "wb") as f:
+                self.adb.shell_stream(
+                    device_serial,
+                    self._tracer_command(cmd, cancel_token, device_output_path),
+                    f,
+                    on_progress=progress,
+                    stdin_data=config_data,
+                    compress=self.adb.should_compress(device_serial),
+                    cancel_token=cancel_token,
+                )
+            os.replace(tmp_path, output_path)
+            return output_path
+        except AdbError as e:
+            raise RuntimeError(f"Perfetto capture failed: {e}") from e
+        finally:
+            unregister()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if cancel_token is not None:
+                self.adb.shell(device_serial, ["rm", "-f", self._pid_file(device_output_path)], check=False)
+
+    def record_long_trace(
+        self,
+        device_serial: str,
+        output_path: str,
+        duration_seconds: int = 600,
+        categories: List[str] = None,
+        buffer_size_kb: int = 32768,
+        file_write_period_ms: int = 2500,
+        flush_period_ms: int = 30000,
+        on_progress: Optional[Callable[[int], None]] = None,
+        poll_interval: Optional[float] = None,
+        trace_config: Optional[TraceConfig] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
+        stop_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Records a long trace: perfetto runs in the background with write_into_file
+        and the host keeps copying whatever has been appended to the device file
+        into output_path while recording. If the device disconnects, the data
+        received so far stays in output_path.
+        trace_config, if given, must have write_into_file set; its periods then
+        take precedence over the arguments. A trace_config without duration_ms
+        records until perfetto stops on its own or stop_token is cancelled.
+        Cancelling stop_token ends the session early and keeps the trace; a
+        session that doesn't exit STOP_GRACE_SECONDS after SIGTERM is killed.
+        Cancelling cancel_token kills the background session and removes both
+        the device file and output_path, then raises CaptureCancelled.
+        Returns the local path to the trace file.
+        """
+        if categories is None:
+            categories = list(DEFAULT_CATEGORIES)
+        if trace_config is None:
+            trace_config = build_trace_config(
+                duration_seconds,
+                buffer_size_kb,
+                categories,
+                write_into_file=True,
+                file_write_period_ms=file_write_period_ms,
+                flush_period_ms=flush_period_ms,
             )
-            # 2. Pull the file
-            pull_cmd = [
-                self.adb_path,
-                "-s",
-                device_serial,
-                "pull",
-                device_output_path,
-                output_path,
-            ]
-            subprocess.run(
-                pull_cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
+        else:
+            duration_seconds = trace_config.duration_ms // 1000 if trace_config.duration_ms else None
+            file_write_period_ms = trace_config.file_write_period_ms or file_write_period_ms
+            flush_period_ms = trace_config.flush_period_ms or flush_period_ms
+        if poll_interval is None:
+            poll_interval = max(file_write_period_ms / 1000.0, 0.5)
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_STARTING)
+
+        device_output_path = f"{LONG_TRACE_DIR}/easytracer_{int(time.time())}.perfetto-trace"
+        cmd = ["perfetto", "--background", "-c", "-", "-o", device_output_path]
+
+        try:
+            started = self.adb.shell(device_serial, cmd, stdin_data=to_binary(trace_config))
+        except AdbError as e:
+            raise RuntimeError(f"Perfetto capture failed: {e}") from e
+        # --background prints the pid of the detached tracing session
+        pid_text = started.stdout.strip().splitlines()[-1:] or [""]
+        if not pid_text[0].isdigit():
+            # Without the pid the session can't be watched or stopped
+            raise RuntimeError(
+                f"Perfetto capture failed: no session pid in perfetto's output: {started.stdout!r}"
             )
-            # 3. Cleanup on device
-            cleanup_cmd = [
-                self.adb_path,
-                "-s",
+        pid = int(pid_text[0])
+        phase(PHASE_RECORDING)
+
+        # Give perfetto time for the final flush before deciding it is stuck
+        deadline = None
+        if duration_seconds is not None:
+            deadline = time.monotonic() + duration_seconds + flush_period_ms / 1000.0 + STOP_GRACE_SECONDS
+        try:
+            self._drain_until_stopped(
                 device_serial,
-                "shell",
-                "rm",
                 device_output_path,
-            ]
-            subprocess.run(
-                cleanup_cmd,
-                capture_output=True,
-                check=False,
-                **subprocess_hidden_window_kwargs(),
+                output_path,
+                pid,
+                deadline,
+                poll_interval,
+                on_progress,
+                cancel_token,
+                stop_token,
+                phase,
             )
-
-            return output_path
-
-        except subprocess.CalledProcessError as e:
+        except CaptureCancelled:
+            self.adb.shell(device_serial, ["kill", str(pid)], check=False)
+            self.adb.shell(device_serial, ["rm", "-f", device_output_path], check=False)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        except AdbError as e:
+            received = os.path.getsize(output_path) if os.path.exists(output_path) else 0
             raise RuntimeError(
-                f"Perfetto capture failed: {e.stderr if e.stderr else e.stdout}"
+                f"Perfetto capture interrupted: {e}. "
+                f"Partial trace ({received} bytes) kept at {output_path}; "
+                f"the device copy is {device_output_path}"
             ) from e
+
+        self.adb.shell(device_serial, ["rm", "-f", device_output_path], check=False)
+        return output_path
+
+    def _drain_until_stopped(
+        self,
+        device_serial: str,
+        device_output_path: str,
+        output_path: str,
+        pid: int,
+        deadline: Optional[float],
+        poll_interval: float,
+        on_progress: Optional[Callable[[int], None]],
+        cancel_token: Optional[CancellationToken],
+        stop_token: Optional[CancellationToken],
+        phase: PhaseCallback,
+    ) -> int:
+        """
+        Copies the growing device file into output_path until perfetto exits; returns
+        the bytes received. Past deadline, or once stop_token is cancelled, perfetto
+        gets SIGTERM, then SIGKILL if it is still running after STOP_GRACE_SECONDS.
+        """
+        compress = self.adb.should_compress(device_serial)
+        # When the last signal was sent, and which one
+        signalled_at = None
+        killed = False
+        with open(output_path, "wb") as f:
+            while True:
+                if cancel_token is None:
+                    time.sleep(poll_interval)
+                elif cancel_token.wait(poll_interval):
+                    cancel_token.raise_if_cancelled()
+                running = self._drain(
+                    device_serial, device_output_path, f, pid, on_progress, compress, cancel_token
+                )
+                if not running:
+                    break
+                now = time.monotonic()
+                if signalled_at is None:
+                    stop_requested = stop_token is not None and stop_token.is_cancelled
+                    if stop_requested or (deadline is not None and now > deadline):
+                        # SIGTERM makes perfetto stop and write out what it has
+                        phase(PHASE_STOPPING)
+                        self.adb.shell(device_serial, ["kill", str(pid)], check=False)
+                        signalled_at = now
+                elif now > signalled_at + STOP_GRACE_SECONDS:
+                    if killed:
+                        # Not even SIGKILL ended it; keep what was received
+                        break
+                    self.adb.shell(device_serial, ["kill", "-KILL", str(pid)], check=False)
+                    signalled_at = now
+                    killed = True
+            # Pick up whatever was written between the last poll and exit
+            phase(PHASE_STOPPING)
+            self._drain(device_serial, device_output_path, f, None, on_progress, compress, cancel_token)
+            return f.tell()
+
+    def _drain(
+        self,
+        device_serial: str,
+        device_path: str,
+        sink: BinaryIO,
+        pid: Optional[int],
+        on_progress: Optional[Callable[[int], None]],
+        compress: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> bool:
+        """
+        Appends the bytes added to device_path since the last drain to sink.
+        Returns True while the perfetto process pid is still running. Without a
+        pid, a failing read (e.g. the file was never created) raises AdbError.
+        """
+        offset = sink.tell()
+        cmd = f"tail -c +{offset + 1} {device_path}"
+        if pid is not None:
+            cmd += f"; kill -0 {pid} 2>/dev/null"
+
+        def progress(count: int) -> None:
+            if on_progress:
+                on_progress(offset + count)
+
+        result = self.adb.shell_stream(
+            device_serial,
+            cmd,
+            sink,
+            on_progress=progress,
+            check=pid is None,
+            compress=compress,
+            cancel_token=cancel_token,
+        )
+        sink.flush()
+        return pid is not None and result.exit_code == 0
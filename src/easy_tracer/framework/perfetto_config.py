@@ -0,0 +1,345 @@
+"""TraceConfig model for Perfetto and its serializers.
+
+Only the subset of perfetto's TraceConfig proto that EasyTracer sets is
+modelled. Every message lists its fields as (attribute, field number, kind),
+and the same table drives both the binary protobuf encoder (what is piped to
+``perfetto -c -``) and the text format writer (``perfetto -c - --txt``), so the
+two can't drift apart. Fields left as None or empty lists are not emitted.
+"""
+
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, List, Optional, Tuple, Union
+
+FILL_POLICIES = {"RING_BUFFER": 1, "DISCARD": 2}
+STAT_COUNTERS = {"STAT_CPU_TIMES": 1, "STAT_IRQ_COUNTS": 2, "STAT_SOFTIRQ_COUNTS": 3, "STAT_FORK_COUNT": 4}
+BATTERY_COUNTERS = {
+    "BATTERY_COUNTER_CHARGE": 1,
+    "BATTERY_COUNTER_CAPACITY_PERCENT": 2,
+    "BATTERY_COUNTER_CURRENT": 3,
+    "BATTERY_COUNTER_CURRENT_AVG": 4,
+}
+
+# Kinds: "uint", "bool", "string", "message" or an enum name -> value table
+_Kind = Union[str, Dict[str, int]]
+_Fields = List[Tuple[str, int, _Kind]]
+
+
+@dataclass
+class BufferConfig:
+    size_kb: int
+    fill_policy: str = "RING_BUFFER"
+
+    FIELDS: ClassVar[_Fields] = [("size_kb", 1, "uint"), ("fill_policy", 4, FILL_POLICIES)]
+
+
+@dataclass
+class CompactSchedConfig:
+    enabled: bool = True
+
+    FIELDS: ClassVar[_Fields] = [("enabled", 1, "bool")]
+
+
+@dataclass
+class FtraceConfig:
+    ftrace_events: List[str] = field(default_factory=list)
+    atrace_categories: List[str] = field(default_factory=list)
+    atrace_apps: List[str] = field(default_factory=list)
+    # Per-CPU kernel buffer and how often traced_probes empties it
+    buffer_size_kb: Optional[int] = None
+    drain_period_ms: Optional[int] = None
+    compact_sched: Optional[CompactSchedConfig] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("ftrace_events", 1, "string"),
+        ("atrace_categories", 2, "string"),
+        ("atrace_apps", 3, "string"),
+        ("buffer_size_kb", 10, "uint"),
+        ("drain_period_ms", 11, "uint"),
+        ("compact_sched", 12, "message"),
+    ]
+
+
+@dataclass
+class ProcessStatsConfig:
+    scan_all_processes_on_start: Optional[bool] = None
+    record_thread_names: Optional[bool] = None
+    proc_stats_poll_ms: Optional[int] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("scan_all_processes_on_start", 2, "bool"),
+        ("record_thread_names", 3, "bool"),
+        ("proc_stats_poll_ms", 4, "uint"),
+    ]
+
+
+@dataclass
+class SysStatsConfig:
+    meminfo_period_ms: Optional[int] = None
+    vmstat_period_ms: Optional[int] = None
+    stat_period_ms: Optional[int] = None
+    stat_counters: List[str] = field(default_factory=list)
+
+    FIELDS: ClassVar[_Fields] = [
+        ("meminfo_period_ms", 1, "uint"),
+        ("vmstat_period_ms", 3, "uint"),
+        ("stat_period_ms", 5, "uint"),
+        ("stat_counters", 6, STAT_COUNTERS),
+    ]
+
+
+@dataclass
+class AndroidPowerConfig:
+    battery_poll_ms: Optional[int] = None
+    battery_counters: List[str] = field(default_factory=list)
+    collect_power_rails: Optional[bool] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("battery_poll_ms", 1, "uint"),
+        ("battery_counters", 2, BATTERY_COUNTERS),
+        ("collect_power_rails", 3, "bool"),
+    ]
+
+
+@dataclass
+class HeapprofdConfig:
+    process_cmdline: List[str] = field(default_factory=list)
+    sampling_interval_bytes: Optional[int] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("sampling_interval_bytes", 1, "uint"),
+        ("process_cmdline", 2, "string"),
+    ]
+
+
+@dataclass
+class JavaHprofConfig:
+    process_cmdline: List[str] = field(default_factory=list)
+
+    FIELDS: ClassVar[_Fields] = [("process_cmdline", 1, "string")]
+
+
+@dataclass
+class DataSourceConfig:
+    name: str
+    target_buffer: Optional[int] = None
+    ftrace_config: Optional[FtraceConfig] = None
+    process_stats_config: Optional[ProcessStatsConfig] = None
+    sys_stats_config: Optional[SysStatsConfig] = None
+    heapprofd_config: Optional[HeapprofdConfig] = None
+    android_power_config: Optional[AndroidPowerConfig] = None
+    java_hprof_config: Optional[JavaHprofConfig] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("name", 1, "string"),
+        ("target_buffer", 2, "uint"),
+        ("ftrace_config", 100, "message"),
+        ("process_stats_config", 103, "message"),
+        ("sys_stats_config", 104, "message"),
+        ("heapprofd_config", 105, "message"),
+        ("android_power_config", 106, "message"),
+        ("java_hprof_config", 110, "message"),
+    ]
+
+
+@dataclass
+class DataSource:
+    config: DataSourceConfig
+
+    FIELDS: ClassVar[_Fields] = [("config", 1, "message")]
+
+
+@dataclass
+class TraceConfig:
+    buffers: List[BufferConfig] = field(default_factory=list)
+    data_sources: List[DataSource] = field(default_factory=list)
+    duration_ms: Optional[int] = None
+    write_into_file: Optional[bool] = None
+    file_write_period_ms: Optional[int] = None
+    flush_period_ms: Optional[int] = None
+
+    FIELDS: ClassVar[_Fields] = [
+        ("buffers", 1, "message"),
+        ("data_sources", 2, "message"),
+        ("duration_ms", 3, "uint"),
+        ("write_into_file", 8, "bool"),
+        ("file_write_period_ms", 9, "uint"),
+        ("flush_period_ms", 13, "uint"),
+    ]
+
+    def add_data_source(self, config: DataSourceConfig) -> None:
+        self.data_sources.append(DataSource(config))
+
+    def data_source_names(self) -> List[str]:
+        return [source.config.name for source in self.data_sources]
+
+
+def _values(message: object, attr: str) -> list:
+    value = getattr(message, attr)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+# ----------------------------------------------------------------------
+# Binary protobuf
+# ----------------------------------------------------------------------
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _encode(message: object) -> bytes:
+    out = bytearray()
+    for attr, number, kind in message.FIELDS:
+        for value in _values(message, attr):
+            if kind == "message":
+                payload = _encode(value)
+                out += _varint(number << 3 | 2) + _varint(len(payload)) + payload
+            elif kind == "string":
+                payload = value.encode("utf-8")
+                out += _varint(number << 3 | 2) + _varint(len(payload)) + payload
+            elif kind == "bool":
+                out += _varint(number << 3) + _varint(int(bool(value)))
+            elif kind == "uint":
+                out += _varint(number << 3) + _varint(int(value))
+            else:
+                if value not in kind:
+                    raise ValueError(f"Unknown {attr} value: {value}")
+                out += _varint(number << 3) + _varint(kind[value])
+    return bytes(out)
+
+
+def to_binary(config: TraceConfig) -> bytes:
+    """Serializes the config as a binary TraceConfig protobuf."""
+    return _encode(config)
+
+
+# ----------------------------------------------------------------------
+# Text format
+# ----------------------------------------------------------------------
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _write_text(message: object, indent: str, lines: List[str]) -> None:
+    for attr, _number, kind in message.FIELDS:
+        for value in _values(message, attr):
+            if kind == "message":
+                lines.append(f"{indent}{attr} {{")
+                _write_text(value, indent + "  ", lines)
+                lines.append(f"{indent}}}")
+            elif kind == "string":
+                lines.append(f"{indent}{attr}: {_quote(value)}")
+            elif kind == "bool":
+                lines.append(f"{indent}{attr}: {'true' if value else 'false'}")
+            elif kind == "uint":
+                lines.append(f"{indent}{attr}: {int(value)}")
+            else:
+                if value not in kind:
+                    raise ValueError(f"Unknown {attr} value: {value}")
+                lines.append(f"{indent}{attr}: {value}")
+
+
+def to_pbtxt(config: TraceConfig) -> str:
+    """Serializes the config in protobuf text format (perfetto --txt)."""
+    lines: List[str] = []
+    _write_text(config, "", lines)
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# Builder
+# ----------------------------------------------------------------------
+
+DEFAULT_DATA_SOURCES = ["linux.ftrace", "linux.process_stats"]
+
+# Tuned for sched-heavy captures: compact_sched stores sched_switch/sched_waking
+# in a columnar form, and a larger per-CPU buffer lets traced_probes drain less
+# often without losing events.
+FTRACE_BUFFER_KB = 4096
+FTRACE_DRAIN_PERIOD_MS = 500
+POLL_PERIOD_MS = 1000
+
+
+def build_trace_config(
+    duration_seconds: int,
+    buffer_size_kb: int,
+    categories: List[str],
+    data_sources: Optional[List[str]] = None,
+    ftrace_events: Optional[List[str]] = None,
+    atrace_apps: Optional[List[str]] = None,
+    fill_policy: str = "RING_BUFFER",
+    write_into_file: bool = False,
+    file_write_period_ms: int = 2500,
+    flush_period_ms: int = 30000,
+) -> TraceConfig:
+    """
+    Builds a TraceConfig from the options shown in the Perfetto panel.
+    data_sources are data source names (linux.ftrace, android.power, ...); known
+    ones get tuned settings, the rest are enabled with their defaults.
+    heapprofd and java_hprof need target processes and are only added when
+    atrace_apps names specific apps.
+    """
+    if fill_policy not in FILL_POLICIES:
+        raise ValueError(f"Unknown fill policy: {fill_policy}")
+    config = TraceConfig(
+        buffers=[BufferConfig(buffer_size_kb, fill_policy)],
+        duration_ms=duration_seconds * 1000,
+    )
+    if write_into_file:
+        config.write_into_file = True
+        config.file_write_period_ms = file_write_period_ms
+        config.flush_period_ms = flush_period_ms
+
+    apps = [app for app in atrace_apps or [] if app and app != "*"]
+    for name in data_sources if data_sources is not None else DEFAULT_DATA_SOURCES:
+        source = DataSourceConfig(name)
+        if name == "linux.ftrace":
+            source.ftrace_config = FtraceConfig(
+                ftrace_events=list(ftrace_events or []),
+                atrace_categories=list(categories),
+                atrace_apps=apps or ["*"],
+                buffer_size_kb=FTRACE_BUFFER_KB,
+                drain_period_ms=FTRACE_DRAIN_PERIOD_MS,
+                compact_sched=CompactSchedConfig(enabled=True),
+            )
+        elif name == "linux.process_stats":
+            source.process_stats_config = ProcessStatsConfig(
+                scan_all_processes_on_start=True,
+                record_thread_names=True,
+                proc_stats_poll_ms=POLL_PERIOD_MS,
+            )
+        elif name == "linux.sys_stats":
+            source.sys_stats_config = SysStatsConfig(
+                meminfo_period_ms=POLL_PERIOD_MS,
+                vmstat_period_ms=POLL_PERIOD_MS,
+                stat_period_ms=POLL_PERIOD_MS,
+                stat_counters=["STAT_CPU_TIMES", "STAT_FORK_COUNT"],
+            )
+        elif name == "android.power":
+            source.android_power_config = AndroidPowerConfig(
+                battery_poll_ms=POLL_PERIOD_MS,
+                battery_counters=list(BATTERY_COUNTERS),
+                collect_power_rails=True,
+            )
+        elif name == "android.heapprofd":
+            if not apps:
+                continue
+            source.heapprofd_config = HeapprofdConfig(process_cmdline=apps, sampling_interval_bytes=4096)
+        elif name == "android.java_hprof":
+            if not apps:
+                continue
+            source.java_hprof_config = JavaHprofConfig(process_cmdline=apps)
+        config.add_data_source(source)
+    return config
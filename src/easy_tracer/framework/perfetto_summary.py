@@ -0,0 +1,345 @@
+"""Quick summary of a recorded Perfetto trace.
+
+A trace is a sequence of TracePacket fields. The scanner maps the file and
+walks only the top-level fields of each packet: the payload that makes up the
+packet type is measured and skipped, and only the small trace_stats and
+ftrace_stats packets are decoded. That is enough to tell whether the buffer
+overflowed, which packet types (data sources) filled the trace and whether
+sequences lost packets, without opening the trace in the UI.
+"""
+
+import mmap
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Trace.packet
+_TRACE_PACKET = 1
+# TracePacket fields describing the packet rather than holding its data
+_TIMESTAMP = 8
+_SEQUENCE_ID = 10
+_PREVIOUS_PACKET_DROPPED = 42
+_FIRST_PACKET_ON_SEQUENCE = 87
+_METADATA_FIELDS = {
+    3,  # trusted_uid
+    _TIMESTAMP,
+    _SEQUENCE_ID,
+    12,  # interned_data
+    13,  # sequence_flags
+    41,  # incremental_state_cleared
+    _PREVIOUS_PACKET_DROPPED,
+    58,  # timestamp_clock_id
+    59,  # trace_packet_defaults
+    79,  # trusted_pid
+    _FIRST_PACKET_ON_SEQUENCE,
+    98,  # machine_id
+}
+_FTRACE_STATS = 34
+_TRACE_STATS = 35
+_COMPRESSED_PACKETS = 50
+
+# TracePacket data field -> name, for the packet types perfetto records on Android
+PACKET_TYPES = {
+    1: "ftrace_events",
+    2: "process_tree",
+    4: "inode_file_map",
+    5: "chrome_events",
+    6: "clock_snapshot",
+    7: "sys_stats",
+    9: "process_stats",
+    11: "track_event",
+    33: "trace_config",
+    _FTRACE_STATS: "ftrace_stats",
+    _TRACE_STATS: "trace_stats",
+    36: "synchronization_marker",
+    37: "profile_packet",
+    38: "battery",
+    39: "android_log",
+    40: "power_rails",
+    43: "process_descriptor",
+    44: "thread_descriptor",
+    45: "system_info",
+    46: "trigger",
+    47: "packages_list",
+    49: "perfetto_metatrace",
+    54: "streaming_profile_packet",
+    56: "heap_graph",
+    57: "graphics_frame_event",
+    60: "track_descriptor",
+    66: "perf_sample",
+    67: "cpu_info",
+    69: "service_event",
+    76: "frame_timeline_event",
+    89: "trace_uuid",
+}
+
+# TraceStats.buffer_stats and its BufferStats fields
+_BUFFER_STATS = 1
+_BUFFER_FIELDS = {
+    12: "size",
+    1: "bytes_written",
+    3: "chunks_overwritten",
+    18: "chunks_discarded",
+    4: "write_wrap_count",
+}
+# FtraceStats: phase (START_OF_TRACE = 1, END_OF_TRACE = 2) and cpu_stats
+_FTRACE_PHASE = 1
+_FTRACE_CPU_STATS = 2
+_FTRACE_END_OF_TRACE = 2
+_FTRACE_CPU_FIELDS = {1: "cpu", 3: "overrun", 8: "dropped_events"}
+
+
+@dataclass
+class BufferStats:
+    """Usage of one of the trace buffers at the end of the trace."""
+
+    size: int = 0
+    bytes_written: int = 0
+    # Chunks lost to ring buffer wraps or rejected once a DISCARD buffer was full
+    chunks_overwritten: int = 0
+    chunks_discarded: int = 0
+    write_wrap_count: int = 0
+
+    @property
+    def overflowed(self) -> bool:
+        return bool(self.chunks_overwritten or self.chunks_discarded)
+
+
+@dataclass
+class FtraceCpuStats:
+    """Events the kernel ftrace buffer of one CPU lost during the trace."""
+
+    cpu: int
+    overrun: int = 0
+    dropped_events: int = 0
+
+
+@dataclass
+class TraceSummary:
+    path: str
+    size_bytes: int = 0
+    packet_count: int = 0
+    packets_by_type: Dict[str, int] = field(default_factory=dict)
+    bytes_by_type: Dict[str, int] = field(default_factory=dict)
+    packets_by_sequence: Dict[int, int] = field(default_factory=dict)
+    # Packets flagged previous_packet_dropped, per sequence
+    drops_by_sequence: Dict[int, int] = field(default_factory=dict)
+    first_timestamp_ns: Optional[int] = None
+    last_timestamp_ns: Optional[int] = None
+    buffers: List[BufferStats] = field(default_factory=list)
+    ftrace_cpus: List[FtraceCpuStats] = field(default_factory=list)
+    # The file ends in the middle of a packet, or the scan stopped at a corrupt
+    # compressed_packets payload
+    truncated: bool = False
+
+    @property
+    def duration_seconds(self) -> float:
+        if self.first_timestamp_ns is None or self.last_timestamp_ns is None:
+            return 0.0
+        return (self.last_timestamp_ns - self.first_timestamp_ns) / 1e9
+
+    @property
+    def buffer_overflowed(self) -> bool:
+        return any(buffer.overflowed for buffer in self.buffers)
+
+    @property
+    def ftrace_lost_events(self) -> int:
+        return sum(cpu.overrun + cpu.dropped_events for cpu in self.ftrace_cpus)
+
+    def format(self) -> str:
+        """Returns the summary as a few lines of text."""
+        lines = [
+            f"{self.packet_count} packets, {self.size_bytes / (1 << 20):.1f} MB, "
+            f"{self.duration_seconds:.1f} s"
+        ]
+        if self.truncated:
+            lines.append("Trace is truncated.")
+        for i, buffer in enumerate(self.buffers):
+            state = "OVERFLOWED" if buffer.overflowed else "ok"
+            lines.append(
+                f"Buffer {i}: {buffer.bytes_written / (1 << 20):.1f} of "
+                f"{buffer.size / (1 << 20):.1f} MB written, {state} "
+                f"({buffer.chunks_overwritten} chunks overwritten, "
+                f"{buffer.chunks_discarded} discarded)"
+            )
+        lost = [cpu for cpu in self.ftrace_cpus if cpu.overrun or cpu.dropped_events]
+        if lost:
+            lines.append(
+                "Ftrace lost events: "
+                + ", ".join(f"cpu{cpu.cpu} {cpu.overrun + cpu.dropped_events}" for cpu in lost)
+            )
+        drops = sum(self.drops_by_sequence.values())
+        if drops:
+            lines.append(
+                f"{drops} packet drops on {len(self.drops_by_sequence)} of "
+                f"{len(self.packets_by_sequence)} sequences"
+            )
+        by_size = sorted(self.bytes_by_type.items(), key=lambda item: item[1], reverse=True)
+        lines.append(
+            "By type: "
+            + ", ".join(
+                f"{name} {self.packets_by_type[name]} ({size / (1 << 20):.1f} MB)"
+                for name, size in by_size
+            )
+        )
+        return "\n".join(lines)
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_fields(buf, pos: int, end: int) -> Iterator[Tuple[int, int, int, bool]]:
+    """
+    Yields (field number, value start, value end, False) for the fields in
+    buf[pos:end], or (field number, end, value, True) for varint fields. Values
+    are skipped rather than copied.
+    """
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+            yield key >> 3, pos, value, True
+            continue
+        if wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            length = 8
+        elif wire_type == 5:
+            length = 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield key >> 3, pos, pos + length, False
+        pos += length
+
+
+def _read_message(buf, start: int, end: int, names: Dict[int, str]) -> Dict[str, int]:
+    """Returns the varint fields of a message named in names."""
+    values = {}
+    for number, _, value, is_varint in _iter_fields(buf, start, end):
+        if is_varint and number in names:
+            values[names[number]] = value
+    return values
+
+
+class _Scanner:
+    def __init__(self, summary: TraceSummary):
+        self.summary = summary
+        # cpu -> (overrun, dropped_events) at the start of the trace
+        self._ftrace_start: Dict[int, Tuple[int, int]] = {}
+
+    def scan(self, buf, pos: int, end: int) -> None:
+        """Scans the TracePacket fields of a Trace message in buf[pos:end]."""
+        while pos < end:
+            key, pos = _read_varint(buf, pos)
+            if key & 7 != 2:
+                raise ValueError("Not a Perfetto trace")
+            length, pos = _read_varint(buf, pos)
+            if pos + length > end:
+                self.summary.truncated = True
+                return
+            if key >> 3 == _TRACE_PACKET:
+                self._scan_packet(buf, pos, pos + length)
+            pos += length
+
+    def _scan_packet(self, buf, start: int, end: int) -> None:
+        summary = self.summary
+        packet_type = None
+        sequence = 0
+        dropped = False
+        first_on_sequence = False
+        for number, value_start, value, is_varint in _iter_fields(buf, start, end):
+            if number == _TIMESTAMP:
+                if summary.first_timestamp_ns is None or value < summary.first_timestamp_ns:
+                    summary.first_timestamp_ns = value
+                if summary.last_timestamp_ns is None or value > summary.last_timestamp_ns:
+                    summary.last_timestamp_ns = value
+            elif number == _SEQUENCE_ID:
+                sequence = value
+            elif number == _PREVIOUS_PACKET_DROPPED:
+                dropped = bool(value)
+            elif number == _FIRST_PACKET_ON_SEQUENCE:
+                first_on_sequence = bool(value)
+            elif number == _COMPRESSED_PACKETS:
+                # Count the packets inside instead of the compressed wrapper
+                trace = zlib.decompress(buf[value_start:value])
+                self.scan(trace, 0, len(trace))
+                return
+            elif number not in _METADATA_FIELDS:
+                packet_type = PACKET_TYPES.get(number, f"field_{number}")
+                if number == _TRACE_STATS:
+                    self._read_trace_stats(buf, value_start, value)
+                elif number == _FTRACE_STATS:
+                    self._read_ftrace_stats(buf, value_start, value)
+        summary.packet_count += 1
+        # Writers set previous_packet_dropped on a sequence's first packet too,
+        # where nothing can have been lost before it
+        first_on_sequence = first_on_sequence or sequence not in summary.packets_by_sequence
+        summary.packets_by_sequence[sequence] = summary.packets_by_sequence.get(sequence, 0) + 1
+        if dropped and not first_on_sequence:
+            summary.drops_by_sequence[sequence] = summary.drops_by_sequence.get(sequence, 0) + 1
+        packet_type = packet_type or "empty"
+        summary.packets_by_type[packet_type] = summary.packets_by_type.get(packet_type, 0) + 1
+        summary.bytes_by_type[packet_type] = summary.bytes_by_type.get(packet_type, 0) + end - start
+
+    def _read_trace_stats(self, buf, start: int, end: int) -> None:
+        # Stats are written periodically and at the end; the last ones count
+        buffers = []
+        for number, value_start, value_end, is_varint in _iter_fields(buf, start, end):
+            if number == _BUFFER_STATS and not is_varint:
+                buffers.append(BufferStats(**_read_message(buf, value_start, value_end, _BUFFER_FIELDS)))
+        self.summary.buffers = buffers
+
+    def _read_ftrace_stats(self, buf, start: int, end: int) -> None:
+        phase = 0
+        cpus = []
+        for number, value_start, value, is_varint in _iter_fields(buf, start, end):
+            if number == _FTRACE_PHASE and is_varint:
+                phase = value
+            elif number == _FTRACE_CPU_STATS and not is_varint:
+                cpus.append(_read_message(buf, value_start, value, _FTRACE_CPU_FIELDS))
+        if phase != _FTRACE_END_OF_TRACE:
+            for stats in cpus:
+                self._ftrace_start[stats.get("cpu", 0)] = (
+                    stats.get("overrun", 0), stats.get("dropped_events", 0)
+                )
+            return
+        # The kernel counters run since boot, so report what changed during the trace
+        self.summary.ftrace_cpus = []
+        for stats in cpus:
+            cpu = stats.get("cpu", 0)
+            start_overrun, start_dropped = self._ftrace_start.get(cpu, (0, 0))
+            self.summary.ftrace_cpus.append(FtraceCpuStats(
+                cpu=cpu,
+                overrun=stats.get("overrun", 0) - start_overrun,
+                dropped_events=stats.get("dropped_events", 0) - start_dropped,
+            ))
+
+
+def summarize_trace(path: str) -> TraceSummary:
+    """
+    Scans the Perfetto trace at path and returns its TraceSummary.
+    Raises ValueError if the file is not a Perfetto trace.
+    """
+    summary = TraceSummary(path=path)
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        summary.size_bytes = f.tell()
+        if not summary.size_bytes:
+            return summary
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            try:
+                _Scanner(summary).scan(buf, 0, summary.size_bytes)
+            except (IndexError, zlib.error):
+                # A varint runs past the end of the file, or compressed packets don't inflate
+                summary.truncated = True
+    return summary
@@ -0,0 +1,226 @@
+"""Warm helper processes for running the vendored systrace/simpleperf scripts.
+
+The scripts are written as command line tools: they read ``sys.argv``, print to
+stdout and sometimes ``chdir``. Running them inside the GUI process means every
+call re-imports them and patches process-global state, so two captures running
+in parallel corrupt each other. Instead each job runs in a long-lived worker
+process that keeps the modules imported between jobs; a worker only ever runs
+one job at a time, so patching its globals is safe.
+"""
+
+import contextlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from easy_tracer.framework.cancellation import CancellationToken
+
+
+@dataclass
+class ScriptJob:
+    script_path: str
+    module_name: str
+    args: List[str] = field(default_factory=list)
+    # Entry point to call. When argv_param is set it receives argv as its only
+    # argument (run_systrace.main_impl), otherwise sys.argv is patched (main()).
+    entry: str = "main"
+    argv_param: bool = False
+    cwd: Optional[str] = None
+    sys_paths: List[str] = field(default_factory=list)
+
+
+class _PipeWriter(io.TextIOBase):
+    """stdout/stderr replacement that forwards every write to the host."""
+
+    def __init__(self, conn: Any, job_id: int):
+        self._conn = conn
+        self._job_id = job_id
+        self._chunks: List[str] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self._chunks.append(text)
+            self._conn.send(("log", self._job_id, text))
+        return len(text)
+
+    def getvalue(self) -> str:
+        return "".join(self._chunks)
+
+
+def _load_module(job: ScriptJob, modules: Dict[str, Any]) -> Any:
+    module = modules.get(job.script_path)
+    if module is not None:
+        return module
+    for path in job.sys_paths:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(job.module_name, job.script_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Could not load {job.module_name} from {job.script_path}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[job.module_name] = module
+    spec.loader.exec_module(module)
+    modules[job.script_path] = module
+    return module
+
+
+def _run_job(job: ScriptJob, modules: Dict[str, Any], writer: _PipeWriter) -> None:
+    module = _load_module(job, modules)
+    argv = [os.path.basename(job.script_path)] + job.args
+    original_argv = sys.argv
+    original_cwd = os.getcwd()
+    try:
+        if job.cwd:
+            os.chdir(job.cwd)
+        with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+            try:
+                entry = getattr(module, job.entry)
+                if job.argv_param:
+                    entry(argv)
+                else:
+                    sys.argv = argv
+                    entry()
+            except SystemExit as e:
+                if e.code not in (0, None):
+                    raise RuntimeError(f"{job.module_name} exited with code {e.code}")
+    finally:
+        sys.argv = original_argv
+        os.chdir(original_cwd)
+
+
+def _worker_main(conn: Any) -> None:
+    modules: Dict[str, Any] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        job_id, job = message
+        writer = _PipeWriter(conn, job_id)
+        try:
+            _run_job(job, modules, writer)
+            conn.send(("done", job_id, writer.getvalue()))
+        except BaseException as e:
+            detail = "".join(traceback.format_exception_only(type(e), e)).strip()
+            conn.send(("failed", job_id, (detail, writer.getvalue())))
+
+
+class _Worker:
+    def __init__(self, ctx: Any):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ScriptHost:
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        # Notified whenever a worker goes back to the pool or a slot frees up
+        self._available = threading.Condition(self._lock)
+        self._next_job_id = 0
+
+    def _acquire(self) -> _Worker:
+        with self._available:
+            while not self._idle and len(self._workers) >= self.max_workers:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            worker = _Worker(self._ctx)
+            self._workers.append(worker)
+            return worker
+
+    def _release(self, worker: _Worker) -> None:
+        with self._available:
+            if worker in self._workers:
+                self._idle.append(worker)
+                self._available.notify()
+
+    def _discard(self, worker: _Worker) -> None:
+        with self._available:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            # The freed slot lets a waiting caller start a fresh worker
+            self._available.notify()
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.conn.close()
+
+    def run(
+        self,
+        job: ScriptJob,
+        on_log: Optional[Callable[[str], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Runs the job on a warm worker and returns everything it printed.
+        on_log is called with output as it is produced. Cancelling cancel_token
+        kills the worker (scripts can't be interrupted cooperatively) and
+        raises CaptureCancelled.
+        """
+        with self._lock:
+            self._next_job_id += 1
+            job_id = self._next_job_id
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        worker = self._acquire()
+        unregister = cancel_token.on_cancel(worker.process.kill) if cancel_token is not None else (lambda: None)
+        try:
+            worker.conn.send((job_id, job))
+            while True:
+                kind, msg_id, payload = worker.conn.recv()
+                if msg_id != job_id:
+                    continue
+                if kind != "log":
+                    break
+                if on_log:
+                    on_log(payload)
+        except (EOFError, OSError) as e:
+            self._discard(worker)
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            raise RuntimeError(f"{job.module_name} worker process died: {e}") from e
+        except BaseException:
+            # e.g. KeyboardInterrupt or an unpicklable job; the worker may be mid-job
+            self._discard(worker)
+            raise
+        finally:
+            # Stop watching the token before the worker goes back to the pool
+            unregister()
+        self._release(worker)
+        if kind == "done":
+            return payload
+        detail, captured = payload
+        raise RuntimeError(f"{job.module_name} failed: {detail}\nLog: {captured}")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._idle.clear()
+        for worker in workers:
+            worker.stop()
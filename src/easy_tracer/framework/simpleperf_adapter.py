@@ -1,54 +1,80 @@
 import os
-import sys
-import io
-import contextlib
-import importlib.util
-import subprocess
-from typing import Optional
-from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
+from typing import Callable, Dict, List, Optional, Tuple
+from easy_tracer.framework.adb_client import AdbClient, AdbError
+from easy_tracer.framework.cancellation import (
+    PHASE_PULLING,
+    PHASE_RECORDING,
+    CancellationToken,
+    CaptureCancelled,
+    PhaseCallback,
+)
+from easy_tracer.framework.script_host import ScriptHost, ScriptJob
 
 
 class SimpleperfAdapter:
-    def __init__(self, adb_path: str = "adb"):
+    # Where simpleperf record writes when run directly on the device
+    DEVICE_PERF_DATA = "/data/local/tmp/perf.data"
+
+    # Report format -> default file name next to perf.data. Every format is
+    # produced by report_engine.py, which reads perf.data once for all of them.
+    REPORT_FORMATS: Dict[str, str] = {
+        "html": "report.html",
+        "gecko": "gecko_profile.json",
+        "pprof": "pprof.profile",
+        "stackcollapse": "stackcollapse.txt",
+        "inferno": "inferno.html",
+        # Columnar sample cache that filters and queries read instead of perf.data
+        "samples": "perf.data.samples",
+    }
+    # Prefix of the lines report_engine.py prints for formats that failed
+    REPORT_FAILED = "REPORT_FAILED"
+    # Script workers inherit these; simpleperf_utils.SymbolizationCache and
+    # DisassemblyCache read them
+    SYMBOLIZATION_CACHE_ENV = "SIMPLEPERF_SYMBOLIZATION_CACHE"
+    DISASSEMBLY_CACHE_ENV = "SIMPLEPERF_DISASSEMBLY_CACHE"
+
+    def __init__(
+        self,
+        adb_path: str = "adb",
+        adb_client: Optional[AdbClient] = None,
+        script_host: Optional[ScriptHost] = None,
+        report_host: Optional[ScriptHost] = None,
+    ):
         self.adb_path = adb_path
+        self.adb = adb_client or AdbClient(adb_path, use_server=False)
+        self.script_host = script_host or ScriptHost()
+        # Report scripts are CPU bound; a separate host lets them use every
+        # core without holding up the workers that drive captures
+        self.report_host = report_host or self.script_host
         # Calculate path to simpleperf scripts
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.simpleperf_dir = os.path.join(current_dir, "external", "simpleperf")
         self.app_profiler_path = os.path.join(self.simpleperf_dir, "app_profiler.py")
         self.report_html_path = os.path.join(self.simpleperf_dir, "report_html.py")
+        self.report_engine_path = os.path.join(self.simpleperf_dir, "report_engine.py")
 
-    def _import_and_run_script(self, script_path: str, module_name: str, args: list) -> str:
-        """Helper to import a script and run its main function with patched sys.argv"""
-        if self.simpleperf_dir not in sys.path:
-            sys.path.insert(0, self.simpleperf_dir)
-
-        spec = importlib.util.spec_from_file_location(module_name, script_path)
-        if spec is None or spec.loader is None:
-            raise ImportError(f"Could not load {module_name} from {script_path}")
-
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
-
-        # Patch sys.argv
-        original_argv = sys.argv
-        sys.argv = [os.path.basename(script_path)] + args
-
-        output_capture = io.StringIO()
-        try:
-            with contextlib.redirect_stdout(output_capture), contextlib.redirect_stderr(output_capture):
-                try:
-                    module.main()
-                except SystemExit as e:
-                    if e.code != 0:
-                        raise RuntimeError(f"{module_name} exited with code {e.code}")
-        except Exception as e:
-            captured = output_capture.getvalue()
-            raise RuntimeError(f"{module_name} failed: {str(e)}\nLog: {captured}")
-        finally:
-            sys.argv = original_argv
+    def _import_and_run_script(
+        self,
+        script_path: str,
+        module_name: str,
+        args: List[str],
+        cwd: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        host: Optional[ScriptHost] = None,
+    ) -> str:
+        """Runs a simpleperf script's main() in a warm script worker and returns its output."""
+        job = ScriptJob(
+            script_path=script_path,
+            module_name=module_name,
+            args=args,
+            cwd=cwd,
+            sys_paths=[self.simpleperf_dir],
+        )
+        return (host or self.script_host).run(job, cancel_token=cancel_token)
 
-        return output_capture.getvalue()
+    def stop_recording(self, device_serial: str) -> None:
+        """SIGINT makes simpleperf record stop early and close perf.data cleanly."""
+        self.adb.shell(device_serial, "pkill -INT simpleperf", check=False)
 
     def run_app_profiler(
         self,
@@ -58,8 +84,15 @@ class SimpleperfAdapter:
         duration_seconds: int = 10,
         frequency: int = 4000,
         record_options: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        binary_store_dir: Optional[str] = None,
     ) -> str:
-        """Runs app_profiler.py to profile an Android app."""
+        """
+        Runs app_profiler.py to profile an Android app. Cancelling cancel_token
+        stops simpleperf on the device and removes the partial perf.data.
+        binary_store_dir shares pulled binaries between profiles, so binaries
+        already in it are not pulled from the device again.
+        """
         if not os.path.exists(self.app_profiler_path):
             raise FileNotFoundError(
                 f"app_profiler.py not found at {self.app_profiler_path}"
@@ -70,44 +103,142 @@ class SimpleperfAdapter:
 
         perf_data_path = os.path.join(output_dir, "perf.data")
 
-        # Change CWD to output_dir so relative paths work if script uses them
-        # app_profiler writes to CWD usually or uses -o
-        original_cwd = os.getcwd()
-        os.chdir(output_dir)
+        args = [
+            "-p", app_name,
+            "-o", perf_data_path,
+            "--serial", device_serial,
+            "-r", f"-f {frequency} --duration {duration_seconds}",
+        ]
 
+        if record_options:
+            args[-1] = record_options # Replace the -r default
+        if binary_store_dir:
+            args += ["--binary_store", os.path.abspath(binary_store_dir)]
+
+        # Run from output_dir so relative paths the script writes end up there
         try:
-            args = [
-                "-p", app_name,
-                "-o", perf_data_path,
-                "--serial", device_serial,
-                "-r", f"-f {frequency} --duration {duration_seconds}",
-            ]
-
-            if record_options:
-                args[-1] = record_options # Replace the -r default
-
-            self._import_and_run_script(self.app_profiler_path, "app_profiler", args)
-            return perf_data_path
-        finally:
-            os.chdir(original_cwd)
+            self._import_and_run_script(
+                self.app_profiler_path, "app_profiler", args, cwd=output_dir, cancel_token=cancel_token
+            )
+        except CaptureCancelled:
+            self.stop_recording(device_serial)
+            if os.path.exists(perf_data_path):
+                os.remove(perf_data_path)
+            raise
+        return perf_data_path
 
-    def generate_html_report(self, perf_data_path: str, output_html_path: str) -> str:
+    def generate_html_report(
+        self,
+        perf_data_path: str,
+        output_html_path: str,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
         """Generates an HTML report from perf.data."""
-        if not os.path.exists(self.report_html_path):
+        return self.generate_report(perf_data_path, "html", output_html_path, cancel_token)
+
+    def generate_report(
+        self,
+        perf_data_path: str,
+        fmt: str,
+        output_path: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Generates a report in one of REPORT_FORMATS from perf.data. output_path
+        defaults to the format's file name next to perf.data. Returns the report path.
+        """
+        outputs, errors = self.generate_reports(
+            perf_data_path, [fmt], {fmt: output_path} if output_path else None, cancel_token
+        )
+        if fmt in errors:
+            raise RuntimeError(f"Simpleperf {fmt} report failed: {errors[fmt]}")
+        return outputs[fmt]
+
+    def generate_reports(
+        self,
+        perf_data_path: str,
+        formats: List[str],
+        output_paths: Optional[Dict[str, str]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        time_window: Optional[Tuple[float, float]] = None,
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Generates every format in one pass over perf.data on the report host.
+        output_paths overrides the default file names per format. time_window,
+        (start, end) in seconds from the first sample, reports only that part
+        of the recording; default names then get a _<start>s-<end>s suffix.
+        Returns (outputs, errors) per format; one failing format doesn't stop the others.
+        """
+        window_args: List[str] = []
+        suffix = ""
+        if time_window is not None:
+            start, end = time_window
+            window_args = ["--time-window", str(start), str(end)]
+            suffix = f"_{start:g}s-{end:g}s"
+        return self._run_report_engine(
+            perf_data_path, formats, output_paths, cancel_token, window_args, suffix
+        )
+
+    def _run_report_engine(
+        self,
+        perf_data_path: str,
+        formats: List[str],
+        output_paths: Optional[Dict[str, str]],
+        cancel_token: Optional[CancellationToken],
+        extra_args: List[str],
+        suffix: str,
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        for fmt in formats:
+            if fmt not in self.REPORT_FORMATS:
+                raise ValueError(f"Unknown report format: {fmt}")
+        if suffix and "samples" in formats:
+            raise ValueError("The samples cache always covers the whole recording")
+        if not os.path.exists(self.report_engine_path):
             raise FileNotFoundError(
-                f"report_html.py not found at {self.report_html_path}"
+                f"report_engine.py not found at {self.report_engine_path}"
             )
 
         if not os.path.exists(perf_data_path):
             raise FileNotFoundError(f"perf.data not found at {perf_data_path}")
 
-        args = [
-            "-i", perf_data_path,
-            "-o", output_html_path,
-        ]
+        paths = {
+            fmt: os.path.abspath(
+                (output_paths or {}).get(fmt)
+                or self._default_report_path(perf_data_path, fmt, suffix)
+            )
+            for fmt in formats
+        }
+        # Workers chdir into cwd, so hand them absolute paths
+        args = ["-i", os.path.abspath(perf_data_path)]
+        for fmt, path in paths.items():
+            args += [f"--{fmt}", path]
+        args += extra_args
+
+        try:
+            output = self._import_and_run_script(
+                self.report_engine_path,
+                "report_engine",
+                args,
+                cancel_token=cancel_token,
+                host=self.report_host,
+            )
+        except CaptureCancelled:
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
 
-        self._import_and_run_script(self.report_html_path, "report_html", args)
-        return output_html_path
+        errors: Dict[str, str] = {}
+        for line in output.splitlines():
+            if line.startswith(self.REPORT_FAILED + " "):
+                fmt, _, message = line[len(self.REPORT_FAILED) + 1:].partition(": ")
+                errors[fmt] = message
+        outputs = {fmt: path for fmt, path in paths.items() if fmt not in errors}
+        return outputs, errors
+
+    def _default_report_path(self, perf_data_path: str, fmt: str, suffix: str = "") -> str:
+        root, ext = os.path.splitext(self.REPORT_FORMATS[fmt])
+        return os.path.join(os.path.dirname(perf_data_path), root + suffix + ext)
 
     def run_simpleperf_record(
         self,
@@ -117,8 +248,35 @@ class SimpleperfAdapter:
         frequency: int = 4000,
         pid: Optional[int] = None,
         process_name: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
     ) -> str:
-        """Runs simpleperf record directly on the device."""
+        """
+        Runs simpleperf record directly on the device. on_progress receives
+        (bytes pulled, perf.data size) while the file is copied back.
+        """
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_RECORDING)
+        self.record_on_device(
+            device_serial, duration_seconds, frequency, pid, process_name, cancel_token
+        )
+        phase(PHASE_PULLING)
+        return self.pull_perf_data(device_serial, output_path, on_progress, cancel_token)
+
+    def record_on_device(
+        self,
+        device_serial: str,
+        duration_seconds: int = 10,
+        frequency: int = 4000,
+        pid: Optional[int] = None,
+        process_name: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Runs simpleperf record on the device and leaves perf.data there.
+        Returns the device path of perf.data.
+        """
         simpleperf_cmd = (
             f"simpleperf record -f {frequency} --duration {duration_seconds}"
         )
@@ -130,34 +288,47 @@ class SimpleperfAdapter:
         else:
             simpleperf_cmd += " -a"  # System-wide
 
-        simpleperf_cmd += " -o /data/local/tmp/perf.data"
-        adb_cmd = [self.adb_path, "-s", device_serial, "shell", simpleperf_cmd]
+        simpleperf_cmd += f" -o {self.DEVICE_PERF_DATA}"
 
+        unregister = (
+            cancel_token.on_cancel(lambda: self.stop_recording(device_serial))
+            if cancel_token is not None
+            else (lambda: None)
+        )
         try:
-            subprocess.run(
-                adb_cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-            # Pull the file
-            pull_cmd = [
-                self.adb_path,
-                "-s",
+            self.adb.shell(device_serial, simpleperf_cmd)
+            unregister()
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            return self.DEVICE_PERF_DATA
+        except AdbError as e:
+            raise RuntimeError(f"Simpleperf record failed: {e}") from e
+        except CaptureCancelled:
+            self.adb.shell(device_serial, ["rm", "-f", self.DEVICE_PERF_DATA], check=False)
+            raise
+        finally:
+            unregister()
+
+    def pull_perf_data(
+        self,
+        device_serial: str,
+        output_path: str,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """Copies perf.data written by record_on_device() to output_path."""
+        try:
+            self.adb.pull(
                 device_serial,
-                "pull",
-                "/data/local/tmp/perf.data",
+                self.DEVICE_PERF_DATA,
                 output_path,
-            ]
-            subprocess.run(
-                pull_cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
+                compress=None,
+                on_progress=on_progress,
+                cancel_token=cancel_token,
             )
-
             return output_path
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Simpleperf record failed: {e.stderr}") from e
+        except AdbError as e:
+            raise RuntimeError(f"Simpleperf record failed: {e}") from e
+        except CaptureCancelled:
+            self.adb.shell(device_serial, ["rm", "-f", self.DEVICE_PERF_DATA], check=False)
+            raise
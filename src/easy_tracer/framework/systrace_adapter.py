@@ -1,13 +1,23 @@
 import os
-import sys
-import io
-import contextlib
-import importlib.util
-from typing import List, Optional
+from typing import Dict, List, Optional
+from easy_tracer.framework.adb_client import AdbClient, AdbError
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.framework.script_host import ScriptHost, ScriptJob
 
 class SystraceAdapter:
-    def __init__(self, adb_path: str = "adb"):
+    # Script workers inherit this; systrace's trace_html_writer inlines the
+    # catapult trace viewer found there into the HTML it writes
+    VIEWER_DIR_ENV = "SYSTRACE_VIEWER_DIR"
+
+    def __init__(
+        self,
+        adb_path: str = "adb",
+        adb_client: Optional[AdbClient] = None,
+        script_host: Optional[ScriptHost] = None,
+    ):
         self.adb_path = adb_path
+        self.adb = adb_client or AdbClient(adb_path, use_server=False)
+        self.script_host = script_host or ScriptHost()
         # Calculate path to run_systrace.py directory
         current_dir = os.path.dirname(os.path.abspath(__file__))
         # The structure is src/easy_tracer/framework/external/systrace/systrace/systrace/run_systrace.py
@@ -20,45 +30,23 @@ class SystraceAdapter:
         self.script_dir = os.path.join(self.systrace_package_root, "systrace")
         self.script_path = os.path.join(self.script_dir, "run_systrace.py")
 
-    def _import_and_run_systrace(self, args: List[str]) -> str:
+    def _import_and_run_systrace(
+        self, args: List[str], cancel_token: Optional[CancellationToken] = None
+    ) -> str:
         """
-        Dynamically imports run_systrace and runs its main_impl with args.
+        Runs run_systrace.main_impl with args in a warm script worker.
         Captures and returns stdout.
         """
-        # Ensure sys.path has the package root
-        if self.systrace_package_root not in sys.path:
-            sys.path.insert(0, self.systrace_package_root)
-
-        # Also add the script directory for local imports if any (though systrace uses package imports)
-        if self.script_dir not in sys.path:
-            sys.path.insert(0, self.script_dir)
-
-        # Import run_systrace module
-        spec = importlib.util.spec_from_file_location("run_systrace", self.script_path)
-        if spec is None or spec.loader is None:
-            raise ImportError(f"Could not load run_systrace from {self.script_path}")
-
-        module = importlib.util.module_from_spec(spec)
-        sys.modules["run_systrace"] = module
-        spec.loader.exec_module(module)
-
-        # Capture output
-        output_capture = io.StringIO()
-
-        try:
-            with contextlib.redirect_stdout(output_capture), contextlib.redirect_stderr(output_capture):
-                try:
-                    # main_impl expects argv where argv[0] is script name
-                    module.main_impl(["run_systrace.py"] + args)
-                except SystemExit as e:
-                    if e.code != 0:
-                        raise RuntimeError(f"Systrace exited with code {e.code}")
-        except Exception as e:
-            # Check if we have any captured output to help debug
-            captured = output_capture.getvalue()
-            raise RuntimeError(f"Systrace failed: {str(e)}\nLog: {captured}")
-
-        return output_capture.getvalue()
+        job = ScriptJob(
+            script_path=self.script_path,
+            module_name="run_systrace",
+            args=args,
+            entry="main_impl",
+            argv_param=True,
+            # The package root lets 'from systrace import ...' work; the script dir covers local imports
+            sys_paths=[self.systrace_package_root, self.script_dir],
+        )
+        return self.script_host.run(job, cancel_token=cancel_token)
 
     def run_systrace(
         self,
@@ -68,9 +56,12 @@ class SystraceAdapter:
         categories: List[str],
         buffer_size_kb: Optional[int] = None,
         app_name: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> str:
         """
         Runs systrace with the given parameters.
+        Cancelling cancel_token stops atrace on the device, removes the partial
+        output file and raises CaptureCancelled.
         Returns the output (stdout) of the command.
         """
         if not os.path.exists(self.script_path):
@@ -91,7 +82,49 @@ class SystraceAdapter:
         # Add categories at the end
         args.extend(categories)
 
-        return self._import_and_run_systrace(args)
+        try:
+            return self._import_and_run_systrace(args, cancel_token)
+        except CaptureCancelled:
+            self.stop_atrace(device_serial)
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+
+    def convert_perfetto_trace(
+        self,
+        trace_file: str,
+        output_file: str,
+        output_format: str = "systrace",
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Converts a Perfetto trace to systrace text ("systrace") or Chrome JSON
+        ("json") with systrace's built-in converter, without traceconv.
+        Returns output_file.
+        """
+        job = ScriptJob(
+            script_path=os.path.join(self.script_dir, "perfetto_to_systrace.py"),
+            module_name="perfetto_to_systrace",
+            args=["--format", output_format, trace_file, output_file],
+            sys_paths=[self.systrace_package_root, self.script_dir],
+        )
+        try:
+            self.script_host.run(job, cancel_token=cancel_token)
+        except CaptureCancelled:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+        return output_file
+
+    def stop_atrace(self, device_serial: str) -> None:
+        """
+        Stops a running atrace session left behind by a killed systrace run:
+        SIGINT makes atrace stop early, --async_stop turns tracing off in case
+        the session was started asynchronously.
+        """
+        self.adb.shell(
+            device_serial, "pkill -INT atrace; atrace --async_stop >/dev/null 2>&1", check=False
+        )
 
     def get_categories(self, device_serial: str) -> List[str]:
         """
@@ -117,38 +150,49 @@ class SystraceAdapter:
                 categories.append(parts[0])
         return categories
 
-    def get_ftrace_events(self, device_serial: str) -> List[str]:
-        # Keep ADB implementation for this as it uses shell cat directly
-        # No change needed here as it uses AdbAdapter logic essentially via subprocess calling adb directly
-        # Wait, the previous implementation used subprocess.run([self.adb_path, ...])
-        # That is fine because adb is an external binary, not a python script.
-        import subprocess
-        from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
-
-        cmd = [
-            self.adb_path,
-            "-s",
-            device_serial,
-            "shell",
-            "cat",
-            "/sys/kernel/tracing/available_events",
-        ]
-
+    def get_device_info(self, device_serial: str) -> Dict[str, str]:
+        """
+        Returns the build fingerprint, SDK level, ABI and tracefs mount point
+        of the device in a single shell round trip.
+        """
+        script = (
+            "getprop ro.build.fingerprint; "
+            "getprop ro.build.version.sdk; "
+            "getprop ro.product.cpu.abi; "
+            "if [ -d /sys/kernel/tracing/events ]; then echo /sys/kernel/tracing; "
+            "else echo /sys/kernel/debug/tracing; fi"
+        )
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
+            result = self.adb.shell(device_serial, script)
+        except AdbError as e:
+            raise RuntimeError(f"Failed to query device properties: {e}") from e
+
+        lines = [line.strip() for line in result.stdout.splitlines()]
+        lines += [""] * (4 - len(lines))
+        return {
+            "fingerprint": lines[0],
+            "sdk": lines[1],
+            "abi": lines[2],
+            "tracing_path": lines[3] or "/sys/kernel/tracing",
+        }
+
+    def get_ftrace_events(
+        self, device_serial: str, tracing_path: str = "/sys/kernel/tracing"
+    ) -> List[str]:
+        """
+        Returns the ftrace events the device kernel exposes.
+        """
+        try:
+            result = self.adb.shell(
+                device_serial, ["cat", f"{tracing_path}/available_events"]
             )
-            events = []
-            for line in result.stdout.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                events.append(line)
-            return events
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Failed to list ftrace events: {e.stderr}") from e
+        except AdbError as e:
+            raise RuntimeError(f"Failed to list ftrace events: {e}") from e
 
+        events = []
+        for line in result.stdout.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            events.append(line)
+        return events
@@ -1,11 +1,12 @@
-import subprocess
 import time
-from easy_tracer.framework.subprocess_utils import subprocess_hidden_window_kwargs
+from typing import Optional
+from easy_tracer.framework.adb_client import AdbClient, AdbError
 
 
 class TraceviewAdapter:
-    def __init__(self, adb_path: str = "adb"):
+    def __init__(self, adb_path: str = "adb", adb_client: Optional[AdbClient] = None):
         self.adb_path = adb_path
+        self.adb = adb_client or AdbClient(adb_path, use_server=False)
 
     def start_tracing(
         self,
@@ -17,7 +18,7 @@ class TraceviewAdapter:
         """Starts method tracing for the specified package."""
         trace_file = f"/data/local/tmp/{package_name}.trace"
 
-        cmd = [self.adb_path, "-s", device_serial, "shell", "am", "profile", "start"]
+        cmd = ["am", "profile", "start"]
 
         if sampling:
             cmd.extend(["--sampling", str(sampling_interval)])
@@ -25,75 +26,40 @@ class TraceviewAdapter:
         cmd.extend([package_name, trace_file])
 
         try:
-            subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(
-                f"Failed to start Traceview: {e.stderr if e.stderr else e.stdout}"
-            ) from e
+            self.adb.shell(device_serial, cmd)
+        except AdbError as e:
+            raise RuntimeError(f"Failed to start Traceview: {e}") from e
 
     def stop_tracing(
         self, device_serial: str, package_name: str, output_path: str
     ) -> str:
         """Stops method tracing and pulls the trace file."""
-        # Stop profiling
+        self.stop_profiling(device_serial, package_name)
+        return self.pull_trace(device_serial, package_name, output_path)
+
+    def stop_profiling(self, device_serial: str, package_name: str) -> None:
+        """Stops method tracing; the trace stays on the device until pull_trace()."""
         try:
-            subprocess.run(
-                [
-                    self.adb_path,
-                    "-s",
-                    device_serial,
-                    "shell",
-                    "am",
-                    "profile",
-                    "stop",
-                    package_name,
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Failed to stop Traceview: {e.stderr}") from e
+            self.adb.shell(device_serial, ["am", "profile", "stop", package_name])
+        except AdbError as e:
+            raise RuntimeError(f"Failed to stop Traceview: {e}") from e
 
         # Give Android a moment to flush the file
         time.sleep(1)
 
+    def pull_trace(self, device_serial: str, package_name: str, output_path: str) -> str:
+        """Pulls the trace file written after stop_profiling() and removes it from the device."""
         device_trace_file = f"/data/local/tmp/{package_name}.trace"
 
         # Pull file
         try:
-            subprocess.run(
-                [
-                    self.adb_path,
-                    "-s",
-                    device_serial,
-                    "pull",
-                    device_trace_file,
-                    output_path,
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-                **subprocess_hidden_window_kwargs(),
-            )
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Failed to pull trace file: {e.stderr}") from e
+            self.adb.pull(device_serial, device_trace_file, output_path, compress=None)
+        except AdbError as e:
+            raise RuntimeError(f"Failed to pull trace file: {e}") from e
 
         # Cleanup
         try:
-            subprocess.run(
-                [self.adb_path, "-s", device_serial, "shell", "rm", device_trace_file],
-                capture_output=True,
-                check=False,
-                **subprocess_hidden_window_kwargs(),
-            )
+            self.adb.shell(device_serial, ["rm", device_trace_file], check=False)
         except Exception:
             pass
 
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import atexit
+import multiprocessing
+import os
 from pathlib import Path
 import subprocess
 import sys
@@ -13,12 +15,17 @@ if str(src_dir) not in sys.path:
 
 from PySide6 import QtWidgets
 from easy_tracer.framework.adb_adapter import AdbAdapter
+from easy_tracer.framework.adb_client import AdbClient
+from easy_tracer.framework.script_host import ScriptHost
 from easy_tracer.framework.systrace_adapter import SystraceAdapter
 from easy_tracer.framework.simpleperf_adapter import SimpleperfAdapter
 from easy_tracer.framework.perfetto_adapter import PerfettoAdapter
 from easy_tracer.framework.traceview_adapter import TraceviewAdapter
 from easy_tracer.services.device_service import DeviceService
 from easy_tracer.services.capture_service import CaptureService
+from easy_tracer.services.capability_cache import CapabilityCache
+from easy_tracer.services.capture_scheduler import CaptureScheduler
+from easy_tracer.services.report_queue import ReportQueue
 from easy_tracer.services.simpleperf_service import SimpleperfService
 from easy_tracer.services.perfetto_service import PerfettoService
 from easy_tracer.services.traceview_service import TraceviewService
@@ -66,30 +73,80 @@ def run() -> None:
         default_output_dir=app_root / "output",
     )
 
-    adb_adapter = AdbAdapter(adb_path=config_service.adb_path)
+    # One client talks to the adb server socket for every adapter, so captures
+    # don't fork an adb process per command.
+    adb_client = AdbClient(adb_path=config_service.adb_path)
+    adb_adapter = AdbAdapter(adb_path=config_service.adb_path, adb_client=adb_client)
 
     # Register cleanup handler to kill ADB server on exit
     # This prevents ADB daemon from holding locks on files in dist directory
     atexit.register(_kill_adb_server, config_service.adb_path)
+    atexit.register(adb_client.close)
+
+    # Source lines and disassembly found by the simpleperf scripts are kept
+    # across reports, keyed by build id; set before any script worker starts
+    os.environ.setdefault(
+        SimpleperfAdapter.SYMBOLIZATION_CACHE_ENV,
+        str(app_root / "cache" / "simpleperf_symbols.db"),
+    )
+    os.environ.setdefault(
+        SimpleperfAdapter.DISASSEMBLY_CACHE_ENV,
+        str(app_root / "cache" / "simpleperf_disassembly"),
+    )
+    # Catapult's systrace_trace_viewer.html and webcomponents.min.js are
+    # downloaded here on first use and inlined into systrace HTML; without
+    # them the page links to Perfetto UI
+    os.environ.setdefault(
+        SystraceAdapter.VIEWER_DIR_ENV, str(app_root / "cache" / "systrace_viewer")
+    )
+
+    # Warm worker processes for the vendored systrace/simpleperf scripts
+    script_host = ScriptHost(max_workers=2)
+    atexit.register(script_host.shutdown)
+
+    # Queues captures so two panels never trace the same device at once
+    capture_scheduler = CaptureScheduler(max_concurrent_jobs=4)
+    atexit.register(capture_scheduler.shutdown)
 
     device_service = DeviceService(adb_adapter)
     main_presenter = MainPresenter(device_service)
 
-    systrace_adapter = SystraceAdapter(adb_path=config_service.adb_path)
-    capture_service = CaptureService(systrace_adapter, output_dir=config_service.output_dir)
-    systrace_presenter = SystracePresenter(capture_service)
-
-    simpleperf_adapter = SimpleperfAdapter(adb_path=config_service.adb_path)
-    simpleperf_service = SimpleperfService(simpleperf_adapter, output_dir=config_service.output_dir)
-    simpleperf_presenter = SimpleperfPresenter(simpleperf_service)
+    systrace_adapter = SystraceAdapter(
+        adb_path=config_service.adb_path, adb_client=adb_client, script_host=script_host
+    )
+    capability_cache = CapabilityCache(app_root / "cache" / "device_capabilities.json")
+    capture_service = CaptureService(
+        systrace_adapter,
+        output_dir=config_service.output_dir,
+        capability_cache=capability_cache,
+    )
+    systrace_presenter = SystracePresenter(capture_service, capture_scheduler)
+
+    # Simpleperf reports run in their own workers, one per core, so they never
+    # hold up the next capture
+    report_host = ScriptHost(max_workers=os.cpu_count() or 2)
+    atexit.register(report_host.shutdown)
+    simpleperf_adapter = SimpleperfAdapter(
+        adb_path=config_service.adb_path,
+        adb_client=adb_client,
+        script_host=script_host,
+        report_host=report_host,
+    )
+    report_queue = ReportQueue(simpleperf_adapter, max_workers=report_host.max_workers)
+    # Registered after report_host so it runs first and stops feeding it jobs
+    atexit.register(report_queue.shutdown)
+    simpleperf_service = SimpleperfService(
+        simpleperf_adapter, output_dir=config_service.output_dir, report_queue=report_queue
+    )
+    simpleperf_presenter = SimpleperfPresenter(simpleperf_service, capture_scheduler)
 
-    perfetto_adapter = PerfettoAdapter(adb_path=config_service.adb_path)
+    perfetto_adapter = PerfettoAdapter(adb_path=config_service.adb_path, adb_client=adb_client)
     perfetto_service = PerfettoService(perfetto_adapter, output_dir=config_service.output_dir)
-    perfetto_presenter = PerfettoPresenter(perfetto_service)
+    perfetto_presenter = PerfettoPresenter(perfetto_service, capture_scheduler)
 
-    traceview_adapter = TraceviewAdapter(adb_path=config_service.adb_path)
+    traceview_adapter = TraceviewAdapter(adb_path=config_service.adb_path, adb_client=adb_client)
     traceview_service = TraceviewService(traceview_adapter, output_dir=config_service.output_dir)
-    traceview_presenter = TraceviewPresenter(traceview_service)
+    traceview_presenter = TraceviewPresenter(traceview_service, capture_scheduler)
 
     combo_service = ComboService(
         systrace_service=capture_service,
@@ -98,7 +155,7 @@ def run() -> None:
         traceview_service=traceview_service,
         output_dir=config_service.output_dir,
     )
-    combo_presenter = ComboPresenter(combo_service)
+    combo_presenter = ComboPresenter(combo_service, capture_scheduler)
 
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow(
@@ -115,4 +172,6 @@ def run() -> None:
 
 
 if __name__ == "__main__":
+    # Script worker processes re-launch the frozen executable
+    multiprocessing.freeze_support()
     run()
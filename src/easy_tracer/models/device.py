@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
 @dataclass
 class Device:
@@ -14,3 +15,15 @@ class Device:
         if self.model:
             return f"{self.model} ({self.serial})"
         return self.serial
+
+
+@dataclass
+class DeviceCapabilities:
+    serial: str
+    fingerprint: str
+    sdk_level: int = 0
+    abi: str = ""
+    tracing_path: str = "/sys/kernel/tracing"
+    categories: List[str] = field(default_factory=list)
+    ftrace_events: List[str] = field(default_factory=list)
+    updated_at: float = 0.0
@@ -1,14 +1,20 @@
-from typing import Dict, Any, Optional, Callable
-from easy_tracer.services.combo_service import ComboService
+from typing import Dict, Any, List, Optional, Callable
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.presenters.job_runner import JobRunner
+from easy_tracer.services.capture_scheduler import PRIORITY_LOW, CaptureScheduler
+from easy_tracer.services.combo_service import ComboService, DeviceCaptureResult
 
 class ComboPresenter:
-    def __init__(self, combo_service: ComboService):
+    def __init__(self, combo_service: ComboService, scheduler: Optional[CaptureScheduler] = None):
         self.combo_service = combo_service
         self.view_update: Optional[Callable[[], None]] = None
+        self.jobs = JobRunner(scheduler, self._notify_view)
 
         # State
         self.is_running: bool = False
         self.results: Dict[str, str] = {}
+        self.device_results: List[DeviceCaptureResult] = []
+        self.manifest_path: Optional[str] = None
         self.error_message: Optional[str] = None
 
     def bind_view_update(self, callback: Callable[[], None]):
@@ -18,6 +24,13 @@ class ComboPresenter:
         if self.view_update:
             self.view_update()
 
+    def _on_job_cancelled(self):
+        self.is_running = False
+        self.error_message = "Combo capture cancelled."
+
+    def cancel(self):
+        self.jobs.cancel()
+
     def start_combo(
         self,
         device_serial: str,
@@ -37,18 +50,85 @@ class ComboPresenter:
 
         self.is_running = True
         self.results = {}
+        self.device_results = []
+        self.manifest_path = None
         self.error_message = None
         self._notify_view()
 
-        try:
-            self.results = self.combo_service.start_combo_capture(
-                device_serial=device_serial,
-                duration=duration,
-                enabled_tools=enabled_tools,
-                configs=configs
-            )
-        except Exception as e:
-            self.error_message = str(e)
-        finally:
-            self.is_running = False
+        def run(cancel_token: CancellationToken):
+            try:
+                self.results = self.combo_service.start_combo_capture(
+                    device_serial=device_serial,
+                    duration=duration,
+                    enabled_tools=enabled_tools,
+                    configs=configs,
+                    cancel_token=cancel_token,
+                )
+            except CaptureCancelled:
+                self.error_message = "Combo capture cancelled."
+            except Exception as e:
+                self.error_message = str(e)
+            finally:
+                self.is_running = False
+                self._notify_view()
+
+        self.jobs.run("combo", [device_serial], run, on_cancelled=self._on_job_cancelled)
+
+    def start_fanout(
+        self,
+        device_serials: List[str],
+        duration: int,
+        enabled_tools: Dict[str, bool],
+        configs: Dict[str, Any],
+        max_parallel_devices: int = 4,
+    ):
+        if not device_serials:
+            self.error_message = "Select at least one device."
             self._notify_view()
+            return
+
+        if not any(enabled_tools.values()):
+            self.error_message = "Select at least one tool."
+            self._notify_view()
+            return
+
+        self.is_running = True
+        self.results = {}
+        self.device_results = []
+        self.manifest_path = None
+        self.error_message = None
+        self._notify_view()
+
+        def on_device_done(device: DeviceCaptureResult):
+            self.device_results = self.device_results + [device]
+            self._notify_view()
+
+        def run(cancel_token: CancellationToken):
+            try:
+                batch = self.combo_service.start_fanout_capture(
+                    device_serials=device_serials,
+                    duration=duration,
+                    enabled_tools=enabled_tools,
+                    configs=configs,
+                    max_parallel_devices=max_parallel_devices,
+                    on_device_done=on_device_done,
+                    cancel_token=cancel_token,
+                )
+                self.device_results = batch.devices
+                self.manifest_path = batch.manifest_path
+                if cancel_token.is_cancelled:
+                    self.error_message = "Combo capture cancelled; finished devices are in the manifest."
+                elif batch.failed:
+                    self.error_message = (
+                        f"{len(batch.failed)} of {len(batch.devices)} device(s) had errors, see the manifest."
+                    )
+            except Exception as e:
+                self.error_message = str(e)
+            finally:
+                self.is_running = False
+                self._notify_view()
+
+        # A batch holds all of its devices and should not starve single captures
+        self.jobs.run(
+            "combo batch", list(device_serials), run, on_cancelled=self._on_job_cancelled, priority=PRIORITY_LOW
+        )
@@ -0,0 +1,69 @@
+from typing import Callable, List, Optional
+from easy_tracer.framework.cancellation import CancellationToken
+from easy_tracer.services.capture_scheduler import (
+    CANCELLED,
+    PRIORITY_NORMAL,
+    QUEUED,
+    CaptureJob,
+    CaptureScheduler,
+)
+
+
+class JobRunner:
+    """
+    Runs a presenter's capture work as a CaptureScheduler job and re-renders the
+    view on every job state change. Without a scheduler the work runs inline on
+    the calling thread, as before.
+    """
+
+    def __init__(self, scheduler: Optional[CaptureScheduler], notify_view: Callable[[], None]):
+        self.scheduler = scheduler
+        self._notify_view = notify_view
+        self.job: Optional[CaptureJob] = None
+        self.cancel_token: Optional[CancellationToken] = None
+
+    @property
+    def is_queued(self) -> bool:
+        return self.job is not None and self.job.state == QUEUED
+
+    def run(
+        self,
+        name: str,
+        devices: List[str],
+        body: Callable[[CancellationToken], None],
+        on_cancelled: Optional[Callable[[], None]] = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> None:
+        """
+        Runs body(cancel_token) once the devices are free. on_cancelled is called
+        instead of body when the job is cancelled before it started.
+        """
+        token = CancellationToken()
+        self.cancel_token = token
+        if self.scheduler is None:
+            body(token)
+            return
+
+        def on_state_change(job: CaptureJob) -> None:
+            if job.state == CANCELLED and job.started_at is None and on_cancelled:
+                on_cancelled()
+            self._notify_view()
+
+        self.job = self.scheduler.submit(
+            body,
+            token,
+            name=name,
+            devices=devices,
+            priority=priority,
+            on_state_change=on_state_change,
+            cancel_token=token,
+        )
+
+    def cancel(self) -> bool:
+        """Cancels the current job, whether it is still queued or already running."""
+        if self.scheduler is None or self.job is None:
+            if self.cancel_token is None or self.cancel_token.is_cancelled:
+                return False
+            self.cancel_token.cancel()
+            return True
+        return self.scheduler.cancel(self.job)
@@ -1,6 +1,6 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
 from easy_tracer.models.device import Device
-from easy_tracer.services.device_service import DeviceService
+from easy_tracer.services.device_service import DeviceEvent, DeviceService
 
 class MainPresenter:
     def __init__(self, device_service: DeviceService):
@@ -11,6 +11,15 @@ class MainPresenter:
         """Fetches the list of connected devices."""
         return self.device_service.get_connected_devices()
 
+    def start_device_tracking(
+        self, on_change: Callable[[List[Device], List[DeviceEvent]], None]
+    ):
+        """Subscribes to device hot-plug events. on_change runs on a background thread."""
+        self.device_service.start_tracking(on_change)
+
+    def stop_device_tracking(self):
+        self.device_service.stop_tracking()
+
     def on_device_selected(self, device: Optional[Device]):
         """Handles device selection."""
         self.selected_device = device
@@ -1,15 +1,29 @@
 from typing import List, Optional, Callable
+from easy_tracer.framework.cancellation import PHASE_POST_PROCESSING, CancellationToken, CaptureCancelled
+from easy_tracer.framework.perfetto_summary import TraceSummary
+from easy_tracer.presenters.job_runner import JobRunner
+from easy_tracer.services.capture_scheduler import CaptureScheduler
 from easy_tracer.services.perfetto_service import PerfettoService
 
 class PerfettoPresenter:
-    def __init__(self, perfetto_service: PerfettoService):
+    def __init__(self, perfetto_service: PerfettoService, scheduler: Optional[CaptureScheduler] = None):
         self.perfetto_service = perfetto_service
         self.view_update: Optional[Callable[[], None]] = None
+        self.jobs = JobRunner(scheduler, self._notify_view)
 
         # State
         self.is_recording: bool = False
+        self.phase: Optional[str] = None
+        self.bytes_received: int = 0
         self.last_output_path: Optional[str] = None
+        self.last_summary: Optional[TraceSummary] = None
         self.error_message: Optional[str] = None
+        # Ends a long-mode recording early while keeping the trace
+        self._stop_token: Optional[CancellationToken] = None
+
+    @property
+    def can_stop(self) -> bool:
+        return self.is_recording and self._stop_token is not None and not self._stop_token.is_cancelled
 
     def bind_view_update(self, callback: Callable[[], None]):
         self.view_update = callback
@@ -18,6 +32,31 @@ class PerfettoPresenter:
         if self.view_update:
             self.view_update()
 
+    def _on_transfer_progress(self, received: int):
+        # Refresh the view about once per MB rather than on every packet
+        if received // (1 << 20) != self.bytes_received // (1 << 20):
+            self.bytes_received = received
+            self._notify_view()
+        else:
+            self.bytes_received = received
+
+    def _on_phase(self, phase: str):
+        self.phase = phase
+        self._notify_view()
+
+    def _on_job_cancelled(self):
+        self.is_recording = False
+        self.error_message = "Recording cancelled."
+
+    def cancel(self):
+        self.jobs.cancel()
+
+    def stop(self):
+        """Stops a long-mode recording now; the trace recorded so far is kept."""
+        if self._stop_token is not None:
+            self._stop_token.cancel()
+            self._notify_view()
+
     def start_recording(
         self,
         device_serial: str,
@@ -26,6 +65,13 @@ class PerfettoPresenter:
         categories: List[str],
         output_dir: Optional[str] = None,
         create_subfolder: bool = False,
+        long_mode: bool = False,
+        write_period_ms: int = 2500,
+        flush_period_ms: int = 30000,
+        data_sources: Optional[List[str]] = None,
+        ftrace_events: Optional[List[str]] = None,
+        atrace_apps: Optional[List[str]] = None,
+        fill_policy: str = "RING_BUFFER",
     ):
         if not device_serial:
             self.error_message = "No device selected."
@@ -33,22 +79,50 @@ class PerfettoPresenter:
             return
 
         self.is_recording = True
+        self.phase = None
+        self.bytes_received = 0
         self.last_output_path = None
+        self.last_summary = None
         self.error_message = None
+        self._stop_token = CancellationToken() if long_mode else None
+        stop_token = self._stop_token
         self._notify_view()
 
-        try:
-            path = self.perfetto_service.record_trace(
-                device_serial=device_serial,
-                duration_seconds=duration,
-                buffer_size_kb=buffer_size,
-                categories=categories,
-                output_dir=output_dir,
-                create_subfolder=create_subfolder,
-            )
-            self.last_output_path = path
-        except Exception as e:
-            self.error_message = f"Perfetto recording failed: {str(e)}"
-        finally:
-            self.is_recording = False
-            self._notify_view()
+        def run(cancel_token: CancellationToken):
+            try:
+                path = self.perfetto_service.record_trace(
+                    device_serial=device_serial,
+                    duration_seconds=duration,
+                    buffer_size_kb=buffer_size,
+                    categories=categories,
+                    output_dir=output_dir,
+                    create_subfolder=create_subfolder,
+                    on_progress=self._on_transfer_progress,
+                    long_mode=long_mode,
+                    file_write_period_ms=write_period_ms,
+                    flush_period_ms=flush_period_ms,
+                    data_sources=data_sources,
+                    ftrace_events=ftrace_events,
+                    atrace_apps=atrace_apps,
+                    fill_policy=fill_policy,
+                    cancel_token=cancel_token,
+                    on_phase=self._on_phase,
+                    stop_token=stop_token,
+                )
+                self.last_output_path = path
+                self._on_phase(PHASE_POST_PROCESSING)
+                try:
+                    self.last_summary = self.perfetto_service.summarize_trace(path)
+                except (OSError, ValueError) as e:
+                    # The trace is saved either way
+                    self.error_message = f"Could not summarize the trace: {e}"
+            except CaptureCancelled:
+                self.error_message = "Recording cancelled."
+            except Exception as e:
+                self.error_message = f"Perfetto recording failed: {str(e)}"
+            finally:
+                self.is_recording = False
+                self.phase = None
+                self._notify_view()
+
+        self.jobs.run("perfetto", [device_serial], run, on_cancelled=self._on_job_cancelled)
@@ -1,15 +1,25 @@
-from typing import Optional, Callable
+from typing import List, Optional, Callable, Tuple
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.presenters.job_runner import JobRunner
+from easy_tracer.services.capture_scheduler import CaptureScheduler
+from easy_tracer.services.report_queue import ReportSession
 from easy_tracer.services.simpleperf_service import SimpleperfService
 
 class SimpleperfPresenter:
-    def __init__(self, simpleperf_service: SimpleperfService):
+    def __init__(self, simpleperf_service: SimpleperfService, scheduler: Optional[CaptureScheduler] = None):
         self.simpleperf_service = simpleperf_service
         self.view_update: Optional[Callable[[], None]] = None
+        self.jobs = JobRunner(scheduler, self._notify_view)
 
         # State
         self.is_profiling: bool = False
+        self.phase: Optional[str] = None
+        # (bytes pulled, perf.data size) while perf.data is copied back
+        self.transfer: Tuple[int, int] = (0, 0)
         self.last_output_path: Optional[str] = None
         self.error_message: Optional[str] = None
+        # Background report generation, newest last
+        self.report_sessions: List[ReportSession] = []
 
     def bind_view_update(self, callback: Callable[[], None]):
         self.view_update = callback
@@ -18,6 +28,71 @@ class SimpleperfPresenter:
         if self.view_update:
             self.view_update()
 
+    def _on_phase(self, phase: str):
+        self.phase = phase
+        self._notify_view()
+
+    def _on_transfer_progress(self, received: int, total: int):
+        # Refresh the view about once per MB rather than on every packet
+        notify = received // (1 << 20) != self.transfer[0] // (1 << 20)
+        self.transfer = (received, total)
+        if notify:
+            self._notify_view()
+
+    def _start(self):
+        self.is_profiling = True
+        self.phase = None
+        self.transfer = (0, 0)
+        self.last_output_path = None
+        self.error_message = None
+        self._notify_view()
+
+    def _finish(self):
+        self.is_profiling = False
+        self.phase = None
+        self._notify_view()
+
+    def _on_job_cancelled(self):
+        self.is_profiling = False
+        self.error_message = "Profiling cancelled."
+
+    def cancel(self):
+        self.jobs.cancel()
+
+    def _generates_reports_inline(self) -> bool:
+        return self.simpleperf_service.report_queue is None
+
+    def _queue_reports(self, perf_data_path: str, report_formats: Optional[List[str]]):
+        """Hands perf.data to the report queue so the capture job can end right away."""
+        session = self.simpleperf_service.queue_reports(
+            perf_data_path, report_formats or ["html"], on_update=lambda _: self._notify_view()
+        )
+        self.report_sessions.append(session)
+
+    def report_window(self, start: float, end: float, report_formats: Optional[List[str]] = None):
+        """Queues reports of only start..end seconds of the last recording."""
+        perf_data_path = self.last_output_path
+        if not perf_data_path or not perf_data_path.endswith(".data"):
+            self.error_message = "Record perf.data before reporting a time window."
+            self._notify_view()
+            return
+        if end <= start:
+            self.error_message = "The time window must end after it starts."
+            self._notify_view()
+            return
+        if self._generates_reports_inline():
+            self.error_message = "Time window reports need the report queue."
+            self._notify_view()
+            return
+        self.error_message = None
+        # The samples cache always covers the whole recording
+        formats = [fmt for fmt in report_formats or ["html"] if fmt != "samples"]
+        session = self.simpleperf_service.queue_reports(
+            perf_data_path, formats, on_update=lambda _: self._notify_view(), time_window=(start, end)
+        )
+        self.report_sessions.append(session)
+        self._notify_view()
+
     def start_app_profiling(
         self,
         device_serial: str,
@@ -25,6 +100,7 @@ class SimpleperfPresenter:
         duration: int,
         frequency: int,
         output_dir: Optional[str] = None,
+        report_formats: Optional[List[str]] = None,
     ):
         if not device_serial:
             self.error_message = "No device selected."
@@ -36,25 +112,31 @@ class SimpleperfPresenter:
             self._notify_view()
             return
 
-        self.is_profiling = True
-        self.last_output_path = None
-        self.error_message = None
-        self._notify_view()
+        self._start()
 
-        try:
-            path = self.simpleperf_service.profile_app(
-                device_serial=device_serial,
-                app_name=app_name,
-                duration_seconds=duration,
-                frequency=frequency,
-                output_dir=output_dir,
-            )
-            self.last_output_path = path
-        except Exception as e:
-            self.error_message = f"App profiling failed: {str(e)}"
-        finally:
-            self.is_profiling = False
-            self._notify_view()
+        def run(cancel_token: CancellationToken):
+            try:
+                path = self.simpleperf_service.profile_app(
+                    device_serial=device_serial,
+                    app_name=app_name,
+                    duration_seconds=duration,
+                    frequency=frequency,
+                    generate_report=self._generates_reports_inline(),
+                    output_dir=output_dir,
+                    cancel_token=cancel_token,
+                    on_phase=self._on_phase,
+                )
+                self.last_output_path = path
+                if not self._generates_reports_inline():
+                    self._queue_reports(path, report_formats)
+            except CaptureCancelled:
+                self.error_message = "Profiling cancelled."
+            except Exception as e:
+                self.error_message = f"App profiling failed: {str(e)}"
+            finally:
+                self._finish()
+
+        self.jobs.run("simpleperf", [device_serial], run, on_cancelled=self._on_job_cancelled)
 
     def start_system_profiling(
         self,
@@ -62,27 +144,35 @@ class SimpleperfPresenter:
         duration: int,
         frequency: int,
         output_dir: Optional[str] = None,
+        report_formats: Optional[List[str]] = None,
     ):
         if not device_serial:
             self.error_message = "No device selected."
             self._notify_view()
             return
 
-        self.is_profiling = True
-        self.last_output_path = None
-        self.error_message = None
-        self._notify_view()
+        self._start()
 
-        try:
-            path = self.simpleperf_service.profile_system(
-                device_serial=device_serial,
-                duration_seconds=duration,
-                frequency=frequency,
-                output_dir=output_dir,
-            )
-            self.last_output_path = path
-        except Exception as e:
-            self.error_message = f"System profiling failed: {str(e)}"
-        finally:
-            self.is_profiling = False
-            self._notify_view()
+        def run(cancel_token: CancellationToken):
+            try:
+                path = self.simpleperf_service.profile_system(
+                    device_serial=device_serial,
+                    duration_seconds=duration,
+                    frequency=frequency,
+                    generate_report=self._generates_reports_inline(),
+                    output_dir=output_dir,
+                    cancel_token=cancel_token,
+                    on_phase=self._on_phase,
+                    on_progress=self._on_transfer_progress,
+                )
+                self.last_output_path = path
+                if not self._generates_reports_inline():
+                    self._queue_reports(path, report_formats)
+            except CaptureCancelled:
+                self.error_message = "Profiling cancelled."
+            except Exception as e:
+                self.error_message = f"System profiling failed: {str(e)}"
+            finally:
+                self._finish()
+
+        self.jobs.run("simpleperf", [device_serial], run, on_cancelled=self._on_job_cancelled)
@@ -1,10 +1,14 @@
 from typing import List, Optional, Callable
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.presenters.job_runner import JobRunner
+from easy_tracer.services.capture_scheduler import CaptureScheduler
 from easy_tracer.services.capture_service import CaptureService
 
 class SystracePresenter:
-    def __init__(self, capture_service: CaptureService):
+    def __init__(self, capture_service: CaptureService, scheduler: Optional[CaptureScheduler] = None):
         self.capture_service = capture_service
         self.view_update: Optional[Callable[[], None]] = None
+        self.jobs = JobRunner(scheduler, self._notify_view)
 
         # State
         self.categories: List[str] = []
@@ -12,6 +16,7 @@ class SystracePresenter:
         self.is_loading_categories: bool = False
         self.is_loading_ftrace: bool = False
         self.is_capturing: bool = False
+        self.phase: Optional[str] = None
         self.last_output_path: Optional[str] = None
         self.error_message: Optional[str] = None
 
@@ -22,25 +27,30 @@ class SystracePresenter:
         if self.view_update:
             self.view_update()
 
-    def load_categories(self, device_serial: str):
-        """Loads categories for the specific device."""
+    def load_categories(self, device_serial: str, refresh: bool = False):
+        """
+        Loads categories for the specific device. Cached results for the device are
+        shown right away and then re-validated against its build fingerprint.
+        """
         if not device_serial:
             return
 
+        cached = None if refresh else self.capture_service.get_cached_capabilities(device_serial)
         self.is_loading_categories = True
-        self.categories = []
+        self.categories = list(cached.categories) if cached else []
+        self.ftrace_events = list(cached.ftrace_events) if cached else []
         self.error_message = None
         self._notify_view()
 
         try:
-            self.categories = self.capture_service.get_available_categories(device_serial)
+            self.categories = self.capture_service.get_available_categories(device_serial, refresh)
         except Exception as e:
             self.error_message = f"Failed to load categories: {str(e)}"
         finally:
             self.is_loading_categories = False
             self._notify_view()
 
-    def load_ftrace_events(self, device_serial: str):
+    def load_ftrace_events(self, device_serial: str, refresh: bool = False):
         """Loads ftrace events for the specific device."""
         if not device_serial:
             return
@@ -51,13 +61,24 @@ class SystracePresenter:
         self._notify_view()
 
         try:
-            self.ftrace_events = self.capture_service.get_ftrace_events(device_serial)
+            self.ftrace_events = self.capture_service.get_ftrace_events(device_serial, refresh)
         except Exception as e:
             self.error_message = f"Failed to load ftrace events: {str(e)}"
         finally:
             self.is_loading_ftrace = False
             self._notify_view()
 
+    def _on_phase(self, phase: str):
+        self.phase = phase
+        self._notify_view()
+
+    def _on_job_cancelled(self):
+        self.is_capturing = False
+        self.error_message = "Capture cancelled."
+
+    def cancel(self):
+        self.jobs.cancel()
+
     def start_capture(
         self,
         device_serial: str,
@@ -79,23 +100,32 @@ class SystracePresenter:
             return
 
         self.is_capturing = True
+        self.phase = None
         self.last_output_path = None
         self.error_message = None
         self._notify_view()
 
-        try:
-            path = self.capture_service.start_capture(
-                device_serial=device_serial,
-                categories=selected_categories,
-                duration_seconds=duration,
-                buffer_size_kb=buffer_size,
-                app_name=app_name,
-                output_dir=output_dir,
-                create_subfolder=create_subfolder,
-            )
-            self.last_output_path = path
-        except Exception as e:
-            self.error_message = f"Capture failed: {str(e)}"
-        finally:
-            self.is_capturing = False
-            self._notify_view()
+        def run(cancel_token: CancellationToken):
+            try:
+                path = self.capture_service.start_capture(
+                    device_serial=device_serial,
+                    categories=selected_categories,
+                    duration_seconds=duration,
+                    buffer_size_kb=buffer_size,
+                    app_name=app_name,
+                    output_dir=output_dir,
+                    create_subfolder=create_subfolder,
+                    cancel_token=cancel_token,
+                    on_phase=self._on_phase,
+                )
+                self.last_output_path = path
+            except CaptureCancelled:
+                self.error_message = "Capture cancelled."
+            except Exception as e:
+                self.error_message = f"Capture failed: {str(e)}"
+            finally:
+                self.is_capturing = False
+                self.phase = None
+                self._notify_view()
+
+        self.jobs.run("systrace", [device_serial], run, on_cancelled=self._on_job_cancelled)
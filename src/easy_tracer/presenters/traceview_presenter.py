@@ -1,10 +1,14 @@
 from typing import Optional, Callable
+from easy_tracer.framework.cancellation import CancellationToken
+from easy_tracer.presenters.job_runner import JobRunner
+from easy_tracer.services.capture_scheduler import PRIORITY_HIGH, CaptureScheduler
 from easy_tracer.services.traceview_service import TraceviewService
 
 class TraceviewPresenter:
-    def __init__(self, traceview_service: TraceviewService):
+    def __init__(self, traceview_service: TraceviewService, scheduler: Optional[CaptureScheduler] = None):
         self.traceview_service = traceview_service
         self.view_update: Optional[Callable[[], None]] = None
+        self.jobs = JobRunner(scheduler, self._notify_view)
 
         # State
         self.is_tracing: bool = False
@@ -39,20 +43,24 @@ class TraceviewPresenter:
         self.error_message = None
         self.current_package = package_name
 
-        try:
-            self.traceview_service.start_tracing(
-                device_serial=device_serial,
-                package_name=package_name,
-                sampling=sampling,
-                interval=interval
-            )
-            self.is_tracing = True
-            self.last_output_path = None
-        except Exception as e:
-            self.error_message = f"Failed to start tracing: {str(e)}"
-            self.is_tracing = False
-        finally:
-            self._notify_view()
+        def run(_cancel_token: CancellationToken):
+            try:
+                self.traceview_service.start_tracing(
+                    device_serial=device_serial,
+                    package_name=package_name,
+                    sampling=sampling,
+                    interval=interval
+                )
+                self.is_tracing = True
+                self.last_output_path = None
+            except Exception as e:
+                self.error_message = f"Failed to start tracing: {str(e)}"
+                self.is_tracing = False
+            finally:
+                self._notify_view()
+
+        # Start/stop are short commands; run them ahead of queued captures
+        self.jobs.run("traceview start", [device_serial], run, priority=PRIORITY_HIGH)
 
     def stop_tracing(self, device_serial: str, output_dir: Optional[str] = None, create_subfolder: bool = False):
         if not device_serial:
@@ -67,17 +75,20 @@ class TraceviewPresenter:
             self._notify_view()
             return
 
-        try:
-            path = self.traceview_service.stop_tracing(
-                device_serial=device_serial,
-                package_name=self.current_package,
-                output_dir=output_dir,
-                create_subfolder=create_subfolder,
-            )
-            self.last_output_path = path
-        except Exception as e:
-             self.error_message = f"Failed to stop tracing: {str(e)}"
-        finally:
-            self.is_tracing = False
-            self.current_package = None
-            self._notify_view()
+        def run(_cancel_token: CancellationToken):
+            try:
+                path = self.traceview_service.stop_tracing(
+                    device_serial=device_serial,
+                    package_name=self.current_package,
+                    output_dir=output_dir,
+                    create_subfolder=create_subfolder,
+                )
+                self.last_output_path = path
+            except Exception as e:
+                 self.error_message = f"Failed to stop tracing: {str(e)}"
+            finally:
+                self.is_tracing = False
+                self.current_package = None
+                self._notify_view()
+
+        self.jobs.run("traceview stop", [device_serial], run, priority=PRIORITY_HIGH)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Optional
+from easy_tracer.models.device import DeviceCapabilities
+
+
+class CapabilityCache:
+    """
+    On-disk cache of what each device supports (atrace categories, ftrace events,
+    SDK level, ABI, tracing path). Entries are keyed by serial and only valid for
+    the build fingerprint they were probed on, so an OTA update invalidates them.
+    """
+
+    def __init__(self, cache_path: Path, ttl_seconds: float = 7 * 24 * 3600):
+        self.cache_path = Path(cache_path)
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, DeviceCapabilities] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            for serial, entry in data.get("devices", {}).items():
+                self._entries[serial] = DeviceCapabilities(**entry)
+        except (json.JSONDecodeError, OSError, TypeError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        payload = {"devices": {serial: asdict(caps) for serial, caps in self._entries.items()}}
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp_path, self.cache_path)
+
+    def _is_fresh(self, caps: DeviceCapabilities) -> bool:
+        return time.time() - caps.updated_at < self.ttl_seconds
+
+    def get(self, serial: str, fingerprint: Optional[str] = None) -> Optional[DeviceCapabilities]:
+        """
+        Returns the cached entry for the device. When a fingerprint is given the entry
+        must match it and still be within the TTL; without one the last known entry is
+        returned as-is so the UI can show it before the device has been queried.
+        """
+        with self._lock:
+            caps = self._entries.get(serial)
+        if caps is None:
+            return None
+        if fingerprint is None:
+            return caps
+        if caps.fingerprint != fingerprint or not self._is_fresh(caps):
+            return None
+        return caps
+
+    def put(self, caps: DeviceCapabilities) -> None:
+        caps.updated_at = time.time()
+        with self._lock:
+            self._entries[caps.serial] = caps
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def invalidate(self, serial: Optional[str] = None) -> None:
+        """Drops one device's entry, or every entry when serial is None."""
+        with self._lock:
+            if serial is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(serial, None)
+            try:
+                self._save()
+            except OSError:
+                pass
@@ -0,0 +1,237 @@
+"""Capture lifecycle stages and the pipeline that overlaps them across tools.
+
+Every tool goes through the same stages:
+
+    start -> (recording) -> stop -> collect -> post_process
+
+The pipeline runs the recordings of all tools side by side, then pulls the
+artifacts one at a time (they share one adb link, so the first one lands
+sooner than if all pulls were interleaved) and post-processes each artifact
+as soon as it has landed, while the next one is still being pulled. A combo
+capture then takes about as long as its slowest tool instead of the sum of
+every tool's pull and report time.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from easy_tracer.framework.cancellation import CancellationToken
+from easy_tracer.services.capture_service import CaptureService
+from easy_tracer.services.perfetto_service import PerfettoService
+from easy_tracer.services.simpleperf_service import SimpleperfService
+from easy_tracer.services.traceview_service import TraceviewService
+
+DEFAULT_SYSTRACE_CATEGORIES = ["sched", "gfx", "view", "wm", "am"]
+
+
+@dataclass
+class CaptureSession:
+    device_serial: str
+    duration: int
+    output_dir: Optional[str] = None
+    configs: Dict[str, Any] = field(default_factory=dict)
+    cancel_token: Optional[CancellationToken] = None
+    # Per-tool values handed from one stage to the next, keyed by tool name
+    state: Dict[str, Any] = field(default_factory=dict)
+    # Seconds spent in each stage, keyed by tool name then stage
+    timings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def package_name(self) -> Optional[str]:
+        return self.configs.get("package_name")
+
+
+class CaptureTool(ABC):
+    """
+    One capture tool split into lifecycle stages. Tools whose recording is a
+    single blocking call do all of it in start(); tools with separate start
+    and stop commands set blocking to False and the pipeline calls stop()
+    once the capture duration has elapsed.
+    """
+
+    name = ""
+    blocking = True
+
+    @abstractmethod
+    def start(self, session: CaptureSession) -> None:
+        """Starts recording; blocking tools also finish recording here."""
+
+    def stop(self, session: CaptureSession) -> None:
+        pass
+
+    def collect(self, session: CaptureSession) -> str:
+        """Brings the artifact to the host and returns its local path."""
+        return session.state[self.name]
+
+    def post_process(self, session: CaptureSession, artifact: str) -> str:
+        """Turns the artifact into the final output; returns its path."""
+        return artifact
+
+
+class SystraceTool(CaptureTool):
+    # run_systrace records, pulls and writes the HTML in one call
+    name = "systrace"
+
+    def __init__(self, service: CaptureService):
+        self.service = service
+
+    def start(self, session: CaptureSession) -> None:
+        session.state[self.name] = self.service.start_capture(
+            session.device_serial,
+            categories=session.configs.get("systrace_categories") or DEFAULT_SYSTRACE_CATEGORIES,
+            duration_seconds=session.duration,
+            buffer_size_kb=session.configs.get("systrace_buffer", 16384),
+            app_name=session.package_name,
+            output_dir=session.output_dir,
+            cancel_token=session.cancel_token,
+        )
+
+
+class PerfettoTool(CaptureTool):
+    # The trace is streamed to the host while perfetto finishes, so recording includes the pull
+    name = "perfetto"
+
+    def __init__(self, service: PerfettoService):
+        self.service = service
+
+    def start(self, session: CaptureSession) -> None:
+        session.state[self.name] = self.service.record_trace(
+            session.device_serial,
+            duration_seconds=session.duration,
+            buffer_size_kb=session.configs.get("perfetto_buffer", 32768),
+            categories=session.configs.get("perfetto_categories"),
+            output_dir=session.output_dir,
+            cancel_token=session.cancel_token,
+        )
+
+
+class SimpleperfTool(CaptureTool):
+    name = "simpleperf"
+
+    def __init__(self, service: SimpleperfService):
+        self.service = service
+
+    def start(self, session: CaptureSession) -> None:
+        frequency = session.configs.get("simpleperf_freq", 4000)
+        if session.package_name:
+            session_dir = self.service.new_session_dir("simpleperf", session.output_dir)
+            # app_profiler pulls perf.data itself
+            session.state[self.name] = self.service.record_app(
+                session.device_serial,
+                session.package_name,
+                session_dir,
+                session.duration,
+                frequency,
+                session.cancel_token,
+            )
+        else:
+            session.state[self.name] = None
+            self.service.record_system(
+                session.device_serial, session.duration, frequency, session.cancel_token
+            )
+
+    def collect(self, session: CaptureSession) -> str:
+        if session.state[self.name]:
+            return session.state[self.name]
+        session_dir = self.service.new_session_dir("simpleperf_system", session.output_dir)
+        return self.service.collect_system(
+            session.device_serial, session_dir, cancel_token=session.cancel_token
+        )
+
+    def post_process(self, session: CaptureSession, artifact: str) -> str:
+        return self.service.generate_report(artifact, session.cancel_token)
+
+
+class TraceviewTool(CaptureTool):
+    name = "traceview"
+    blocking = False
+
+    def __init__(self, service: TraceviewService):
+        self.service = service
+
+    def start(self, session: CaptureSession) -> None:
+        if not session.package_name:
+            raise ValueError("Package name required for Traceview")
+        self.service.start_tracing(
+            session.device_serial,
+            session.package_name,
+            session.configs.get("traceview_sampling", False),
+            session.configs.get("traceview_interval", 1000),
+        )
+
+    def stop(self, session: CaptureSession) -> None:
+        self.service.stop_profiling(session.device_serial, session.package_name)
+
+    def collect(self, session: CaptureSession) -> str:
+        return self.service.collect_trace(
+            session.device_serial, session.package_name, output_dir=session.output_dir
+        )
+
+
+class CapturePipeline:
+    """Runs a set of tools through their stages, overlapping stages across tools."""
+
+    def __init__(self, tools: List[CaptureTool], max_post_workers: int = 2):
+        self.tools = tools
+        self.max_post_workers = max_post_workers
+
+    def run(self, session: CaptureSession) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Returns (results, errors) per tool name; one failing tool doesn't stop the others."""
+        results: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        if not self.tools:
+            return results, errors
+        collect_lock = threading.Lock()
+        # Non-blocking tools are started first so they cover the other tools' recordings
+        tools = sorted(self.tools, key=lambda t: t.blocking)
+
+        def run_tool(tool: CaptureTool) -> Optional[Future]:
+            try:
+                self._timed(session, tool, "start", tool.start, session)
+                if not tool.blocking:
+                    # Keep recording for the capture duration, or until cancelled
+                    if session.cancel_token is not None:
+                        session.cancel_token.wait(session.duration)
+                    else:
+                        time.sleep(session.duration)
+                    self._timed(session, tool, "stop", tool.stop, session)
+                # One pull at a time: they share the device's link
+                with collect_lock:
+                    if session.cancel_token is not None:
+                        session.cancel_token.raise_if_cancelled()
+                    artifact = self._timed(session, tool, "collect", tool.collect, session)
+            except Exception as e:
+                errors[tool.name] = str(e)
+                return None
+            return post_pool.submit(
+                self._timed, session, tool, "post_process", tool.post_process, session, artifact
+            )
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_post_workers, thread_name_prefix="capture-post"
+        ) as post_pool:
+            with ThreadPoolExecutor(
+                max_workers=len(tools), thread_name_prefix="capture-record"
+            ) as record_pool:
+                pending = list(zip(tools, record_pool.map(run_tool, tools)))
+            for tool, future in pending:
+                if future is None:
+                    continue
+                try:
+                    results[tool.name] = future.result()
+                except Exception as e:
+                    errors[tool.name] = str(e)
+        return results, errors
+
+    @staticmethod
+    def _timed(
+        session: CaptureSession, tool: CaptureTool, stage: str, fn: Callable[..., Any], *args: Any
+    ) -> Any:
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            session.timings.setdefault(tool.name, {})[stage] = round(time.monotonic() - started, 3)
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+
+@dataclass(eq=False)
+class CaptureJob:
+    job_id: int
+    name: str
+    devices: List[str]
+    priority: int
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    on_state_change: Optional[Callable[["CaptureJob"], None]] = None
+    state: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Cancelled by CaptureScheduler.cancel(); running jobs pass it down to the adapters
+    cancel_token: CancellationToken = field(default_factory=CancellationToken)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self.cancel_token.is_cancelled
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class CaptureScheduler:
+    """
+    Runs capture jobs with at most max_concurrent_jobs at a time and at most one
+    job per device, so two panels can't start conflicting atrace/perfetto
+    sessions on the same phone. Queued jobs start in priority order (then
+    submission order); a job waiting for a busy device doesn't hold back jobs
+    for other devices. Jobs without devices only count toward the global limit.
+    """
+
+    def __init__(self, max_concurrent_jobs: int = 4):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int, CaptureJob]] = []
+        self._running: Set[CaptureJob] = set()
+        self._busy_devices: Set[str] = set()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        name: str = "",
+        devices: Optional[List[str]] = None,
+        priority: int = PRIORITY_NORMAL,
+        on_state_change: Optional[Callable[[CaptureJob], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        **kwargs: Any,
+    ) -> CaptureJob:
+        """
+        Queues fn(*args, **kwargs) to run once every device in devices is free.
+        on_state_change is called (from a scheduler thread) on every state change.
+        cancel_token, if given, becomes the job's token so fn can already hold it.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Capture scheduler has been shut down")
+            job = CaptureJob(
+                job_id=next(self._ids),
+                name=name or getattr(fn, "__name__", "job"),
+                devices=[d for d in devices or [] if d],
+                priority=priority,
+                fn=fn,
+                args=args,
+                kwargs=kwargs,
+                on_state_change=on_state_change,
+                cancel_token=cancel_token or CancellationToken(),
+            )
+            heapq.heappush(self._queue, (-priority, job.job_id, job))
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job: CaptureJob) -> bool:
+        """
+        Cancels a queued job right away. A running job only gets its cancel_token
+        cancelled and finishes when its function notices. Returns False if the job has
+        already finished.
+        """
+        with self._lock:
+            if job.is_finished:
+                return False
+            # Callbacks registered on the token run on their own thread
+            job.cancel_token.cancel()
+            if job.state != QUEUED:
+                return True
+            # Lazily removed from the heap by _dispatch()
+            job.state = CANCELLED
+            job.finished_at = time.time()
+        job._done.set()
+        self._notify(job)
+        return True
+
+    def jobs(self) -> List[CaptureJob]:
+        """Returns running jobs followed by queued jobs in the order they will start."""
+        with self._lock:
+            queued = [job for _, _, job in sorted(self._queue) if job.state == QUEUED]
+            running = sorted(self._running, key=lambda j: j.job_id)
+        return running + queued
+
+    def is_device_busy(self, device_serial: str) -> bool:
+        with self._lock:
+            return device_serial in self._busy_devices
+
+    def set_max_concurrent_jobs(self, value: int) -> None:
+        with self._lock:
+            self.max_concurrent_jobs = max(1, value)
+        self._dispatch()
+
+    def shutdown(self) -> None:
+        """Cancels every queued job and rejects new ones; running jobs are asked to stop."""
+        with self._lock:
+            self._closed = True
+            pending = [job for _, _, job in self._queue] + list(self._running)
+        for job in pending:
+            self.cancel(job)
+
+    def _dispatch(self) -> None:
+        started: List[CaptureJob] = []
+        with self._lock:
+            blocked: List[Tuple[int, int, CaptureJob]] = []
+            while self._queue and len(self._running) < self.max_concurrent_jobs:
+                entry = heapq.heappop(self._queue)
+                job = entry[2]
+                if job.state != QUEUED:
+                    continue
+                if self._busy_devices.intersection(job.devices):
+                    blocked.append(entry)
+                    continue
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._running.add(job)
+                self._busy_devices.update(job.devices)
+                started.append(job)
+            for entry in blocked:
+                heapq.heappush(self._queue, entry)
+
+        for job in started:
+            self._notify(job)
+            threading.Thread(target=self._run, args=(job,), name=f"capture-job-{job.job_id}", daemon=True).start()
+
+    def _run(self, job: CaptureJob) -> None:
+        try:
+            job.result = job.fn(*job.args, **job.kwargs)
+            state = DONE
+        except Exception as e:
+            job.error = str(e)
+            state = CANCELLED if job.cancel_requested or isinstance(e, CaptureCancelled) else FAILED
+        with self._lock:
+            job.state = state
+            job.finished_at = time.time()
+            self._running.discard(job)
+            self._busy_devices.difference_update(job.devices)
+        job._done.set()
+        self._notify(job)
+        self._dispatch()
+
+    @staticmethod
+    def _notify(job: CaptureJob) -> None:
+        if job.on_state_change:
+            try:
+                job.on_state_change(job)
+            except Exception:
+                pass
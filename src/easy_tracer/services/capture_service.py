@@ -1,24 +1,87 @@
 import os
 import time
 from typing import List, Optional
+from easy_tracer.framework.cancellation import (
+    PHASE_RECORDING,
+    PHASE_STARTING,
+    CancellationToken,
+    PhaseCallback,
+)
 from easy_tracer.framework.systrace_adapter import SystraceAdapter
+from easy_tracer.models.device import DeviceCapabilities
+from easy_tracer.services.capability_cache import CapabilityCache
 
 class CaptureService:
-    def __init__(self, systrace_adapter: SystraceAdapter, output_dir: str = "output"):
+    def __init__(
+        self,
+        systrace_adapter: SystraceAdapter,
+        output_dir: str = "output",
+        capability_cache: Optional[CapabilityCache] = None,
+    ):
         self.systrace_adapter = systrace_adapter
         self.output_dir = output_dir
+        self.capability_cache = capability_cache
 
         # Ensure output directory exists
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-    def get_available_categories(self, device_serial: str) -> List[str]:
+    def get_cached_capabilities(self, device_serial: str) -> Optional[DeviceCapabilities]:
+        """Returns the last known capabilities of the device without talking to it."""
+        if self.capability_cache is None:
+            return None
+        return self.capability_cache.get(device_serial)
+
+    def get_capabilities(self, device_serial: str, refresh: bool = False) -> DeviceCapabilities:
+        """
+        Returns the device's capabilities, probing the device only when the cache has
+        no fresh entry for its current build fingerprint (or refresh is requested).
+        """
+        caps = self._device_entry(device_serial)
+        if caps.categories and not refresh:
+            return caps
+        caps.categories = self.systrace_adapter.get_categories(device_serial)
+        if self.capability_cache is not None:
+            self.capability_cache.put(caps)
+        return caps
+
+    def _device_entry(self, device_serial: str) -> DeviceCapabilities:
+        """
+        Returns the cached entry for the device's current build, or a new one holding
+        only the device info; the slower probes (categories, ftrace events) are left
+        for the caller to fill in or refresh.
+        """
+        info = self.systrace_adapter.get_device_info(device_serial)
+        if self.capability_cache is not None:
+            cached = self.capability_cache.get(device_serial, info["fingerprint"])
+            if cached is not None:
+                return cached
+        return DeviceCapabilities(
+            serial=device_serial,
+            fingerprint=info["fingerprint"],
+            sdk_level=int(info["sdk"]) if info["sdk"].isdigit() else 0,
+            abi=info["abi"],
+            tracing_path=info["tracing_path"],
+        )
+
+    def get_available_categories(self, device_serial: str, refresh: bool = False) -> List[str]:
         """Returns available systrace categories for the device."""
-        return self.systrace_adapter.get_categories(device_serial)
+        if self.capability_cache is None:
+            return self.systrace_adapter.get_categories(device_serial)
+        return self.get_capabilities(device_serial, refresh).categories
 
-    def get_ftrace_events(self, device_serial: str) -> List[str]:
+    def get_ftrace_events(self, device_serial: str, refresh: bool = False) -> List[str]:
         """Returns available ftrace events for the device."""
-        return self.systrace_adapter.get_ftrace_events(device_serial)
+        if self.capability_cache is None:
+            return self.systrace_adapter.get_ftrace_events(device_serial)
+        caps = self._device_entry(device_serial)
+        if caps.ftrace_events and not refresh:
+            return caps.ftrace_events
+        caps.ftrace_events = self.systrace_adapter.get_ftrace_events(
+            device_serial, caps.tracing_path
+        )
+        self.capability_cache.put(caps)
+        return caps.ftrace_events
 
     def start_capture(
         self,
@@ -29,11 +92,15 @@ class CaptureService:
         app_name: Optional[str] = None,
         output_dir: Optional[str] = None,
         create_subfolder: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
     ) -> str:
         """
         Starts a systrace capture.
         Returns the path to the generated output file.
         """
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_STARTING)
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"trace_{timestamp}.html"
         base_dir = output_dir or self.output_dir
@@ -46,13 +113,16 @@ class CaptureService:
         # Ensure absolute path for the adapter
         output_path = os.path.abspath(output_path)
 
+        # run_systrace records, stops and writes the HTML in one call
+        phase(PHASE_RECORDING)
         self.systrace_adapter.run_systrace(
             output_file=output_path,
             time_seconds=duration_seconds,
             device_serial=device_serial,
             categories=categories,
             buffer_size_kb=buffer_size_kb,
-            app_name=app_name
+            app_name=app_name,
+            cancel_token=cancel_token,
         )
 
         return output_path
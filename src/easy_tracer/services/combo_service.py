@@ -1,11 +1,62 @@
-import threading
+import json
+import re
 import os
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from easy_tracer.framework.cancellation import CancellationToken
+from easy_tracer.services.capture_pipeline import (
+    CapturePipeline,
+    CaptureSession,
+    PerfettoTool,
+    SimpleperfTool,
+    SystraceTool,
+    TraceviewTool,
+)
 from easy_tracer.services.capture_service import CaptureService
 from easy_tracer.services.simpleperf_service import SimpleperfService
 from easy_tracer.services.perfetto_service import PerfettoService
 from easy_tracer.services.traceview_service import TraceviewService
 
+@dataclass
+class DeviceCaptureResult:
+    serial: str
+    output_dir: str
+    results: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    # Seconds per tool and lifecycle stage, see CapturePipeline
+    timings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+    @property
+    def status(self) -> str:
+        if not self.errors:
+            return "ok"
+        return "partial" if self.results else "failed"
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return self.finished_at - self.started_at
+
+
+@dataclass
+class FanoutResult:
+    batch_dir: str
+    manifest_path: str
+    devices: List[DeviceCaptureResult] = field(default_factory=list)
+
+    @property
+    def failed(self) -> List[DeviceCaptureResult]:
+        return [d for d in self.devices if d.status != "ok"]
+
+
+def _safe_dir_name(serial: str) -> str:
+    # Network serials look like 192.168.1.20:5555, which is not a valid Windows path
+    return re.sub(r"[^A-Za-z0-9._-]", "_", serial)
+
+
 class ComboService:
     def __init__(
         self,
@@ -29,121 +80,116 @@ class ComboService:
         device_serial: str,
         duration: int,
         enabled_tools: Dict[str, bool],
-        configs: Dict[str, Any]
+        configs: Dict[str, Any],
+        output_dir: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> Dict[str, str]:
         """
-        Runs selected tools in parallel.
+        Runs selected tools in parallel, overlapping one tool's pull and
+        report generation with the others' recording.
         Returns a dictionary of tool name -> output file path.
         """
-        results = {}
-        errors = {}
-        threads = []
-
-        package_name = configs.get('package_name')
-
-        # --- 1. Start Non-Blocking / Init ---
-
-        # Traceview start (if enabled and package provided)
-        if enabled_tools.get('traceview'):
-            if not package_name:
-                errors['traceview'] = "Package name required for Traceview"
-            else:
-                try:
-                    self.traceview.start_tracing(
-                        device_serial,
-                        package_name,
-                        configs.get('traceview_sampling', False),
-                        configs.get('traceview_interval', 1000)
-                    )
-                except Exception as e:
-                    errors['traceview'] = str(e)
-
-        # --- 2. Define Worker Functions for Blocking Tools ---
-
-        def run_systrace():
-            try:
-                # Default categories if not provided
-                cats = configs.get('systrace_categories') or ["sched", "gfx", "view", "wm", "am"]
-                path = self.systrace.start_capture(
-                    device_serial,
-                    categories=cats,
-                    duration_seconds=duration,
-                    buffer_size_kb=configs.get('systrace_buffer', 16384),
-                    app_name=package_name
-                )
-                results['systrace'] = path
-            except Exception as e:
-                errors['systrace'] = str(e)
-
-        def run_perfetto():
-            try:
-                path = self.perfetto.record_trace(
-                    device_serial,
-                    duration_seconds=duration,
-                    buffer_size_kb=configs.get('perfetto_buffer', 32768),
-                    categories=configs.get('perfetto_categories')
-                )
-                results['perfetto'] = path
-            except Exception as e:
-                errors['perfetto'] = str(e)
-
-        def run_simpleperf():
-            try:
-                if package_name:
-                    path = self.simpleperf.profile_app(
-                        device_serial,
-                        package_name,
-                        duration_seconds=duration,
-                        frequency=configs.get('simpleperf_freq', 4000)
-                    )
-                else:
-                    path = self.simpleperf.profile_system(
-                        device_serial,
-                        duration_seconds=duration,
-                        frequency=configs.get('simpleperf_freq', 4000)
-                    )
-                results['simpleperf'] = path
-            except Exception as e:
-                errors['simpleperf'] = str(e)
-
-        # --- 3. Start Threads ---
-
-        if enabled_tools.get('systrace'):
-            t = threading.Thread(target=run_systrace)
-            t.start()
-            threads.append(t)
-
-        if enabled_tools.get('perfetto'):
-            t = threading.Thread(target=run_perfetto)
-            t.start()
-            threads.append(t)
-
-        if enabled_tools.get('simpleperf'):
-            t = threading.Thread(target=run_simpleperf)
-            t.start()
-            threads.append(t)
-
-        # --- 4. Wait for Blocking Tools ---
-        for t in threads:
-            t.join()
-
-        # --- 5. Stop Traceview ---
-        if enabled_tools.get('traceview') and 'traceview' not in errors:
-            try:
-                # We stop traceview after the duration (blocking tools finished)
-                path = self.traceview.stop_tracing(device_serial, package_name)
-                results['traceview'] = path
-            except Exception as e:
-                errors['traceview'] = str(e)
-
+        results, errors = self._capture_device(
+            device_serial, duration, enabled_tools, configs, output_dir, cancel_token
+        )
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         if errors:
-            # We return partial results but raise an error with details
+            # Partial results are not returned; the error names every failed tool
             error_msg = "; ".join([f"{k}: {v}" for k, v in errors.items()])
-            # If we have at least one success, we might want to return it,
-            # but usually an exception is better to notify UI.
-            # Let's attach results to the exception or just return what we have and let presenter handle errors?
-            # For simplicity, let's return results and put errors in a special key or raise if critical.
-            # Raising Runtime Error is easiest for now.
             raise RuntimeError(f"Combo capture errors: {error_msg}")
 
         return results
+
+    def start_fanout_capture(
+        self,
+        device_serials: List[str],
+        duration: int,
+        enabled_tools: Dict[str, bool],
+        configs: Dict[str, Any],
+        max_parallel_devices: int = 4,
+        on_device_done: Optional[Callable[[DeviceCaptureResult], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> FanoutResult:
+        """
+        Runs the same combo capture on several devices at once, at most
+        max_parallel_devices at a time. Every device writes into its own folder
+        under a batch folder, and a failing device is recorded in the manifest
+        instead of failing the batch. on_device_done is called from a worker
+        thread as each device finishes. Devices that haven't started when
+        cancel_token is cancelled are skipped and reported as cancelled.
+        """
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        batch_dir = os.path.abspath(os.path.join(self.output_dir, f"combo_batch_{timestamp}"))
+        os.makedirs(batch_dir, exist_ok=True)
+
+        def run_device(serial: str) -> DeviceCaptureResult:
+            device = DeviceCaptureResult(serial, os.path.join(batch_dir, _safe_dir_name(serial)))
+            device.started_at = time.time()
+            try:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                os.makedirs(device.output_dir, exist_ok=True)
+                device.results, device.errors = self._capture_device(
+                    serial,
+                    duration,
+                    enabled_tools,
+                    configs,
+                    device.output_dir,
+                    cancel_token,
+                    device.timings,
+                )
+            except Exception as e:
+                device.errors["device"] = str(e)
+            device.finished_at = time.time()
+            if on_device_done:
+                on_device_done(device)
+            return device
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_parallel_devices, len(device_serials) or 1)),
+            thread_name_prefix="combo-device",
+        ) as pool:
+            devices = list(pool.map(run_device, device_serials))
+
+        manifest_path = os.path.join(batch_dir, "manifest.json")
+        manifest = {
+            "created": timestamp,
+            "duration_seconds": duration,
+            "tools": [name for name, enabled in enabled_tools.items() if enabled],
+            "configs": configs,
+            "devices": [
+                dict(asdict(d), status=d.status, elapsed_seconds=round(d.elapsed_seconds, 3))
+                for d in devices
+            ],
+        }
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        return FanoutResult(batch_dir, manifest_path, devices)
+
+    def _capture_device(
+        self,
+        device_serial: str,
+        duration: int,
+        enabled_tools: Dict[str, bool],
+        configs: Dict[str, Any],
+        output_dir: Optional[str],
+        cancel_token: Optional[CancellationToken] = None,
+        timings: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Runs the enabled tools on one device through a CapturePipeline and
+        returns (results, errors) per tool. Per-stage timings go into timings.
+        """
+        available = {
+            "traceview": lambda: TraceviewTool(self.traceview),
+            "systrace": lambda: SystraceTool(self.systrace),
+            "perfetto": lambda: PerfettoTool(self.perfetto),
+            "simpleperf": lambda: SimpleperfTool(self.simpleperf),
+        }
+        tools = [make() for name, make in available.items() if enabled_tools.get(name)]
+        session = CaptureSession(device_serial, duration, output_dir, configs, cancel_token)
+        results, errors = CapturePipeline(tools).run(session)
+        if timings is not None:
+            timings.update(session.timings)
+        return results, errors
@@ -1,10 +1,39 @@
-from typing import List
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
 from easy_tracer.models.device import Device
 from easy_tracer.framework.adb_adapter import AdbAdapter
 
+
+@dataclass
+class DeviceEvent:
+    kind: str  # 'added', 'removed' or 'changed'
+    device: Device
+
+
+def diff_devices(old: List[Device], new: List[Device]) -> List[DeviceEvent]:
+    """Returns the add/remove/state-change events between two device lists."""
+    old_by_serial: Dict[str, Device] = {d.serial: d for d in old}
+    new_by_serial: Dict[str, Device] = {d.serial: d for d in new}
+    events = []
+    for serial, device in new_by_serial.items():
+        previous = old_by_serial.get(serial)
+        if previous is None:
+            events.append(DeviceEvent("added", device))
+        elif previous != device:
+            events.append(DeviceEvent("changed", device))
+    for serial, device in old_by_serial.items():
+        if serial not in new_by_serial:
+            events.append(DeviceEvent("removed", device))
+    return events
+
+
 class DeviceService:
     def __init__(self, adb_adapter: AdbAdapter):
         self.adb_adapter = adb_adapter
+        self._tracked: Optional[List[Device]] = None
+        self._tracker_thread: Optional[threading.Thread] = None
+        self._tracker_stop = threading.Event()
 
     def get_connected_devices(self) -> List[Device]:
         """Returns a list of connected devices."""
@@ -13,3 +42,40 @@ class DeviceService:
     def is_adb_available(self) -> bool:
         """Checks if ADB is installed and available."""
         return self.adb_adapter.is_available()
+
+    def start_tracking(
+        self, on_change: Callable[[List[Device], List[DeviceEvent]], None]
+    ) -> None:
+        """
+        Starts a background tracker that calls on_change(devices, events) whenever a
+        device is plugged in, removed or changes state. The callback runs on the
+        tracker thread.
+        """
+        if self._tracker_thread and self._tracker_thread.is_alive():
+            return
+        self._tracker_stop.clear()
+        self._tracked = None
+
+        def on_devices(devices: List[Device]) -> None:
+            first = self._tracked is None
+            events = diff_devices(self._tracked or [], devices)
+            self._tracked = devices
+            # Always report the first snapshot so an empty device list is shown too
+            if events or first:
+                on_change(devices, events)
+
+        self._tracker_thread = threading.Thread(
+            target=self.adb_adapter.track_devices,
+            args=(on_devices, self._tracker_stop),
+            name="adb-device-tracker",
+            daemon=True,
+        )
+        self._tracker_thread.start()
+
+    def stop_tracking(self) -> None:
+        """Stops the background device tracker."""
+        self._tracker_stop.set()
+        self.adb_adapter.stop_tracking()
+        if self._tracker_thread:
+            self._tracker_thread.join(timeout=2)
+            self._tracker_thread = None
@@ -1,7 +1,10 @@
 import os
 import time
-from typing import List
-from easy_tracer.framework.perfetto_adapter import PerfettoAdapter
+from typing import Callable, List, Optional
+from easy_tracer.framework.cancellation import CancellationToken, PhaseCallback
+from easy_tracer.framework.perfetto_adapter import DEFAULT_CATEGORIES, PerfettoAdapter
+from easy_tracer.framework.perfetto_config import build_trace_config
+from easy_tracer.framework.perfetto_summary import TraceSummary, summarize_trace
 
 class PerfettoService:
     def __init__(self, perfetto_adapter: PerfettoAdapter, output_dir: str = "output"):
@@ -20,9 +23,28 @@ class PerfettoService:
         categories: List[str] = None,
         output_dir: str | None = None,
         create_subfolder: bool = False,
+        stream_output: bool = True,
+        on_progress: Optional[Callable[[int], None]] = None,
+        long_mode: bool = False,
+        file_write_period_ms: int = 2500,
+        flush_period_ms: int = 30000,
+        data_sources: Optional[List[str]] = None,
+        ftrace_events: Optional[List[str]] = None,
+        atrace_apps: Optional[List[str]] = None,
+        fill_policy: str = "RING_BUFFER",
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
+        stop_token: Optional[CancellationToken] = None,
     ) -> str:
         """
-        Records a Perfetto trace.
+        Records a Perfetto trace. By default the trace is streamed from perfetto's
+        stdout straight into the output file, without a temp file on the device.
+        In long mode perfetto writes into a file on the device every
+        file_write_period_ms and the host drains it while recording.
+        data_sources, ftrace_events, atrace_apps and fill_policy go into the
+        TraceConfig; by default ftrace and process_stats are recorded.
+        Cancelling cancel_token stops perfetto and discards the trace; in long
+        mode cancelling stop_token stops it early and keeps the trace.
         Returns the path to the output file.
         """
         timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -37,12 +59,49 @@ class PerfettoService:
         # Ensure absolute path
         output_path = os.path.abspath(output_path)
 
+        trace_config = build_trace_config(
+            duration_seconds,
+            buffer_size_kb,
+            categories if categories is not None else DEFAULT_CATEGORIES,
+            data_sources=data_sources,
+            ftrace_events=ftrace_events,
+            atrace_apps=atrace_apps,
+            fill_policy=fill_policy,
+            write_into_file=long_mode,
+            file_write_period_ms=file_write_period_ms,
+            flush_period_ms=flush_period_ms,
+        )
+
+        if long_mode:
+            self.perfetto_adapter.record_long_trace(
+                device_serial=device_serial,
+                output_path=output_path,
+                on_progress=on_progress,
+                trace_config=trace_config,
+                cancel_token=cancel_token,
+                on_phase=on_phase,
+                stop_token=stop_token,
+            )
+            return output_path
+
         self.perfetto_adapter.record_trace(
             device_serial=device_serial,
             output_path=output_path,
             duration_seconds=duration_seconds,
             buffer_size_kb=buffer_size_kb,
-            categories=categories
+            categories=categories,
+            stream_output=stream_output,
+            on_progress=on_progress,
+            trace_config=trace_config,
+            cancel_token=cancel_token,
+            on_phase=on_phase,
         )
 
         return output_path
+
+    def summarize_trace(self, trace_path: str) -> TraceSummary:
+        """
+        Returns packet counts, buffer overflows and ftrace losses of a recorded
+        trace, scanned without decoding the trace data.
+        """
+        return summarize_trace(trace_path)
@@ -0,0 +1,140 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.framework.simpleperf_adapter import SimpleperfAdapter
+from easy_tracer.services.capture_scheduler import CANCELLED, DONE, FAILED, QUEUED, RUNNING
+
+
+@dataclass(eq=False)
+class ReportSession:
+    session_id: int
+    perf_data_path: str
+    formats: List[str]
+    # Per-format state (QUEUED/RUNNING/DONE/FAILED/CANCELLED), output path and error
+    status: Dict[str, str] = field(default_factory=dict)
+    outputs: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancel_token: CancellationToken = field(default_factory=CancellationToken)
+    # (start, end) seconds from the first sample when only part of perf.data is reported
+    time_window: Optional[Tuple[float, float]] = None
+
+    @property
+    def state(self) -> str:
+        """Overall state: running until every format has finished, failed if any did."""
+        states = set(self.status.values())
+        if states & {QUEUED, RUNNING}:
+            return RUNNING if RUNNING in states else QUEUED
+        if FAILED in states:
+            return FAILED
+        if CANCELLED in states:
+            return CANCELLED
+        return DONE
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+
+class ReportQueue:
+    """
+    Generates simpleperf reports off the capture path, so a new capture never
+    waits for the previous session's reports. Each session is one task that
+    produces all of its formats in a single pass over perf.data; sessions run
+    side by side in the adapter's report host worker processes, one per core
+    by default.
+    """
+
+    def __init__(self, simpleperf_adapter: SimpleperfAdapter, max_workers: Optional[int] = None):
+        self.simpleperf_adapter = simpleperf_adapter
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 2, thread_name_prefix="simpleperf-report"
+        )
+        self._lock = threading.Lock()
+        self._sessions: List[ReportSession] = []
+        self._ids = itertools.count(1)
+
+    def submit(
+        self,
+        perf_data_path: str,
+        formats: List[str],
+        on_update: Optional[Callable[[ReportSession], None]] = None,
+        time_window: Optional[Tuple[float, float]] = None,
+    ) -> ReportSession:
+        """
+        Queues reports in every format for perf_data_path and returns the session
+        at once. time_window limits them to (start, end) seconds of the recording.
+        """
+        for fmt in formats:
+            if fmt not in self.simpleperf_adapter.REPORT_FORMATS:
+                raise ValueError(f"Unknown report format: {fmt}")
+        session = ReportSession(
+            next(self._ids), perf_data_path, list(formats), time_window=time_window
+        )
+        session.status = {fmt: QUEUED for fmt in formats}
+        with self._lock:
+            self._sessions.append(session)
+        if formats:
+            self._executor.submit(self._run, session, on_update)
+        else:
+            session.finished_at = time.time()
+        return session
+
+    def sessions(self) -> List[ReportSession]:
+        with self._lock:
+            return list(self._sessions)
+
+    def cancel(self, session: ReportSession) -> None:
+        session.cancel_token.cancel()
+
+    def shutdown(self) -> None:
+        """Cancels outstanding reports and waits for the running ones to stop."""
+        for session in self.sessions():
+            session.cancel_token.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _run(
+        self,
+        session: ReportSession,
+        on_update: Optional[Callable[[ReportSession], None]],
+    ) -> None:
+        if session.cancel_token.is_cancelled:
+            self._set_status(session, dict.fromkeys(session.formats, CANCELLED), on_update)
+            return
+        self._set_status(session, dict.fromkeys(session.formats, RUNNING), on_update)
+        window = {"time_window": session.time_window} if session.time_window else {}
+        try:
+            outputs, errors = self.simpleperf_adapter.generate_reports(
+                session.perf_data_path, session.formats, cancel_token=session.cancel_token, **window
+            )
+        except CaptureCancelled:
+            self._set_status(session, dict.fromkeys(session.formats, CANCELLED), on_update)
+            return
+        except Exception as e:
+            outputs, errors = {}, dict.fromkeys(session.formats, str(e))
+        session.outputs.update(outputs)
+        session.errors.update(errors)
+        self._set_status(
+            session,
+            {fmt: FAILED if fmt in errors else DONE for fmt in session.formats},
+            on_update,
+        )
+
+    def _set_status(
+        self,
+        session: ReportSession,
+        status: Dict[str, str],
+        on_update: Optional[Callable[[ReportSession], None]],
+    ) -> None:
+        with self._lock:
+            session.status.update(status)
+            if session.is_finished:
+                session.finished_at = time.time()
+        if on_update:
+            on_update(session)
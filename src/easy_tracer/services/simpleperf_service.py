@@ -1,11 +1,31 @@
 import os
 import time
+from typing import Callable, List, Optional, Tuple
+from easy_tracer.framework.cancellation import (
+    PHASE_POST_PROCESSING,
+    PHASE_PULLING,
+    PHASE_RECORDING,
+    PHASE_STARTING,
+    CancellationToken,
+    PhaseCallback,
+)
 from easy_tracer.framework.simpleperf_adapter import SimpleperfAdapter
+from easy_tracer.services.report_queue import ReportQueue, ReportSession
 
 class SimpleperfService:
-    def __init__(self, simpleperf_adapter: SimpleperfAdapter, output_dir: str = "output"):
+    def __init__(
+        self,
+        simpleperf_adapter: SimpleperfAdapter,
+        output_dir: str = "output",
+        report_queue: Optional[ReportQueue] = None,
+    ):
         self.simpleperf_adapter = simpleperf_adapter
         self.output_dir = output_dir
+        # When set, reports are generated in the background via queue_reports()
+        self.report_queue = report_queue
+        # Binaries pulled for symbolization, shared by every session so a device
+        # build's binaries are only pulled once
+        self.binary_store_dir = os.path.join(self.output_dir, "binary_store")
 
         # Ensure output directory exists
         if not os.path.exists(self.output_dir):
@@ -19,28 +39,26 @@ class SimpleperfService:
         frequency: int = 4000,
         generate_report: bool = True,
         output_dir: str | None = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
     ) -> str:
         """
         Profiles an Android app using simpleperf.
         Returns the path to the output (HTML report if generate_report is True, else perf.data).
         """
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        base_dir = output_dir or self.output_dir
-        session_dir = os.path.join(base_dir, f"simpleperf_{timestamp}")
-        os.makedirs(session_dir, exist_ok=True)
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_STARTING)
+        session_dir = self.new_session_dir("simpleperf", output_dir)
 
-        # Run profiler
-        perf_data_path = self.simpleperf_adapter.run_app_profiler(
-            device_serial=device_serial,
-            app_name=app_name,
-            output_dir=session_dir,
-            duration_seconds=duration_seconds,
-            frequency=frequency
+        # Run profiler (app_profiler records and pulls perf.data in one go)
+        phase(PHASE_RECORDING)
+        perf_data_path = self.record_app(
+            device_serial, app_name, session_dir, duration_seconds, frequency, cancel_token
         )
 
         if generate_report:
-            html_path = os.path.join(session_dir, "report.html")
-            return self.simpleperf_adapter.generate_html_report(perf_data_path, html_path)
+            phase(PHASE_POST_PROCESSING)
+            return self.generate_report(perf_data_path, cancel_token)
 
         return perf_data_path
 
@@ -51,27 +69,108 @@ class SimpleperfService:
         frequency: int = 4000,
         generate_report: bool = True,
         output_dir: str | None = None,
+        cancel_token: Optional[CancellationToken] = None,
+        on_phase: Optional[PhaseCallback] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
     ) -> str:
         """
         Performs system-wide profiling using simpleperf.
+        on_progress receives (bytes pulled, perf.data size) while perf.data is copied.
         Returns the path to the output.
         """
+        phase = on_phase or (lambda _: None)
+        phase(PHASE_STARTING)
+        session_dir = self.new_session_dir("simpleperf_system", output_dir)
+
+        phase(PHASE_RECORDING)
+        self.record_system(device_serial, duration_seconds, frequency, cancel_token)
+        phase(PHASE_PULLING)
+        perf_data_path = self.collect_system(device_serial, session_dir, on_progress, cancel_token)
+
+        if generate_report:
+            phase(PHASE_POST_PROCESSING)
+            return self.generate_report(perf_data_path, cancel_token)
+
+        return perf_data_path
+
+    # The stages below are what profile_app/profile_system are made of; the
+    # combo pipeline calls them separately to overlap them with other tools.
+
+    def new_session_dir(self, prefix: str, output_dir: str | None = None) -> str:
+        """Creates and returns <output_dir>/<prefix>_<timestamp>."""
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         base_dir = output_dir or self.output_dir
-        session_dir = os.path.join(base_dir, f"simpleperf_system_{timestamp}")
+        session_dir = os.path.join(base_dir, f"{prefix}_{timestamp}")
         os.makedirs(session_dir, exist_ok=True)
+        return session_dir
 
-        perf_data_path = os.path.join(session_dir, "perf.data")
-
-        self.simpleperf_adapter.run_simpleperf_record(
+    def record_app(
+        self,
+        device_serial: str,
+        app_name: str,
+        session_dir: str,
+        duration_seconds: int = 10,
+        frequency: int = 4000,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """Records the app and pulls perf.data into session_dir; returns its path."""
+        return self.simpleperf_adapter.run_app_profiler(
             device_serial=device_serial,
-            output_path=perf_data_path,
+            app_name=app_name,
+            output_dir=session_dir,
             duration_seconds=duration_seconds,
-            frequency=frequency
+            frequency=frequency,
+            cancel_token=cancel_token,
+            binary_store_dir=self.binary_store_dir,
         )
 
-        if generate_report:
-            html_path = os.path.join(session_dir, "report.html")
-            return self.simpleperf_adapter.generate_html_report(perf_data_path, html_path)
+    def record_system(
+        self,
+        device_serial: str,
+        duration_seconds: int = 10,
+        frequency: int = 4000,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> None:
+        """Records system-wide; perf.data stays on the device until collect_system()."""
+        self.simpleperf_adapter.record_on_device(
+            device_serial,
+            duration_seconds=duration_seconds,
+            frequency=frequency,
+            cancel_token=cancel_token,
+        )
 
-        return perf_data_path
+    def collect_system(
+        self,
+        device_serial: str,
+        session_dir: str,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """Pulls perf.data written by record_system() into session_dir; returns its path."""
+        return self.simpleperf_adapter.pull_perf_data(
+            device_serial, os.path.join(session_dir, "perf.data"), on_progress, cancel_token
+        )
+
+    def generate_report(
+        self, perf_data_path: str, cancel_token: Optional[CancellationToken] = None
+    ) -> str:
+        """Writes report.html next to perf.data; returns its path."""
+        html_path = os.path.join(os.path.dirname(perf_data_path), "report.html")
+        return self.simpleperf_adapter.generate_html_report(
+            perf_data_path, html_path, cancel_token=cancel_token
+        )
+
+    def queue_reports(
+        self,
+        perf_data_path: str,
+        formats: List[str],
+        on_update: Optional[Callable[[ReportSession], None]] = None,
+        time_window: Optional[Tuple[float, float]] = None,
+    ) -> ReportSession:
+        """
+        Queues reports for perf.data on the report queue; returns without waiting
+        for them. time_window reports only (start, end) seconds of the recording.
+        """
+        if self.report_queue is None:
+            raise RuntimeError("No report queue configured")
+        return self.report_queue.submit(perf_data_path, formats, on_update, time_window)
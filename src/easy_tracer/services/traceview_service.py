@@ -26,6 +26,21 @@ class TraceviewService:
         Stops method tracing and pulls the file.
         Returns the path to the pulled trace file.
         """
+        self.stop_profiling(device_serial, package_name)
+        return self.collect_trace(device_serial, package_name, output_dir, create_subfolder)
+
+    def stop_profiling(self, device_serial: str, package_name: str) -> None:
+        """Stops method tracing; the trace stays on the device until collect_trace()."""
+        self.adapter.stop_profiling(device_serial, package_name)
+
+    def collect_trace(
+        self,
+        device_serial: str,
+        package_name: str,
+        output_dir: str | None = None,
+        create_subfolder: bool = False,
+    ) -> str:
+        """Pulls the trace written after stop_profiling(); returns the local path."""
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"traceview_{package_name}_{timestamp}.trace"
         base_dir = output_dir or self.output_dir
@@ -38,4 +53,4 @@ class TraceviewService:
         # Ensure absolute path
         output_path = os.path.abspath(output_path)
 
-        return self.adapter.stop_tracing(device_serial, package_name, output_path)
+        return self.adapter.pull_trace(device_serial, package_name, output_path)
@@ -0,0 +1,25 @@
+from typing import Optional
+from easy_tracer.framework.cancellation import (
+    PHASE_POST_PROCESSING,
+    PHASE_PULLING,
+    PHASE_RECORDING,
+    PHASE_STARTING,
+    PHASE_STOPPING,
+)
+
+_PHASE_TEXT = {
+    PHASE_STARTING: "Starting...",
+    PHASE_RECORDING: "Recording...",
+    PHASE_STOPPING: "Stopping...",
+    PHASE_PULLING: "Pulling data...",
+    PHASE_POST_PROCESSING: "Post-processing...",
+}
+
+
+def phase_text(phase: Optional[str], done: int = 0, total: int = 0) -> str:
+    """Status line for a capture phase; done/total are byte counts while pulling."""
+    if phase == PHASE_PULLING and done:
+        if total:
+            return f"Pulling data... {done / (1 << 20):.1f} / {total / (1 << 20):.1f} MB"
+        return f"Pulling data... {done / (1 << 20):.1f} MB"
+    return _PHASE_TEXT.get(phase, "Starting...")
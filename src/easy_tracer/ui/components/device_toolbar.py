@@ -58,6 +58,7 @@ class DeviceToolbar(QtWidgets.QWidget):
         self.meminfo_cb.stateChanged.connect(self.options_changed.emit)
 
     def set_devices(self, devices: List[Device]) -> None:
+        previous = self.current_device()
         self._devices = devices
         self.combo.blockSignals(True)
         self.combo.clear()
@@ -65,11 +66,16 @@ class DeviceToolbar(QtWidgets.QWidget):
             self.combo.addItem("No devices")
             self.combo.setCurrentIndex(0)
         else:
-            for device in devices:
+            selected_index = 0
+            for index, device in enumerate(devices):
                 self.combo.addItem(str(device), device)
-            self.combo.setCurrentIndex(0)
+                if previous and device.serial == previous.serial:
+                    selected_index = index
+            self.combo.setCurrentIndex(selected_index)
         self.combo.blockSignals(False)
-        self._emit_current_device()
+        # Hot-plug updates re-send the whole list; only notify when the selection really changed
+        if self.current_device() != previous or previous is None:
+            self._emit_current_device()
 
     def _emit_current_device(self) -> None:
         device = self.current_device()
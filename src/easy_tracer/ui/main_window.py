@@ -10,6 +10,7 @@ from easy_tracer.presenters.perfetto_presenter import PerfettoPresenter
 from easy_tracer.presenters.traceview_presenter import TraceviewPresenter
 from easy_tracer.presenters.combo_presenter import ComboPresenter
 from easy_tracer.services.config_service import ConfigService
+from easy_tracer.services.device_service import DeviceEvent
 from easy_tracer.ui.components.device_toolbar import DeviceToolbar
 from easy_tracer.ui.components.log_panel import LogPanel
 from easy_tracer.ui.panels.device_panel import DevicePanel
@@ -23,6 +24,10 @@ from easy_tracer.ui.panels.about_panel import AboutPanel
 from easy_tracer.ui.qt_threading import Worker
 
 
+class _DeviceEmitter(QtCore.QObject):
+    changed = QtCore.Signal(object, object)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(
         self,
@@ -40,6 +45,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.current_device: Optional[Device] = None
         self._refresh_in_progress = False
         self._refresh_pending = False
+        self._device_emitter = _DeviceEmitter()
+        self._device_emitter.changed.connect(self._on_device_events)
 
         self.setWindowTitle("EasyTracer")
         self.resize(1100, 780)
@@ -133,11 +140,26 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.setCentralWidget(central)
 
-        QtCore.QTimer.singleShot(0, self.refresh_devices)
+        QtCore.QTimer.singleShot(0, self._start_device_tracking)
 
     def _log(self, message: str) -> None:
         self.log_panel.append(message)
 
+    def _start_device_tracking(self) -> None:
+        self._log("Watching for devices...")
+        self.presenter.start_device_tracking(self._device_emitter.changed.emit)
+
+    def _on_device_events(self, devices: List[Device], events: List[DeviceEvent]) -> None:
+        for event in events:
+            self._log(f"Device {event.kind}: {event.device} [{event.device.status}]")
+        self.device_toolbar.set_devices(devices)
+        self.device_panel.set_devices(devices)
+        self.combo_panel.set_devices(devices)
+
+    def closeEvent(self, event) -> None:
+        self.presenter.stop_device_tracking()
+        super().closeEvent(event)
+
     def refresh_devices(self) -> None:
         if self._refresh_in_progress:
             self._refresh_pending = True
@@ -164,6 +186,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def _on_devices_loaded(self, devices: List[Device]) -> None:
         self.device_toolbar.set_devices(devices)
         self.device_panel.set_devices(devices)
+        self.combo_panel.set_devices(devices)
         self._log(f"Found {len(devices)} device(s).")
 
     def _on_devices_error(self, message: str) -> None:
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 from PySide6 import QtCore, QtWidgets
+from easy_tracer.models.device import Device
 from easy_tracer.presenters.combo_presenter import ComboPresenter
 from easy_tracer.ui.qt_threading import run_in_thread
 
@@ -50,8 +51,19 @@ class ComboPanel(QtWidgets.QWidget):
         self.duration_spin.setValue(10)
         self.duration_spin.setSuffix(" s")
 
+        self.multi_device_cb = QtWidgets.QCheckBox("多设备模式 (Multi-device)")
+        self.device_list = QtWidgets.QListWidget()
+        self.device_list.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.device_list.itemChanged.connect(lambda _item: self._update_start_enabled())
+        self.parallel_spin = QtWidgets.QSpinBox()
+        self.parallel_spin.setRange(1, 20)
+        self.parallel_spin.setValue(4)
+        self.multi_device_cb.toggled.connect(self._toggle_multi_device)
+
         self.start_button = QtWidgets.QPushButton("开始组合抓取")
         self.start_button.setEnabled(False)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
 
         self.progress = QtWidgets.QProgressBar()
         self.progress.setRange(0, 0)
@@ -81,12 +93,18 @@ class ComboPanel(QtWidgets.QWidget):
         config_form.addRow("Target:", target_row)
         config_form.addRow(self.cold_start_cb)
         config_form.addRow("Duration:", self.duration_spin)
+        config_form.addRow(self.multi_device_cb)
+        config_form.addRow("Devices:", self.device_list)
+        config_form.addRow("Parallel:", self.parallel_spin)
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(QtWidgets.QLabel("组合抓取配置"))
         layout.addLayout(tools_layout)
         layout.addLayout(config_form)
-        layout.addWidget(self.start_button)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self.start_button, 1)
+        buttons.addWidget(self.cancel_button)
+        layout.addLayout(buttons)
         layout.addWidget(self.progress)
         layout.addWidget(self.status_label)
         layout.addWidget(self.error_label)
@@ -94,15 +112,52 @@ class ComboPanel(QtWidgets.QWidget):
         layout.addWidget(self.result_text, 1)
 
         self.start_button.clicked.connect(self._on_start)
+        self.cancel_button.clicked.connect(self.presenter.cancel)
+        self._toggle_multi_device(False)
         self.update_device(self.device_serial)
 
     def _toggle_target_input(self, text: str) -> None:
         self.target_input.setEnabled(text == "自定义包名")
 
+    def _toggle_multi_device(self, enabled: bool) -> None:
+        self.device_list.setVisible(enabled)
+        self.parallel_spin.setVisible(enabled)
+        self._update_start_enabled()
+
+    def _checked_serials(self) -> List[str]:
+        serials = []
+        for i in range(self.device_list.count()):
+            item = self.device_list.item(i)
+            if item.checkState() == QtCore.Qt.Checked:
+                serials.append(item.data(QtCore.Qt.UserRole))
+        return serials
+
+    def _update_start_enabled(self) -> None:
+        if self.multi_device_cb.isChecked():
+            ready = bool(self._checked_serials())
+        else:
+            ready = bool(self.device_serial)
+        self.start_button.setEnabled(ready and not self.presenter.is_running)
+
+    def set_devices(self, devices: List[Device]) -> None:
+        """Lists the online devices for multi-device mode, keeping their check state."""
+        checked = set(self._checked_serials())
+        self.device_list.blockSignals(True)
+        self.device_list.clear()
+        for device in devices:
+            if device.status != "device":
+                continue
+            item = QtWidgets.QListWidgetItem(str(device))
+            item.setData(QtCore.Qt.UserRole, device.serial)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked if device.serial in checked else QtCore.Qt.Unchecked)
+            self.device_list.addItem(item)
+        self.device_list.blockSignals(False)
+        self._update_start_enabled()
+
     def update_device(self, serial: Optional[str]) -> None:
         self.device_serial = serial
-        can_start = bool(serial) and not self.presenter.is_running
-        self.start_button.setEnabled(can_start)
+        self._update_start_enabled()
         if serial:
             self.status_label.setText(f"Selected device: {serial}")
         else:
@@ -111,13 +166,29 @@ class ComboPanel(QtWidgets.QWidget):
     def update_view(self) -> None:
         busy = self.presenter.is_running
         self.progress.setVisible(busy)
-        self.start_button.setEnabled(bool(self.device_serial) and not busy)
-        if busy:
+        self._update_start_enabled()
+        self.cancel_button.setEnabled(busy)
+        if busy and self.presenter.jobs.is_queued:
+            self.status_label.setText("Waiting for the device (another capture is running)...")
+        elif busy and self.presenter.device_results:
+            self.status_label.setText(
+                f"Combo capture running... {len(self.presenter.device_results)} device(s) done"
+            )
+        elif busy:
             self.status_label.setText("Combo capture running...")
         else:
             self.status_label.setText("Ready.")
         self.error_label.setText(self.presenter.error_message or "")
-        if self.presenter.results:
+        if self.presenter.device_results:
+            lines = []
+            for device in self.presenter.device_results:
+                lines.append(f"[{device.serial}] {device.status} ({device.elapsed_seconds:.1f}s)")
+                lines.extend(f"  {k}: {v}" for k, v in device.results.items())
+                lines.extend(f"  {k} error: {v}" for k, v in device.errors.items())
+            if self.presenter.manifest_path:
+                lines.append(f"Manifest: {self.presenter.manifest_path}")
+            self.result_text.setPlainText("\n".join(lines))
+        elif self.presenter.results:
             lines = [f"{k}: {v}" for k, v in self.presenter.results.items()]
             self.result_text.setPlainText("\n".join(lines))
 
@@ -130,7 +201,8 @@ class ComboPanel(QtWidgets.QWidget):
         return None
 
     def _on_start(self) -> None:
-        if not self.device_serial:
+        multi_device = self.multi_device_cb.isChecked()
+        if not multi_device and not self.device_serial:
             return
 
         enabled = {
@@ -145,6 +217,17 @@ class ComboPanel(QtWidgets.QWidget):
             "simpleperf_freq": int(self.simpleperf_freq.currentText()),
         }
 
+        if multi_device:
+            run_in_thread(
+                self.presenter.start_fanout,
+                self._checked_serials(),
+                int(self.duration_spin.value()),
+                enabled,
+                configs,
+                self.parallel_spin.value(),
+            )
+            return
+
         run_in_thread(
             self.presenter.start_combo,
             self.device_serial,
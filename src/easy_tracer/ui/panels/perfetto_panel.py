@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Dict, Optional
 from PySide6 import QtCore, QtWidgets
 from easy_tracer.presenters.perfetto_presenter import PerfettoPresenter
 from easy_tracer.ui.qt_threading import run_in_thread
+from easy_tracer.ui.components.capture_status import phase_text
 from easy_tracer.ui.components.output_path_widget import OutputPathWidget
 
 
@@ -29,6 +30,8 @@ class PerfettoPanel(QtWidgets.QWidget):
         self.duration_combo.addItems(["10s", "30s", "60s", "10min"])
         self.buffer_combo = QtWidgets.QComboBox()
         self.buffer_combo.addItems(["150 MB", "300 MB", "600 MB"])
+        self.fill_policy_combo = QtWidgets.QComboBox()
+        self.fill_policy_combo.addItems(["RING_BUFFER", "DISCARD"])
 
         self.write_period = QtWidgets.QSpinBox()
         self.write_period.setRange(500, 10000)
@@ -83,6 +86,7 @@ class PerfettoPanel(QtWidgets.QWidget):
         self.atrace_app = QtWidgets.QLineEdit()
         self.atrace_app.setPlaceholderText("所有应用 (*)")
 
+        self.data_source_checks: Dict[str, QtWidgets.QCheckBox] = {}
         self.data_tabs = QtWidgets.QTabWidget()
         self.data_tabs.addTab(self._build_core_tab(), "核心追踪")
         self.data_tabs.addTab(self._build_gpu_tab(), "渲染/GPU")
@@ -94,6 +98,11 @@ class PerfettoPanel(QtWidgets.QWidget):
 
         self.start_button = QtWidgets.QPushButton("Start Recording")
         self.start_button.setEnabled(False)
+        # Long mode only: ends the recording early and keeps the trace
+        self.stop_button = QtWidgets.QPushButton("Stop")
+        self.stop_button.setEnabled(False)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
 
         self.progress = QtWidgets.QProgressBar()
         self.progress.setRange(0, 0)
@@ -104,6 +113,9 @@ class PerfettoPanel(QtWidgets.QWidget):
         self.error_label.setStyleSheet("color: #b00020;")
         self.result_label = QtWidgets.QLabel("")
         self.result_label.setStyleSheet("color: #1b5e20;")
+        self.summary_label = QtWidgets.QLabel("")
+        self.summary_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.summary_label.setWordWrap(True)
 
         mode_layout = QtWidgets.QHBoxLayout()
         mode_layout.addWidget(self.normal_radio)
@@ -112,6 +124,7 @@ class PerfettoPanel(QtWidgets.QWidget):
         basic_form = QtWidgets.QFormLayout()
         basic_form.addRow("Duration:", self.duration_combo)
         basic_form.addRow("Buffer:", self.buffer_combo)
+        basic_form.addRow("Fill Policy:", self.fill_policy_combo)
         basic_form.addRow("Write Period:", self.write_period)
         basic_form.addRow("Flush Period:", self.flush_period)
 
@@ -137,60 +150,73 @@ class PerfettoPanel(QtWidgets.QWidget):
         layout.addLayout(sources_layout, 1)
         layout.addWidget(QtWidgets.QLabel("Output"))
         layout.addWidget(self.output_path)
-        layout.addWidget(self.start_button)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self.start_button, 1)
+        buttons.addWidget(self.stop_button)
+        buttons.addWidget(self.cancel_button)
+        layout.addLayout(buttons)
         layout.addWidget(self.progress)
         layout.addWidget(self.status_label)
         layout.addWidget(self.error_label)
         layout.addWidget(self.result_label)
+        layout.addWidget(self.summary_label)
 
         self._toggle_long_fields()
         self.start_button.clicked.connect(self._on_start_recording)
+        self.stop_button.clicked.connect(self.presenter.stop)
+        self.cancel_button.clicked.connect(self.presenter.cancel)
         self.update_device(self.device_serial)
 
+    def _add_data_source(self, layout: QtWidgets.QVBoxLayout, name: str, checked: bool = False) -> None:
+        checkbox = QtWidgets.QCheckBox(name)
+        checkbox.setChecked(checked)
+        self.data_source_checks[name] = checkbox
+        layout.addWidget(checkbox)
+
     def _build_core_tab(self) -> QtWidgets.QWidget:
         widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(widget)
-        layout.addWidget(QtWidgets.QCheckBox("linux.ftrace"))
-        layout.addWidget(QtWidgets.QCheckBox("linux.process_stats"))
-        layout.addWidget(QtWidgets.QCheckBox("linux.sys_stats"))
-        layout.addWidget(QtWidgets.QCheckBox("linux.system_info"))
+        self._add_data_source(layout, "linux.ftrace", checked=True)
+        self._add_data_source(layout, "linux.process_stats", checked=True)
+        self._add_data_source(layout, "linux.sys_stats")
+        self._add_data_source(layout, "linux.system_info")
         layout.addStretch(1)
         return widget
 
     def _build_gpu_tab(self) -> QtWidgets.QWidget:
         widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(widget)
-        layout.addWidget(QtWidgets.QCheckBox("android.surfaceflinger.frametimeline"))
-        layout.addWidget(QtWidgets.QCheckBox("android.surfaceflinger.frame"))
-        layout.addWidget(QtWidgets.QCheckBox("android.gpu.memory"))
-        layout.addWidget(QtWidgets.QCheckBox("android.gpu.work"))
+        self._add_data_source(layout, "android.surfaceflinger.frametimeline")
+        self._add_data_source(layout, "android.surfaceflinger.frame")
+        self._add_data_source(layout, "android.gpu.memory")
+        self._add_data_source(layout, "android.gpu.work")
         layout.addStretch(1)
         return widget
 
     def _build_memory_tab(self) -> QtWidgets.QWidget:
         widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(widget)
-        layout.addWidget(QtWidgets.QCheckBox("android.heapprofd"))
-        layout.addWidget(QtWidgets.QCheckBox("android.java_hprof"))
-        layout.addWidget(QtWidgets.QCheckBox("linux.kmem_activity"))
+        self._add_data_source(layout, "android.heapprofd")
+        self._add_data_source(layout, "android.java_hprof")
+        self._add_data_source(layout, "linux.kmem_activity")
         layout.addStretch(1)
         return widget
 
     def _build_power_tab(self) -> QtWidgets.QWidget:
         widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(widget)
-        layout.addWidget(QtWidgets.QCheckBox("android.power"))
-        layout.addWidget(QtWidgets.QCheckBox("linux.perf"))
+        self._add_data_source(layout, "android.power")
+        self._add_data_source(layout, "linux.perf")
         layout.addStretch(1)
         return widget
 
     def _build_misc_tab(self) -> QtWidgets.QWidget:
         widget = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout(widget)
-        layout.addWidget(QtWidgets.QCheckBox("android.packages_list"))
-        layout.addWidget(QtWidgets.QCheckBox("android.log"))
-        layout.addWidget(QtWidgets.QCheckBox("android.network_packets"))
-        layout.addWidget(QtWidgets.QCheckBox("track_event"))
+        self._add_data_source(layout, "android.packages_list")
+        self._add_data_source(layout, "android.log")
+        self._add_data_source(layout, "android.network_packets")
+        self._add_data_source(layout, "track_event")
         layout.addStretch(1)
         return widget
 
@@ -211,8 +237,12 @@ class PerfettoPanel(QtWidgets.QWidget):
         busy = self.presenter.is_recording
         self.progress.setVisible(busy)
         self.start_button.setEnabled(bool(self.device_serial) and not busy)
-        if busy:
-            self.status_label.setText("Recording trace... Please wait.")
+        self.stop_button.setEnabled(self.presenter.can_stop)
+        self.cancel_button.setEnabled(busy)
+        if busy and self.presenter.jobs.is_queued:
+            self.status_label.setText("Waiting for the device (another capture is running)...")
+        elif busy:
+            self.status_label.setText(phase_text(self.presenter.phase, self.presenter.bytes_received))
         else:
             self.status_label.setText("Ready.")
         self.error_label.setText(
@@ -221,6 +251,13 @@ class PerfettoPanel(QtWidgets.QWidget):
         self.result_label.setText(
             f"Trace saved to: {self.presenter.last_output_path}" if self.presenter.last_output_path else ""
         )
+        summary = self.presenter.last_summary
+        self.summary_label.setText(summary.format() if summary else "")
+        # Lost data is worth noticing before the trace is opened
+        lossy = summary is not None and (
+            summary.buffer_overflowed or summary.ftrace_lost_events or summary.drops_by_sequence
+        )
+        self.summary_label.setStyleSheet("color: #b00020;" if lossy else "")
 
     def _selected_atrace_categories(self) -> list[str]:
         selected = []
@@ -230,6 +267,20 @@ class PerfettoPanel(QtWidgets.QWidget):
                 selected.append(item.text())
         return selected
 
+    def _selected_ftrace_events(self) -> list[str]:
+        selected = []
+        for i in range(self.ftrace_list.count()):
+            item = self.ftrace_list.item(i)
+            if item.checkState() == QtCore.Qt.Checked:
+                selected.append(item.text())
+        return selected
+
+    def _selected_data_sources(self) -> list[str]:
+        return [name for name, checkbox in self.data_source_checks.items() if checkbox.isChecked()]
+
+    def _atrace_apps(self) -> list[str]:
+        return [app.strip() for app in self.atrace_app.text().split(",") if app.strip()]
+
     def _duration_seconds(self) -> int:
         text = self.duration_combo.currentText()
         if text.endswith("min"):
@@ -252,4 +303,11 @@ class PerfettoPanel(QtWidgets.QWidget):
             self._selected_atrace_categories(),
             self.output_path.output_dir(),
             self.output_path.create_subfolder(),
+            self.long_radio.isChecked(),
+            self.write_period.value(),
+            self.flush_period.value(),
+            self._selected_data_sources(),
+            self._selected_ftrace_events(),
+            self._atrace_apps(),
+            self.fill_policy_combo.currentText(),
         )
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import List, Optional
 from PySide6 import QtCore, QtWidgets
 from easy_tracer.presenters.simpleperf_presenter import SimpleperfPresenter
 from easy_tracer.ui.qt_threading import run_in_thread
+from easy_tracer.ui.components.capture_status import phase_text
 from easy_tracer.ui.components.output_path_widget import OutputPathWidget
 
 
@@ -53,14 +54,30 @@ class SimpleperfPanel(QtWidgets.QWidget):
 
         self.cold_start_cb = QtWidgets.QCheckBox("冷启动模式 (force-stop)")
         self.flamegraph_cb = QtWidgets.QCheckBox("生成火焰图")
+        self.gecko_cb = QtWidgets.QCheckBox("Firefox Profiler (gecko)")
+        self.pprof_cb = QtWidgets.QCheckBox("pprof")
         self.offcpu_cb = QtWidgets.QCheckBox("同时采集 Off-CPU 事件")
         self.flamegraph_cb.setChecked(True)
         self.offcpu_cb.setChecked(True)
 
         self.output_path = OutputPathWidget(default_output_dir)
 
+        # Re-report part of the last recording; the window is looked up in its
+        # sample cache instead of re-reading all of perf.data
+        self.window_start = QtWidgets.QDoubleSpinBox()
+        self.window_end = QtWidgets.QDoubleSpinBox()
+        for spin in (self.window_start, self.window_end):
+            spin.setRange(0, 3600)
+            spin.setDecimals(1)
+            spin.setSuffix(" s")
+        self.window_end.setValue(1)
+        self.window_button = QtWidgets.QPushButton("Report Window")
+        self.window_button.setEnabled(False)
+
         self.profile_button = QtWidgets.QPushButton("Start Capture")
         self.profile_button.setEnabled(False)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
 
         self.progress = QtWidgets.QProgressBar()
         self.progress.setRange(0, 0)
@@ -71,6 +88,8 @@ class SimpleperfPanel(QtWidgets.QWidget):
         self.error_label.setStyleSheet("color: #b00020;")
         self.result_label = QtWidgets.QLabel("")
         self.result_label.setStyleSheet("color: #1b5e20;")
+        self.report_label = QtWidgets.QLabel("")
+        self.report_label.setWordWrap(True)
 
         duration_row = QtWidgets.QHBoxLayout()
         duration_row.addWidget(self.duration_combo)
@@ -94,16 +113,35 @@ class SimpleperfPanel(QtWidgets.QWidget):
         layout.addLayout(form_layout)
         layout.addWidget(self.cold_start_cb)
         layout.addWidget(self.flamegraph_cb)
+        report_row = QtWidgets.QHBoxLayout()
+        report_row.addWidget(self.gecko_cb)
+        report_row.addWidget(self.pprof_cb)
+        report_row.addStretch(1)
+        layout.addLayout(report_row)
         layout.addWidget(self.offcpu_cb)
+        window_row = QtWidgets.QHBoxLayout()
+        window_row.addWidget(QtWidgets.QLabel("Report only:"))
+        window_row.addWidget(self.window_start)
+        window_row.addWidget(QtWidgets.QLabel("to"))
+        window_row.addWidget(self.window_end)
+        window_row.addWidget(self.window_button)
+        window_row.addStretch(1)
+        layout.addLayout(window_row)
         layout.addWidget(QtWidgets.QLabel("Output"))
         layout.addWidget(self.output_path)
-        layout.addWidget(self.profile_button)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self.profile_button, 1)
+        buttons.addWidget(self.cancel_button)
+        layout.addLayout(buttons)
         layout.addWidget(self.progress)
         layout.addWidget(self.status_label)
         layout.addWidget(self.error_label)
         layout.addWidget(self.result_label)
+        layout.addWidget(self.report_label)
 
         self.profile_button.clicked.connect(self._on_profile)
+        self.cancel_button.clicked.connect(self.presenter.cancel)
+        self.window_button.clicked.connect(self._on_report_window)
         self.update_device(self.device_serial)
 
     def _toggle_custom_duration(self, text: str) -> None:
@@ -125,8 +163,13 @@ class SimpleperfPanel(QtWidgets.QWidget):
         busy = self.presenter.is_profiling
         self.progress.setVisible(busy)
         self.profile_button.setEnabled(bool(self.device_serial) and not busy)
-        if busy:
-            self.status_label.setText("Profiling... Please wait.")
+        self.cancel_button.setEnabled(busy)
+        last = self.presenter.last_output_path
+        self.window_button.setEnabled(not busy and bool(last) and last.endswith(".data"))
+        if busy and self.presenter.jobs.is_queued:
+            self.status_label.setText("Waiting for the device (another capture is running)...")
+        elif busy:
+            self.status_label.setText(phase_text(self.presenter.phase, *self.presenter.transfer))
         else:
             self.status_label.setText("Ready.")
         self.error_label.setText(
@@ -135,6 +178,37 @@ class SimpleperfPanel(QtWidgets.QWidget):
         self.result_label.setText(
             f"Output saved to: {self.presenter.last_output_path}" if self.presenter.last_output_path else ""
         )
+        self.report_label.setText(self._report_status_text())
+
+    def _report_status_text(self) -> str:
+        """Status of the last few report sessions, e.g. 'html done, gecko running'."""
+        lines = []
+        for session in self.presenter.report_sessions[-3:]:
+            formats = ", ".join(f"{fmt} {state}" for fmt, state in session.status.items())
+            window = ""
+            if session.time_window:
+                window = " ({:g}-{:g} s)".format(*session.time_window)
+            lines.append(f"Reports for {session.perf_data_path}{window}: {formats}")
+            for fmt, error in session.errors.items():
+                lines.append(f"  {fmt} failed: {error}")
+        return "\n".join(lines)
+
+    def _report_formats(self) -> List[str]:
+        formats = ["html"]
+        if self.flamegraph_cb.isChecked():
+            formats += ["inferno", "stackcollapse"]
+        if self.gecko_cb.isChecked():
+            formats.append("gecko")
+        if self.pprof_cb.isChecked():
+            formats.append("pprof")
+        # Decoded samples for later filtering; costs no extra pass over perf.data
+        formats.append("samples")
+        return formats
+
+    def _on_report_window(self) -> None:
+        self.presenter.report_window(
+            self.window_start.value(), self.window_end.value(), self._report_formats()
+        )
 
     def _duration_seconds(self) -> int:
         text = self.duration_combo.currentText()
@@ -173,6 +247,7 @@ class SimpleperfPanel(QtWidgets.QWidget):
                 self._duration_seconds(),
                 self._frequency(),
                 output_dir,
+                self._report_formats(),
             )
             return
 
@@ -184,4 +259,5 @@ class SimpleperfPanel(QtWidgets.QWidget):
             self._duration_seconds(),
             self._frequency(),
             output_dir,
+            self._report_formats(),
         )
@@ -4,6 +4,7 @@ from typing import Optional
 from PySide6 import QtCore, QtWidgets
 from easy_tracer.presenters.systrace_presenter import SystracePresenter
 from easy_tracer.ui.qt_threading import run_in_thread
+from easy_tracer.ui.components.capture_status import phase_text
 from easy_tracer.ui.components.output_path_widget import OutputPathWidget
 
 
@@ -17,6 +18,7 @@ class SystracePanel(QtWidgets.QWidget):
         self.presenter = presenter
         self.device_serial = device_serial
         self.default_output_dir = default_output_dir
+        self._shown_categories: list[str] = []
         self._update_emitter = _UpdateEmitter()
         self._update_emitter.updated.connect(self.update_view)
         self.presenter.bind_view_update(self._update_emitter.updated.emit)
@@ -103,6 +105,8 @@ class SystracePanel(QtWidgets.QWidget):
 
         self.start_button = QtWidgets.QPushButton("Start Capture")
         self.start_button.setEnabled(False)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
 
         self.progress = QtWidgets.QProgressBar()
         self.progress.setRange(0, 0)
@@ -138,15 +142,19 @@ class SystracePanel(QtWidgets.QWidget):
         layout.addWidget(self.enhance_cb)
         layout.addWidget(QtWidgets.QLabel("Output"))
         layout.addWidget(self.output_path)
-        layout.addWidget(self.start_button)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self.start_button, 1)
+        buttons.addWidget(self.cancel_button)
+        layout.addLayout(buttons)
         layout.addWidget(self.progress)
         layout.addWidget(self.status_label)
         layout.addWidget(self.error_label)
         layout.addWidget(self.result_label)
 
-        self.load_categories_button.clicked.connect(self._on_load_categories)
-        self.load_ftrace_button.clicked.connect(self._on_load_ftrace)
+        self.load_categories_button.clicked.connect(lambda: self._on_load_categories(refresh=True))
+        self.load_ftrace_button.clicked.connect(lambda: self._on_load_ftrace(refresh=True))
         self.start_button.clicked.connect(self._on_start_capture)
+        self.cancel_button.clicked.connect(self.presenter.cancel)
         self.preset_min.clicked.connect(lambda: self._apply_preset("min"))
         self.preset_graphics.clicked.connect(lambda: self._apply_preset("graphics"))
         self.preset_system.clicked.connect(lambda: self._apply_preset("system"))
@@ -201,6 +209,7 @@ class SystracePanel(QtWidgets.QWidget):
         self.start_button.setEnabled(can_load and bool(self.presenter.categories))
         if not serial:
             self.atrace_list.clear()
+            self._shown_categories = []
             self.ftrace_tree.clear()
             self.status_label.setText("Please select a device.")
         else:
@@ -214,14 +223,23 @@ class SystracePanel(QtWidgets.QWidget):
         busy = self.presenter.is_loading_categories or self.presenter.is_loading_ftrace or self.presenter.is_capturing
         self.progress.setVisible(busy)
 
-        if self.presenter.categories and self.atrace_list.count() == 0:
+        if self.presenter.categories != self._shown_categories:
+            # Cached categories are shown first and may be replaced once the device answers;
+            # keep whatever the user already ticked.
+            checked = {
+                self.atrace_list.item(i).text()
+                for i in range(self.atrace_list.count())
+                if self.atrace_list.item(i).checkState() == QtCore.Qt.Checked
+            }
             self.atrace_list.clear()
-            defaults = {"sched", "freq", "idle", "am", "wm", "view", "gfx", "input", "dalvik", "binder_driver", "binder_lock"}
+            defaults = checked or {"sched", "freq", "idle", "am", "wm", "view", "gfx", "input", "dalvik", "binder_driver", "binder_lock"}
             for cat in self.presenter.categories:
                 item = QtWidgets.QListWidgetItem(cat)
                 item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
                 item.setCheckState(QtCore.Qt.Checked if cat in defaults else QtCore.Qt.Unchecked)
                 self.atrace_list.addItem(item)
+            self._shown_categories = list(self.presenter.categories)
+            self._apply_atrace_filter(self.atrace_filter.text())
 
         if self.presenter.ftrace_events:
             self._populate_ftrace_tree(self.presenter.ftrace_events, self.ftrace_filter.text())
@@ -237,13 +255,16 @@ class SystracePanel(QtWidgets.QWidget):
             self.status_label.setText("Loading categories...")
         elif self.presenter.is_loading_ftrace:
             self.status_label.setText("Loading ftrace events...")
+        elif self.presenter.is_capturing and self.presenter.jobs.is_queued:
+            self.status_label.setText("Waiting for the device (another capture is running)...")
         elif self.presenter.is_capturing:
-            self.status_label.setText("Capturing trace... Please wait.")
+            self.status_label.setText(phase_text(self.presenter.phase))
         else:
             self.status_label.setText("Ready.")
 
         can_run = bool(self.device_serial) and bool(self.presenter.categories) and not busy
         self.start_button.setEnabled(can_run)
+        self.cancel_button.setEnabled(self.presenter.is_capturing)
         self.load_categories_button.setEnabled(bool(self.device_serial) and not busy)
         self.load_ftrace_button.setEnabled(bool(self.device_serial) and not busy)
 
@@ -264,17 +285,16 @@ class SystracePanel(QtWidgets.QWidget):
             else:
                 item.setCheckState(QtCore.Qt.Checked if item.text() in presets[preset] else QtCore.Qt.Unchecked)
 
-    def _on_load_categories(self) -> None:
+    def _on_load_categories(self, refresh: bool = False) -> None:
         if not self.device_serial:
             return
-        self.atrace_list.clear()
-        run_in_thread(self.presenter.load_categories, self.device_serial)
+        run_in_thread(self.presenter.load_categories, self.device_serial, refresh)
 
-    def _on_load_ftrace(self) -> None:
+    def _on_load_ftrace(self, refresh: bool = False) -> None:
         if not self.device_serial:
             return
         self.ftrace_tree.clear()
-        run_in_thread(self.presenter.load_ftrace_events, self.device_serial)
+        run_in_thread(self.presenter.load_ftrace_events, self.device_serial, refresh)
 
     def _get_duration(self) -> int:
         text = self.duration_combo.currentText()
@@ -1,5 +1,6 @@
 import unittest
 from unittest.mock import MagicMock, patch
+import io
 import os
 import shutil
 import tempfile
@@ -91,12 +92,16 @@ test_device_serial        device product:test model:Test_Phone device:test
         self.assertIn("-e", args)
         self.assertIn(self.device_serial, args)
 
+    @patch('subprocess.Popen')
     @patch('subprocess.run')
-    @patch('os.path.exists')
-    def test_e2e_perfetto_capture(self, mock_exists, mock_run):
-        """Test Perfetto capture orchestration"""
-        mock_exists.return_value = True
-        mock_run.return_value = MagicMock(returncode=0)
+    def test_e2e_perfetto_capture(self, mock_run, mock_popen):
+        """Test Perfetto capture orchestration (streamed from perfetto's stdout)"""
+        # Without an adb server the trace streams through `adb exec-out`
+        mock_run.return_value = MagicMock(returncode=0, stdout="0\n", stderr="")
+        proc = mock_popen.return_value
+        proc.stdout = io.BytesIO(b"perfetto-trace-bytes")
+        proc.stderr = io.BytesIO(b"")
+        proc.wait.return_value = 0
 
         path = self.perfetto_service.record_trace(
             device_serial=self.device_serial,
@@ -106,12 +111,19 @@ test_device_serial        device product:test model:Test_Phone device:test
 
         self.assertTrue(path.startswith(self.output_dir))
         self.assertTrue(path.endswith(".perfetto-trace"))
-
-        # Verify calls (record -> pull -> cleanup)
-        self.assertEqual(mock_run.call_count, 3)
-        record_args = mock_run.call_args_list[0][0][0]
-        self.assertIn("perfetto", record_args)
-        self.assertIn("sched", record_args)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"perfetto-trace-bytes")
+
+        # A single perfetto run writes the trace to stdout; nothing is pulled
+        mock_popen.assert_called_once()
+        record_args = mock_popen.call_args[0][0]
+        self.assertIn("exec-out", record_args)
+        self.assertIn("perfetto -c - -o -", record_args[-1])
+        # The trace config goes to perfetto's stdin
+        config = proc.stdin.write.call_args[0][0]
+        self.assertIn(b"sched", config)
+        for call in mock_run.call_args_list:
+            self.assertNotIn("pull", call[0][0])
 
     @patch('subprocess.run')
     @patch('os.path.exists')
@@ -190,9 +202,11 @@ test_device_serial        device product:test model:Test_Phone device:test
 
         with patch.object(self.systrace_service, 'start_capture', return_value="sys.html") as mock_sys, \
              patch.object(self.perfetto_service, 'record_trace', return_value="perf.trace") as mock_perf, \
-             patch.object(self.simpleperf_service, 'profile_app', return_value="simp.html") as mock_simp, \
+             patch.object(self.simpleperf_service, 'record_app', return_value="perf.data") as mock_simp, \
+             patch.object(self.simpleperf_service, 'generate_report', return_value="simp.html") as mock_simp_report, \
              patch.object(self.traceview_service, 'start_tracing') as mock_tv_start, \
-             patch.object(self.traceview_service, 'stop_tracing', return_value="tv.trace") as mock_tv_stop:
+             patch.object(self.traceview_service, 'stop_profiling') as mock_tv_stop, \
+             patch.object(self.traceview_service, 'collect_trace', return_value="tv.trace") as mock_tv_collect:
 
             results = self.combo_service.start_combo_capture(
                 device_serial=self.device_serial,
@@ -214,8 +228,11 @@ test_device_serial        device product:test model:Test_Phone device:test
             mock_sys.assert_called_once()
             mock_perf.assert_called_once()
             mock_simp.assert_called_once()
+            # The report is generated from the recorded perf.data
+            self.assertEqual(mock_simp_report.call_args[0][0], "perf.data")
             mock_tv_start.assert_called_once()
             mock_tv_stop.assert_called_once()
+            mock_tv_collect.assert_called_once()
 
 if __name__ == '__main__':
     unittest.main()
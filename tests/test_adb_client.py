@@ -0,0 +1,392 @@
+import unittest
+from unittest.mock import ANY, MagicMock, patch
+import gzip
+import io
+import os
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.adb_client import AdbClient, AdbError
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+
+DEVICES = "emulator-5554          device product:sdk model:Pixel_7 device:emu64 transport_id:1\n"
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    """Implements just enough of the adb server protocol for the client tests."""
+
+    def _recv_exact(self, size):
+        buf = b""
+        while len(buf) < size:
+            chunk = self.request.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError
+            buf += chunk
+        return buf
+
+    def _read_request(self):
+        length = int(self._recv_exact(4), 16)
+        return self._recv_exact(length).decode()
+
+    def _okay_block(self, payload):
+        data = payload.encode()
+        self.request.sendall(b"OKAY" + b"%04x" % len(data) + data)
+
+    def _fail(self, message):
+        data = message.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        try:
+            request = self._read_request()
+            if request == "host:version":
+                self._okay_block("0029")
+                return
+            if request == "host:devices-l":
+                self._okay_block(DEVICES)
+                return
+            if request == "host:track-devices-l":
+                self._okay_block(DEVICES)
+                block = b"emulator-5554          offline\n"
+                self.request.sendall(b"%04x" % len(block) + block)
+                self.request.sendall(b"0000")
+                return
+            if request != "host:transport:emulator-5554":
+                self._fail("device not found")
+                return
+            self.request.sendall(b"OKAY")
+            service = self._read_request()
+            if service.startswith("shell,v2,raw:"):
+                self.request.sendall(b"OKAY")
+                self._shell(service[len("shell,v2,raw:"):])
+            elif service == "sync:":
+                self.request.sendall(b"OKAY")
+                self._sync()
+            else:
+                self._fail("unknown service")
+        except ConnectionError:
+            pass
+
+    def _packet(self, packet_id, data):
+        self.request.sendall(bytes([packet_id]) + struct.pack("<I", len(data)) + data)
+
+    def _shell(self, command):
+        self.server.commands.append(command)
+        if command == "perfetto -o - -t 1s":
+            for i in range(3):
+                self._packet(1, bytes([i]) * 100000)
+            self._packet(2, b"trace written\n")
+            self._packet(3, b"\x00")
+        elif command == "set -o pipefail; (perfetto -o - -t 1s) | gzip -c -1":
+            packed = gzip.compress(b"".join(bytes([i]) * 100000 for i in range(3)))
+            for i in range(0, len(packed), 100):
+                self._packet(1, packed[i:i + 100])
+            self._packet(3, b"\x00")
+        elif command.startswith("gzip -c -1 "):
+            packed = gzip.compress(self.server.files[command[len("gzip -c -1 "):]])
+            if command.endswith("/truncated"):
+                packed = packed[: len(packed) // 2]
+            self._packet(1, packed)
+            self._packet(3, b"\x00")
+        elif command.startswith("echo "):
+            self._packet(1, command[5:].encode() + b"\n")
+            self._packet(3, b"\x00")
+        else:
+            self._packet(2, b"not found\n")
+            self._packet(3, b"\x7f")
+
+    def _sync(self):
+        while True:
+            header = self._recv_exact(8)
+            tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+            if tag == b"QUIT":
+                return
+            path = self._recv_exact(length).decode()
+            if tag == b"STAT":
+                content = self.server.files.get(path)
+                mode, size = (0o100644, len(content)) if content is not None else (0, 0)
+                self.request.sendall(b"STAT" + struct.pack("<III", mode, size, 0))
+            elif tag == b"RECV":
+                content = self.server.files.get(path)
+                if content is None:
+                    msg = b"No such file"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
+                    continue
+                for i in range(0, len(content), 7):
+                    chunk = content[i:i + 7]
+                    self.request.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                    if self.server.drop_mid_recv:
+                        # Dies once, after the first chunk
+                        self.server.drop_mid_recv = False
+                        return
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+            elif tag == b"SEND":
+                remote = path.rsplit(",", 1)[0]
+                data = b""
+                while True:
+                    header = self._recv_exact(8)
+                    tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+                    if tag == b"DONE":
+                        break
+                    data += self._recv_exact(length)
+                self.server.files[remote] = data
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            if self.server.drop_sync:
+                return
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeAdbHandler)
+        self.connections = 0
+        self.commands = []
+        self.files = {}
+        # Close sync connections after one request, like a server that restarted
+        self.drop_sync = False
+        self.drop_mid_recv = False
+
+
+class TestAdbClient(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeAdbServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = AdbClient(port=self.server.server_address[1])
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    @patch('subprocess.run')
+    def test_devices_and_version_use_socket(self, mock_run):
+        self.assertEqual(self.client.devices_output(), DEVICES)
+        self.assertTrue(self.client.is_available())
+        mock_run.assert_not_called()
+
+    def test_track_devices_stream(self):
+        stream = self.client.track_devices()
+        snapshots = []
+        for snapshot in stream:
+            snapshots.append(snapshot)
+            if len(snapshots) == 3:
+                break
+        stream.close()
+        self.assertEqual(snapshots, [DEVICES, "emulator-5554          offline\n", ""])
+
+    @patch('subprocess.run')
+    def test_shell_v2_exit_code(self, mock_run):
+        result = self.client.shell("emulator-5554", ["echo", "hello"])
+        self.assertEqual(result.stdout, "hello\n")
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(self.server.commands, ["echo hello"])
+
+        with self.assertRaises(AdbError):
+            self.client.shell("emulator-5554", "missing_binary")
+        failed = self.client.shell("emulator-5554", "missing_binary", check=False)
+        self.assertEqual(failed.exit_code, 127)
+        self.assertEqual(failed.stderr, "not found\n")
+        mock_run.assert_not_called()
+
+    def test_shell_stream_writes_binary_to_sink(self):
+        out = os.path.join(self.tmp.name, "trace.bin")
+        progress = []
+        with open(out, "wb") as f:
+            result = self.client.shell_stream(
+                "emulator-5554", ["perfetto", "-o", "-", "-t", "1s"], f, on_progress=progress.append
+            )
+        with open(out, "rb") as f:
+            data = f.read()
+        self.assertEqual(data, b"\x00" * 100000 + b"\x01" * 100000 + b"\x02" * 100000)
+        self.assertEqual(progress, [100000, 200000, 300000])
+        self.assertEqual(result.stderr, "trace written\n")
+        self.assertEqual(result.stdout, "")
+
+    def test_unknown_device_raises(self):
+        with self.assertRaises(AdbError):
+            self.client.shell("nope", "echo hi")
+
+    def test_push_pull_reuse_pooled_connection(self):
+        local = os.path.join(self.tmp.name, "in.bin")
+        with open(local, "wb") as f:
+            f.write(b"perfetto-trace-bytes" * 10)
+
+        self.client.push("emulator-5554", local, "/data/local/tmp/x")
+        out = os.path.join(self.tmp.name, "out.bin")
+        self.client.pull("emulator-5554", "/data/local/tmp/x", out)
+
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"perfetto-trace-bytes" * 10)
+        # Both transfers ran over the same sync connection
+        self.assertEqual(self.server.connections, 1)
+
+    def test_pull_retries_when_pooled_connection_was_closed(self):
+        self.server.files["/data/local/tmp/x"] = b"trace" * 10
+        self.server.drop_sync = True
+        out = os.path.join(self.tmp.name, "out.bin")
+
+        self.client.pull("emulator-5554", "/data/local/tmp/x", out)
+        self.client.pull("emulator-5554", "/data/local/tmp/x", out)
+
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"trace" * 10)
+
+    def test_pooled_connection_dies_mid_transfer(self):
+        self.server.files["/x"] = b"x" * 30
+        self.server.files["/y"] = b"y" * 30
+        out = os.path.join(self.tmp.name, "out.bin")
+        self.client.pull("emulator-5554", "/y", out)
+
+        self.server.drop_mid_recv = True
+        self.client.pull("emulator-5554", "/x", out)
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 30)
+
+        self.client.pull("emulator-5554", "/y", out)
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"y" * 30)
+
+    @patch('subprocess.run')
+    def test_local_error_mid_transfer_is_not_retried(self, mock_run):
+        self.server.files["/x"] = b"x" * 30
+        self.server.files["/y"] = b"y" * 30
+        out = os.path.join(self.tmp.name, "out.bin")
+        self.client.pull("emulator-5554", "/y", out)
+
+        def disk_full(received, total):
+            raise OSError("No space left on device")
+
+        with self.assertRaises(OSError):
+            self.client.pull("emulator-5554", "/x", out, on_progress=disk_full)
+        with self.assertRaises(FileNotFoundError):
+            self.client.pull("emulator-5554", "/x", os.path.join(self.tmp.name, "missing", "out.bin"))
+        mock_run.assert_not_called()
+
+        # The half-read connection was closed rather than pooled
+        self.client.pull("emulator-5554", "/y", out)
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"y" * 30)
+
+    def test_pull_missing_file(self):
+        out = os.path.join(self.tmp.name, "missing.bin")
+        with self.assertRaises(AdbError):
+            self.client.pull("emulator-5554", "/nope", out)
+        self.assertFalse(os.path.exists(out))
+        self.assertFalse(os.path.exists(out + ".part"))
+
+    def test_pull_reports_progress_against_file_size(self):
+        self.server.files["/data/local/tmp/perf.data"] = b"x" * 20
+        out = os.path.join(self.tmp.name, "perf.data")
+        progress = []
+
+        self.client.pull(
+            "emulator-5554", "/data/local/tmp/perf.data", out, on_progress=lambda *p: progress.append(p)
+        )
+
+        self.assertEqual(progress, [(7, 20), (14, 20), (20, 20)])
+
+    def test_pull_cancelled_mid_transfer(self):
+        self.server.files["/data/local/tmp/perf.data"] = b"x" * 70
+        out = os.path.join(self.tmp.name, "perf.data")
+        token = CancellationToken()
+
+        with self.assertRaises(CaptureCancelled):
+            self.client.pull(
+                "emulator-5554",
+                "/data/local/tmp/perf.data",
+                out,
+                on_progress=lambda received, total: token.cancel(),
+                cancel_token=token,
+            )
+        self.assertFalse(os.path.exists(out))
+        self.assertFalse(os.path.exists(out + ".part"))
+
+    def test_shell_stream_compressed(self):
+        out = os.path.join(self.tmp.name, "trace.bin")
+        progress = []
+        with open(out, "wb") as f:
+            self.client.shell_stream(
+                "emulator-5554", "perfetto -o - -t 1s", f, on_progress=progress.append, compress=True
+            )
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"\x00" * 100000 + b"\x01" * 100000 + b"\x02" * 100000)
+        # Progress counts inflated bytes, not what crossed the wire
+        self.assertEqual(progress[-1], 300000)
+
+    def test_shell_stream_feeds_compression_policy(self):
+        with patch.object(self.client.compression, "record") as record:
+            for compress in (False, True):
+                self.client.shell_stream(
+                    "emulator-5554", "perfetto -o - -t 1s", io.BytesIO(), compress=compress
+                )
+        self.assertEqual(record.call_args_list, [
+            (("emulator-5554", False, 300000, ANY),),
+            (("emulator-5554", True, 300000, ANY),),
+        ])
+
+    def test_pull_compressed(self):
+        content = os.urandom(1000) * 50
+        self.server.files["/data/local/tmp/perf.data"] = content
+        out = os.path.join(self.tmp.name, "perf.data")
+
+        self.client.pull("emulator-5554", "/data/local/tmp/perf.data", out, compress=True)
+
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(self.server.commands, ["gzip -c -1 /data/local/tmp/perf.data"])
+
+    def test_pull_compressed_truncated(self):
+        self.server.files["/truncated"] = os.urandom(5000)
+        out = os.path.join(self.tmp.name, "truncated.bin")
+        with self.assertRaises(AdbError):
+            self.client.pull("emulator-5554", "/truncated", out, compress=True)
+        self.assertFalse(os.path.exists(out))
+        self.assertFalse(os.path.exists(out + ".part"))
+
+    @patch('subprocess.run')
+    def test_falls_back_to_subprocess_without_server(self, mock_run):
+        self.server.shutdown()
+        self.server.server_close()
+        mock_run.return_value = MagicMock(returncode=0, stdout="ok", stderr="")
+
+        result = self.client.shell("emulator-5554", ["echo", "ok"])
+
+        self.assertEqual(result.stdout, "ok")
+        args = mock_run.call_args[0][0]
+        self.assertEqual(args, ["adb", "-s", "emulator-5554", "shell", "echo", "ok"])
+
+    @patch('subprocess.run')
+    @patch('subprocess.Popen')
+    def test_stream_falls_back_to_exec_out(self, mock_popen, mock_run):
+        self.server.shutdown()
+        self.server.server_close()
+        proc = mock_popen.return_value
+        proc.stdout = io.BytesIO(b"\x00\r\n\x01")
+        proc.stderr = io.BytesIO(b"")
+        proc.wait.return_value = 0
+        mock_run.return_value = MagicMock(returncode=0, stdout="perfetto: warning\n3\n", stderr="")
+        sink = io.BytesIO()
+
+        result = self.client.shell_stream("emulator-5554", "perfetto -o -", sink, check=False)
+
+        self.assertEqual(sink.getvalue(), b"\x00\r\n\x01")
+        self.assertEqual((result.exit_code, result.stderr), (3, "perfetto: warning\n"))
+        args = mock_popen.call_args[0][0]
+        self.assertEqual(args[:4], ["adb", "-s", "emulator-5554", "exec-out"])
+        self.assertTrue(args[4].startswith("(perfetto -o -) 2>/data/local/tmp/"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import stat
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+
+# The systrace scripts import their package from the systrace package root
+SYSTRACE_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/systrace/systrace'))
+sys.path.insert(0, SYSTRACE_DIR)
+
+from systrace.tracing_agents.atrace_stream import AtraceStreamProcessor, stream_command_output
+
+try:
+    # Needs six, devil and the other catapult dependencies
+    from systrace.tracing_agents import atrace_agent
+except ImportError:
+    atrace_agent = None
+
+TRACE = (
+    b"# tracer: nop\n"
+    b"#\n"
+    b"  Binder_1-381 (-----) [000] .... 1.000000: dropped\n"
+    b"##### CPU 1 buffer started ####\n"
+    b"  Binder_2-382 (-----) [001] .... 2.000000: kept\n"
+    b"  <idle>-0 (-----) [002] .... 3.000000: idle\n"
+)
+EXPECTED = (
+    b"# tracer: nop\n"
+    b"#\n"
+    b"##### CPU 1 buffer started ####\n"
+    b"Binder_2-382 ( 128) [001] .... 2.000000: kept\n"
+    b"  <idle>-0 (-----) [002] .... 3.000000: idle\n"
+)
+PID2_TGID = {b"381": b"128", b"382": b"128"}
+
+
+def _process(raw, chunk_size, **kwargs):
+    processor = AtraceStreamProcessor(**kwargs)
+    for i in range(0, len(raw), chunk_size):
+        processor.feed(raw[i:i + chunk_size])
+    return processor.finish()
+
+
+class TestAtraceStreamProcessor(unittest.TestCase):
+    def test_plain_trace_with_crlf(self):
+        raw = b"capturing trace... done\r\nTRACE:\r\n" + TRACE.replace(b"\n", b"\r\n")
+        for chunk_size in (1, 3, 1 << 20):
+            self.assertEqual(_process(raw, chunk_size, pid2_tgid=PID2_TGID), EXPECTED)
+
+    def test_compressed_trace_split_across_chunks(self):
+        raw = b"TRACE:\r\r\n" + zlib.compress(TRACE).replace(b"\n", b"\r\r\n")
+        for chunk_size in (1, 2, 7, 1 << 20):
+            self.assertEqual(_process(raw, chunk_size, pid2_tgid=PID2_TGID), EXPECTED)
+
+    def test_fixes_can_be_turned_off(self):
+        raw = b"TRACE:\n" + TRACE
+        self.assertEqual(_process(raw, 5, fix_circular=False), TRACE)
+
+    def test_missing_marker(self):
+        processor = AtraceStreamProcessor()
+        processor.feed(b"error: closed\n")
+        with self.assertRaises(IOError):
+            processor.finish()
+
+
+# Bytes that are not valid utf-8, as in compressed trace data
+RAW_OUTPUT = b"TRACE:\r\n\x78\x9c\xff\xfe\r\n"
+
+
+def _python(code):
+    return [sys.executable, "-c", code]
+
+
+class TestStreamCommandOutput(unittest.TestCase):
+    def test_passes_raw_bytes_through_a_real_pipe(self):
+        chunks = []
+        returncode, stderr = stream_command_output(
+            _python("import sys; sys.stdout.buffer.write(%r)" % RAW_OUTPUT), chunks.append, 30)
+
+        self.assertEqual((returncode, stderr), (0, b""))
+        self.assertEqual(b"".join(chunks), RAW_OUTPUT)
+
+    def test_reports_exit_code_and_stderr(self):
+        returncode, stderr = stream_command_output(
+            _python("import sys; sys.stderr.write('no atrace'); sys.exit(3)"), lambda chunk: None, 30)
+
+        self.assertEqual((returncode, stderr), (3, b"no atrace"))
+
+    def test_timeout_kills_a_blocked_read(self):
+        started = time.monotonic()
+        chunks = []
+        returncode, _ = stream_command_output(
+            _python("import sys, time; sys.stdout.write('x'); sys.stdout.flush(); time.sleep(60)"),
+            chunks.append, 0.5)
+
+        self.assertIsNone(returncode)
+        self.assertEqual(chunks, [b"x"])
+        self.assertLess(time.monotonic() - started, 30)
+
+
+@unittest.skipIf(atrace_agent is None, "systrace dependencies are not installed")
+class TestAtraceAgentStreamShellOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Stands in for adb: writes the raw output whatever it is asked to run
+        self.adb = os.path.join(self.tmp.name, "adb")
+        with open(self.adb, "w") as f:
+            f.write("#!%s\nimport sys\nsys.stdout.buffer.write(%r)\n" % (sys.executable, RAW_OUTPUT))
+        os.chmod(self.adb, os.stat(self.adb).st_mode | stat.S_IEXEC)
+        self.agent = atrace_agent.AtraceAgent.__new__(atrace_agent.AtraceAgent)
+        self.agent._device_serial_number = "emulator-5554"
+        self.agent._device_utils = SimpleNamespace(adb=SimpleNamespace(GetAdbPath=lambda: self.adb))
+
+    def test_stream_shell_output_reads_raw_bytes(self):
+        chunks = []
+        self.agent._stream_shell_output(["atrace", "--async_stop", "-z"], chunks.append)
+        self.assertEqual(b"".join(chunks), RAW_OUTPUT)
+
+if __name__ == '__main__':
+    unittest.main()
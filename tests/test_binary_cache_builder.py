@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# binary_cache_builder is a vendored simpleperf script importing its siblings as top-level modules
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+import binary_cache_builder
+from binary_cache_builder import BinaryCacheBuilder, BinaryStore
+
+LIBC_ID = '0x' + 'a' * 40
+LIBM_ID = '0x' + 'b' * 40
+
+
+class FakeDevice:
+    """adb pull writes the build id of a device file as the host file's content."""
+
+    def __init__(self, files):
+        self.files = files
+        self.pulled = []
+
+    def run(self, args):
+        if args[0] == 'pull' and args[1] in self.files:
+            self.pulled.append(args[1])
+            Path(args[2]).write_text(self.files[args[1]])
+            return True
+        return args[0] != 'pull'
+
+
+def _read_build_id(path):
+    return Path(path).read_text()
+
+
+class TestBinaryCacheBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.device = FakeDevice({'/system/lib64/libc.so': LIBC_ID,
+                                  '/system/lib64/libm.so': LIBM_ID})
+        adb = MagicMock()
+        adb.run.side_effect = self.device.run
+        readelf = MagicMock()
+        readelf.get_build_id.side_effect = _read_build_id
+        for patcher in [patch.object(binary_cache_builder, 'AdbHelper', return_value=adb),
+                        patch.object(binary_cache_builder, 'ReadElf', return_value=readelf)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _build(self, session, binaries):
+        builder = BinaryCacheBuilder(None, False, self.root / 'binary_store', jobs=2)
+        builder.binary_cache_dir = self.root / session / 'binary_cache'
+        builder.binary_cache.binary_dir = builder.binary_cache_dir
+        builder.binary_cache_dir.mkdir(parents=True)
+        builder.binaries = binaries
+        builder.pull_binaries_from_device()
+        builder.create_build_id_list()
+        return builder
+
+    def _pulled_binaries(self):
+        return sorted(path for path in self.device.pulled if path != '/proc/kallsyms')
+
+    def test_second_profile_links_binaries_from_store(self):
+        binaries = {'/system/lib64/libc.so': LIBC_ID, '/system/lib64/libm.so': LIBM_ID}
+        self._build('session1', binaries)
+        self.assertEqual(self._pulled_binaries(), sorted(binaries))
+        self.device.pulled.clear()
+
+        builder = self._build('session2', binaries)
+
+        self.assertEqual(self._pulled_binaries(), [])
+        libc = builder.binary_cache_dir / LIBC_ID[2:] / 'libc.so'
+        self.assertEqual(libc.read_text(), LIBC_ID)
+        self.assertEqual(
+            (builder.binary_cache_dir / 'build_id_list').read_text().splitlines(),
+            ['%s=%s' % (LIBC_ID, os.path.join(LIBC_ID[2:], 'libc.so')),
+             '%s=%s' % (LIBM_ID, os.path.join(LIBM_ID[2:], 'libm.so'))])
+        store = BinaryStore(self.root / 'binary_store')
+        self.assertEqual(store.get(LIBC_ID).read_text(), LIBC_ID)
+
+    def test_only_missing_binaries_are_pulled(self):
+        self._build('session1', {'/system/lib64/libc.so': LIBC_ID})
+        self.device.pulled.clear()
+
+        self._build('session2', {'/system/lib64/libc.so': LIBC_ID,
+                                 '/system/lib64/libm.so': LIBM_ID})
+
+        self.assertEqual(self._pulled_binaries(), ['/system/lib64/libm.so'])
+
+    def test_binary_with_other_build_id_is_not_stored(self):
+        builder = self._build('session1', {'/system/lib64/libc.so': LIBM_ID})
+
+        self.assertIsNone(BinaryStore(self.root / 'binary_store').get(LIBM_ID))
+        self.assertEqual((builder.binary_cache_dir / 'build_id_list').read_text(), '')
+
+if __name__ == '__main__':
+    unittest.main()
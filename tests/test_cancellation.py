@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+import unittest
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+
+
+class TestCancellationToken(unittest.TestCase):
+    def test_cancel_runs_callbacks_once(self):
+        token = CancellationToken()
+        calls = []
+        done = threading.Event()
+        token.on_cancel(lambda: (calls.append("stop"), done.set()))
+
+        token.cancel()
+        token.cancel()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, ["stop"])
+        self.assertTrue(token.is_cancelled)
+        with self.assertRaises(CaptureCancelled):
+            token.raise_if_cancelled()
+
+    def test_unregistered_callback_is_not_run(self):
+        token = CancellationToken()
+        calls = []
+        unregister = token.on_cancel(lambda: calls.append("stop"))
+        unregister()
+
+        token.cancel()
+
+        self.assertEqual(calls, [])
+
+    def test_callback_registered_after_cancel_runs_immediately(self):
+        token = CancellationToken()
+        token.cancel()
+        calls = []
+
+        token.on_cancel(lambda: calls.append("stop"))
+
+        self.assertEqual(calls, ["stop"])
+        self.assertTrue(token.wait(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.services.capture_pipeline import (
+    CapturePipeline,
+    CaptureSession,
+    CaptureTool,
+    PerfettoTool,
+    SimpleperfTool,
+)
+
+
+class TestCapturePipeline(unittest.TestCase):
+    def test_report_overlaps_other_tools_recording(self):
+        report_started = threading.Event()
+        perfetto = MagicMock()
+        simpleperf = MagicMock()
+        simpleperf.record_app.return_value = "perf.data"
+
+        def generate_report(perf_data, cancel_token):
+            report_started.set()
+            return "report.html"
+
+        def record_trace(serial, **kwargs):
+            # Perfetto only finishes once simpleperf's report is under way
+            self.assertTrue(report_started.wait(5))
+            return "trace.perfetto-trace"
+
+        simpleperf.generate_report.side_effect = generate_report
+        perfetto.record_trace.side_effect = record_trace
+        session = CaptureSession("123", 1, configs={"package_name": "com.example"})
+
+        results, errors = CapturePipeline([PerfettoTool(perfetto), SimpleperfTool(simpleperf)]).run(session)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(results, {"perfetto": "trace.perfetto-trace", "simpleperf": "report.html"})
+        self.assertEqual(
+            set(session.timings["simpleperf"]), {"start", "collect", "post_process"}
+        )
+
+    def test_system_profile_is_pulled_in_collect_stage(self):
+        simpleperf = MagicMock()
+        simpleperf.collect_system.return_value = "perf.data"
+        simpleperf.generate_report.return_value = "report.html"
+        session = CaptureSession("123", 1)
+
+        results, errors = CapturePipeline([SimpleperfTool(simpleperf)]).run(session)
+
+        self.assertEqual(results, {"simpleperf": "report.html"})
+        simpleperf.record_system.assert_called_once_with("123", 1, 4000, None)
+        simpleperf.collect_system.assert_called_once()
+
+    def test_failing_stage_is_reported_per_tool(self):
+        class Broken(CaptureTool):
+            name = "broken"
+
+            def start(self, session):
+                raise RuntimeError("device offline")
+
+        perfetto = MagicMock()
+        perfetto.record_trace.return_value = "trace"
+
+        results, errors = CapturePipeline([Broken(), PerfettoTool(perfetto)]).run(CaptureSession("123", 1))
+
+        self.assertEqual(results, {"perfetto": "trace"})
+        self.assertEqual(errors, {"broken": "device offline"})
+
+
+if __name__ == '__main__':
+    unittest.main()
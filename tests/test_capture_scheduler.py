@@ -0,0 +1,93 @@
+import unittest
+import os
+import sys
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.services.capture_scheduler import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    PRIORITY_HIGH,
+    QUEUED,
+    RUNNING,
+    CaptureScheduler,
+)
+
+
+class TestCaptureScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = CaptureScheduler(max_concurrent_jobs=2)
+        self.gates = {}
+
+    def tearDown(self):
+        for gate in self.gates.values():
+            gate.set()
+        self.scheduler.shutdown()
+
+    def _blocking(self, name):
+        gate = self.gates[name] = threading.Event()
+
+        def run():
+            gate.wait(5)
+            return name
+        return run
+
+    def test_one_job_per_device(self):
+        first = self.scheduler.submit(self._blocking("a"), devices=["dev1"])
+        second = self.scheduler.submit(self._blocking("b"), devices=["dev1"])
+        other = self.scheduler.submit(self._blocking("c"), devices=["dev2"])
+
+        self.assertEqual(first.state, RUNNING)
+        self.assertEqual(second.state, QUEUED)
+        # A job for another device is not held back by the busy one
+        self.assertEqual(other.state, RUNNING)
+        self.assertTrue(self.scheduler.is_device_busy("dev1"))
+
+        self.gates["a"].set()
+        self.assertTrue(first.wait(5))
+        self.assertEqual(first.result, "a")
+        self.gates["b"].set()
+        self.assertTrue(second.wait(5))
+        self.assertEqual(second.state, DONE)
+
+    def test_global_limit_and_priority(self):
+        order = []
+        self.scheduler.submit(self._blocking("a"), devices=["dev1"])
+        self.scheduler.submit(self._blocking("b"), devices=["dev2"])
+        low = self.scheduler.submit(lambda: order.append("low"), devices=["dev3"])
+        high = self.scheduler.submit(lambda: order.append("high"), devices=["dev4"], priority=PRIORITY_HIGH)
+
+        self.assertEqual(low.state, QUEUED)
+        self.assertEqual([j.state for j in self.scheduler.jobs()], [RUNNING, RUNNING, QUEUED, QUEUED])
+        self.assertIs(self.scheduler.jobs()[2], high)
+
+        self.gates["a"].set()
+        self.assertTrue(high.wait(5))
+        self.gates["b"].set()
+        self.assertTrue(low.wait(5))
+        self.assertEqual(order, ["high", "low"])
+
+    def test_cancel_and_failure(self):
+        states = []
+        self.scheduler.submit(self._blocking("a"), devices=["dev1"])
+        queued = self.scheduler.submit(
+            self._blocking("b"), devices=["dev1"], on_state_change=lambda job: states.append(job.state)
+        )
+        self.assertTrue(self.scheduler.cancel(queued))
+        self.assertEqual(queued.state, CANCELLED)
+        self.assertEqual(states, [QUEUED, CANCELLED])
+        self.assertFalse(self.scheduler.cancel(queued))
+
+        def boom():
+            raise RuntimeError("device offline")
+        failed = self.scheduler.submit(boom, devices=["dev2"])
+        self.assertTrue(failed.wait(5))
+        self.assertEqual(failed.state, FAILED)
+        self.assertEqual(failed.error, "device offline")
+        self.assertFalse(self.scheduler.is_device_busy("dev2"))
+
+if __name__ == '__main__':
+    unittest.main()
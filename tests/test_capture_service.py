@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.services.capability_cache import CapabilityCache
+from easy_tracer.services.capture_service import CaptureService
+
+class TestCaptureServiceCapabilities(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.tmp.name) / "caps.json"
+        self.adapter = MagicMock()
+        self.adapter.get_device_info.return_value = {
+            "fingerprint": "google/oriole/oriole:14/AP1A/1:user/release-keys",
+            "sdk": "34",
+            "abi": "arm64-v8a",
+            "tracing_path": "/sys/kernel/tracing",
+        }
+        self.adapter.get_categories.return_value = ["gfx", "sched"]
+        self.adapter.get_ftrace_events.return_value = ["sched/sched_switch"]
+        self.service = CaptureService(
+            self.adapter,
+            output_dir=self.tmp.name,
+            capability_cache=CapabilityCache(self.cache_path),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_categories_are_probed_once_per_fingerprint(self):
+        self.assertEqual(self.service.get_available_categories("123"), ["gfx", "sched"])
+        self.assertEqual(self.service.get_available_categories("123"), ["gfx", "sched"])
+        self.adapter.get_categories.assert_called_once_with("123")
+
+        caps = self.service.get_cached_capabilities("123")
+        self.assertEqual(caps.sdk_level, 34)
+        self.assertEqual(caps.abi, "arm64-v8a")
+
+    def test_cache_survives_restart_and_invalidates_on_new_build(self):
+        self.service.get_ftrace_events("123")
+
+        reloaded = CaptureService(
+            self.adapter,
+            output_dir=self.tmp.name,
+            capability_cache=CapabilityCache(self.cache_path),
+        )
+        self.assertEqual(reloaded.get_ftrace_events("123"), ["sched/sched_switch"])
+        self.adapter.get_ftrace_events.assert_called_once_with("123", "/sys/kernel/tracing")
+
+        self.adapter.get_device_info.return_value = dict(
+            self.adapter.get_device_info.return_value, fingerprint="google/oriole/oriole:15/new"
+        )
+        reloaded.get_ftrace_events("123")
+        self.assertEqual(self.adapter.get_ftrace_events.call_count, 2)
+
+    def test_ftrace_events_do_not_probe_categories(self):
+        self.assertEqual(self.service.get_ftrace_events("123"), ["sched/sched_switch"])
+        self.adapter.get_categories.assert_not_called()
+
+        # Categories are filled in later without dropping the events
+        self.assertEqual(self.service.get_available_categories("123"), ["gfx", "sched"])
+        self.assertEqual(self.service.get_ftrace_events("123"), ["sched/sched_switch"])
+        self.adapter.get_ftrace_events.assert_called_once_with("123", "/sys/kernel/tracing")
+
+    def test_refresh_forces_probe(self):
+        self.service.get_available_categories("123")
+        self.service.get_available_categories("123", refresh=True)
+        self.assertEqual(self.adapter.get_categories.call_count, 2)
+
+    def test_refresh_keeps_the_other_probe(self):
+        self.service.get_available_categories("123")
+        self.service.get_ftrace_events("123")
+
+        self.adapter.get_categories.return_value = ["gfx"]
+        self.service.get_available_categories("123", refresh=True)
+        self.assertEqual(self.service.get_cached_capabilities("123").ftrace_events,
+                         ["sched/sched_switch"])
+
+        self.adapter.get_ftrace_events.return_value = ["sched/sched_waking"]
+        self.service.get_ftrace_events("123", refresh=True)
+        caps = self.service.get_cached_capabilities("123")
+        self.assertEqual(caps.categories, ["gfx"])
+        self.assertEqual(caps.ftrace_events, ["sched/sched_waking"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from unittest.mock import MagicMock, patch
+import json
 import os
 import sys
+import tempfile
 
 # Add src to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
@@ -29,8 +31,9 @@ class TestComboService(unittest.TestCase):
         # Setup mocks
         self.mock_systrace.start_capture.return_value = "systrace.html"
         self.mock_perfetto.record_trace.return_value = "perfetto.trace"
-        self.mock_simpleperf.profile_app.return_value = "simpleperf.html"
-        self.mock_traceview.stop_tracing.return_value = "traceview.trace"
+        self.mock_simpleperf.record_app.return_value = "perf.data"
+        self.mock_simpleperf.generate_report.return_value = "simpleperf.html"
+        self.mock_traceview.collect_trace.return_value = "traceview.trace"
 
         device_serial = "123"
         duration = 1
@@ -60,11 +63,13 @@ class TestComboService(unittest.TestCase):
         # Verify calls
         self.mock_systrace.start_capture.assert_called_once()
         self.mock_perfetto.record_trace.assert_called_once()
-        self.mock_simpleperf.profile_app.assert_called_once()
+        self.mock_simpleperf.record_app.assert_called_once()
+        self.mock_simpleperf.generate_report.assert_called_once_with("perf.data", None)
 
-        # Traceview specific: start then stop
+        # Traceview specific: start, stop, then pull
         self.mock_traceview.start_tracing.assert_called_once()
-        self.mock_traceview.stop_tracing.assert_called_once()
+        self.mock_traceview.stop_profiling.assert_called_once_with("123", "com.example")
+        self.mock_traceview.collect_trace.assert_called_once()
 
     def test_start_combo_capture_partial(self):
         self.mock_systrace.start_capture.return_value = "systrace.html"
@@ -91,5 +96,42 @@ class TestComboService(unittest.TestCase):
 
         self.mock_perfetto.record_trace.assert_not_called()
 
+    def test_fanout_isolates_devices(self):
+        def record_trace(serial, **kwargs):
+            if serial == "bad":
+                raise RuntimeError("device offline")
+            return os.path.join(kwargs["output_dir"], "perfetto.trace")
+
+        self.mock_perfetto.record_trace.side_effect = record_trace
+        self.mock_simpleperf.generate_report.return_value = "perf.html"
+        done = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.service.output_dir = tmp
+            batch = self.service.start_fanout_capture(
+                ["emulator-5554", "bad", "10.0.0.2:5555"],
+                1,
+                {'perfetto': True, 'simpleperf': True},
+                {},
+                max_parallel_devices=2,
+                on_device_done=done.append,
+            )
+
+            self.assertEqual([d.serial for d in batch.devices], ["emulator-5554", "bad", "10.0.0.2:5555"])
+            self.assertEqual(len(done), 3)
+            good, bad, wifi = batch.devices
+            self.assertEqual(good.status, "ok")
+            self.assertEqual(bad.status, "partial")
+            self.assertEqual(bad.errors, {"perfetto": "device offline"})
+            self.assertEqual(batch.failed, [bad])
+            # Every device gets its own folder; host:port serials are made path-safe
+            self.assertEqual(os.path.basename(wifi.output_dir), "10.0.0.2_5555")
+            self.assertTrue(wifi.results["perfetto"].startswith(wifi.output_dir))
+
+            with open(batch.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["tools"], ["perfetto", "simpleperf"])
+            self.assertEqual([d["status"] for d in manifest["devices"]], ["ok", "partial", "ok"])
+
 if __name__ == '__main__':
     unittest.main()
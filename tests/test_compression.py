@@ -0,0 +1,60 @@
+import unittest
+import gzip
+import io
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.compression import CompressionPolicy, GzipDecodingSink
+
+MB = 1 << 20
+
+
+class TestGzipDecodingSink(unittest.TestCase):
+    def test_decodes_in_chunks(self):
+        data = b"perfetto" * 10000
+        packed = gzip.compress(data)
+        out = io.BytesIO()
+        sink = GzipDecodingSink(out)
+        for i in range(0, len(packed), 17):
+            sink.write(packed[i:i + 17])
+        sink.finish()
+        self.assertEqual(out.getvalue(), data)
+        self.assertEqual(sink.written, len(data))
+
+    def test_truncated_stream(self):
+        sink = GzipDecodingSink(io.BytesIO())
+        sink.write(gzip.compress(os.urandom(1000))[:100])
+        with self.assertRaises(EOFError):
+            sink.finish()
+
+
+class TestCompressionPolicy(unittest.TestCase):
+    def test_defaults_to_compressing_network_devices(self):
+        policy = CompressionPolicy()
+        self.assertTrue(policy.should_compress("192.168.1.20:5555"))
+        self.assertFalse(policy.should_compress("emulator-5554"))
+
+    def test_follows_measured_throughput(self):
+        policy = CompressionPolicy()
+        # Slow USB link: worth trying compression
+        policy.record("usb", False, 10 * MB, 2.0)
+        self.assertTrue(policy.should_compress("usb"))
+        # ...but the device compresses slower than the link moves plain data
+        policy.record("usb", True, 10 * MB, 4.0)
+        self.assertFalse(policy.should_compress("usb"))
+
+        # Small transfers are ignored
+        policy.record("wifi:5555", True, 1000, 10.0)
+        self.assertIsNone(policy.rate("wifi:5555", True))
+
+    def test_fixed_modes(self):
+        self.assertTrue(CompressionPolicy("always").should_compress("emulator-5554"))
+        self.assertFalse(CompressionPolicy("never").should_compress("10.0.0.1:5555"))
+        with self.assertRaises(ValueError):
+            CompressionPolicy("sometimes")
+
+if __name__ == '__main__':
+    unittest.main()
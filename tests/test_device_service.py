@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.models.device import Device
+from easy_tracer.services.device_service import DeviceService, diff_devices
+
+class TestDeviceService(unittest.TestCase):
+    def test_diff_devices(self):
+        old = [Device("a", "device"), Device("b", "device")]
+        new = [Device("a", "offline"), Device("c", "device")]
+
+        events = {(e.kind, e.device.serial) for e in diff_devices(old, new)}
+
+        self.assertEqual(events, {("changed", "a"), ("added", "c"), ("removed", "b")})
+
+    def test_tracking_reports_changes_only(self):
+        snapshots = [
+            [Device("a", "device")],
+            [Device("a", "device")],
+            [Device("a", "device"), Device("b", "unauthorized")],
+            [],
+        ]
+        adapter = MagicMock()
+
+        def track_devices(on_devices, stop_event):
+            for devices in snapshots:
+                on_devices(devices)
+
+        adapter.track_devices.side_effect = track_devices
+        service = DeviceService(adapter)
+        calls = []
+        done = threading.Event()
+
+        def on_change(devices, events):
+            calls.append([(e.kind, e.device.serial) for e in events])
+            if not devices:
+                done.set()
+
+        service.start_tracking(on_change)
+        self.assertTrue(done.wait(2))
+        service.stop_tracking()
+
+        self.assertEqual(calls, [
+            [("added", "a")],
+            [("added", "b")],
+            [("removed", "a"), ("removed", "b")],
+        ])
+        adapter.stop_tracking.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# simpleperf_utils is a vendored simpleperf script imported as a top-level module
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+import simpleperf_utils
+from simpleperf_utils import AddrRange, DisassemblyCache, Objdump
+
+DSO_INFO = ('/cache/libview.so', 'arm64', '0xbeef')
+
+
+def _function_lines(i):
+    start = 0x1000 + 0x20 * i
+    return (['%016x <f%d>:' % (start, i), '; view.cpp:%d' % i] +
+            [' %x:      \tnop' % (start + 4 * k) for k in range(4)])
+
+
+def _objdump_output(count=200):
+    lines = ['', 'Disassembly of section .text:', '']
+    for i in range(count):
+        lines += _function_lines(i) + ['']
+    return lines
+
+
+class TestDisassemblyCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = patch.object(simpleperf_utils.ToolFinder, 'find_tool_path', return_value='tool')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _objdump(self, output):
+        cache = DisassemblyCache(self.tmp.name)
+        # Small blocks, so lookups cross block boundaries
+        cache.BLOCK_LINES = 7
+        objdump = Objdump(None, MagicMock(), cache)
+        objdump._disassemble_binary = MagicMock(side_effect=output)
+        return objdump
+
+    def test_functions_are_looked_up_in_cached_binary(self):
+        ranges = [AddrRange(0x1000 + 0x20 * i, 0x10) for i in (3, 4, 90, 150)]
+        objdump = self._objdump(lambda dso_info: iter(_objdump_output()))
+
+        result = objdump.disassemble_functions(DSO_INFO, ranges)
+
+        lines = [[line for line, _ in disassembly.lines] for disassembly in result]
+        # Lines after an instruction belong to it, except after the last one, where a
+        # direct objdump run stops.
+        self.assertEqual(lines, [_function_lines(3) + [''], _function_lines(4) + [''],
+                                 _function_lines(90) + [''], _function_lines(150)])
+        self.assertEqual(result[0].lines[2], (' 1060:      \tnop', 0x1060))
+
+        # A later report reads the cache file instead of running objdump
+        second = self._objdump(AssertionError('objdump must not run'))
+        cached = second.disassemble_functions(DSO_INFO, ranges)
+        self.assertEqual([d.lines for d in cached], [d.lines for d in result])
+
+    def test_stripped_binary_has_its_own_cache_entry(self):
+        objdump = self._objdump(lambda dso_info: iter(_objdump_output()))
+        objdump.readelf = MagicMock()
+        objdump.readelf.get_arch.return_value = 'arm64'
+        keys = []
+        for name, size in (('unstripped.so', 4096), ('stripped.so', 1024)):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, 'wb') as f:
+                f.write(b'\0' * size)
+            objdump.binary_finder.find_binary.return_value = path
+            dso_info = objdump.get_dso_info('/system/lib64/libview.so', '0xbeef')
+            objdump.disassemble_functions(dso_info, [AddrRange(0x1000, 0x10)])
+            keys.append(dso_info[2])
+
+        # Both copies have the same build id, but each one is disassembled
+        self.assertEqual(keys, ['0xbeef-4096', '0xbeef-1024'])
+        self.assertEqual(objdump._disassemble_binary.call_count, 2)
+
+    def test_failed_objdump_is_not_cached(self):
+        def output(dso_info):
+            yield from _objdump_output(3)
+            raise subprocess.CalledProcessError(1, 'llvm-objdump')
+
+        objdump = self._objdump(output)
+
+        self.assertIsNone(objdump.disassemble_functions(DSO_INFO, [AddrRange(0x1000, 0x10)]))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,18 @@
 import unittest
 from unittest.mock import MagicMock, patch
+import itertools
 import os
 import sys
+import tempfile
+import threading
 
 # Add src to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from easy_tracer.framework.perfetto_adapter import PerfettoAdapter
+from easy_tracer.framework.adb_client import AdbError, ShellResult
+from easy_tracer.framework.cancellation import CancellationToken, CaptureCancelled
+from easy_tracer.framework.perfetto_adapter import DEFAULT_CATEGORIES, PerfettoAdapter
+from easy_tracer.framework.perfetto_config import build_trace_config, to_binary
 
 class TestPerfettoAdapter(unittest.TestCase):
     def setUp(self):
@@ -50,5 +56,244 @@ class TestPerfettoAdapter(unittest.TestCase):
         self.assertEqual(args3[3], "shell")
         self.assertEqual(args3[4], "rm")
 
+    def test_record_trace_streamed(self):
+        adb = MagicMock()
+
+        def shell_stream(serial, cmd, sink, on_progress=None, stdin_data=None, compress=False, cancel_token=None):
+            sink.write(b"trace-bytes")
+            on_progress(11)
+
+        adb.shell_stream.side_effect = shell_stream
+        adb.should_compress.return_value = False
+        adapter = PerfettoAdapter(adb_client=adb)
+        progress = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "local.trace")
+            path = adapter.record_trace(
+                device_serial="12345",
+                output_path=output_path,
+                duration_seconds=5,
+                stream_output=True,
+                on_progress=progress.append,
+            )
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"trace-bytes")
+            self.assertEqual(os.listdir(tmp), ["local.trace"])
+
+        cmd = adb.shell_stream.call_args[0][1]
+        self.assertEqual(cmd[:3], ["perfetto", "-o", "-"])
+        self.assertEqual(progress, [11])
+        # No temp file on the device: nothing to pull or remove
+        adb.pull.assert_not_called()
+        adb.shell.assert_not_called()
+
+    def test_record_trace_pipes_trace_config(self):
+        adb = MagicMock()
+        adapter = PerfettoAdapter(adb_client=adb)
+        config = build_trace_config(5, 1024, ["gfx"], data_sources=["linux.ftrace", "android.power"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            adapter.record_trace(
+                "12345", os.path.join(tmp, "local.trace"), stream_output=True, trace_config=config
+            )
+
+        args, kwargs = adb.shell_stream.call_args
+        self.assertEqual(args[1], ["perfetto", "-c", "-", "-o", "-"])
+        self.assertEqual(kwargs["stdin_data"], to_binary(config))
+
+    def _long_mode_adb(self, chunks):
+        """Fake client whose device file grows by one chunk per tail; the last chunk ends the session."""
+        adb = MagicMock()
+        adb.shell.return_value = ShellResult(0, "4242\n", "")
+        state = {"polls": 0}
+
+        def shell_stream(serial, cmd, sink, on_progress=None, check=True, compress=False, cancel_token=None):
+            index = state["polls"]
+            state["polls"] += 1
+            chunk = chunks[index] if index < len(chunks) else b""
+            if isinstance(chunk, Exception):
+                raise chunk
+            sink.write(chunk)
+            on_progress(len(chunk))
+            running = index < len(chunks) - 1
+            return ShellResult(0 if running else 1, "", "")
+
+        adb.shell_stream.side_effect = shell_stream
+        adb.should_compress.return_value = False
+        return adb
+
+    def test_record_long_trace_drains_while_recording(self):
+        adb = self._long_mode_adb([b"aa", b"bbb", b"c"])
+        adapter = PerfettoAdapter(adb_client=adb)
+        progress = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            adapter.record_long_trace(
+                "12345",
+                output_path,
+                duration_seconds=60,
+                file_write_period_ms=1000,
+                flush_period_ms=5000,
+                on_progress=progress.append,
+                poll_interval=0,
+            )
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(), b"aabbbc")
+
+        start_cmd = adb.shell.call_args_list[0]
+        self.assertEqual(start_cmd[0][1][:4], ["perfetto", "--background", "-c", "-"])
+        expected = build_trace_config(
+            60,
+            32768,
+            DEFAULT_CATEGORIES,
+            write_into_file=True,
+            file_write_period_ms=1000,
+            flush_period_ms=5000,
+        )
+        self.assertEqual(start_cmd[1]["stdin_data"], to_binary(expected))
+
+        tails = [c[0][1] for c in adb.shell_stream.call_args_list]
+        self.assertTrue(tails[0].startswith("tail -c +1 "))
+        self.assertTrue(tails[1].startswith("tail -c +3 "))
+        self.assertIn("kill -0 4242", tails[1])
+        self.assertTrue(tails[3].startswith("tail -c +7 "))
+        self.assertEqual(progress, [2, 5, 6, 6])
+        self.assertEqual(adb.shell.call_args_list[-1][0][1][:2], ["rm", "-f"])
+
+    def test_record_long_trace_without_duration_is_not_stopped(self):
+        adb = self._long_mode_adb([b"aa", b"bbb", b"c"])
+        adapter = PerfettoAdapter(adb_client=adb)
+        config = build_trace_config(60, 32768, DEFAULT_CATEGORIES, write_into_file=True)
+        config.duration_ms = None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            # Every poll looks like another hour has passed
+            with patch('time.monotonic', side_effect=itertools.count(0, 3600)):
+                adapter.record_long_trace("12345", output_path, poll_interval=0, trace_config=config)
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(), b"aabbbc")
+
+        commands = [c[0][1] for c in adb.shell.call_args_list]
+        self.assertNotIn(["kill", "4242"], commands)
+
+    def test_stop_token_ends_unbounded_trace_and_keeps_it(self):
+        adb = self._long_mode_adb([b"aa", b"bbb", b"c"])
+        adapter = PerfettoAdapter(adb_client=adb)
+        config = build_trace_config(60, 32768, DEFAULT_CATEGORIES, write_into_file=True)
+        config.duration_ms = None
+        stop_token = CancellationToken()
+        stop_token.cancel()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            adapter.record_long_trace(
+                "12345", output_path, poll_interval=0, trace_config=config, stop_token=stop_token
+            )
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(), b"aabbbc")
+
+        commands = [c[0][1] for c in adb.shell.call_args_list]
+        self.assertEqual(commands.count(["kill", "4242"]), 1)
+
+    def test_perfetto_ignoring_sigterm_is_killed(self):
+        # The session never exits on its own
+        adb = self._long_mode_adb([b"a"] * 100)
+        adapter = PerfettoAdapter(adb_client=adb)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            with patch('time.monotonic', side_effect=itertools.count(0, 3600)):
+                adapter.record_long_trace("12345", output_path, duration_seconds=60, poll_interval=0)
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(), b"aaaa")
+
+        commands = [c[0][1] for c in adb.shell.call_args_list]
+        self.assertEqual(commands[1:3], [["kill", "4242"], ["kill", "-KILL", "4242"]])
+        self.assertEqual(commands[-1][:2], ["rm", "-f"])
+
+    def test_record_long_trace_without_pid_fails(self):
+        adb = self._long_mode_adb([b"aa"])
+        adb.shell.return_value = ShellResult(0, "perfetto: started\n", "")
+        adapter = PerfettoAdapter(adb_client=adb)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(RuntimeError) as ctx:
+                adapter.record_long_trace("12345", os.path.join(tmp, "long.trace"), poll_interval=0)
+
+        self.assertIn("no session pid", str(ctx.exception))
+        adb.shell_stream.assert_not_called()
+
+    def test_record_long_trace_keeps_partial_data_on_disconnect(self):
+        adb = self._long_mode_adb([b"aa", b"bbb", AdbError("device offline"), b""])
+        adapter = PerfettoAdapter(adb_client=adb)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            with self.assertRaises(RuntimeError) as ctx:
+                adapter.record_long_trace("12345", output_path, poll_interval=0)
+            with open(output_path, "rb") as f:
+                self.assertEqual(f.read(), b"aabbb")
+
+        self.assertIn("Partial trace (5 bytes)", str(ctx.exception))
+        # The device copy is left in place so it can still be pulled later
+        self.assertEqual(adb.shell.call_count, 1)
+
+    def test_cancel_streamed_trace_stops_perfetto(self):
+        adb = MagicMock()
+        adb.should_compress.return_value = False
+        token = CancellationToken()
+        killed = threading.Event()
+        adb.shell.side_effect = lambda serial, cmd, **kwargs: killed.set() if "kill" in cmd else None
+
+        def shell_stream(serial, cmd, sink, on_progress=None, stdin_data=None, compress=False, cancel_token=None):
+            sink.write(b"partial")
+            cancel_token.cancel()
+            # The tracer is stopped from the token's callback thread
+            self.assertTrue(killed.wait(5))
+            cancel_token.raise_if_cancelled()
+
+        adb.shell_stream.side_effect = shell_stream
+        adapter = PerfettoAdapter(adb_client=adb)
+        phases = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(CaptureCancelled):
+                adapter.record_trace(
+                    "12345",
+                    os.path.join(tmp, "local.trace"),
+                    stream_output=True,
+                    cancel_token=token,
+                    on_phase=phases.append,
+                )
+            self.assertEqual(os.listdir(tmp), [])
+
+        cmd = adb.shell_stream.call_args[0][1]
+        self.assertEqual(cmd[:2], ["sh", "-c"])
+        self.assertIn("exec perfetto -o -", cmd[2])
+        pid_file = cmd[2].split(" > ")[1].split(";")[0]
+        self.assertIn(f"kill -TERM $(cat {pid_file})", adb.shell.call_args_list[0][0][1])
+        self.assertEqual(adb.shell.call_args_list[-1][0][1], ["rm", "-f", pid_file])
+        self.assertEqual(phases, ["starting", "recording"])
+
+    def test_cancel_long_trace_removes_device_and_local_files(self):
+        adb = self._long_mode_adb([b"aa", b"bbb", b"c"])
+        adapter = PerfettoAdapter(adb_client=adb)
+        token = CancellationToken()
+        token.cancel()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "long.trace")
+            with self.assertRaises(CaptureCancelled):
+                adapter.record_long_trace("12345", output_path, poll_interval=0, cancel_token=token)
+            self.assertFalse(os.path.exists(output_path))
+
+        commands = [c[0][1] for c in adb.shell.call_args_list]
+        self.assertEqual(commands[1], ["kill", "4242"])
+        self.assertEqual(commands[2][:2], ["rm", "-f"])
+        adb.shell_stream.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.perfetto_config import (
+    BufferConfig,
+    DataSourceConfig,
+    TraceConfig,
+    build_trace_config,
+    to_binary,
+    to_pbtxt,
+)
+
+
+class TestPerfettoConfig(unittest.TestCase):
+    def test_binary_encoding(self):
+        config = TraceConfig(buffers=[BufferConfig(1024, "DISCARD")], duration_ms=10000)
+        config.add_data_source(DataSourceConfig("linux.ftrace"))
+
+        expected = (
+            b"\x0a\x05" + b"\x08\x80\x08" + b"\x20\x02"  # buffers { size_kb: 1024 fill_policy: DISCARD }
+            + b"\x12\x10" + b"\x0a\x0e" + b"\x0a\x0clinux.ftrace"  # data_sources { config { name } }
+            + b"\x18\x90\x4e"  # duration_ms: 10000
+        )
+        self.assertEqual(to_binary(config), expected)
+
+    def test_pbtxt_from_builder(self):
+        config = build_trace_config(
+            10,
+            65536,
+            ["gfx", "view"],
+            data_sources=["linux.ftrace", "linux.process_stats", "android.surfaceflinger.frametimeline"],
+            ftrace_events=["sched/sched_switch"],
+            atrace_apps=["com.example"],
+            write_into_file=True,
+            file_write_period_ms=1000,
+            flush_period_ms=5000,
+        )
+        text = to_pbtxt(config)
+
+        self.assertIn("buffers {\n  size_kb: 65536\n  fill_policy: RING_BUFFER\n}", text)
+        self.assertIn('      ftrace_events: "sched/sched_switch"', text)
+        self.assertIn('      atrace_apps: "com.example"', text)
+        self.assertIn("      compact_sched {\n        enabled: true\n      }", text)
+        self.assertIn("      drain_period_ms: 500", text)
+        self.assertIn("      proc_stats_poll_ms: 1000", text)
+        self.assertIn('    name: "android.surfaceflinger.frametimeline"\n  }', text)
+        self.assertIn("write_into_file: true\nfile_write_period_ms: 1000\nflush_period_ms: 5000\n", text)
+
+    def test_builder_skips_heap_profilers_without_target(self):
+        config = build_trace_config(10, 1024, [], data_sources=["linux.ftrace", "android.heapprofd"])
+        self.assertEqual(config.data_source_names(), ["linux.ftrace"])
+
+        config = build_trace_config(
+            10, 1024, [], data_sources=["android.heapprofd"], atrace_apps=["com.example"]
+        )
+        self.assertEqual(config.data_sources[0].config.heapprofd_config.process_cmdline, ["com.example"])
+
+    def test_unknown_fill_policy(self):
+        with self.assertRaises(ValueError):
+            build_trace_config(10, 1024, [], fill_policy="KEEP")
+
+if __name__ == '__main__':
+    unittest.main()
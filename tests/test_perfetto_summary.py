@@ -0,0 +1,131 @@
+import unittest
+import os
+import sys
+import tempfile
+import zlib
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.perfetto_summary import summarize_trace
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, value):
+    if isinstance(value, int):
+        return _varint(number << 3) + _varint(value)
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _message(*fields):
+    return b''.join(_field(number, value) for number, value in fields)
+
+
+def _trace(*packets):
+    return b''.join(_field(1, packet) for packet in packets)
+
+
+def _ftrace_stats(phase, *cpus):
+    return _message((34, _message((1, phase), *[
+        (2, _message((1, cpu), (3, overrun), (8, dropped))) for cpu, overrun, dropped in cpus
+    ])))
+
+
+BUNDLE = _message((1, _message((1, 0), (2, b'x' * 100))), (10, 7))
+TRACE = _trace(
+    _message((8, 1000000000), (10, 1), (6, b'clock')),
+    _ftrace_stats(1, (0, 5, 0), (1, 2, 1)),
+    BUNDLE,
+    _message((42, 1), (1, _message((1, 1))), (10, 7)),
+    _message((50, zlib.compress(_trace(BUNDLE, BUNDLE)))),
+    _ftrace_stats(2, (0, 5, 0), (1, 12, 4)),
+    _message((8, 3500000000), (10, 1), (35, _message((1, _message(
+        (12, 1 << 20), (1, 3 << 20), (3, 2), (18, 0), (4, 3)))))),
+)
+
+
+class TestPerfettoSummary(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _summarize(self, data):
+        path = os.path.join(self.tmp.name, 'trace.perfetto-trace')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return summarize_trace(path)
+
+    def test_summary(self):
+        summary = self._summarize(TRACE)
+        self.assertEqual(summary.size_bytes, len(TRACE))
+        self.assertEqual(summary.packet_count, 8)
+        self.assertEqual(summary.packets_by_type, {
+            'clock_snapshot': 1, 'ftrace_stats': 2, 'ftrace_events': 4, 'trace_stats': 1,
+        })
+        self.assertEqual(summary.packets_by_sequence, {1: 2, 0: 2, 7: 4})
+        self.assertEqual(summary.drops_by_sequence, {7: 1})
+        self.assertEqual(summary.duration_seconds, 2.5)
+        self.assertFalse(summary.truncated)
+
+        self.assertEqual(len(summary.buffers), 1)
+        buffer = summary.buffers[0]
+        self.assertEqual((buffer.size, buffer.bytes_written, buffer.write_wrap_count), (1 << 20, 3 << 20, 3))
+        self.assertTrue(summary.buffer_overflowed)
+
+        # Only losses during the trace count
+        self.assertEqual([(c.cpu, c.overrun, c.dropped_events) for c in summary.ftrace_cpus],
+                         [(0, 0, 0), (1, 10, 3)])
+        self.assertEqual(summary.ftrace_lost_events, 13)
+
+        text = summary.format()
+        self.assertIn('8 packets', text)
+        self.assertIn('OVERFLOWED', text)
+        self.assertIn('cpu1 13', text)
+        self.assertIn('1 packet drops on 1 of 3 sequences', text)
+
+    def test_drop_flag_on_first_packet_of_sequence_is_ignored(self):
+        data = _trace(
+            _message((42, 1), (1, _message((1, 1))), (10, 7)),
+            BUNDLE,
+            # A sequence restarted by its writer
+            _message((42, 1), (87, 1), (1, _message((1, 1))), (10, 7)),
+            _message((42, 1), (1, _message((1, 1))), (10, 9)),
+        )
+        summary = self._summarize(data)
+        self.assertEqual(summary.packets_by_sequence, {7: 3, 9: 1})
+        self.assertEqual(summary.drops_by_sequence, {})
+
+    def test_truncated_trace(self):
+        summary = self._summarize(TRACE[:-5])
+        self.assertTrue(summary.truncated)
+        self.assertEqual(summary.packet_count, 7)
+        self.assertEqual(summary.buffers, [])
+
+    def test_corrupt_compressed_packets(self):
+        data = _trace(BUNDLE, _message((50, b'not zlib data')), BUNDLE)
+        summary = self._summarize(data)
+        self.assertTrue(summary.truncated)
+        self.assertEqual(summary.packet_count, 1)
+
+    def test_empty_file(self):
+        summary = self._summarize(b'')
+        self.assertEqual(summary.packet_count, 0)
+        self.assertEqual(summary.duration_seconds, 0.0)
+
+    def test_not_a_trace(self):
+        with self.assertRaises(ValueError):
+            self._summarize(b'# tracer: nop\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+import io
+import json
+import os
+import sys
+import tempfile
+import zlib
+
+# The systrace scripts import their package from the systrace package root
+SYSTRACE_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/systrace/systrace'))
+sys.path.insert(0, SYSTRACE_DIR)
+
+from systrace import perfetto_to_systrace
+from systrace.perfetto_to_systrace import SYSTRACE_HEADER
+
+
+def _varint(value):
+    value &= (1 << 64) - 1
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, value):
+    if isinstance(value, int):
+        return _varint(number << 3) + _varint(value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _message(*fields):
+    return b''.join(_field(number, value) for number, value in fields)
+
+
+def _packed(*values):
+    return b''.join(_varint(v) for v in values)
+
+
+def _trace(*packets):
+    return b''.join(_field(1, packet) for packet in packets)
+
+
+def _bundle(cpu, *events, compact=None):
+    fields = [(1, cpu)] + [(2, event) for event in events]
+    if compact is not None:
+        fields.append((4, compact))
+    return _message((1, _message(*fields)))
+
+
+def _event(ts, pid, field, payload):
+    return _message((1, ts), (2, pid), (field, payload))
+
+
+def _print(ts, pid, buf):
+    return _event(ts, pid, 3, _message((1, 0), (2, buf)))
+
+
+PROCESS_TREE = _message((2, _message(
+    (1, _message((1, 100), (2, 1), (3, '/system/bin/surfaceflinger'))),
+    (2, _message((1, 101), (2, 'RenderThread'), (3, 100))),
+)))
+TRACE = _trace(
+    PROCESS_TREE,
+    _bundle(0,
+            _print(1000000000, 101, 'B|100|frame\n'),
+            _event(1002000000, 101, 4, _message(
+                (1, 'RenderThread'), (2, 101), (3, 120), (4, 1),
+                (5, 'swapper/0'), (6, 0), (7, 120)))),
+    _bundle(1,
+            _event(1001000000, 0, 11, _message((1, 1800000), (2, 1))),
+            _event(1003000000, 0, 17, _message(
+                (1, 'RenderThread'), (2, 101), (3, 110), (4, 1), (5, 0)))),
+)
+EXPECTED_LINES = [
+    '    RenderThread-101   (  100) [000] .... 1.000000: tracing_mark_write: B|100|frame\n',
+    '          <idle>-0     (-----) [001] .... 1.001000: cpu_frequency: state=1800000 cpu_id=1\n',
+    '    RenderThread-101   (  100) [000] .... 1.002000: sched_switch: prev_comm=RenderThread '
+    'prev_pid=101 prev_prio=120 prev_state=S ==> next_comm=swapper/0 next_pid=0 next_prio=120\n',
+    '          <idle>-0     (-----) [001] .... 1.003000: sched_wakeup: comm=RenderThread '
+    'pid=101 prio=110 target_cpu=000\n',
+]
+
+
+def _convert(data, output_format='systrace'):
+    out = io.StringIO()
+    perfetto_to_systrace.convert(io.BytesIO(data), out, output_format)
+    return out.getvalue()
+
+
+class TestPerfettoToSystrace(unittest.TestCase):
+    def test_events_merged_across_cpus(self):
+        self.assertEqual(_convert(TRACE), SYSTRACE_HEADER + ''.join(EXPECTED_LINES))
+
+    def test_compact_sched(self):
+        compact = _message(
+            (5, 'swapper/2'), (5, 'binder:100_1'),
+            (1, _packed(5000000000, 1000)),
+            (2, _packed(0, 2)),
+            (3, _packed(102, 0)),
+            (4, _packed(120, 120)),
+            (6, _packed(1, 0)),
+            (7, _packed(5000000500)),
+            (8, _packed(101)),
+            (9, _packed(3)),
+            (10, _packed(110)),
+            (11, _packed(1)),
+        )
+        lines = _convert(_trace(_bundle(2, compact=compact)))[len(SYSTRACE_HEADER):]
+        self.assertEqual(lines.splitlines(), [
+            '          <idle>-0     (-----) [002] .... 5.000000: sched_switch: prev_comm=<idle> '
+            'prev_pid=0 prev_prio=120 prev_state=R ==> next_comm=binder:100_1 next_pid=102 next_prio=120',
+            '    binder:100_1-102   (-----) [002] .... 5.000000: sched_waking: comm=binder:100_1 '
+            'pid=101 prio=110 target_cpu=003',
+            '    binder:100_1-102   (-----) [002] .... 5.000001: sched_switch: prev_comm=binder:100_1 '
+            'prev_pid=102 prev_prio=120 prev_state=D ==> next_comm=swapper/2 next_pid=0 next_prio=120',
+        ])
+
+    def test_prev_state_letters(self):
+        fmt = perfetto_to_systrace._format_prev_state
+        self.assertEqual(fmt(0), 'R')
+        # Preempted while running
+        self.assertEqual(fmt(0x100), 'R+')
+        self.assertEqual(fmt(0x1 | 0x100), 'S+')
+        self.assertEqual(fmt(0x2), 'D')
+
+    def test_compressed_packets(self):
+        packets = TRACE[len(_field(1, PROCESS_TREE)):]
+        data = _trace(PROCESS_TREE, _message((50, zlib.compress(packets))))
+        self.assertEqual(_convert(data), _convert(TRACE))
+
+    def test_truncated_trace(self):
+        # The last packet, the bundle of CPU 1, is cut off
+        self.assertEqual(_convert(TRACE[:-3]),
+                         SYSTRACE_HEADER + EXPECTED_LINES[0] + EXPECTED_LINES[2])
+
+    def test_json_output(self):
+        result = json.loads(_convert(TRACE, 'json'))
+        self.assertEqual(result['traceEvents'], [])
+        self.assertEqual(result['systemTraceEvents'], _convert(TRACE))
+
+    def test_main_writes_output_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, 'trace.perfetto-trace')
+            out_path = os.path.join(tmp, 'trace.txt')
+            with open(trace_path, 'wb') as f:
+                f.write(TRACE)
+            self.assertEqual(perfetto_to_systrace.main([trace_path, out_path]), 0)
+            with open(out_path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), _convert(TRACE))
+
+if __name__ == '__main__':
+    unittest.main()
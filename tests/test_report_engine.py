@@ -0,0 +1,155 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# report_engine runs inside script workers with the simpleperf scripts on sys.path
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+import report_engine
+
+
+def _symbol(name, dso="libapp.so", vaddr_in_file=0):
+    return SimpleNamespace(symbol_name=name, dso_name=dso, vaddr_in_file=vaddr_in_file,
+                           symbol_addr=0, symbol_len=0, mapping=None)
+
+
+def _callchain(*names):
+    entries = [SimpleNamespace(ip=0, symbol=_symbol(name)) for name in names]
+    return SimpleNamespace(nr=len(entries), entries=entries)
+
+
+class FakeReportLib:
+    """Replays fixed samples through the subset of ReportLib the sinks use."""
+
+    def __init__(self, samples):
+        self.samples = list(samples)
+        self.current = None
+        self.next_calls = 0
+        self.closed = False
+
+    def ShowIpForUnknownSymbol(self):
+        pass
+
+    def SetReportOptions(self, options):
+        pass
+
+    def GetArch(self):
+        return "arm64"
+
+    def MetaInfo(self):
+        return {}
+
+    def GetRecordCmd(self):
+        return "simpleperf record -a"
+
+    def GetNextSample(self):
+        self.next_calls += 1
+        if not self.samples:
+            return None
+        self.current = self.samples.pop(0)
+        return self.current[0]
+
+    def GetEventOfCurrentSample(self):
+        return SimpleNamespace(name="cpu-clock")
+
+    def GetSymbolOfCurrentSample(self):
+        return self.current[1]
+
+    def GetCallChainOfCurrentSample(self):
+        return self.current[2]
+
+    def Close(self):
+        self.closed = True
+
+
+def _samples():
+    for i, (leaf, caller) in enumerate([("draw", "__start_thread"), ("draw", "__start_thread"),
+                                         ("layout", "__start_thread")]):
+        sample = SimpleNamespace(pid=10, tid=10, thread_comm="app", period=100,
+                                 time=(i + 1) * 1000000, cpu=0, ip=0)
+        # Like simpleperf, the callchain lists callers of the sampled symbol
+        yield sample, _symbol(leaf), _callchain(leaf, caller)
+
+
+class FailingSink(report_engine.ReportSink):
+    name = 'broken'
+
+    def add_sample(self, lib, sample, event, symbol, callchain):
+        raise ValueError("cannot aggregate")
+
+    def finish(self):
+        raise AssertionError("finish must not run after add_sample failed")
+
+
+class TestReportEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.lib = FakeReportLib(_samples())
+        patcher = patch.object(report_engine, 'GetReportLib', return_value=self.lib)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_one_pass_feeds_every_sink(self):
+        sinks, errors = report_engine.create_sinks(
+            [('stackcollapse', self._path('stacks.txt')), ('gecko', self._path('gecko.json'))],
+            None, None, 1)
+        errors.update(report_engine.run_report_pass('perf.data', sinks, None))
+
+        self.assertEqual(errors, {})
+        # Three samples plus the end marker: the file was read once for both sinks
+        self.assertEqual(self.lib.next_calls, 4)
+        self.assertTrue(self.lib.closed)
+        with open(self._path('stacks.txt')) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ["app;__start_thread;draw 200", "app;__start_thread;layout 100"])
+        with open(self._path('gecko.json')) as f:
+            profile = json.load(f)
+        self.assertEqual(len(profile["threads"]), 1)
+        self.assertEqual(len(profile["threads"][0]["samples"]["data"]), 3)
+
+    def test_failing_sink_does_not_stop_others(self):
+        sinks, _ = report_engine.create_sinks(
+            [('stackcollapse', self._path('stacks.txt'))], None, None, 1)
+        errors = report_engine.run_report_pass(
+            'perf.data', [FailingSink(self._path('broken'))] + sinks, None)
+
+        self.assertEqual(errors, {'broken': 'cannot aggregate'})
+        self.assertTrue(os.path.exists(self._path('stacks.txt')))
+
+    def test_stackcollapse_reports_unknown_symbols_as_unknown(self):
+        # What ShowIpForUnknownSymbol() names frames without a symbol
+        unknown = SimpleNamespace(ip=0, symbol=_symbol(
+            "libapp.so[+1a0]", dso="/data/app/lib/libapp.so", vaddr_in_file=0x1a0))
+        chain = _callchain("draw", "__start_thread")
+        chain.entries.insert(1, unknown)
+        chain.nr += 1
+        sample = SimpleNamespace(pid=10, tid=10, thread_comm="app", period=100,
+                                 time=1000000, cpu=0, ip=0)
+        self.lib.samples = [(sample, _symbol("draw"), chain)]
+        sinks, _ = report_engine.create_sinks(
+            [('stackcollapse', self._path('stacks.txt'))], None, None, 1)
+        report_engine.run_report_pass('perf.data', sinks, None)
+
+        with open(self._path('stacks.txt')) as f:
+            self.assertEqual(f.read().splitlines(), ["app;__start_thread;unknown;draw 100"])
+
+    def test_hide_unknown_ip_keeps_real_symbols(self):
+        symbol = _symbol("lib_helper[+1a0]", vaddr_in_file=0x1a0)
+        self.assertIs(report_engine.hide_unknown_ip(symbol), symbol)
+        chain = _callchain("draw")
+        self.assertIs(report_engine.hide_unknown_ips(chain), chain)
+
+if __name__ == '__main__':
+    unittest.main()
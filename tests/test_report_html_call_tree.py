@@ -0,0 +1,64 @@
+import unittest
+import os
+import sys
+
+# report_html is a vendored simpleperf script that imports its siblings as top-level modules
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+from report_html import CallTree
+
+
+def _tree(*paths):
+    tree = CallTree()
+    for func_ids, event_count in paths:
+        tree.add_path(func_ids, event_count)
+    tree.update_subtree_event_count()
+    return tree
+
+
+def _node(e, s, f, *children):
+    return {'e': e, 's': s, 'f': f, 'c': list(children)}
+
+
+class TestCallTree(unittest.TestCase):
+    def test_subtree_event_count(self):
+        tree = _tree(([1, 2], 10), ([1, 3], 5), ([1], 1), ([4], 2))
+
+        self.assertEqual(tree.subtree_event_count, 18)
+        self.assertEqual(tree.gen_sample_info(), _node(
+            0, 18, -1,
+            _node(1, 16, 1, _node(10, 10, 2), _node(5, 5, 3)),
+            _node(2, 2, 4)))
+
+    def test_cut_edge_drops_small_subtrees(self):
+        tree = _tree(([1, 2], 10), ([1, 3], 1), ([4, 5], 1))
+        hit_func_ids = set()
+
+        tree.cut_edge(5, hit_func_ids)
+
+        self.assertEqual(hit_func_ids, {-1, 1, 2})
+        self.assertEqual(tree.gen_sample_info(), _node(
+            0, 12, -1, _node(0, 11, 1, _node(10, 10, 2))))
+
+    def test_merge_adds_counts_and_appends_new_children(self):
+        tree = _tree(([1, 2], 10))
+        tree.merge(_tree(([1, 3], 4), ([1, 2], 1)))
+
+        self.assertEqual(tree.gen_sample_info(), _node(
+            0, 15, -1, _node(0, 15, 1, _node(11, 11, 2), _node(4, 4, 3))))
+
+    def test_sort_by_function_name(self):
+        names = {1: 'b', 2: 'a', 3: 'c', 4: 'a'}
+        tree = _tree(([1, 3], 1), ([1, 4], 2), ([2], 3))
+
+        tree.sort_by_function_name(names.get)
+
+        self.assertEqual(tree.gen_sample_info(), _node(
+            0, 6, -1,
+            _node(3, 3, 2),
+            _node(0, 3, 1, _node(2, 2, 4), _node(1, 1, 3))))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import base64
+import json
+import os
+import re
+import sys
+import tempfile
+import zlib
+
+# report_html is a vendored simpleperf script that imports its siblings as top-level modules
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+from report_html import CallTree, HtmlWriter, RecordDataWriter, dump_json
+
+
+def _read_blocks(path):
+    blocks = {}
+    pattern = r'<script id="([^"]+)" class="record_data" type="application/json"' \
+              r'( data-encoding="gzip-base64")?>(.*?)</script>'
+    with open(path) as f:
+        for block_id, compressed, text in re.findall(pattern, f.read(), re.S):
+            if compressed:
+                text = zlib.decompress(base64.b64decode(text), wbits=31).decode('utf-8')
+            blocks[block_id] = text
+    return blocks
+
+
+def _resolve(value, blocks):
+    """Replaces {"__chunk": id} references like report_html.js does."""
+    if isinstance(value, dict):
+        if '__chunk' in value:
+            return _resolve(json.loads(blocks[value['__chunk']]), blocks)
+        return {key: _resolve(child, blocks) for key, child in value.items()}
+    if isinstance(value, list):
+        return [_resolve(child, blocks) for child in value]
+    return value
+
+
+class TestRecordDataWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'report.html')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, compress, write):
+        hw = HtmlWriter(self.path)
+        writer = RecordDataWriter(hw, compress)
+        # Flush often, so base64 groups split across compressor outputs
+        writer.FLUSH_SIZE = 7
+        write(writer)
+        hw.close()
+        return _read_blocks(self.path)
+
+    def test_chunks_round_trip(self):
+        names = ['func_%d' % i for i in range(500)]
+
+        def write(writer):
+            names_ref = writer.write_chunk(
+                ['['] + ['"%s",' % name for name in names[:-1]] + ['"%s"]' % names[-1]])
+            last_ref = writer.write_value(names[-1])
+            writer.write_block('record_data', [dump_json({'names': names_ref, 'last': last_ref})])
+
+        for compress in (True, False):
+            blocks = self._write(compress, write)
+            record_info = _resolve(json.loads(blocks['record_data']), blocks)
+            self.assertEqual(len(blocks), 3)
+            self.assertEqual(record_info, {'names': names, 'last': 'func_499'})
+
+    def test_call_tree_json_matches_sample_info(self):
+        tree = CallTree()
+        tree.add_path([1, 2, 3], 5)
+        tree.add_path([1, 4], 2)
+        tree.add_path([5], 1)
+        tree.update_subtree_event_count()
+
+        self.assertEqual(''.join(tree.iter_json()), dump_json(tree.gen_sample_info()))
+        self.assertEqual(''.join(CallTree().iter_json()), '{"e":0,"s":0,"f":-1,"c":[]}')
+
+if __name__ == '__main__':
+    unittest.main()
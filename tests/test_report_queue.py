@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import threading
+from unittest.mock import MagicMock
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.simpleperf_adapter import SimpleperfAdapter
+from easy_tracer.services.capture_scheduler import CANCELLED, DONE, FAILED
+from easy_tracer.services.report_queue import ReportQueue
+
+
+class TestReportQueue(unittest.TestCase):
+    def setUp(self):
+        self.adapter = MagicMock()
+        self.adapter.REPORT_FORMATS = SimpleperfAdapter.REPORT_FORMATS
+        self.queue = ReportQueue(self.adapter, max_workers=2)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def _wait(self, session):
+        for _ in range(200):
+            if session.is_finished:
+                return
+            threading.Event().wait(0.01)
+        self.fail("report session did not finish")
+
+    def test_submit_returns_before_reports_finish(self):
+        release = threading.Event()
+
+        def generate(perf_data_path, formats, cancel_token=None):
+            release.wait(2)
+            return {fmt: f"/out/{fmt}" for fmt in formats}, {}
+
+        self.adapter.generate_reports.side_effect = generate
+        updates = []
+        session = self.queue.submit("/out/perf.data", ["html", "gecko"], on_update=updates.append)
+
+        self.assertFalse(session.is_finished)
+        release.set()
+        self._wait(session)
+        self.assertEqual(session.state, DONE)
+        self.assertEqual(session.outputs, {"html": "/out/html", "gecko": "/out/gecko"})
+        self.assertIn(session, self.queue.sessions())
+        self.assertTrue(updates)
+        # Both formats come from a single pass over perf.data
+        self.adapter.generate_reports.assert_called_once()
+
+    def test_failed_format_does_not_stop_others(self):
+        self.adapter.generate_reports.return_value = (
+            {"html": "/out/report.html"}, {"pprof": "no protobuf"}
+        )
+        session = self.queue.submit("/out/perf.data", ["html", "pprof"])
+        self._wait(session)
+
+        self.assertEqual(session.state, FAILED)
+        self.assertEqual(session.status["html"], DONE)
+        self.assertEqual(session.errors["pprof"], "no protobuf")
+
+    def test_cancel_stops_running_reports(self):
+        started = threading.Event()
+
+        def generate(perf_data_path, formats, cancel_token=None):
+            started.set()
+            cancel_token.wait(2)
+            cancel_token.raise_if_cancelled()
+            return {}, {}
+
+        self.adapter.generate_reports.side_effect = generate
+        session = self.queue.submit("/out/perf.data", ["html"])
+        started.wait(2)
+        self.queue.cancel(session)
+        self._wait(session)
+
+        self.assertEqual(session.state, CANCELLED)
+
+    def test_unknown_format_rejected(self):
+        with self.assertRaises(ValueError):
+            self.queue.submit("/out/perf.data", ["svg"])
+
+if __name__ == '__main__':
+    unittest.main()
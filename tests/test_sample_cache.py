@@ -0,0 +1,170 @@
+import unittest
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# sample_cache runs inside script workers with the simpleperf scripts on sys.path
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+import report_engine
+import sample_cache
+import sample_filter
+
+
+def _symbol(name):
+    return SimpleNamespace(symbol_name=name, dso_name="libapp.so", vaddr_in_file=0x10,
+                           symbol_addr=0x100, symbol_len=0x20)
+
+
+def _callchain(*names):
+    entries = [SimpleNamespace(symbol=_symbol(name)) for name in names]
+    return SimpleNamespace(nr=len(entries), entries=entries)
+
+
+class FakeReportLib:
+    """Replays fixed samples through the subset of ReportLib the cache builder uses."""
+
+    def __init__(self, samples):
+        self.samples = list(samples)
+        self.current = None
+
+    def ShowIpForUnknownSymbol(self):
+        pass
+
+    def SetSymfs(self, symfs_dir):
+        pass
+
+    def SetReportOptions(self, options):
+        pass
+
+    def MetaInfo(self):
+        return {}
+
+    def GetRecordCmd(self):
+        return "simpleperf record -a"
+
+    def GetArch(self):
+        return "arm64"
+
+    def GetNextSample(self):
+        if not self.samples:
+            return None
+        self.current = self.samples.pop(0)
+        return self.current[0]
+
+    def GetEventOfCurrentSample(self):
+        return SimpleNamespace(name="cpu-clock")
+
+    def GetSymbolOfCurrentSample(self):
+        return self.current[1]
+
+    def GetCallChainOfCurrentSample(self):
+        return self.current[2]
+
+    def Close(self):
+        pass
+
+
+def _samples():
+    # Out of time order, like samples from different cpus
+    for time, tid, leaf in [(3000, 11, "layout"), (1000, 10, "draw"), (2000, 10, "draw")]:
+        sample = SimpleNamespace(pid=10, tid=tid, thread_comm="t%d" % tid, period=time // 10,
+                                 time=time, cpu=tid - 10, ip=0)
+        yield sample, _symbol(leaf), _callchain("main")
+
+
+class TestSampleCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.record_file = os.path.join(self.tmp.name, "perf.data")
+        with open(self.record_file, "wb") as f:
+            f.write(b"fake")
+        patcher = patch.object(sample_cache, 'GetReportLib',
+                               side_effect=lambda path: FakeReportLib(_samples()))
+        self.get_report_lib = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_sorted_by_time(self):
+        with sample_cache.load_sample_cache(self.record_file) as cache:
+            self.assertEqual(len(cache), 3)
+            self.assertEqual(list(cache.column('time')), [1000, 2000, 3000])
+            self.assertEqual(list(cache.column('tid')), [10, 10, 11])
+            self.assertEqual(list(cache.column('period')), [100, 200, 300])
+            self.assertEqual(cache.events, ["cpu-clock"])
+            self.assertEqual(cache.string(cache.column('thread_name')[2]), "t11")
+            frames = [cache.symbol_name(s) for s in cache.callchain(2)]
+            self.assertEqual(frames, ["layout", "main"])
+            self.assertEqual(cache.dso_name(cache.callchain(0)[0]), "libapp.so")
+            self.assertEqual(cache.time_range(1500, 3000), (1, 2))
+
+    def test_reuses_cache_until_record_file_changes(self):
+        sample_cache.load_sample_cache(self.record_file).close()
+        sample_cache.load_sample_cache(self.record_file).close()
+        self.assertEqual(self.get_report_lib.call_count, 1)
+
+        with open(self.record_file, "ab") as f:
+            f.write(b"more")
+        sample_cache.load_sample_cache(self.record_file).close()
+        self.assertEqual(self.get_report_lib.call_count, 2)
+
+    def test_thread_index(self):
+        with sample_cache.load_sample_cache(self.record_file) as cache:
+            self.assertEqual(list(cache.thread_ids()), [10, 11])
+            self.assertEqual(list(cache.thread_samples(10)), [0, 1])
+            self.assertEqual(list(cache.thread_samples(10, 1500)), [1])
+            self.assertEqual(list(cache.thread_samples(10, 0, 2000)), [0])
+            self.assertEqual(list(cache.thread_samples(11, 0, 3001)), [2])
+            self.assertEqual(list(cache.thread_samples(12)), [])
+
+    def test_split_time_range_covers_every_sample_once(self):
+        with sample_cache.load_sample_cache(self.record_file) as cache:
+            self.assertEqual(cache.time_bounds(), (1000, 3000))
+            windows = cache.split_time_range(2)
+            self.assertEqual(windows, [(1000, 2000), (2000, 3001)])
+            self.assertEqual([cache.time_range(*w) for w in windows], [(0, 1), (1, 3)])
+
+    def test_sample_filter_time_range_does_not_build_a_cache(self):
+        reader = sample_filter.RecordFileReader(self.record_file)
+        self.assertEqual(reader.get_time_range(), (1000, 3000))
+        self.assertFalse(os.path.exists(sample_cache.cache_path_for(self.record_file)))
+
+        # A current cache answers without reading the record file
+        sample_cache.load_sample_cache(self.record_file, symfs_dir="binary_cache").close()
+        calls = self.get_report_lib.call_count
+        self.assertEqual(reader.get_time_range(), (1000, 3000))
+        self.assertEqual(self.get_report_lib.call_count, calls)
+
+    def test_cache_is_rebuilt_for_other_report_options(self):
+        options = sample_cache.ReportLibOptions(
+            show_art_frames=False, trace_offcpu=None, proguard_mapping_files=None,
+            sample_filters=None, aggregate_threads=None)
+        sample_cache.load_sample_cache(self.record_file, report_lib_options=options).close()
+        sample_cache.load_sample_cache(self.record_file, report_lib_options=options).close()
+        self.assertEqual(self.get_report_lib.call_count, 1)
+
+        options.show_art_frames = True
+        sample_cache.load_sample_cache(self.record_file, report_lib_options=options).close()
+        sample_cache.load_sample_cache(
+            self.record_file, report_lib_options=options, symfs_dir="binary_cache").close()
+        self.assertEqual(self.get_report_lib.call_count, 3)
+
+    def test_time_window_filter_file(self):
+        path = report_engine.write_time_window_filter(self.record_file, part=(2, 2))
+        self.addCleanup(os.remove, path)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines()[1:], ["GLOBAL_BEGIN 2000", "GLOBAL_END 3001"])
+
+        path = report_engine.write_time_window_filter(self.record_file, window=(0.0, 1e-6))
+        self.addCleanup(os.remove, path)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines()[1:], ["GLOBAL_BEGIN 1000", "GLOBAL_END 2000"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from easy_tracer.framework.script_host import ScriptHost, ScriptJob
+
+SCRIPT = '''
+import os
+import sys
+import time
+
+IMPORTS = globals().get("IMPORTS", 0) + 1
+RUNS = 0
+
+def main():
+    global RUNS
+    RUNS += 1
+    if "--fail" in sys.argv:
+        print("about to fail")
+        sys.exit(3)
+    if "--sleep" in sys.argv:
+        time.sleep(0.3)
+    if "--die" in sys.argv:
+        print("dying", flush=True)
+        time.sleep(0.3)
+        os._exit(1)
+    print("args=%s runs=%d cwd=%s" % (" ".join(sys.argv[1:]), RUNS, os.path.basename(os.getcwd())))
+
+def main_impl(argv):
+    print("argv0=%s" % argv[0])
+'''
+
+class TestScriptHost(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.script = os.path.join(cls.tmp.name, "fake_tool.py")
+        with open(cls.script, "w") as f:
+            f.write(SCRIPT)
+        cls.workdir = os.path.join(cls.tmp.name, "session")
+        os.makedirs(cls.workdir)
+        cls.host = ScriptHost(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.host.shutdown()
+        cls.tmp.cleanup()
+
+    def _job(self, *args, **kwargs):
+        return ScriptJob(self.script, "fake_tool", list(args), **kwargs)
+
+    def test_module_stays_imported_between_jobs(self):
+        logs = []
+        first = self.host.run(self._job("-a", cwd=self.workdir), on_log=logs.append)
+        second = self.host.run(self._job("-b", cwd=self.workdir))
+
+        self.assertIn("args=-a runs=", first)
+        self.assertIn("cwd=session", first)
+        self.assertIn("".join(logs), first)
+        # Same worker, same module object: the run counter kept counting
+        runs_first = int(first.split("runs=")[1].split()[0])
+        runs_second = int(second.split("runs=")[1].split()[0])
+        self.assertEqual(runs_second, runs_first + 1)
+
+    def test_argv_param_entry(self):
+        output = self.host.run(self._job(entry="main_impl", argv_param=True))
+        self.assertIn("argv0=fake_tool.py", output)
+
+    def test_failure_raises_with_log(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            self.host.run(self._job("--fail"))
+        self.assertIn("exited with code 3", str(ctx.exception))
+        self.assertIn("about to fail", str(ctx.exception))
+
+    def test_concurrent_jobs_keep_output_separate(self):
+        results = {}
+
+        def run(name):
+            results[name] = self.host.run(self._job("--sleep", name))
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in ("one", "two")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertIn("args=--sleep one", results["one"])
+        self.assertNotIn("two", results["one"])
+        self.assertIn("args=--sleep two", results["two"])
+
+    def test_dead_worker_is_replaced_for_waiting_callers(self):
+        host = ScriptHost(max_workers=1)
+        self.addCleanup(host.shutdown)
+        dying = threading.Event()
+        errors = []
+
+        def run_dying():
+            try:
+                host.run(self._job("--die"), on_log=lambda text: dying.set())
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run_dying)
+        thread.start()
+        self.assertTrue(dying.wait(30))
+        # Waits for the only worker, which dies; a fresh one takes its slot
+        output = host.run(self._job("-y"))
+        thread.join()
+
+        self.assertIn("args=-y runs=1", output)
+        self.assertIn("worker process died", str(errors[0]))
+
+    def test_failed_send_frees_the_worker(self):
+        host = ScriptHost(max_workers=1)
+        self.addCleanup(host.shutdown)
+        job = self._job()
+        job.cwd = lambda: None
+
+        with self.assertRaises(Exception):
+            host.run(job)
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(host.run(self._job("-z"))), daemon=True)
+        thread.start()
+        thread.join(30)
+        self.assertIn("args=-z", results[0])
+
+if __name__ == '__main__':
+    unittest.main()
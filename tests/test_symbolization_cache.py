@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# simpleperf_utils is a vendored simpleperf script imported as a top-level module
+SIMPLEPERF_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/simpleperf'))
+sys.path.insert(0, SIMPLEPERF_DIR)
+
+import simpleperf_utils
+from simpleperf_utils import Addr2Nearestline, SymbolizationCache
+
+# addr -> (function, line) known to the fake llvm-symbolizer
+LINES = {0x1000: ('draw', 10), 0x1008: ('draw', 12), 0x2000: ('layout', 30)}
+
+
+class FakeSymbolizer:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, args, stdin=None, stdout=None):
+        proc = MagicMock()
+        proc.communicate.side_effect = self.communicate
+        return proc
+
+    def communicate(self, data):
+        addrs = [int(line, 16) for line in data.decode().split()]
+        self.requests.append(addrs)
+        out = ''
+        for addr in addrs:
+            if addr in LINES:
+                func, line = LINES[addr]
+                out += '0x%x\n%s\n/src/view.cpp:%d:1\n\n' % (addr, func, line)
+            else:
+                out += '0x%x\n??\n??:0:0\n\n' % addr
+        return out.encode(), b''
+
+
+class TestSymbolizationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'cache', 'symbols.db')
+        self.symbolizer = FakeSymbolizer()
+        for patcher in [
+                patch.object(simpleperf_utils.ToolFinder, 'find_tool_path', return_value='tool'),
+                patch.object(simpleperf_utils.subprocess, 'Popen', self.symbolizer)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _symbolize(self, addrs, sections=('.debug_line',)):
+        cache = SymbolizationCache(self.db_path)
+        self.addCleanup(cache.close)
+        binary_finder = MagicMock()
+        binary_finder.find_binary.return_value = 'libview.so'
+        addr2line = Addr2Nearestline(None, binary_finder, True, cache)
+        addr2line.readelf = MagicMock()
+        addr2line.readelf.get_sections.return_value = list(sections)
+        addr2line.readelf.get_arch.return_value = 'arm64'
+        addr2line.readelf.get_build_id.return_value = '0xbeef'
+        for func_addr, addr in addrs:
+            addr2line.add_addr('/system/lib64/libview.so', None, func_addr, addr)
+        addr2line.convert_addrs_to_lines(1)
+        dso = addr2line.get_dso('/system/lib64/libview.so')
+        return {addr: addr2line.get_addr_source(dso, addr) for _, addr in addrs}
+
+    def test_second_report_skips_symbolizer(self):
+        # 0x100c has no line info itself, so the nearest line before it is used
+        addrs = [(0x1000, 0x1000), (0x1000, 0x100c), (0x2000, 0x2000), (0x3000, 0x3004)]
+        first = self._symbolize(addrs)
+        calls = len(self.symbolizer.requests)
+
+        second = self._symbolize(addrs)
+
+        self.assertEqual(first[0x100c], [('/src/view.cpp', 12, 'draw')])
+        self.assertIsNone(first[0x3004])
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.symbolizer.requests), calls)
+
+    def test_only_misses_are_symbolized(self):
+        self._symbolize([(0x1000, 0x1000)])
+        self.symbolizer.requests.clear()
+
+        result = self._symbolize([(0x1000, 0x1000), (0x2000, 0x2000)])
+
+        self.assertEqual(self.symbolizer.requests, [[0x2000]])
+        self.assertEqual(result[0x1000], [('/src/view.cpp', 10, 'draw')])
+        self.assertEqual(result[0x2000], [('/src/view.cpp', 30, 'layout')])
+
+    def test_stripped_binary_does_not_hide_lines(self):
+        # A stripped copy of the library has the same build id but no line info
+        stripped = self._symbolize([(0x1000, 0x1000)], sections=())
+        self.assertIsNone(stripped[0x1000])
+
+        result = self._symbolize([(0x1000, 0x1000)])
+
+        self.assertEqual(result[0x1000], [('/src/view.cpp', 10, 'draw')])
+        self.assertEqual(self.symbolizer.requests, [[0x1000]])
+
+    def test_lines_are_keyed_by_function_and_build_id(self):
+        cache = SymbolizationCache(self.db_path)
+        self.addCleanup(cache.close)
+        cache.put_lines('0xbeef', True, [(0xffffffff80001000, 0x1000, [['a.cpp', 1, 'f']])])
+
+        self.assertEqual(cache.get_lines('0xbeef', True, {0xffffffff80001000: 0x1000}),
+                         {0xffffffff80001000: [['a.cpp', 1, 'f']]})
+        self.assertEqual(cache.get_lines('0xbeef', True, {0xffffffff80001000: 0x800}), {})
+        self.assertEqual(cache.get_lines('0xcafe', True, {0xffffffff80001000: 0x1000}), {})
+        self.assertEqual(cache.get_lines('0xbeef', False, {0xffffffff80001000: 0x1000}), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import base64
+import gzip
+import io
+import os
+import re
+import sys
+import tempfile
+from unittest.mock import patch
+
+# The systrace scripts import their package from the systrace package root
+SYSTRACE_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../src/easy_tracer/framework/external/systrace/systrace'))
+sys.path.insert(0, SYSTRACE_DIR)
+
+from systrace import trace_html_writer
+from systrace.trace_result import TraceResult
+
+
+def _trace_blocks(html):
+    """(source, decoded payload) of every trace-data block."""
+    blocks = re.findall(r'data-source="([^"]+)">\n(.*?)</script>', html, re.S)
+    return [(source, gzip.decompress(base64.b64decode(text))) for source, text in blocks]
+
+
+class TestTraceHtmlWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = os.path.join(self.tmp.name, "trace.html")
+        for patcher in (patch.object(trace_html_writer, "_POLYMER_DIR", self.tmp.name),
+                        patch.object(trace_html_writer, "_download_failed", False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write(self, results, viewer_dir=None):
+        with patch.dict(os.environ, {trace_html_writer.VIEWER_DIR_ENV: viewer_dir or ""}):
+            path = trace_html_writer.write_trace_html(results, self.output)
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_streams_every_result_without_viewer_assets(self):
+        # Bigger than one chunk, and with text that would end a script block
+        atrace = b"  Binder-1 ( 1) [000] .... 1.0: </script>\n" * 50000
+        html = self._write([
+            TraceResult("systemTraceEvents", atrace),
+            TraceResult("systraceController", {"clock": [1, 2]}),
+            TraceResult("traceEvents", "café"),
+        ])
+
+        self.assertIn('id="trace_list"', html)
+        self.assertNotIn("tr-ui-timeline-view>", html)
+        self.assertEqual(_trace_blocks(html), [
+            ("systemTraceEvents", atrace),
+            ("systraceController", b'{"clock": [1, 2]}'),
+            ("traceEvents", "café".encode("utf-8")),
+        ])
+
+    def test_inlines_catapult_viewer_when_found(self):
+        viewer_dir = os.path.join(self.tmp.name, "viewer")
+        os.makedirs(viewer_dir)
+        for name, text in ((trace_html_writer.TRACE_VIEWER_HTML, "<!-- viewer -->"),
+                           (trace_html_writer.WEBCOMPONENTS_JS, "/* polyfill */")):
+            with open(os.path.join(viewer_dir, name), "w") as f:
+                f.write(text)
+
+        html = self._write([TraceResult("systemTraceEvents", b"# tracer: nop\n")], viewer_dir)
+
+        self.assertIn("/* polyfill */", html)
+        self.assertIn("<!-- viewer -->", html)
+        self.assertIn("<tr-ui-timeline-view>", html)
+        self.assertNotIn("{{", html)
+        self.assertEqual(_trace_blocks(html), [("systemTraceEvents", b"# tracer: nop\n")])
+
+    @patch("urllib.request.urlopen")
+    def test_downloads_viewer_assets_on_first_use(self, mock_urlopen):
+        assets = {trace_html_writer.TRACE_VIEWER_HTML: b"<!-- viewer -->",
+                  trace_html_writer.WEBCOMPONENTS_JS: b"/* polyfill */"}
+        mock_urlopen.side_effect = lambda url, timeout: io.BytesIO(base64.b64encode(
+            assets[url.split("/")[-1].split("?")[0]]))
+        viewer_dir = os.path.join(self.tmp.name, "cache", "viewer")
+
+        html = self._write([TraceResult("systemTraceEvents", b"# tracer: nop\n")], viewer_dir)
+        self.assertIn("<!-- viewer -->", html)
+        self.assertIn("/* polyfill */", html)
+
+        # Later captures use the cached copies
+        self._write([TraceResult("systemTraceEvents", b"# tracer: nop\n")], viewer_dir)
+        self.assertEqual(mock_urlopen.call_count, 2)
+        self.assertEqual(sorted(os.listdir(viewer_dir)), sorted(assets))
+
+    @patch("urllib.request.urlopen", side_effect=OSError("offline"))
+    def test_failed_download_falls_back_to_trace_list(self, mock_urlopen):
+        viewer_dir = os.path.join(self.tmp.name, "viewer")
+
+        for _ in range(2):
+            html = self._write([TraceResult("systemTraceEvents", b"# tracer: nop\n")], viewer_dir)
+            self.assertIn('id="trace_list"', html)
+        # The network is not tried again for every capture
+        mock_urlopen.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()